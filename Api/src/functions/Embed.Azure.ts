@@ -23,6 +23,24 @@ import { IEmbedRequest, IEmbedResponse } from "../../../CommonTs/src/EmbedApi.Ty
 const chunker = getDefaultTextChunker();
 const driver = getDefaultEmbeddingModelDriver();
 
+/**
+ * If the text is bigger than available context, we have to summarise it.
+ * 
+ * @param spec - The embed request, used for the summarisation persona.
+ * @param text - The text to be embedded.
+ * @param context - The context object for logging.
+ * @returns The text, or a summary of it that fits in one embedding chunk.
+ */
+async function fitToEmbeddingChunk (spec: IEmbedRequest, text: string, context: InvocationContext) : Promise<string> {
+
+   if (!chunker.fitsInEmbeddingChunk(text)) {
+      text = await recursiveSummarize(spec.persona, text, 0, chunker.embeddingChunkSize)
+
+      context.log("Summarised to fit in maximum chunk.");
+   }
+   return text;
+}
+
 /**
  * Embed function processes a request to embed text data using CalculateEmbedding function.
  * 
@@ -42,15 +60,33 @@ export async function embed(request: HttpRequest, context: InvocationContext): P
          const spec = (jsonRequest as any).request as IEmbedRequest;
          text = spec.text;
 
-         if ((text && text.length > 0)) {
-
-            // If the text is bigger than available context, we have to summarise it
-            if (!chunker.fitsInEmbeddingChunk(text)) {
-               text = await recursiveSummarize(spec.persona, text, 0, chunker.embeddingChunkSize)
+         // Batch request - embed every text and return them in the same order
+         if (spec.texts && spec.texts.length > 0) {
 
-               context.log("Summarised to fit in maximum chunk.");
+            if (spec.texts.some ((item: string) => !item || item.length === 0)) {
+               context.error("Error embedding batch:");
+               return invalidRequestResponse("Empty text in batch.");
             }
 
+            const embeddings = await Promise.all (spec.texts.map (async (item: string) => {
+               return driver.embed(await fitToEmbeddingChunk (spec, item, context));
+            }));
+
+            const embeddingResponse : IEmbedResponse = {
+               embedding: embeddings[0],
+               embeddings: embeddings
+            };
+
+            return {
+               status: 200, // Ok
+               body: JSON.stringify(embeddingResponse)
+            };
+         }
+
+         if ((text && text.length > 0)) {
+
+            text = await fitToEmbeddingChunk (spec, text, context);
+
             const embeddingResponse : IEmbedResponse = {
                embedding: await driver.embed(text)
             };
@@ -23,9 +23,10 @@ import { HttpRequest, HttpResponseInit, InvocationContext } from "@azure/functio
 
 // Internal imports
 import { isSessionValid, sessionFailResponse, notFoundResponse } from "./Utility.Azure";
-import { IStorable, IStorableQuerySpec, IStorableMultiQuerySpec, IStorableOperationResult} from "../../../CommonTs/src/IStorable";
+import { IStorable, IStorableQuerySpec, IStorableMultiQuerySpec, IStorableOperationResult,
+         IStorableMultiKeyQuerySpec, IStorableMultiSaveSpec, IStorableMultiOperationResult} from "../../../CommonTs/src/IStorable";
 import {AzureLogger, findStorable, loadStorable, saveStorable, removeStorable, 
-        loadRecentStorables, ICosmosStorableParams, StorableTransformer} from './StorableApi.Cosmos';
+        loadRecentStorables, findStorables, saveStorables, ICosmosStorableParams, StorableTransformer} from './StorableApi.Cosmos';
 
 // A transformer function that can be applied to a storable to transform it in some way to the HTTP response
 export type StorableResponseTransformer = (storable: IStorable) => HttpResponseInit;
@@ -109,6 +110,98 @@ export async function findStorableApi(request: HttpRequest,
    }
 };
 
+/**
+ * Asynchronous function to find several Storables by functional search key in one request.
+ * Validates the session key from the request query parameters, then returns the Storables found,
+ * which may be fewer than the keys requested.
+ * 
+ * @param request - The HTTP request containing the session key and an IStorableMultiKeyQuerySpec.
+ * @param params The parameters required for finding the records, including partition key and collection path.
+ * @param context - The context object for logging and error handling.
+ * @param transformer - An optional transformer function to apply to each loaded storable.
+ * @param resultTransformer - An optional transformer function to apply to the result storable array.
+ * @returns A promise of an HTTP response with the array of Storables found.
+ */
+export async function findStorablesApi(request: HttpRequest, 
+   params: ICosmosStorableParams, 
+   context: InvocationContext,
+   transformer: StorableTransformer | undefined = undefined,
+   resultTransformer: StorableArrayResponseTransformer | undefined = undefined): Promise<HttpResponseInit> {
+
+   if (isSessionValid(request, context)) {
+
+      try {      
+         const jsonRequest = await request.json();
+         const spec = (jsonRequest as any).request as IStorableMultiKeyQuerySpec;
+
+         const logger = new AzureLogger(context);
+
+         const results = await findStorables (spec.functionalSearchKeys, params, logger, transformer);
+         context.log("Found:" + results.length.toString());
+
+         return applyArrayTransformer (results, resultTransformer);
+      }
+      catch (e: any) {
+         context.error ("Failed find:" + e?.toString());
+         return {
+            status: 500,
+            body: "Failed find."
+         };
+      }
+   }
+   else {
+      context.error("Failed session validation");           
+      return sessionFailResponse();
+   }
+};
+
+/**
+ * Saves several Storable records in one request.
+ * Validates the session key from the request query parameters, then saves every record in the IStorableMultiSaveSpec,
+ * optionally replacing stored records with the same functional search key.
+ * Returns an HTTP response with the id each record was saved with, and which were saved. If only some
+ * were saved, the response is still 200, with ok false, so the caller knows which to retry.
+ *
+ * @param request - The HTTP request containing an IStorableMultiSaveSpec.
+ * @param params The parameters required for saving the records, including partition key and collection path. 
+ * @param context - The context for the current invocation.
+ * @returns A promise that resolves to an HTTP response with an IStorableMultiOperationResult.
+ */
+export async function saveStorablesApi (request: HttpRequest,  
+   params: ICosmosStorableParams,
+   context: InvocationContext): Promise<HttpResponseInit> {
+
+   if (isSessionValid(request, context)) {
+
+      try {
+         const jsonRequest = await request.json();
+         const spec = (jsonRequest as any).request as IStorableMultiSaveSpec;   
+
+         const logger = new AzureLogger(context);
+         const result: IStorableMultiOperationResult = await saveStorables(spec.records, spec.upsertByFunctionalKey, params, logger);
+
+         if (!result.ok) {
+            context.error("Failed to save some records:" + result.saved.filter ((wasSaved) => !wasSaved).length.toString());
+         }
+         return {
+            status: 200,
+            body: JSON.stringify(result)
+         };         
+      }
+      catch (e: any) {
+         context.error("Failed save:" + e?.toString());
+         return {
+            status: 500,
+            body: "Failed save."
+         };
+      }
+   }
+   else {
+      context.error("Failed session validation");      
+      return sessionFailResponse();
+   }
+};
+
 /**
  * Asynchronous function to load an Storable based on the provided request and context.
  * Validates the session key from the request query parameters and removes the Storable if the session key matches predefined keys.
@@ -21,7 +21,7 @@ import axios from "axios";
 
 // Internal imports
 import { throwIfUndefined } from "../../../CommonTs/src/Asserts";
-import { IStorable, IStorableMultiQuerySpec } from "../../../CommonTs/src/IStorable";
+import { IStorable, IStorableMultiQuerySpec, IStorableMultiOperationResult } from "../../../CommonTs/src/IStorable";
 
 const chunkPartitionKey: string = "c02af798a60b48129c5e223e645a9b72";
 const chunkCollectionPath = "dbs/Studio/colls/Chunk";
@@ -35,6 +35,9 @@ const pagePartitionKey: string = "f11a7404e266499a84a58fead932eec4";
 const pageCollectionPath = "dbs/Studio/colls/Page";
 const pageCollectionName = "Page";
 
+// Most records saveStorables writes at once, so a large batch does not exceed the request units of the collection
+const saveConcurrency = 10;
+
 import { makeStorablePostToken, makeStorableDeleteToken, 
    makePostQueryHeader, makePostHeader, makeDeleteHeader } from './CosmosRepositoryApi';
 
@@ -253,6 +256,130 @@ export async function loadStorable(id: string | undefined,
    return done;
 }
 
+/**
+ * Asynchronously finds several Storables from the database by functional search key, in one query.
+ * 
+ * @param keys - The functional search keys of the Storables to be found.
+ * @param params - the ICosmosStorableParams for the collection
+ * @param context - The invocation context for logging purposes.
+ * @param transformer - An optional transformer function to apply to each loaded storable.
+ * @returns A Promise that resolves to the Storables found, in no particular order.
+ */
+export async function findStorables(keys: Array<string>,    
+   params: ICosmosStorableParams, 
+   context: ILoggingContext,
+   transformer: StorableTransformer | undefined = undefined): Promise<Array<IStorable>> {
+
+   if (!keys || keys.length === 0)
+      return new Array<IStorable>();
+   
+   const dbkey = process.env.COSMOS_API_KEY;
+
+   const done = new Promise<Array<IStorable>>(async function (resolve, reject) {
+
+      const time = new Date().toUTCString();
+      let continuation: string | undefined = undefined;
+      let more = true;
+
+      throwIfUndefined(dbkey); // Keep compiler happy, should not be able to get here with actual undefined key.       
+      const key = makeStorablePostToken(time, params.collectionPath, dbkey);
+      const storedRecords = new Array<IStorable>();
+
+      const query = "SELECT * FROM " + params.collectionName + " a WHERE ARRAY_CONTAINS(@keys, a.functionalSearchKey)";
+
+      // Cosmos returns results a page at a time, so follow the continuation until there are no more
+      while (more) {
+
+         try {
+            const headers = makePostQueryHeader(key, time, params.partitionKey, continuation);
+
+            const resp = await axios.post('https://braidstudio.documents.azure.com:443/' + params.collectionPath + '/docs/',
+               {
+                  "query": query,
+                  "parameters": [
+                     {
+                        "name": "@keys",
+                        "value": keys
+                     }
+                  ]
+               },
+               {
+                  headers: headers
+               });
+
+            if (resp.headers["x-ms-continuation"]) {
+               continuation = resp.headers["x-ms-continuation"];
+            }
+            else {
+               more = false;
+            }
+            const responseRecords = resp.data.Documents;
+
+            for (let i = 0; i < responseRecords.length; i++) {
+               storedRecords.push(applyTransformer(responseRecords[i], transformer));
+            }
+         }
+         catch (error: any) {
+
+            context.error ("Error calling database:", error);
+            reject(new Array<IStorable>());
+            return;
+         }
+      }
+
+      context.log ("Found storables:", storedRecords.length);
+      resolve(storedRecords);
+   });
+
+   return done;
+}
+
+/**
+ * Saves several storable records to a Cosmos database, saveConcurrency at a time.
+ * If upsertByFunctionalKey is true, each record whose functionalSearchKey is already stored is given
+ * the stored id first, found with one query for the whole batch.
+ * A record that fails to save does not stop the others, the result says which were saved.
+ * 
+ * @param records The storable records to be saved.
+ * @param upsertByFunctionalKey Replace stored records with the same functionalSearchKey.
+ * @param params The parameters required for saving the records, including partition key and collection path.
+ * @param context The logging context for capturing log messages during the save operation.
+ * @returns A Promise that resolves to the id each record was saved with and whether it was saved, in input order.
+ */
+export async function saveStorables(records: Array<IStorable>, 
+   upsertByFunctionalKey: boolean,
+   params: ICosmosStorableParams, 
+   context: ILoggingContext): Promise<IStorableMultiOperationResult> {
+
+   if (upsertByFunctionalKey) {
+      const keys = records.map ((record) => record.functionalSearchKey).filter ((key) => key !== undefined) as Array<string>;
+      const existing = await findStorables (keys, params, context);
+      const storedIds = new Map<string, string>();
+      for (const stored of existing) {
+         if (stored.functionalSearchKey && stored.id)
+            storedIds.set (stored.functionalSearchKey, stored.id);
+      }
+      for (const record of records) {
+         const storedId = record.functionalSearchKey ? storedIds.get (record.functionalSearchKey) : undefined;
+         if (storedId)
+            record.id = storedId;
+      }
+   }
+
+   const saved = new Array<boolean>();
+   for (let start = 0; start < records.length; start += saveConcurrency) {
+      const results = await Promise.all (records.slice (start, start + saveConcurrency).map (
+         (record) => saveStorable (record, params, context).catch (() => false)));
+      saved.push (...results);
+   }
+
+   return {
+      ok: saved.every ((wasSaved) => wasSaved),
+      ids: records.map ((record) => record.id as string),
+      saved: saved
+   };
+}
+
 /**
  * Saves a storable record to a Cosmos database.
  * 
@@ -15,7 +15,8 @@ import { app, HttpRequest, HttpResponseInit, InvocationContext } from "@azure/fu
 
 // Internal imports
 import { chunkStorableAttributes } from './StorableApi.Cosmos';
-import { findStorableApi, removeStorableApi, saveStorableApi, getStorableApi, getRecentStorablesApi } from "./StorableApi.Azure";
+import { findStorableApi, removeStorableApi, saveStorableApi, getStorableApi, getRecentStorablesApi,
+         findStorablesApi, saveStorablesApi } from "./StorableApi.Azure";
 
 app.http('GetChunk', {
    methods: ['GET', 'POST'],
@@ -80,6 +81,44 @@ export async function saveChunk(request: HttpRequest, context: InvocationContext
    return saveStorableApi (request, chunkStorableAttributes, context);
 };
 
+app.http('FindChunks', {
+   methods: ['POST'],
+   authLevel: 'anonymous',
+   handler: findChunks
+});
+
+/**
+ * Finds several Chunk records by functional search key in one request.
+ * Validates the session key from the request query parameters, then returns the Chunks found.
+ *
+ * @param request - The HTTP request containing the functional search keys.
+ * @param context - The context for the current invocation.
+ * @returns A promise that resolves to an HTTP response with the array of Chunks found.
+ */
+export async function findChunks(request: HttpRequest, context: InvocationContext): Promise<HttpResponseInit> {
+   
+   return findStorablesApi (request, chunkStorableAttributes, context);
+};
+
+app.http('SaveChunks', {
+   methods: ['POST'],
+   authLevel: 'anonymous',
+   handler: saveChunks
+});
+
+/**
+ * Saves several Chunk records in one request, optionally replacing stored Chunks with the same functional search key.
+ * Validates the session key from the request query parameters, then saves the Chunks.
+ *
+ * @param request - The HTTP request containing the Chunks.
+ * @param context - The context for the current invocation.
+ * @returns A promise that resolves to an HTTP response with the id each Chunk was saved with.
+ */
+export async function saveChunks(request: HttpRequest, context: InvocationContext): Promise<HttpResponseInit> {
+
+   return saveStorablesApi (request, chunkStorableAttributes, context);
+};
+
 app.http('RemoveChunk', {
    methods: ['POST'],
    authLevel: 'anonymous',
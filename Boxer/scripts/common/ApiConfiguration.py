@@ -30,6 +30,8 @@ class ApiConfiguration:
         self.embedModelName="text-embedding-ada-002"
         self.processingThreads = 1
         self.openAiRequestTimeout = 60
+        self.embedBatchSize = 16        # Texts sent per embeddings call
+        self.embedBatchTokens = 64000   # Upper limit on estimated tokens per embeddings call
         self.summaryWordCount = 50      # 50 word summary
         self.chunkDurationMins = 10     # 10 minute long video clips
         self.maxTokens = 4096           # Upper limit on total tokens in an API call. 10 minutes of video = 600 words = 2400 tokens, plus approx 2x headroom
@@ -45,6 +47,8 @@ class ApiConfiguration:
     embedModelName: str
     processingThreads: int
     openAiRequestTimeout: int
+    embedBatchSize: int
+    embedBatchTokens: int
     summaryWordCount: int
     chunkDurationMins: int
     maxTokens: int
@@ -1,5 +1,7 @@
 # Standard library imports
 import os
+import json
+import queue
 from openai import AzureOpenAI
 
 from common.ApiConfiguration import ApiConfiguration
@@ -22,6 +24,23 @@ def ensure_directory_exists(directory):
         # print(f"Directory '{directory}' already exists.")
         pass
 
+def write_chunks_json(file_name, chunks):
+   """
+   Writes a list of chunks as a compact JSON array, one chunk per line.
+   The output reads back with json.load like an indented file, at a fraction of the size,
+   and each chunk is serialised on its own rather than the whole list in one string.
+
+   Parameters:
+   file_name (str): The file to write.
+   chunks (list): The chunks, each JSON-serialisable.
+   """
+   with open(file_name, "w", encoding="utf-8") as f:
+      f.write("[")
+      for i, chunk in enumerate(chunks):
+         f.write(",\n" if i else "\n")
+         f.write(json.dumps(chunk, ensure_ascii=False, separators=(",", ":")))
+      f.write("\n]\n")
+
 # Construct the path using os.path.join() for cross-platform compatibility
 HTML_DESTINATION_DIR = os.path.join("data", "web")
 ensure_directory_exists(HTML_DESTINATION_DIR)
@@ -35,4 +54,51 @@ def get_embedding(text : str, client : AzureOpenAI, config : ApiConfiguration):
    
    return response.data[0].embedding
 
+def get_embeddings(texts : list, client : AzureOpenAI, config : ApiConfiguration):
+   """
+   Gets embeddings for several texts in one call.
+
+   Parameters:
+   texts (list): The texts to embed.
+
+   Returns:
+   list: One embedding per text, in the same order as 'texts'.
+   """
+   texts = [text.replace("\n", " ") for text in texts]
+   response = client.embeddings.create(input = texts,
+                                   model=config.azureEmbedDeploymentName,
+                                   timeout=config.openAiRequestTimeout)
+
+   # The API tags each result with the index of its input, so do not rely on response order
+   embeddings = [None] * len(texts)
+   for item in response.data:
+      embeddings[item.index] = item.embedding
+   return embeddings
+
+def take_embedding_batch(q, config : ApiConfiguration):
+   """
+   Takes chunks from a queue until the batch reaches config.embedBatchSize items
+   or config.embedBatchTokens estimated tokens (4 characters per token).
+   A chunk that would take the batch over the token budget is put back on the queue
+   for a later batch, so a chunk larger than the budget forms a batch on its own.
+
+   Returns:
+   list: The chunks taken, empty if the queue was empty.
+   """
+   batch = []
+   batch_tokens = 0
+   while len(batch) < config.embedBatchSize:
+      try:
+         chunk = q.get_nowait()
+      except queue.Empty:
+         break
+      chunk_tokens = len(chunk.get("text", "")) // 4
+      if batch and batch_tokens + chunk_tokens > config.embedBatchTokens:
+         # Callers sort their output, so the chunk can go to the back of the queue
+         q.put(chunk)
+         break
+      batch.append(chunk)
+      batch_tokens = batch_tokens + chunk_tokens
+   return batch
+
 
@@ -5,6 +5,7 @@
 import logging
 from logging import Logger
 import os
+import sys
 import json
 
 # Third-Party Packages
@@ -26,6 +27,13 @@ from numpy.linalg import norm
 from common.ApiConfiguration import ApiConfiguration
 from common.common_functions import get_embedding
 
+# Repository root, for CommonPy
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from CommonPy.src.ann_index import AnnIndex, fingerprint_files
+
+kIndexDirectory = "ann_index"  # Sub-directory of the source directory holding the saved chunk index
+kIndexProbes = None            # Index lists searched per question. None = index default, raise for higher recall
+
 kOpenAiPersonaPrompt = "You are an AI assistant helping an application developer understand generative AI. You explain complex concepts in simple language, using Python examples if it helps. You limit replies to 50 words or less. If you don't know the answer, say 'I don't know'. If the question is not related to building AI applications, Python, or Large Language Models (LLMs), say 'That doesn't seem to be about AI'."
 kInitialQuestionPrompt = "You are an AI assistant helping an application developer understand generative AI. You will be presented with a question. Answer the question in a few sentences, using language a suitable for a technical graduate student will understand. Limit your reply to 50 words or less. If you don't know the answer, say 'I don't know'. If the question is not related to building AI applications, Python, or Large Language Models (LLMs), say 'That doesn't seem to be about AI'.\n"
 kEnrichmentPrompt = "You will be provided with a question about building applications that use generative AI technology. Write a 50 word summary of an article that would be a great answer to the question. Consider enriching the question with additional topics that the question asker might want to understand. Write the summary in the present tense, as though the article exists. If the question is not related to building AI applications, Python, or Large Language Models (LLMs), say 'That doesn't seem to be about AI'.\n"
@@ -218,6 +226,10 @@ def run_tests(config, testDestinationDir, sourceDir, questions):
       with open(cache_file, "r", encoding="utf-8") as f:
          current = json.load(f)       
 
+   # Index the chunk embeddings once, reusing the saved index unless the chunk file has changed
+   index = AnnIndex.load_or_build(os.path.join(sourceDir, kIndexDirectory), current,
+                                  fingerprint_files([cache_file]), fields=("ada_v2",))
+
    logger.info("Starting test run, total questions to be processed: %s", len(questions))
 
    for question in questions:
@@ -229,21 +241,15 @@ def run_tests(config, testDestinationDir, sourceDir, questions):
       # Convert the text of the enriched question to a vector embedding
       embedding = get_text_embedding(client, config, result.enriched_question, logger)
    
-      # Iterate through the chunks we have stored 
-      for chunk in current:
-         
-         # calculate the similarity between the chunk and the question
-         ada = chunk.get("ada_v2")
-         similarity = cosine_similarity(ada, embedding)
-
-         # If we pass a reasonableness threshold, count it as a hit
-         if similarity > 0.8:
-            result.hit = True
-         
-         # If it is the best hit so far, record the match
-         if similarity > result.hitRelevance:
-            result.hitRelevance = similarity 
-            result.hitSummary = chunk.get("summary")
+      # Find the stored chunk nearest to the question
+      hit_ids, hit_scores = index.search(embedding, 1, kIndexProbes)
+      if hit_ids and hit_scores[0] > result.hitRelevance:
+         result.hitRelevance = hit_scores[0]
+         result.hitSummary = current[hit_ids[0]].get("summary")
+
+      # If we pass a reasonableness threshold, count it as a hit
+      if result.hitRelevance > 0.8:
+         result.hit = True
 
       # Ask GPT for a follow-up question on the best match
       # Once we have a follow-up, ask GPT if the follow-up looks like it is about AI            
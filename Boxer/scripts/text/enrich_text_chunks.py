@@ -17,6 +17,7 @@ from rich.progress import Progress
 
 # Local Modules
 from common.common_functions import ensure_directory_exists
+from common.common_functions import write_chunks_json
 
 PERCENTAGE_OVERLAP = 0.05
 AVERAGE_CHARACTERS_PER_TOKEN = 4
@@ -252,5 +253,4 @@ def enrich_text_chunks(config, markdownDestinationDir):
     # Ensure the output subdirectory exists
     ensure_directory_exists(os.path.dirname(output_file))
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=4)
+    write_chunks_json(output_file, chunks)
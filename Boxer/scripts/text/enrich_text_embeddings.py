@@ -22,7 +22,10 @@ from rich.progress import Progress
 
 # Local Modules
 from common.common_functions import ensure_directory_exists
+from common.common_functions import write_chunks_json
 from common.common_functions import get_embedding
+from common.common_functions import get_embeddings
+from common.common_functions import take_embedding_batch
 from common.ApiConfiguration import ApiConfiguration
 
 def normalize_text(s, sep_token=" \n "):
@@ -51,39 +54,80 @@ def get_text_embedding(client : AzureOpenAI, config : ApiConfiguration, text: st
     return embedding
 
 
+@retry(
+    wait=wait_random_exponential(min=10, max=45),
+    stop=stop_after_attempt(5),
+    retry=retry_if_not_exception_type(BadRequestError),
+)
+def get_text_embeddings(client : AzureOpenAI, config : ApiConfiguration, texts: list):
+    """Get the embeddings for several texts in one call."""
+    embeddings = get_embeddings(texts,
+                                client,
+                                config)
+
+    return embeddings
+
+
+def embed_chunks(client : AzureOpenAI, config : ApiConfiguration, logger, chunks, output_chunks):
+    """Embed a batch of chunks in one call, falling back to one call per chunk if the batch is rejected."""
+    try:
+        embeddings = get_text_embeddings(client, config, [chunk["text"] for chunk in chunks])
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk["ada_v2"] = embedding.copy()
+            output_chunks.append(chunk.copy())
+        return
+    except Exception as e:
+        if len(chunks) == 1:
+            logger.warning("Error processing chunk %s: %s", chunks[0].get('sourceId'), str(e))
+            return
+        logger.warning("Batch of %s chunks failed, retrying one at a time: %s", len(chunks), str(e))
+
+    for chunk in chunks:
+        try:
+            embedding = get_text_embedding(client, config, chunk["text"])
+            chunk["ada_v2"] = embedding.copy()
+            output_chunks.append(chunk.copy())
+        except BadRequestError as request_error:
+            logger.warning("Error processing chunk %s: %s", chunk.get('sourceId'), request_error)
+        except Exception as e:
+            logger.warning("Unknown error processing chunk %s: %s", chunk.get('sourceId'), str(e))
+
+
 def process_queue(client : AzureOpenAI, config : ApiConfiguration, progress, task, q, logger, output_chunks, current_chunks):
-    """Process the queue."""
-    while not q.empty():
-        chunk = q.get()
-        found = False
-
-        for i in current_chunks:
-            if i.get('sourceId') == chunk.get('sourceId'):
-              current_summary = i.get("summary")
-              current_ada = i.get("ada_v2")
-              if current_summary and current_ada: 
-                 chunk["summary"] = current_summary
-                 chunk["ada_v2"] = current_ada                
-                 found = True  
-                 output_chunks.append(chunk.copy())                 
-                 break
-
-        if not found:
-            if "ada_v2" in chunk:
-                output_chunks.append(chunk.copy())
-            else:
-                # Get embedding using OpenAI API
-                try:
-                    embedding = get_text_embedding(client, config, chunk["text"])
-                    chunk["ada_v2"] = embedding.copy()
+    """Process the queue, taking chunks in batches so each batch needs only one embeddings call."""
+    while True:
+        batch = take_embedding_batch(q, config)
+        if not batch:
+            break
+
+        to_embed = []
+        for chunk in batch:
+            found = False
+
+            for i in current_chunks:
+                if i.get('sourceId') == chunk.get('sourceId'):
+                  current_summary = i.get("summary")
+                  current_ada = i.get("ada_v2")
+                  if current_summary and current_ada: 
+                     chunk["summary"] = current_summary
+                     chunk["ada_v2"] = current_ada                
+                     found = True  
+                     output_chunks.append(chunk.copy())                 
+                     break
+
+            if not found:
+                if "ada_v2" in chunk:
                     output_chunks.append(chunk.copy())
-                except BadRequestError as request_error:
-                    logger.warning("Error processing chunk %s: %s", chunk.get('sourceId'), request_error)
-                except Exception as e:
-                    logger.warning("Unknown error processing chunk %s: %s", chunk.get('sourceId'), str(e))
+                else:
+                    to_embed.append(chunk)
+
+        # Get embeddings using OpenAI API
+        if to_embed:
+            embed_chunks(client, config, logger, to_embed, output_chunks)
 
-        progress.update(task, advance=1)
-        q.task_done()
+        for chunk in batch:
+            progress.update(task, advance=1)
+            q.task_done()
 
 
 def enrich_text_embeddings(config : ApiConfiguration, destinationDir : str):
@@ -153,5 +197,4 @@ def enrich_text_embeddings(config : ApiConfiguration, destinationDir : str):
     # Ensure the output subdirectory exists
     ensure_directory_exists(os.path.dirname(output_file))
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output_chunks, f, ensure_ascii=False, indent=4)
+    write_chunks_json(output_file, output_chunks)
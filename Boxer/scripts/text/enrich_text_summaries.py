@@ -22,6 +22,7 @@ from rich.progress import Progress
 
 # Local Modules
 from common.common_functions import ensure_directory_exists
+from common.common_functions import write_chunks_json
 from common.ApiConfiguration import ApiConfiguration
 
 class Counter:
@@ -173,8 +174,7 @@ def enrich_text_summaries(config, destinationDir):
       with open(cache_file, "r", encoding="utf-8") as f:
          current = json.load(f)   
    
-   with open(cache_file, "w", encoding="utf-8") as f:
-      json.dump(chunks, f, ensure_ascii=False, indent=4)
+   write_chunks_json(cache_file, chunks)
 
    with Progress() as progress:
       task1 = progress.add_task("[purple]Enriching Summaries...", total=total_chunks)
@@ -202,5 +202,4 @@ def enrich_text_summaries(config, destinationDir):
    # Ensure the output subdirectory exists
    ensure_directory_exists(os.path.dirname(output_file))
    # save chunks to a json file
-   with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output_chunks, f, ensure_ascii=False, indent=4)
\ No newline at end of file
+   write_chunks_json(output_file, output_chunks)
\ No newline at end of file
@@ -15,6 +15,8 @@ from typing import List, Dict
 import tiktoken
 from rich.progress import Progress
 
+# Local Modules
+from common.common_functions import write_chunks_json
 
 # Define constants
 PERCENTAGE_OVERLAP = 0.05
@@ -202,8 +204,7 @@ def enrich_transcript_chunks (config, transcriptDestinationDir):
     output_file = os.path.join(transcriptDestinationDir, output_subdir, "master_transcriptions.json")
 
     ensure_directory_exists(os.path.dirname(output_file))
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=4)
+    write_chunks_json(output_file, chunks)
 
 def ensure_directory_exists(directory):
     """Ensure directory exists; if not, create it."""
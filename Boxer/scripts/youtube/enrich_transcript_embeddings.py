@@ -21,7 +21,10 @@ from rich.progress import Progress
 # Local Modules
 from common.ApiConfiguration import ApiConfiguration
 from common.common_functions import ensure_directory_exists
+from common.common_functions import write_chunks_json
 from common.common_functions import get_embedding
+from common.common_functions import get_embeddings
+from common.common_functions import take_embedding_batch
 
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
@@ -48,35 +51,75 @@ def get_text_embedding(client : AzureOpenAI, config : ApiConfiguration, text: st
                               config)
     return embedding
 
+@retry(
+    wait=wait_random_exponential(min=10, max=45),
+    stop=stop_after_attempt(5),
+    retry=retry_if_not_exception_type(BadRequestError),
+)
+def get_text_embeddings(client, config, texts):
+    """get the embeddings for several texts in one call"""
+    embeddings = get_embeddings(texts, 
+                                client, 
+                                config)
+    return embeddings
+
+
+def embed_chunks(client, config, logger, chunks, output_chunks):
+    """embed a batch of chunks in one call, falling back to one call per chunk if the batch is rejected"""
+    try:
+       embeddings = get_text_embeddings(client, config, [chunk["text"] for chunk in chunks])
+       for chunk, embedding in zip(chunks, embeddings):
+          chunk["ada_v2"] = embedding.copy()
+          output_chunks.append(chunk.copy())
+       return
+    except Exception as e:
+       if len(chunks) == 1:
+          logger.warning("Error: %s %s", chunks[0].get('sourceId'), str(e))
+          return
+       logger.warning("Batch of %s chunks failed, retrying one at a time: %s", len(chunks), str(e))
+
+    for chunk in chunks:
+       try:
+          embedding = get_text_embedding(client, config, chunk["text"])
+          chunk["ada_v2"] = embedding.copy()     
+          output_chunks.append(chunk.copy())                          
+       except BadRequestError as request_error:
+          logger.warning("Error: %s %s", chunk.get('sourceId'), request_error)
+       except Exception as e:
+          logger.warning("Error: %s %s", chunk.get('sourceId'), 'Unknown error')          
+
+
 def process_queue(client, config, progress, task, q, logger, output_chunks, current_chunks):
-    """process the queue"""
-    while not q.empty():
-        chunk = q.get()
-        found = False
-
-        for i in current_chunks: 
-           if i.get('sourceId') == chunk.get('sourceId'):           
-              current_summary = i.get("summary")
-              current_ada = i.get("ada_v2")
-              if current_summary and current_ada: 
-                 chunk["summary"] = current_summary
-                 chunk["ada_v2"] = current_ada   
-                 output_chunks.append(chunk.copy())                                 
-                 found = True  
-                 break
-        
-        if not found:
-           try:
-              embedding = get_text_embedding(client, config, chunk["text"])
-              chunk["ada_v2"] = embedding.copy()     
-              output_chunks.append(chunk.copy())                          
-           except BadRequestError as request_error:
-              logger.warning("Error: %s %s", chunk.get('sourceId'), request_error)
-           except Exception as e:
-              logger.warning("Error: %s %s", chunk.get('sourceId'), 'Unknown error')          
-
-        progress.update(task, advance=1)
-        q.task_done()
+    """process the queue, taking chunks in batches so each batch needs only one embeddings call"""
+    while True:
+        batch = take_embedding_batch(q, config)
+        if not batch:
+            break
+
+        to_embed = []
+        for chunk in batch:
+            found = False
+
+            for i in current_chunks: 
+               if i.get('sourceId') == chunk.get('sourceId'):           
+                 current_summary = i.get("summary")
+                 current_ada = i.get("ada_v2")
+                 if current_summary and current_ada: 
+                     chunk["summary"] = current_summary
+                     chunk["ada_v2"] = current_ada   
+                     output_chunks.append(chunk.copy())                                 
+                     found = True  
+                     break
+            
+            if not found:
+               to_embed.append(chunk)
+
+        if to_embed:
+            embed_chunks(client, config, logger, to_embed, output_chunks)
+
+        for chunk in batch:
+            progress.update(task, advance=1)
+            q.task_done()
 
 def convert_time_to_seconds(value):
     """convert time to seconds"""
@@ -145,5 +188,4 @@ def enrich_transcript_embeddings(config, transcriptDestinationDir):
 
    ensure_directory_exists(os.path.dirname(output_file))
 
-   with open(output_file, "w", encoding="utf-8") as f:
-      json.dump(chunks, f, ensure_ascii=False, indent=4)
+   write_chunks_json(output_file, chunks)
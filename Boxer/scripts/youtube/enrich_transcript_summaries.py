@@ -20,6 +20,7 @@ from rich.progress import Progress
 
 # Local Modules
 from common.common_functions import ensure_directory_exists
+from common.common_functions import write_chunks_json
 from common.ApiConfiguration import ApiConfiguration
 
 class Counter:
@@ -195,6 +196,5 @@ def enrich_transcript_summaries(config : ApiConfiguration, transcriptDestination
 
    ensure_directory_exists(os.path.dirname(output_file))
 
-   with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=4)
+   write_chunks_json(output_file, chunks)
 
@@ -32,16 +32,20 @@ from GeminiEvaluator import GeminiEvaluator
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
+sys.path.append(os.path.dirname(parent_dir))     # Repository root, for CommonPy
 
 # Local Modules
 from common.ApiConfiguration import ApiConfiguration
 from common.common_functions import get_embedding
 from PersonaStrategy import DeveloperPersonaStrategy, TesterPersonaStrategy, BusinessAnalystPersonaStrategy, PersonaStrategy
+from CommonPy.src.ann_index import AnnIndex, fingerprint_files
 
 # Constants
 SIMILARITY_THRESHOLD = 0.8          # Defines the minimum similarity threshold for a question to be considered a hit
 MAX_RETRIES = 15                    # Maximum number of retries for API calls
 NUM_QUESTIONS = 100                 # Number of questions to be generated per test
+INDEX_DIRECTORY = "ann_index"       # Sub-directory of the source directory holding the saved chunk index
+INDEX_PROBES = None                 # Index lists searched per question. None = index default, raise for higher recall
 
 # OpenAI prompts used for persona generation, enrichment, and follow-up question generation
 OPENAI_PERSONA_PROMPT =  "You are an AI assistant helping an application developer understand generative AI. You explain complex concepts in simple language, using Python examples if it helps. You limit replies to 50 words or less. If you don't know the answer, say 'I don't know'. If the question is not related to building AI applications, Python, or Large Language Models (LLMs), say 'That doesn't seem to be about AI'."
@@ -288,7 +292,7 @@ def assess_follow_up_on_topic(chat_client: AzureOpenAI, config: ApiConfiguration
     response = call_openai_chat(chat_client, messages, config, logger)
     return response
 
-def process_questions(chat_client: AzureOpenAI, embedding_client: AzureOpenAI, config: ApiConfiguration, questions: List[str], processed_question_chunks: List[Dict[str, Any]], logger: logging.Logger) -> List[TestResult]:
+def process_questions(chat_client: AzureOpenAI, embedding_client: AzureOpenAI, config: ApiConfiguration, questions: List[str], processed_question_chunks: List[Dict[str, Any]], logger: logging.Logger, index: AnnIndex = None) -> List[TestResult]:
     """
     Processes a list of test questions and evaluates their relevance based on their similarity to pre-processed question chunks.
 
@@ -299,6 +303,7 @@ def process_questions(chat_client: AzureOpenAI, embedding_client: AzureOpenAI, c
         questions (List[str]): The list of test questions to be processed.
         processed_question_chunks (List[Dict[str, Any]]): The list of pre-processed question chunks.
         logger (logging.Logger): The logger instance.
+        index (AnnIndex): Nearest-neighbour index over the chunk embeddings. Built in memory if not provided.
 
     Returns:
         List[TestResult]: A list of test results, each containing the original question, its enriched version, its relevance to the pre-processed chunks, the follow-up question, and whether the follow-up question is on-topic.
@@ -308,6 +313,10 @@ def process_questions(chat_client: AzureOpenAI, embedding_client: AzureOpenAI, c
     """
     # Initialize an empty list to store the results of each processed question.
     question_results: List[TestResult] = []
+
+    # Index the chunk embeddings once, rather than scanning every chunk for every question
+    if index is None:
+        index = AnnIndex.build_from_chunks(processed_question_chunks, fields=("embedding",))
     
     # Loop through each question in the provided list of questions.
     for question in questions:
@@ -324,21 +333,15 @@ def process_questions(chat_client: AzureOpenAI, embedding_client: AzureOpenAI, c
         best_hit_relevance = 0      # To track the highest similarity score
         best_hit_summary = None     # To track the summary corresponding to the highest similarity
 
-        # Iterate through the processed chunks to find the best hit
-        for chunk in processed_question_chunks:
-            # Ensure the chunk is valid and is a dictionary.
-            if chunk and isinstance(chunk, dict):
-                gpt4_embedding = chunk.get("embedding")
-                similarity = cosine_similarity(gpt4_embedding, embedding)
-
-                # If similarity exceeds the defined threshold, mark the question as a hit
-                if similarity > SIMILARITY_THRESHOLD:
-                    question_result.hit = True
+        # Find the best hit from the index
+        hit_ids, hit_scores = index.search(embedding, 1, INDEX_PROBES)
+        if hit_ids and hit_scores[0] > best_hit_relevance:
+            best_hit_relevance = hit_scores[0]
+            best_hit_summary = processed_question_chunks[hit_ids[0]].get("summary")
 
-                # Check if this is the best match so far
-                if similarity > best_hit_relevance:
-                    best_hit_relevance = similarity
-                    best_hit_summary = chunk.get("summary") 
+        # If similarity exceeds the defined threshold, mark the question as a hit
+        if best_hit_relevance > SIMILARITY_THRESHOLD:
+            question_result.hit = True
 
          # Store the highest relevance score and the associated summary in the result.
         question_result.hit_relevance = best_hit_relevance
@@ -485,5 +488,11 @@ def run_tests(config: ApiConfiguration, test_destination_dir: str, source_dir: s
     test_mode = persona_strategy.__class__.__name__.replace('PersonaStrategy', '').lower()
 
     processed_question_chunks = read_processed_chunks(source_dir)
-    question_results = process_questions(chat_client,embedding_client, config, questions, processed_question_chunks, logger)
+
+    # Reuse the saved chunk index unless the chunk files have changed since it was built
+    chunk_files = [os.path.join(source_dir, filename) for filename in os.listdir(source_dir) if filename.endswith(".json")]
+    index = AnnIndex.load_or_build(os.path.join(source_dir, INDEX_DIRECTORY), processed_question_chunks,
+                                   fingerprint_files(chunk_files), fields=("embedding",))
+
+    question_results = process_questions(chat_client,embedding_client, config, questions, processed_question_chunks, logger, index)
     save_results(test_destination_dir, question_results, test_mode)
\ No newline at end of file
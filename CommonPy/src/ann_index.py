@@ -0,0 +1,370 @@
+'''
+Approximate nearest-neighbour index over embeddings, in pure NumPy.
+
+The index is an inverted file (IVF): vectors are clustered with spherical k-means, and each
+vector is stored in the list of its nearest centroid. A query scores the centroids, then scores
+exactly only the vectors in the 'probes' nearest lists. More probes gives higher recall at the
+cost of latency; probing every list gives the same answer as a linear scan.
+
+Vectors are normalised, so scores are cosine similarities. Ids returned by queries are the ids
+the index was built with, e.g. positions in the list of chunks loaded from master_enriched.json.
+
+Functions:
+    embeddings_from_chunks: Pulls the ids and embedding matrix out of enriched chunk dicts
+    fingerprint_files: Fingerprints source files, to tell when a saved index is out of date
+
+Classes:
+    AnnIndex: Build, save, load and query the index
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import json
+import math
+import logging
+import hashlib
+
+import numpy as np
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+EMBEDDING_FIELDS = ('ada_v2', 'embedding')
+DEFAULT_ITERATIONS = 10
+TRAINING_POINTS_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 4096
+INDEX_VERSION = 1
+
+
+def normalise_rows(matrix: np.ndarray) -> np.ndarray:
+    '''
+    Returns a float32 copy of 'matrix' with each row scaled to unit length. All-zero rows stay zero.
+    '''
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embeddings_from_chunks(chunks: list[dict],
+                           fields: tuple[str] = EMBEDDING_FIELDS) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Pulls the embedding out of each enriched chunk dict, from the first of 'fields' it has.
+    Chunks without an embedding are skipped.
+
+    Parameters:
+        chunks (list[dict]): Chunks as loaded from an enriched chunk file.
+        fields (tuple[str]): Field names to look for, in order of preference.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The positions in 'chunks' that had an embedding,
+        and a float32 matrix with one embedding per row.
+    '''
+    ids = []
+    vectors = []
+    for i, chunk in enumerate(chunks):
+        if not chunk or not isinstance(chunk, dict):
+            continue
+        for field in fields:
+            embedding = chunk.get(field)
+            if embedding:
+                ids.append(i)
+                vectors.append(embedding)
+                break
+
+    if not vectors:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), np.asarray(vectors, dtype=np.float32)
+
+
+def fingerprint_files(paths: list[str]) -> str:
+    '''
+    Fingerprints files by name, size and modification time, so a saved index can be
+    rebuilt when the chunk files it was built from change.
+    '''
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _spherical_kmeans(vectors: np.ndarray, lists: int, iterations: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    '''
+    Clusters unit vectors by cosine similarity, returning unit-length centroids.
+    Empty clusters are re-seeded from random training points.
+    '''
+    centroids = vectors[rng.choice(vectors.shape[0], lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=lists)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+        centroids = normalise_rows(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    '''
+    Returns the nearest centroid for each vector, working in blocks to bound memory use.
+    '''
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        assignments[start:start + ASSIGN_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class AnnIndex:
+    '''
+    Inverted-file approximate nearest-neighbour index.
+
+    Vectors are stored sorted by list, so each list is a contiguous block of rows and
+    a probe reads one slice rather than gathering scattered rows.
+
+    Attributes:
+        centroids (np.ndarray): (lists, dimension) unit-length list centroids.
+        offsets (np.ndarray): (lists + 1,) row where each list starts; list i is rows offsets[i]:offsets[i+1].
+        vectors (np.ndarray): (count, dimension) unit-length vectors, sorted by list.
+        ids (np.ndarray): (count,) caller's id for each row of 'vectors'.
+        probes (int): Default number of lists scored per query.
+        fingerprint (str): Optional description of the source data, used by load_or_build.
+    '''
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, vectors: np.ndarray,
+                 ids: np.ndarray, probes: int = None, fingerprint: str = None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.fingerprint = fingerprint
+        if probes is None:
+            probes = AnnIndex.default_probes(self.lists)
+        self.probes = probes
+
+    @property
+    def lists(self) -> int:
+        ''' Number of inverted lists '''
+        return self.centroids.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        ''' Length of each vector '''
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @staticmethod
+    def default_lists(count: int) -> int:
+        ''' About sqrt(count) lists, the usual IVF starting point '''
+        return max(1, int(math.sqrt(count)))
+
+    @staticmethod
+    def default_probes(lists: int) -> int:
+        ''' Probe about one list in sixteen, which keeps recall high for clustered text embeddings '''
+        return max(1, math.ceil(lists / 16))
+
+    @classmethod
+    def build(cls, vectors, ids=None, lists: int = None, probes: int = None,
+              iterations: int = DEFAULT_ITERATIONS, seed: int = 0,
+              fingerprint: str = None) -> 'AnnIndex':
+        '''
+        Builds an index over 'vectors'.
+
+        Parameters:
+            vectors: (count, dimension) embeddings, as an array or list of lists.
+            ids: Optional id per vector. Defaults to 0..count-1.
+            lists (int): Number of inverted lists. Defaults to about sqrt(count).
+            probes (int): Default lists probed per query. Defaults to about lists / 16.
+            iterations (int): k-means iterations.
+            seed (int): Random seed, so builds are repeatable.
+            fingerprint (str): Optional description of the source data.
+
+        Returns:
+            AnnIndex: The built index.
+        '''
+        normalised = normalise_rows(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        count = normalised.shape[0] if len(vectors) else 0
+        ids = np.arange(count, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        if ids.shape[0] != count:
+            raise ValueError('Expected one id per vector')
+
+        if count == 0:
+            return cls(np.zeros((0, 0), dtype=np.float32), np.zeros(1, dtype=np.int64),
+                       np.zeros((0, 0), dtype=np.float32), ids, 1, fingerprint)
+
+        if lists is None:
+            lists = cls.default_lists(count)
+        lists = min(lists, count)
+
+        rng = np.random.default_rng(seed)
+        training_size = min(count, lists * TRAINING_POINTS_PER_LIST)
+        training = normalised[rng.choice(count, training_size, replace=False)]
+        centroids = _spherical_kmeans(training, lists, iterations, rng)
+
+        assignments = _assign(normalised, centroids)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.zeros(lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=lists))
+
+        logger.debug('Built index with %d vectors in %d lists', count, lists)
+        return cls(centroids, offsets, normalised[order], ids[order], probes, fingerprint)
+
+    @classmethod
+    def build_from_chunks(cls, chunks: list[dict], fields: tuple[str] = EMBEDDING_FIELDS,
+                          **kwargs) -> 'AnnIndex':
+        '''
+        Builds an index over the embeddings in enriched chunk dicts. Ids are positions in 'chunks'.
+        Keyword arguments are passed to build().
+        '''
+        ids, vectors = embeddings_from_chunks(chunks, fields)
+        return cls.build(vectors, ids, **kwargs)
+
+    def search(self, query, k: int = 1, probes: int = None) -> tuple[list[int], list[float]]:
+        '''
+        Finds the k vectors nearest to a query.
+
+        Parameters:
+            query: The query embedding.
+            k (int): Number of results.
+            probes (int): Lists to probe, the recall / latency knob. Defaults to self.probes.
+
+        Returns:
+            tuple[list[int], list[float]]: Ids and cosine similarities, nearest first.
+        '''
+        ids, scores = self.search_batch([query], k, probes)
+        return ids[0], scores[0]
+
+    def search_batch(self, queries, k: int = 1,
+                     probes: int = None) -> tuple[list[list[int]], list[list[float]]]:
+        '''
+        Finds the k vectors nearest to each of several queries.
+
+        Parameters:
+            queries: (queries, dimension) query embeddings, as an array or list of lists.
+            k (int): Number of results per query.
+            probes (int): Lists to probe, the recall / latency knob. Defaults to self.probes.
+
+        Returns:
+            tuple[list[list[int]], list[list[float]]]: For each query, ids and cosine
+            similarities, nearest first.
+        '''
+        if len(queries) == 0:
+            return [], []
+        if len(self) == 0:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        if probes is None:
+            probes = self.probes
+        probes = max(1, min(probes, self.lists))
+
+        normalised = normalise_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        centroid_scores = normalised @ self.centroids.T
+        if probes < self.lists:
+            probed = np.argpartition(-centroid_scores, probes - 1, axis=1)[:, :probes]
+        else:
+            probed = np.tile(np.arange(self.lists), (normalised.shape[0], 1))
+
+        all_ids = []
+        all_scores = []
+        for query, lists in zip(normalised, probed):
+            # Score each probed list as a contiguous slice, no gather copy
+            lists = [i for i in lists if self.offsets[i + 1] > self.offsets[i]]
+            if not lists:
+                all_ids.append([])
+                all_scores.append([])
+                continue
+            scores = np.concatenate(
+                [self.vectors[self.offsets[i]:self.offsets[i + 1]] @ query for i in lists])
+            rows = np.concatenate(
+                [np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+
+            top = min(k, rows.shape[0])
+            best = np.argpartition(-scores, top - 1)[:top] if top < rows.shape[0] else np.arange(rows.shape[0])
+            best = best[np.argsort(-scores[best], kind='stable')]
+            all_ids.append(self.ids[rows[best]].tolist())
+            all_scores.append(scores[best].tolist())
+
+        return all_ids, all_scores
+
+    def save(self, directory: str) -> None:
+        '''
+        Saves the index as .npy files plus a small JSON header, so it can be memory-mapped on load.
+        '''
+        os.makedirs(directory, exist_ok=True)
+        header_file = os.path.join(directory, 'index.json')
+        if os.path.exists(header_file):
+            os.remove(header_file)
+
+        np.save(os.path.join(directory, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(directory, 'ids.npy'), self.ids)
+
+        # Written last, so a partly written index is never loaded
+        with open(header_file, 'w', encoding='utf-8') as file:
+            json.dump({'version': INDEX_VERSION,
+                       'count': len(self),
+                       'dimension': self.dimension,
+                       'lists': self.lists,
+                       'probes': self.probes,
+                       'fingerprint': self.fingerprint}, file)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        ''' True if a saved index is present in 'directory' '''
+        return os.path.exists(os.path.join(directory, 'index.json'))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'AnnIndex':
+        '''
+        Loads a saved index. With mmap=True the vectors are mapped from disk rather than read,
+        so loading is fast and pages are only read when queries touch them.
+
+        Raises:
+            FileNotFoundError: If there is no index in 'directory'.
+            ValueError: If the index was written by an incompatible version.
+        '''
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as file:
+            header = json.load(file)
+        if header.get('version') != INDEX_VERSION:
+            raise ValueError(f'Unsupported index version: {header.get("version")}')
+
+        mmap_mode = 'r' if mmap else None
+        return cls(np.load(os.path.join(directory, 'centroids.npy')),
+                   np.load(os.path.join(directory, 'offsets.npy')),
+                   np.load(os.path.join(directory, 'vectors.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(directory, 'ids.npy')),
+                   header.get('probes'),
+                   header.get('fingerprint'))
+
+    @classmethod
+    def load_or_build(cls, directory: str, chunks: list[dict], fingerprint: str,
+                      **kwargs) -> 'AnnIndex':
+        '''
+        Loads the index saved in 'directory' if it was built from data with the same fingerprint,
+        otherwise builds one from 'chunks' and saves it. Keyword arguments are passed to build().
+        '''
+        if cls.exists(directory):
+            try:
+                index = cls.load(directory)
+                if index.fingerprint == fingerprint:
+                    return index
+                logger.info('Index in %s is out of date, rebuilding', directory)
+                # Drop the mapping before the files under it are rewritten
+                del index
+            except (OSError, ValueError) as e:
+                logger.warning('Could not load index from %s, rebuilding: %s', directory, str(e))
+
+        index = cls.build_from_chunks(chunks, fingerprint=fingerprint, **kwargs)
+        index.save(directory)
+        return index
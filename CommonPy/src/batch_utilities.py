@@ -0,0 +1,56 @@
+"""
+Common functions for packing many small API calls into fewer batched calls
+"""
+
+AVERAGE_CHARACTERS_PER_TOKEN = 4
+default_batch_items = 64
+default_batch_tokens = 64000
+
+
+def estimate_tokens(text: str) -> int:
+    '''
+    Cheap token estimate, good enough to keep a batch within a request budget.
+
+    Parameters:
+        text (str): The text to estimate.
+
+    Returns:
+        int: Estimated token count, at least 1.
+    '''
+    if not text:
+        return 1
+    return max(1, len(text) // AVERAGE_CHARACTERS_PER_TOKEN)
+
+
+def make_batches(texts: list[str],
+                 max_items: int = default_batch_items,
+                 max_tokens: int = default_batch_tokens) -> list[list[int]]:
+    '''
+    Packs texts, in order, into batches bounded by item count and estimated token count.
+    A text that is over the token budget on its own gets a batch to itself.
+
+    Parameters:
+        texts (list[str]): The texts to pack.
+        max_items (int): Maximum texts per batch.
+        max_tokens (int): Maximum estimated tokens per batch.
+
+    Returns:
+        list[list[int]]: Each batch as a list of indices into 'texts'.
+    '''
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens = current_tokens + tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
@@ -6,11 +6,13 @@ import os
 import logging
 import datetime
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import uuid
 
-from .request_utilities import request_timeout
-from .storable_types import IStorableQuerySpec
+from .request_utilities import braid_api_url
+from .model_metadata import get_model_metadata
+from .session_pool import get_session
+from .batch_utilities import make_batches, AVERAGE_CHARACTERS_PER_TOKEN
+from .storable_types import IStorableQuerySpec, IStorableMultiKeyQuerySpec, IStorableMultiSaveSpec
 from .chunk_repository_api_types import IStoredChunk, IStoredEmbedding, IStoredTextRendering
 from .type_utilities import safe_dict_to_object, safe_cast
 
@@ -33,35 +35,74 @@ boxer_application_name = 'Boxer'
 chunk_class_name = 'Chunk'
 chunk_schema_version = '1'
 
-class ChunkRepository:
+# Chunks carry their embedding, so a batch is bounded by size as well as count
+default_save_batch_items = 100
+default_save_batch_characters = 4 * 1024 * 1024
+default_find_batch_items = 200
+
+
+def chunk_to_json(chunk: IStoredChunk) -> dict:
     '''
-    Class providing load, save, and existence check for files in the Braid Cosmos database.
+    Converts a chunk, including its embedded objects, to a dictionary that can be sent as JSON.
     '''
+    chunk_as_json = IStoredChunk(chunk)
+    if chunk.storedEmbedding:
+        chunk_as_json.storedEmbedding = chunk.storedEmbedding.__dict__
+    if chunk.storedTitle:
+        chunk_as_json.storedTitle = chunk.storedTitle.__dict__
+    if chunk.storedSummary:
+        chunk_as_json.storedSummary = chunk.storedSummary.__dict__
+    return chunk_as_json.__dict__
 
-    def __init__(self):
 
-        self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+def chunk_from_json(response_json: dict) -> IStoredChunk:
+    '''
+    Converts a chunk dictionary, as returned by the API, back to an IStoredChunk.
+    '''
+    # Convert the main class and nested classes from JSON to Python classes
+    summary_obj = safe_dict_to_object(response_json.get('storedSummary'))
+    safe_summary = safe_cast(summary_obj, IStoredTextRendering)
 
-        models_url = f'https://braid-api.azurewebsites.net/api/EnumerateModels?session={
-        #models_url = f'http://localhost:7071/api/EnumerateModels?session={
-            SESSION_KEY}'
-        json_input = {
-            'request': ''
-        }
+    title_obj = safe_dict_to_object(response_json.get('storedTitle'))
+    safe_title = safe_cast(title_obj, IStoredTextRendering)
 
-        response = self.session.post(
-            models_url, json=json_input, headers=headers, timeout=request_timeout)
+    embedding_obj = safe_dict_to_object(response_json.get('storedEmbedding'))
+    safe_embedding = safe_cast(embedding_obj, IStoredEmbedding)
 
-        if response.status_code == 200:
-            data = response.json()
-            self.default_model = data['defaultId']
-            self.default_embedding_model = data['defaultEmbeddingId']
+    # Glue them together into one Python class
+    response_json['storedEmbedding'] = safe_embedding
+    response_json['storedSummary'] = safe_summary
+    response_json['storedTitle'] = safe_title
+
+    response_obj = safe_dict_to_object(response_json)
+    return safe_cast(response_obj, IStoredChunk)
 
-        else:
-            raise RuntimeError('Error returned from API:' + response.text)
+class ChunkRepository:
+    '''
+    Class providing load, save, and existence check for files in the Braid Cosmos database.
+    '''
+
+    def __init__(self, api_url: str = None):
+        '''
+        Parameters:
+           api_url (str): Base URL of the Braid API. Defaults to braid_api_url.
+        '''
+        self.api_url = api_url or braid_api_url
+        self.model_metadata = get_model_metadata(self.api_url)
+
+    @property
+    def default_model(self) -> str:
+        '''
+        Id of the default text model, fetched from the API the first time any repository reads it.
+        '''
+        return self.model_metadata.default_model
+
+    @property
+    def default_embedding_model(self) -> str:
+        '''
+        Id of the default embedding model, fetched from the API the first time any repository reads it.
+        '''
+        return self.model_metadata.default_embedding_model
 
     def save(self, chunk: IStoredChunk) -> bool:
         '''
@@ -79,24 +120,14 @@ class ChunkRepository:
         chunk.amended = utc_time_string
 
         # we need to turn embedded objects into JSON by converting to dictionaries
-        chunk_as_json = IStoredChunk(chunk)
-        if chunk.storedEmbedding:
-            chunk_as_json.storedEmbedding = chunk.storedEmbedding.__dict__
-        if chunk.storedTitle:
-            chunk_as_json.storedTitle = chunk.storedTitle.__dict__
-        if chunk.storedSummary:
-            chunk_as_json.storedSummary = chunk.storedSummary.__dict__
-
-        chunk_url = f'https://braid-api.azurewebsites.net/api/SaveChunk?session={
-        #chunk_url = f'http://localhost:7071/api/SaveChunk?session={
-            SESSION_KEY}'
+        chunk_url = f'{self.api_url}/SaveChunk?session={SESSION_KEY}'
         json_input = {
-            'request': chunk_as_json.__dict__
+            'request': chunk_to_json(chunk)
         }
 
-        response = self.session.post(
+        response = get_session(chunk_url).post(
             chunk_url, json=json_input, 
-            headers=headers, timeout=request_timeout)
+            headers=headers)
 
         if response.status_code == 200:
             logger.debug('Saved: %s', chunk.id)
@@ -123,39 +154,19 @@ class ChunkRepository:
         spec.functionalSearchKey = functional_key
         logger.debug('Finding: %s', functional_key)
 
-        chunk_url = f'https://braid-api.azurewebsites.net/api/FindChunk?session={
-        #chunk_url = f'http://localhost:7071/api/FindChunk?session={
-            SESSION_KEY}'
+        chunk_url = f'{self.api_url}/FindChunk?session={SESSION_KEY}'
         json_input = {
             'request': spec.__dict__
         }
 
-        response = self.session.post(
+        response = get_session(chunk_url).post(
             chunk_url, json=json_input, 
-            headers=headers, timeout=request_timeout)
+            headers=headers)
 
         if response.status_code == 200:
 
             response_json = json.loads(response.text)
-
-            # Convert the main class and nested classes from JSON to Python classes
-            summary_obj = safe_dict_to_object(response_json['storedSummary'])
-            safe_summary = safe_cast(summary_obj, IStoredTextRendering)
-
-            title_obj = safe_dict_to_object(response_json['storedTitle'])
-            safe_title = safe_cast(title_obj, IStoredTextRendering)
-
-            embedding_obj = safe_dict_to_object(
-                response_json['storedEmbedding'])
-            safe_embedding = safe_cast(embedding_obj, IStoredEmbedding)
-
-            # Glue them together into one Python class
-            response_json['storedEmbedding'] = safe_embedding
-            response_json['storedSummary'] = safe_summary
-            response_json['storedTitle'] = safe_title
-
-            response_obj = safe_dict_to_object(response_json)
-            safe_response: IStoredChunk = safe_cast(response_obj, IStoredChunk)
+            safe_response: IStoredChunk = chunk_from_json(response_json)
 
             logger.debug('Found: %s', functional_key)
             return safe_response
@@ -181,16 +192,14 @@ class ChunkRepository:
         spec.functionalSearchKey = None
         logger.debug('Finding: %s', record_id)
 
-        chunk_url = f'https://braid-api.azurewebsites.net/api/FindChunk?session={
-        #chunk_url = f'http://localhost:7071/api/GetChunk?session={
-            SESSION_KEY}'
+        chunk_url = f'{self.api_url}/FindChunk?session={SESSION_KEY}'
         json_input = {
             'request': spec.__dict__
         }
 
-        response = self.session.post(
+        response = get_session(chunk_url).post(
             chunk_url, json=json_input, 
-            headers=headers, timeout=request_timeout)
+            headers=headers)
 
         if response.status_code == 200:
 
@@ -232,17 +241,14 @@ class ChunkRepository:
         spec.functionalSearchKey = None
         logger.debug('Removing: %s', id)
 
-        chunk_url = f'https://braid-api.azurewebsites.net/api/FindChunk?session={
-        #chunk_url = f'http://localhost:7071/api/RemoveChunk?session={
-            SESSION_KEY}'
+        chunk_url = f'{self.api_url}/FindChunk?session={SESSION_KEY}'
         json_input = {
             'request': spec.__dict__
         }
 
-        response = self.session.post(
+        response = get_session(chunk_url).post(
             chunk_url, json=json_input, 
-            headers=headers,
-            timeout=request_timeout)
+            headers=headers)
 
         if response.status_code == 200:
             logger.debug('Removed: %s', record_id)
@@ -266,16 +272,13 @@ class ChunkRepository:
         spec.functionalSearchKey = functional_key
         logger.debug('Checking existence of: %s', functional_key)
 
-        chunk_url = f'https://braid-api.azurewebsites.net/api/FindChunk?session={
-        #chunk_url = f'http://localhost:7071/api/FindChunk?session={
-            SESSION_KEY}'
+        chunk_url = f'{self.api_url}/FindChunk?session={SESSION_KEY}'
         json_input = {
             'request': spec.__dict__
         }
 
-        response = self.session.post(
-            chunk_url, json=json_input, headers=headers,
-            timeout=request_timeout)
+        response = get_session(chunk_url).post(
+            chunk_url, json=json_input, headers=headers)
 
         if response.status_code == 200:
             logger.debug('Found: %s', functional_key)
@@ -283,3 +286,108 @@ class ChunkRepository:
 
         logger.debug('Failed to find: %s', functional_key)
         return False
+
+    def find_many(self, functional_keys: list[str],
+                  max_items: int = default_find_batch_items) -> list[IStoredChunk]:
+        '''
+        Load several chunks by functional key, sending up to max_items keys per request.
+
+        Parameters:
+           functional_keys (list[str]): functionalKeys of the records
+           max_items (int): Maximum keys per request
+
+        Returns:
+           list[IStoredChunk]: One entry per key, in the same order, None for keys not found.
+
+        Raises:
+           RuntimeError: If a request fails, as a failed lookup would otherwise look like a missing record.
+        '''
+        unique_keys = list(dict.fromkeys(key for key in functional_keys if key))
+        chunk_url = f'{self.api_url}/FindChunks?session={SESSION_KEY}'
+
+        found: dict[str, IStoredChunk] = {}
+        for start in range(0, len(unique_keys), max_items):
+            spec: IStorableMultiKeyQuerySpec = IStorableMultiKeyQuerySpec()
+            spec.functionalSearchKeys = unique_keys[start:start + max_items]
+            logger.debug('Finding %d chunks', len(spec.functionalSearchKeys))
+
+            json_input = {
+                'request': spec.__dict__
+            }
+
+            response = get_session(chunk_url).post(
+                chunk_url, json=json_input,
+                headers=headers)
+
+            if response.status_code != 200:
+                raise RuntimeError('Error returned from API:' + response.text)
+
+            for response_json in json.loads(response.text):
+                chunk = chunk_from_json(response_json)
+                found[chunk.functionalSearchKey] = chunk
+
+        return [found.get(key) for key in functional_keys]
+
+    def save_many(self, chunks: list[IStoredChunk],
+                  upsert: bool = False,
+                  max_items: int = default_save_batch_items,
+                  max_characters: int = default_save_batch_characters) -> bool:
+        '''
+        Save several chunks, packed into requests bounded by item count and size.
+        Chunks with no id are given a new one.
+
+        Parameters:
+           chunks (list[IStoredChunk]): The content to be saved.
+           upsert (bool): If True, a chunk whose functionalSearchKey is already stored replaces
+              the stored chunk, and its id is set to the stored id. This removes the need to call
+              find before save.
+           max_items (int): Maximum chunks per request
+           max_characters (int): Maximum JSON characters per request
+
+        Returns:
+           bool: True if every chunk was saved.
+        '''
+        utc_time = datetime.datetime.now(datetime.timezone.utc)
+        utc_time_string = utc_time.strftime('%Y-%m-%d %H:%M:%S %Z')
+
+        records = []
+        for chunk in chunks:
+            if not chunk.id:
+                chunk.id = str(uuid.uuid4())
+            chunk.amended = utc_time_string
+            records.append(chunk_to_json(chunk))
+
+        chunk_url = f'{self.api_url}/SaveChunks?session={SESSION_KEY}'
+        batches = make_batches([json.dumps(record) for record in records],
+                               max_items, max_characters // AVERAGE_CHARACTERS_PER_TOKEN)
+
+        ok = True
+        for batch in batches:
+            spec: IStorableMultiSaveSpec = IStorableMultiSaveSpec()
+            spec.records = [records[i] for i in batch]
+            spec.upsertByFunctionalKey = upsert
+            json_input = {
+                'request': spec.__dict__
+            }
+
+            response = get_session(chunk_url).post(
+                chunk_url, json=json_input,
+                headers=headers)
+
+            if response.status_code != 200:
+                logger.debug('failed save of %d chunks', len(batch))
+                ok = False
+                continue
+
+            result = json.loads(response.text)
+            for i, saved_id in zip(batch, result['ids']):
+                chunks[i].id = saved_id
+            # Chunks the API could not save keep their ids, so saving them again replaces rather than adds
+            saved = result.get('saved', [True] * len(batch))
+            if not all(saved):
+                logger.debug('failed save of %d of %d chunks', saved.count(False), len(batch))
+                ok = False
+                continue
+            logger.debug('Saved %d chunks', len(batch))
+
+        return ok
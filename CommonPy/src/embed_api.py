@@ -9,10 +9,9 @@ which handle semantic search, question generation, and retrieval of enriched tex
 # Standard Library Imports
 import os
 import logging
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
-from .request_utilities import request_timeout
+from .session_pool import get_session
+from .batch_utilities import make_batches, default_batch_items, default_batch_tokens
 from .embed_api_types import IEmbedRequest, IEmbedResponse
 from .type_utilities import safe_dict_to_object
 
@@ -37,20 +36,15 @@ class EmbeddingApi:
     This class provides a client for interacting with the embedding API endpoint,
     which generates vector embeddings from text using AI models.
 
-    Attributes:
-        session: A requests Session object configured with retry logic
+    Requests go through the shared keep-alive session pool in session_pool.
 
     Methods:
         embed: Generates a vector embedding for the provided text
+        embed_many: Generates vector embeddings for many texts, batching requests
     '''
 
     def __init__(self):
-
-        self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
-
+        return
 
     def embed(self, embedding_request: IEmbedRequest) -> IEmbedResponse:
 
@@ -64,8 +58,8 @@ class EmbeddingApi:
         # question_url = f'https://braid-api.azurewebsites.net/api/Embed?session={SESSION_KEY}'
         question_url = f'http://localhost:7071/api/Embed?session={SESSION_KEY}'
 
-        response = self.session.post(
-            question_url, json=wrapped, headers=headers, timeout=request_timeout)
+        response = get_session(question_url).post(
+            question_url, json=wrapped, headers=headers)
 
         # Check for successful response
         if response.status_code == 200:
@@ -75,3 +69,62 @@ class EmbeddingApi:
 
         return None
 
+    def embed_many(self, texts: list[str], persona: str = None,
+                   max_items: int = default_batch_items,
+                   max_tokens: int = default_batch_tokens) -> list[list[float]]:
+        '''
+        Generates embeddings for many texts. Texts are packed into batches bounded by item count
+        and estimated tokens, and each batch is sent in one request. If a batch request fails,
+        its texts are embedded one at a time instead.
+
+        Parameters:
+            texts (list[str]): The texts to embed.
+            persona (str): Optional persona used if the API has to summarise an over-long text.
+            max_items (int): Maximum texts per request.
+            max_tokens (int): Maximum estimated tokens per request.
+
+        Returns:
+            list[list[float]]: One embedding per text, in the same order. None where a text could not be embedded.
+        '''
+        embeddings: list[list[float]] = [None] * len(texts)
+
+        # question_url = f'https://braid-api.azurewebsites.net/api/Embed?session={SESSION_KEY}'
+        question_url = f'http://localhost:7071/api/Embed?session={SESSION_KEY}'
+
+        for batch in make_batches(texts, max_items, max_tokens):
+            batch_texts = [texts[i] for i in batch]
+            logger.debug('Embedding batch of %d texts', len(batch_texts))
+
+            wrapped = {
+                'request': {
+                    'persona': persona,
+                    'text': batch_texts[0],
+                    'texts': batch_texts
+                }
+            }
+
+            batch_embeddings = None
+            try:
+                response = get_session(question_url).post(
+                    question_url, json=wrapped, headers=headers)
+                if response.status_code == 200:
+                    batch_embeddings = response.json().get('embeddings')
+            except OSError as e:
+                logger.warning('Batch embedding failed: %s', str(e))
+
+            if batch_embeddings is not None and len(batch_embeddings) == len(batch):
+                for i, embedding in zip(batch, batch_embeddings):
+                    embeddings[i] = embedding
+                continue
+
+            # Fall back to one request per text for this batch
+            for i in batch:
+                request = IEmbedRequest()
+                request.persona = persona
+                request.text = texts[i]
+                try:
+                    embeddings[i] = self.embed(request).embedding
+                except (RuntimeError, OSError) as e:
+                    logger.error('Unable to calculate embedding: %s', str(e))
+
+        return embeddings
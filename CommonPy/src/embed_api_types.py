@@ -18,13 +18,17 @@ Key types:
 class IEmbedRequest():
     persona: str
     text: str
+    texts: list[str]
 
 
 class IEmbedResponse():
     embedding: list[float]
+    embeddings: list[list[float]]
 
     def __init__(self, other=None):
         if other:
             self.embedding = other.embedding
+            self.embeddings = getattr(other, 'embeddings', None)
         else:
             self.embedding = None
+            self.embeddings = None
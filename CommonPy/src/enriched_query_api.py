@@ -9,10 +9,8 @@ which handle semantic search, question generation, and retrieval of enriched tex
 # Standard Library Imports
 import os
 import logging
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
-from .request_utilities import request_timeout
+from .session_pool import get_session
 from .enriched_query_api_types import IGenerateQuestionRequest, IQuestionGenerationResponse, IEnrichedQueryRequest, IEnrichedResponse, IEnrichedChunkSummary, IRelevantEnrichedChunk
 from .type_utilities import safe_dict_to_object, safe_cast
 
@@ -37,8 +35,7 @@ class EnrichedQueryApi:
     This class provides a client for interacting with the enriched query API endpoints,
     which handle semantic search, question generation, and retrieval of enriched text chunks.
 
-    Attributes:
-        session: A requests Session object configured with retry logic
+    Requests go through the shared keep-alive session pool in session_pool.
 
     Methods:
         generate_question: Generates follow-up questions based on provided text
@@ -47,12 +44,7 @@ class EnrichedQueryApi:
 
 
     def __init__(self):
-
-        self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
-
+        return
 
     def generate_question(self, question_request: IGenerateQuestionRequest) -> IQuestionGenerationResponse:
 
@@ -66,8 +58,8 @@ class EnrichedQueryApi:
         # question_url = f'https://braid-api.azurewebsites.net/api/GenerateQuestion?session={SESSION_KEY}'
         question_url = f'http://localhost:7071/api/GenerateQuestion?session={SESSION_KEY}'
 
-        response = self.session.post(
-            question_url, json=wrapped, headers=headers, timeout=request_timeout)
+        response = get_session(question_url).post(
+            question_url, json=wrapped, headers=headers)
 
         # Check for successful response
         if response.status_code == 200:
@@ -89,8 +81,8 @@ class EnrichedQueryApi:
         # question_url = f'https://braid-api.azurewebsites.net/api/QueryModelWithEnrichment?session={SESSION_KEY}'
         question_url = f'http://localhost:7071/api/QueryModelWithEnrichment?session={SESSION_KEY}'
 
-        response = self.session.post(
-            question_url, json=wrapped, headers=headers, timeout=request_timeout)
+        response = get_session(question_url).post(
+            question_url, json=wrapped, headers=headers)
 
         # Check for successful response
         if response.status_code == 200:
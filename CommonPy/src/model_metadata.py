@@ -0,0 +1,189 @@
+'''
+Process-wide cache of the model ids returned by the EnumerateModels API.
+
+ChunkRepository used to call EnumerateModels every time it was constructed, so each
+DbRepository, save path and test fixture paid a blocking round trip before doing any work.
+Here the ids are fetched once per API URL, the first time one is read, and kept for a
+time-to-live. If BRAID_MODEL_CACHE_FILE is set, they are also written to that file so a
+short-lived process can start without calling the API at all.
+
+Functions:
+    get_model_metadata: Returns the shared cache for an API URL
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import json
+import time
+import logging
+import threading
+
+from .request_utilities import braid_api_url
+from .session_pool import get_session
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+SESSION_KEY = os.environ['BRAID_SESSION_KEY']
+
+DEFAULT_TTL_SECONDS = 60 * 60
+
+headers = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json'
+}
+
+
+class ModelMetadata:
+    '''
+    Model ids for one API URL, fetched on first use and refreshed when older than ttl_seconds.
+    If a refresh fails, the expired ids are kept rather than failing the caller.
+
+    Attributes:
+        api_url (str): Base URL of the Braid API.
+        ttl_seconds (float): How long fetched ids are used before fetching again.
+        cache_file (str): Optional JSON file the ids are persisted to, shared by all API URLs.
+    '''
+
+    def __init__(self, api_url: str,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 cache_file: str = None):
+        self.api_url = api_url
+        self.ttl_seconds = ttl_seconds
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._models: dict = None
+        self._fetched = 0.0
+        self.fetches = 0
+
+    @property
+    def default_model(self) -> str:
+        ''' Id of the default text model '''
+        return self.get()['defaultId']
+
+    @property
+    def default_embedding_model(self) -> str:
+        ''' Id of the default embedding model '''
+        return self.get()['defaultEmbeddingId']
+
+    def get(self) -> dict:
+        '''
+        Returns the EnumerateModels response, fetching it if there is none or it has expired.
+
+        Raises:
+            RuntimeError: If there are no ids, cached or persisted, and the API call fails.
+        '''
+        models = self._models
+        if models is not None and not self._expired():
+            return models
+
+        with self._lock:
+            if self._models is None:
+                self._read_file()
+            if self._models is None or self._expired():
+                self._fetch()
+            return self._models
+
+    def invalidate(self) -> None:
+        '''
+        Forgets the ids, so the next read fetches them again.
+        '''
+        with self._lock:
+            self._models = None
+            self._fetched = 0.0
+
+    def _expired(self) -> bool:
+        return time.time() - self._fetched > self.ttl_seconds
+
+    def _fetch(self) -> None:
+        models_url = f'{self.api_url}/EnumerateModels?session={SESSION_KEY}'
+        json_input = {
+            'request': ''
+        }
+
+        try:
+            response = get_session(models_url).post(
+                models_url, json=json_input, headers=headers)
+        except OSError as e:
+            response = None
+            error = str(e)
+
+        if response is not None and response.status_code == 200:
+            data = response.json()
+            self._models = {'defaultId': data['defaultId'],
+                            'defaultEmbeddingId': data['defaultEmbeddingId']}
+            self._fetched = time.time()
+            self.fetches = self.fetches + 1
+            self._write_file()
+            return
+
+        if response is not None:
+            error = response.text
+        if self._models is None:
+            raise RuntimeError('Error returned from API:' + error)
+        logger.warning('Using expired model ids for %s: %s', self.api_url, error)
+
+    def _read_file(self) -> None:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                entry = json.load(file).get(self.api_url)
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring model cache file %s: %s', self.cache_file, str(e))
+            return
+        if entry:
+            self._models = entry['models']
+            self._fetched = entry['fetched']
+
+    def _write_file(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            entries = {}
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as file:
+                    entries = json.load(file)
+            entries[self.api_url] = {'models': self._models, 'fetched': self._fetched}
+
+            # Write then rename, so a reader never sees half a file
+            temp_file = f'{self.cache_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump(entries, file)
+            os.replace(temp_file, self.cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning('Could not write model cache file %s: %s', self.cache_file, str(e))
+
+
+_caches: dict[str, ModelMetadata] = {}
+_caches_lock = threading.Lock()
+
+
+def get_model_metadata(api_url: str = None) -> ModelMetadata:
+    '''
+    Returns the process-wide ModelMetadata for an API URL, creating it on first use.
+    Nothing is fetched until a model id is read.
+
+    Parameters:
+        api_url (str): Base URL of the Braid API. Defaults to braid_api_url.
+
+    Returns:
+        ModelMetadata: The shared cache.
+    '''
+    api_url = api_url or braid_api_url
+    cache = _caches.get(api_url)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        cache = _caches.get(api_url)
+        if cache is None:
+            cache = ModelMetadata(api_url,
+                                  float(os.environ.get('BRAID_MODEL_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+                                  os.environ.get('BRAID_MODEL_CACHE_FILE'))
+            _caches[api_url] = cache
+    return cache
@@ -5,11 +5,12 @@
 import os
 import logging
 import datetime
-import requests
-from requests.adapters import HTTPAdapter, Retry
 import zlib
 import base64
 
+from .request_utilities import braid_api_url
+from .model_metadata import get_model_metadata
+from .session_pool import get_session
 from .page_repository_api_types import IStoredPage
 
 page_class_name = 'Page'
@@ -40,12 +41,27 @@ class PageRepository:
     Class providing save & load for Pages in the Braid Cosmos database.
     '''
 
-    def __init__(self):
+    def __init__(self, api_url: str = None):
+        '''
+        Parameters:
+           api_url (str): Base URL of the Braid API. Defaults to braid_api_url.
+        '''
+        self.api_url = api_url or braid_api_url
+        self.model_metadata = get_model_metadata(self.api_url)
+
+    @property
+    def default_model(self) -> str:
+        '''
+        Id of the default text model, shared with ChunkRepository and fetched on first read.
+        '''
+        return self.model_metadata.default_model
 
-        self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+    @property
+    def default_embedding_model(self) -> str:
+        '''
+        Id of the default embedding model, shared with ChunkRepository and fetched on first read.
+        '''
+        return self.model_metadata.default_embedding_model
 
     def save(self, page: IStoredPage) -> bool:
         '''
@@ -61,14 +77,12 @@ class PageRepository:
 
         page.amended = utc_time_string
 
-        page_url = f'https://braid-api.azurewebsites.net/api/SavePage?session={
-        #page_url = f'http://localhost:7071/api/SavePage?session={
-            SESSION_KEY}'
+        page_url = f'{self.api_url}/SavePage?session={SESSION_KEY}'
         json_input = {
             'request': page.__dict__
         }
 
-        response = self.session.post(
+        response = get_session(page_url).post(
             page_url, json=json_input, headers=headers)
 
         if response.status_code == 200:
@@ -93,11 +107,9 @@ class PageRepository:
 
         logger.debug('Finding: %s', record_id)
 
-        page_url = f'https://braid-api.azurewebsites.net/api/GetPage?session={
-        #page_url = f'http://localhost:7071/api/GetPage?session={
-            SESSION_KEY}&id={record_id}'
+        page_url = f'{self.api_url}/GetPage?session={SESSION_KEY}&id={record_id}'
 
-        response = self.session.post(
+        response = get_session(page_url).post(
             page_url, headers=headers)
 
         if response.status_code == 200:
@@ -1,6 +1,10 @@
 """
 Common functions and variables for HTTP requests
 """
+import os
 
 
-request_timeout = 40
\ No newline at end of file
+request_timeout = 40
+
+# Set BRAID_API_URL to e.g. 'http://localhost:7071/api' to use a local server
+braid_api_url = os.environ.get('BRAID_API_URL', 'https://braid-api.azurewebsites.net/api')
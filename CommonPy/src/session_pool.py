@@ -0,0 +1,194 @@
+'''
+Shared, thread-safe pool of HTTP sessions.
+
+Every client of the Braid APIs used to build a new requests.Session, with a fresh Retry adapter,
+on each call, so each call paid a new TCP + TLS handshake. This module keeps one keep-alive
+session per base URL (scheme + host) and retry policy, with a connection pool sized for
+concurrent use, and hands the same session to every caller in the process. Requests made
+without a timeout get the pool's, so configure_sessions(timeout=) applies to every caller.
+
+Functions:
+    get_session: Returns the shared session for a URL
+    configure_sessions: Replaces the process-wide pool with one using different settings
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+from .request_utilities import request_timeout
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TOTAL_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 1
+DEFAULT_STATUS_FORCELIST = (500, 502, 503, 504)
+
+
+def make_base_url(url: str) -> str:
+    '''
+    Reduces a URL to scheme + host, which is the unit a connection pool can be shared across.
+
+    Parameters:
+        url (str): Any URL, e.g. 'https://braid-api.azurewebsites.net/api/Embed?session=x'
+
+    Returns:
+        str: The base URL, e.g. 'https://braid-api.azurewebsites.net'
+    '''
+    split_url = urlsplit(url)
+    return split_url.scheme + '://' + split_url.netloc
+
+
+class TimeoutAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter that gives requests sent without a timeout a default one.
+
+    Attributes:
+        timeout (float): Timeout in seconds for requests that do not pass their own.
+    '''
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['timeout']
+
+    def __init__(self, timeout: float, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):  # pylint: disable=arguments-differ
+        return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+
+class SessionPool:
+    '''
+    Owns one pooled, keep-alive requests.Session per base URL and retry policy.
+
+    Sessions are created lazily on first use under a lock, so the pool can be shared
+    between threads. The underlying urllib3 connection pools are thread safe.
+
+    Attributes:
+        pool_size (int): Maximum number of connections kept alive per base URL.
+        total_retries (int): Number of retries for failed requests.
+        backoff_factor (float): Backoff factor between retries.
+        status_forcelist (tuple[int]): HTTP status codes that trigger a retry.
+        timeout (float): Timeout in seconds for requests made with the pool's sessions that do
+            not pass their own.
+    '''
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 total_retries: int = DEFAULT_TOTAL_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 status_forcelist: tuple[int] = DEFAULT_STATUS_FORCELIST,
+                 timeout: float = request_timeout):
+        self.pool_size = pool_size
+        self.total_retries = total_retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = tuple(status_forcelist)
+        self.timeout = timeout
+        self._sessions: dict[tuple, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str, status_forcelist: tuple[int] = None) -> requests.Session:
+        '''
+        Returns the shared session for the base URL of 'url', creating it if needed.
+
+        Parameters:
+            url (str): The URL that will be called.
+            status_forcelist (tuple[int]): Optional override of the status codes to retry on.
+
+        Returns:
+            requests.Session: A session with keep-alive connections and retries configured.
+        '''
+        if status_forcelist is None:
+            status_forcelist = self.status_forcelist
+        key = (make_base_url(url), tuple(status_forcelist))
+
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._make_session(tuple(status_forcelist))
+                self._sessions[key] = session
+        return session
+
+    def post(self, url: str, status_forcelist: tuple[int] = None, **kwargs) -> requests.Response:
+        '''
+        POST via the shared session for 'url'.
+        '''
+        return self.session_for(url, status_forcelist).post(url, **kwargs)
+
+    def get(self, url: str, status_forcelist: tuple[int] = None, **kwargs) -> requests.Response:
+        '''
+        GET via the shared session for 'url'.
+        '''
+        return self.session_for(url, status_forcelist).get(url, **kwargs)
+
+    def close(self) -> None:
+        '''
+        Closes all sessions and their connections. The pool can still be used afterwards,
+        new sessions are created on demand.
+        '''
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def _make_session(self, status_forcelist: tuple[int]) -> requests.Session:
+        session = requests.Session()
+        retries = Retry(total=self.total_retries, backoff_factor=self.backoff_factor,
+                        status_forcelist=list(status_forcelist))
+        adapter = TimeoutAdapter(self.timeout,
+                                 max_retries=retries,
+                                 pool_connections=1,
+                                 pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+
+_default_pool = SessionPool()
+
+
+def configure_sessions(pool_size: int = DEFAULT_POOL_SIZE,
+                       total_retries: int = DEFAULT_TOTAL_RETRIES,
+                       backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                       status_forcelist: tuple[int] = DEFAULT_STATUS_FORCELIST,
+                       timeout: float = request_timeout) -> SessionPool:
+    '''
+    Replaces the process-wide pool with one using the given settings. Existing sessions are closed.
+    Call this once at startup, before requests are in flight.
+
+    Returns:
+        SessionPool: The new process-wide pool.
+    '''
+    global _default_pool  # pylint: disable=global-statement
+    old_pool = _default_pool
+    _default_pool = SessionPool(pool_size, total_retries, backoff_factor,
+                                status_forcelist, timeout)
+    old_pool.close()
+    return _default_pool
+
+
+def get_session_pool() -> SessionPool:
+    '''
+    Returns the process-wide SessionPool.
+    '''
+    return _default_pool
+
+
+def get_session(url: str, status_forcelist: tuple[int] = None) -> requests.Session:
+    '''
+    Returns the process-wide shared session for the base URL of 'url'.
+
+    Parameters:
+        url (str): The URL that will be called.
+        status_forcelist (tuple[int]): Optional override of the status codes to retry on.
+
+    Returns:
+        requests.Session: A pooled, keep-alive session with retries configured.
+    '''
+    return _default_pool.session_for(url, status_forcelist)
@@ -4,11 +4,13 @@ Defines several class structures for storing and querying data.
 Classes:
     IStorable: A base class with common attributes for storable entities,
         including identifiers, timestamps, and schema version.
+    IStorableMultiKeyQuerySpec, IStorableMultiSaveSpec: requests that find or
+        save several storables at once.
 """
 # Generated by ts2python version 0.7.5 on 2024-11-05 13:56:28.905808
 # pylint: disable=invalid-name
 
-from typing import Union
+from typing import Union, List
 
 class IStorable:
     """
@@ -89,3 +91,40 @@ class IStorableOperationResult:
             self.ok = other.ok
         else:
             self.ok = None
+
+
+class IStorableMultiKeyQuerySpec:
+    """
+    A class for finding several storables by functional key in one request.
+
+    Attributes:
+     functionalSearchKeys (List[str]): The functional keys to find.
+    """
+    functionalSearchKeys: List[str]
+
+    def __init__(self, other=None):
+        if other:
+            self.functionalSearchKeys = other.functionalSearchKeys
+        else:
+            self.functionalSearchKeys = None
+
+
+class IStorableMultiSaveSpec:
+    """
+    A class for saving several storables in one request.
+
+    Attributes:
+     records (List[dict]): The storables to save, as dictionaries.
+     upsertByFunctionalKey (bool): If True, a record whose functionalSearchKey is already
+        stored takes the stored id and replaces the stored record.
+    """
+    records: List[dict]
+    upsertByFunctionalKey: bool
+
+    def __init__(self, other=None):
+        if other:
+            self.records = other.records
+            self.upsertByFunctionalKey = other.upsertByFunctionalKey
+        else:
+            self.records = None
+            self.upsertByFunctionalKey = False
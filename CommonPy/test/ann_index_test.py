@@ -0,0 +1,140 @@
+''' Tests for the approximate nearest-neighbour index '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.ann_index import AnnIndex, embeddings_from_chunks, fingerprint_files, normalise_rows
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+def make_clustered(count: int, dimension: int, clusters: int, seed: int = 1) -> np.ndarray:
+    ''' Points scattered around random centres, which is roughly how text embeddings sit '''
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension))
+    labels = rng.integers(0, clusters, size=count)
+    return (centres[labels] + 0.3 * rng.normal(size=(count, dimension))).astype(np.float32)
+
+
+def exact_nearest(vectors: np.ndarray, queries: np.ndarray, k: int) -> list[list[int]]:
+    scores = normalise_rows(queries) @ normalise_rows(vectors).T
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k].tolist()
+
+
+def test_embeddings_from_chunks():
+    chunks = [{'ada_v2': [1.0, 0.0]}, {'summary': 'none'}, None, {'embedding': [0.0, 1.0]}]
+
+    ids, vectors = embeddings_from_chunks(chunks)
+
+    assert ids.tolist() == [0, 3]
+    assert vectors.shape == (2, 2)
+
+
+def test_empty():
+    index = AnnIndex.build([])
+
+    assert len(index) == 0
+    assert index.search([1.0, 0.0], 3) == ([], [])
+
+
+def test_all_probes_is_exact():
+    vectors = make_clustered(2000, 32, 20)
+    queries = make_clustered(50, 32, 20, seed=2)
+    index = AnnIndex.build(vectors)
+
+    found, _ = index.search_batch(queries, 5, probes=index.lists)
+
+    assert found == exact_nearest(vectors, queries, 5)
+
+
+def test_recall():
+    vectors = make_clustered(20000, 64, 100)
+    queries = make_clustered(200, 64, 100, seed=2)
+    index = AnnIndex.build(vectors)
+
+    expected = exact_nearest(vectors, queries, 10)
+
+    def recall(probes: int) -> float:
+        found, _ = index.search_batch(queries, 10, probes=probes)
+        hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+        return hits / (10 * len(queries))
+
+    assert recall(1) <= recall(index.probes) <= recall(index.lists)
+    assert recall(index.probes) > 0.9
+    assert recall(index.lists) == 1.0
+
+
+def test_ids_and_scores():
+    vectors = [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]]
+    index = AnnIndex.build(vectors, ids=[10, 20, 30], lists=2)
+
+    ids, scores = index.search([1.0, 0.1], 2, probes=2)
+
+    assert ids == [10, 30]
+    assert scores[0] > scores[1]
+    assert abs(scores[0] - 0.995) < 0.01
+
+
+def test_save_and_load(tmp_path):
+    vectors = make_clustered(3000, 16, 10)
+    index = AnnIndex.build(vectors, probes=3, fingerprint='abc')
+    index.save(str(tmp_path))
+
+    loaded = AnnIndex.load(str(tmp_path))
+
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.probes == 3
+    assert loaded.fingerprint == 'abc'
+    assert loaded.search(vectors[5], 3) == index.search(vectors[5], 3)
+
+
+def test_load_or_build(tmp_path):
+    chunk_file = tmp_path / 'master_enriched.json'
+    chunk_file.write_text('[]', encoding='utf-8')
+    chunks = [{'ada_v2': [1.0, 0.0]}, {'ada_v2': [0.0, 1.0]}]
+    index_dir = str(tmp_path / 'index')
+
+    first = AnnIndex.load_or_build(index_dir, chunks, fingerprint_files([str(chunk_file)]))
+    again = AnnIndex.load_or_build(index_dir, [], fingerprint_files([str(chunk_file)]))
+    assert len(first) == 2
+    assert len(again) == 2
+
+    os.utime(chunk_file, ns=(0, 0))
+    rebuilt = AnnIndex.load_or_build(index_dir, chunks[:1], fingerprint_files([str(chunk_file)]))
+    assert len(rebuilt) == 1
+
+
+def test_benchmark(record_property):
+    ''' Query latency of the index against a linear scan '''
+    vectors = make_clustered(50000, 256, 200)
+    queries = make_clustered(100, 256, 200, seed=2)
+    index = AnnIndex.build(vectors)
+    normalised = normalise_rows(vectors)
+
+    start = time.perf_counter()
+    for query in queries:
+        np.argmax(normalised @ query)
+    scan_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, 1)
+    index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    record_property('scan_ms_per_query', scan_ms)
+    record_property('index_ms_per_query', index_ms)
@@ -0,0 +1,52 @@
+''' Tests for packing texts into request batches '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.batch_utilities import make_batches, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 1
+    assert estimate_tokens('abcd' * 10) == 10
+
+
+def test_empty():
+    assert not make_batches([])
+
+
+def test_batches_by_count():
+    batches = make_batches(['a'] * 10, max_items=4)
+
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_batches_by_tokens():
+    texts = ['x' * 40, 'x' * 40, 'x' * 40]   # 10 tokens each
+
+    batches = make_batches(texts, max_items=10, max_tokens=25)
+
+    assert batches == [[0, 1], [2]]
+
+
+def test_oversized_text_alone():
+    texts = ['a', 'x' * 400, 'b']
+
+    batches = make_batches(texts, max_items=10, max_tokens=50)
+
+    assert batches == [[0], [1], [2]]
+
+
+def test_order_preserved():
+    texts = [str(i) * (i + 1) for i in range(100)]
+
+    batches = make_batches(texts, max_items=7, max_tokens=30)
+
+    assert [i for batch in batches for i in batch] == list(range(100))
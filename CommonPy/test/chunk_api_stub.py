@@ -0,0 +1,115 @@
+''' In-memory stand-in for the Chunk endpoints of the Braid Api, for tests that must not touch the real database '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class ChunkApiHandler(BaseHTTPRequestHandler):
+    ''' Serves EnumerateModels, FindChunk, SaveChunk, FindChunks and SaveChunks from server.chunks '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}').get('request')
+        endpoint = urlparse(self.path).path.removeprefix('/api/')
+        server = self.server
+
+        with server.lock:
+            server.calls[endpoint] += 1
+            status, body = 200, {}
+
+            if endpoint == 'EnumerateModels':
+                body = {'defaultId': 'model', 'defaultEmbeddingId': 'embedding_model'}
+            elif endpoint == 'FindChunk':
+                chunk = server.find(request.get('id'), request.get('functionalSearchKey'))
+                status, body = (200, chunk) if chunk else (404, {})
+            elif endpoint == 'SaveChunk':
+                server.chunks[request['id']] = request
+            elif endpoint == 'FindChunks':
+                body = server.query(request['functionalSearchKeys'])
+            elif endpoint == 'SaveChunks':
+                ids = []
+                saved = []
+                stored_ids = {}
+                if request.get('upsertByFunctionalKey'):
+                    # One query for the whole batch, as saveStorables does
+                    stored_ids = {stored['functionalSearchKey']: stored['id'] for stored in
+                                  server.query([record.get('functionalSearchKey') for record in request['records']])}
+                for record in request['records']:
+                    if record.get('functionalSearchKey') in stored_ids:
+                        record['id'] = stored_ids[record['functionalSearchKey']]
+                    # A failed write leaves the others in the batch saved, as saveStorables does
+                    failed = record['id'] in server.failing_ids
+                    if not failed:
+                        server.chunks[record['id']] = record
+                    ids.append(record['id'])
+                    saved.append(not failed)
+                body = {'ok': all(saved), 'ids': ids, 'saved': saved}
+            else:
+                status = 404
+
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+class ChunkApiStub(ThreadingHTTPServer):
+    '''
+    Local server holding chunks in a dictionary by id, and counting calls per endpoint.
+    Use api_url as the api_url of a ChunkRepository.
+
+    Queries by functional key are answered a page of page_size documents at a time, as Cosmos
+    does, and the pages are joined by following the continuation, as findStorables does. Set
+    follow_continuation to False to see what a caller gets if only the first page is read.
+    Records whose ids are in failing_ids fail to save, and SaveChunks reports which.
+    '''
+
+    def __init__(self, page_size: int = 100):
+        super().__init__(('127.0.0.1', 0), ChunkApiHandler)
+        self.chunks: dict[str, dict] = {}
+        self.calls: Counter = Counter()
+        self.page_size = page_size
+        self.follow_continuation = True
+        self.pages = 0
+        self.failing_ids: set[str] = set()
+        self.lock = threading.Lock()
+        self.api_url = f'http://127.0.0.1:{self.server_address[1]}/api'
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def find(self, record_id: str, functional_key: str) -> dict:
+        if record_id:
+            return self.chunks.get(record_id)
+        return next((chunk for chunk in self.chunks.values()
+                     if functional_key and chunk.get('functionalSearchKey') == functional_key), None)
+
+    def query(self, functional_keys: list[str]) -> list[dict]:
+        keys = set(functional_keys)
+        matches = [chunk for chunk in self.chunks.values() if chunk.get('functionalSearchKey') in keys]
+        found = []
+        continuation = 0
+        while continuation is not None:
+            found.extend(matches[continuation:continuation + self.page_size])
+            self.pages = self.pages + 1
+            continuation = continuation + self.page_size
+            if continuation >= len(matches) or not self.follow_continuation:
+                continuation = None
+        return found
+
+    def start(self) -> 'ChunkApiStub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,160 @@
+''' Tests for batched find and save in ChunkRepository, run against a local stand-in for the Api '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import logging
+
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.chunk_repository_api import ChunkRepository, chunk_class_name, chunk_schema_version
+from src.chunk_repository_api_types import IStoredChunk, create_text_rendering, create_embedding
+from test.chunk_api_stub import ChunkApiStub
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+@pytest.fixture
+def stub_api():
+    server = ChunkApiStub().start()
+    yield server
+    server.stop()
+
+
+def make_chunk(key: str, text: str = 'Some text') -> IStoredChunk:
+    chunk = IStoredChunk()
+    chunk.id = None
+    chunk.applicationId = 'Test'
+    chunk.contextId = 'Test'
+    chunk.className = chunk_class_name
+    chunk.schemaVersion = chunk_schema_version
+    chunk.functionalSearchKey = key
+    chunk.originalText = text
+    chunk.storedSummary = create_text_rendering(text, 'model')
+    chunk.storedEmbedding = create_embedding([0.5] * 8, 'embedding_model')
+    return chunk
+
+
+def test_basic(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    assert repository.default_model == 'model'
+    assert repository.default_embedding_model == 'embedding_model'
+
+
+def test_save_and_find_many(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    chunks = [make_chunk('key' + str(i)) for i in range(10)]
+
+    assert repository.save_many(chunks)
+    assert all(chunk.id for chunk in chunks)
+
+    found = repository.find_many(['key3', 'missing', 'key0', 'key3'])
+    assert [chunk.id if chunk else None for chunk in found] == \
+        [chunks[3].id, None, chunks[0].id, chunks[3].id]
+    assert found[0].storedSummary.text == 'Some text'
+    assert found[0].storedEmbedding.embedding == [0.5] * 8
+    assert stub_api.calls['FindChunks'] == 1
+
+
+def test_batches_by_count(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    chunks = [make_chunk('key' + str(i)) for i in range(25)]
+
+    assert repository.save_many(chunks, max_items=10)
+    assert stub_api.calls['SaveChunks'] == 3
+    assert len(repository.find_many(['key' + str(i) for i in range(25)], max_items=10)) == 25
+    assert stub_api.calls['FindChunks'] == 3
+
+
+def test_batches_by_size(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    chunks = [make_chunk('key' + str(i), 'x' * 1000) for i in range(10)]
+
+    assert repository.save_many(chunks, max_characters=5000)
+    assert stub_api.calls['SaveChunks'] >= 4
+    assert len(stub_api.chunks) == 10
+
+
+def test_upsert(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    first = make_chunk('key', 'First')
+    repository.save_many([first])
+
+    second = make_chunk('key', 'Second')
+    assert repository.save_many([second], upsert=True)
+
+    assert second.id == first.id
+    assert len(stub_api.chunks) == 1
+    assert repository.find('key').originalText == 'Second'
+    assert stub_api.calls['FindChunk'] == 1
+
+
+def test_request_count(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    chunks = [make_chunk('key' + str(i)) for i in range(500)]
+
+    repository.find_many([chunk.functionalSearchKey for chunk in chunks])
+    repository.save_many(chunks, upsert=True)
+
+    assert stub_api.calls['FindChunks'] + stub_api.calls['SaveChunks'] <= 10
+    assert stub_api.calls['FindChunk'] == stub_api.calls['SaveChunk'] == 0
+    assert len(stub_api.chunks) == 500
+
+
+def test_find_many_paged(stub_api):
+    # More matches than fit in one page of query results
+    repository = ChunkRepository(stub_api.api_url)
+    stub_api.page_size = 40
+    chunks = [make_chunk('key' + str(i)) for i in range(250)]
+    repository.save_many(chunks)
+    keys = [chunk.functionalSearchKey for chunk in chunks]
+
+    pages = stub_api.pages
+    found = repository.find_many(keys)
+    assert [chunk.id for chunk in found] == [chunk.id for chunk in chunks]
+    # Keys are sent 200 at a time, so 5 pages then 2
+    assert stub_api.pages - pages == 7
+
+    repository.save_many([make_chunk(key, 'Changed') for key in keys], upsert=True)
+    assert len(stub_api.chunks) == 250
+
+    # Reading only the first page loses the rest, and upserts then add duplicates
+    stub_api.follow_continuation = False
+    assert sum(chunk is None for chunk in repository.find_many(keys)) == 170
+    repository.save_many([make_chunk(key, 'Again') for key in keys], upsert=True)
+    assert len(stub_api.chunks) == 380
+
+
+def test_save_many_partial_failure(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    chunks = [make_chunk('key' + str(i)) for i in range(25)]
+    for i, chunk in enumerate(chunks):
+        chunk.id = 'id' + str(i)
+    stub_api.failing_ids = {'id3', 'id17'}
+
+    assert not repository.save_many(chunks, max_items=10)
+    # The rest of each batch is saved, and the failed chunks keep their ids to try again
+    assert sorted(stub_api.chunks) == sorted('id' + str(i) for i in range(25) if i not in (3, 17))
+    assert [chunk.id for chunk in chunks] == ['id' + str(i) for i in range(25)]
+
+    stub_api.failing_ids = set()
+    assert repository.save_many([chunks[3], chunks[17]])
+    assert len(stub_api.chunks) == 25
+
+
+def test_find_many_fails(stub_api):
+    repository = ChunkRepository(stub_api.api_url)
+    repository.api_url = repository.api_url + '/Missing'
+
+    with pytest.raises(RuntimeError):
+        repository.find_many(['key'])
@@ -0,0 +1,98 @@
+''' Tests for the process-wide model metadata cache, run against a local stand-in for the Api '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.model_metadata import ModelMetadata, get_model_metadata
+from src.chunk_repository_api import ChunkRepository
+from src.page_repository_api import PageRepository
+from test.chunk_api_stub import ChunkApiStub
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+@pytest.fixture
+def stub_api():
+    server = ChunkApiStub().start()
+    yield server
+    server.stop()
+
+
+def test_lazy(stub_api):
+    repositories = [ChunkRepository(stub_api.api_url) for _ in range(5)]
+    page_repository = PageRepository(stub_api.api_url)
+    assert stub_api.calls['EnumerateModels'] == 0
+
+    assert repositories[0].default_model == 'model'
+    assert repositories[4].default_embedding_model == 'embedding_model'
+    assert page_repository.default_model == 'model'
+    assert stub_api.calls['EnumerateModels'] == 1
+    assert page_repository.model_metadata is get_model_metadata(stub_api.api_url)
+
+
+def test_threads(stub_api):
+    metadata = ModelMetadata(stub_api.api_url)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: metadata.default_model, range(50)))
+
+    assert models == ['model'] * 50
+    assert stub_api.calls['EnumerateModels'] == 1
+
+
+def test_expiry(stub_api):
+    metadata = ModelMetadata(stub_api.api_url, ttl_seconds=0.05)
+    assert metadata.default_model == 'model'
+    assert metadata.default_model == 'model'
+    time.sleep(0.1)
+    assert metadata.default_model == 'model'
+
+    assert metadata.fetches == 2
+    metadata.invalidate()
+    assert metadata.default_model == 'model'
+    assert stub_api.calls['EnumerateModels'] == 3
+
+
+def test_persists(stub_api, tmpdir):
+    cache_file = str(tmpdir.join('models.json'))
+    assert ModelMetadata(stub_api.api_url, cache_file=cache_file).default_model == 'model'
+
+    reopened = ModelMetadata(stub_api.api_url, cache_file=cache_file)
+    assert reopened.default_embedding_model == 'embedding_model'
+    assert reopened.fetches == 0
+    assert stub_api.calls['EnumerateModels'] == 1
+
+
+def test_fails(stub_api):
+    metadata = ModelMetadata(stub_api.api_url + '/Missing')
+    with pytest.raises(RuntimeError):
+        metadata.get()
+
+
+def test_keeps_expired_on_failure(stub_api, tmpdir):
+    api_url = stub_api.api_url + '/Missing'
+    cache_file = str(tmpdir.join('models.json'))
+    with open(cache_file, 'w', encoding='utf-8') as file:
+        json.dump({api_url: {'models': {'defaultId': 'old', 'defaultEmbeddingId': 'old_embedding'},
+                             'fetched': 0}}, file)
+
+    metadata = ModelMetadata(api_url, cache_file=cache_file)
+    assert metadata.default_model == 'old'
+    assert metadata.fetches == 0
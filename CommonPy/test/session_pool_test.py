@@ -0,0 +1,181 @@
+''' Tests and benchmark for the shared HTTP session pool, run against a local stub server '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.session_pool import SessionPool, make_base_url, configure_sessions, get_session
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+BENCHMARK_CALLS = 200
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    ''' Minimal keep-alive JSON endpoint that records which client connection each call used '''
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.server.client_ports.add(self.client_address[1])
+        time.sleep(self.server.delay)
+
+        body = json.dumps({'embedding': [1.0, 2.0]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.client_ports = set()
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_url(server) -> str:
+    return f'http://127.0.0.1:{server.server_address[1]}/api/Embed?session=test'
+
+
+def post_with_fresh_session(url: str) -> requests.Response:
+    ''' The pattern the pipeline steps used before the pool existed '''
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=1,
+                    status_forcelist=[500, 502, 503, 504])
+    session.mount('http://', HTTPAdapter(max_retries=retries))
+    return session.post(url, json={'request': {'text': 'test'}}, timeout=10)
+
+
+def test_base_url():
+    assert make_base_url(
+        'https://braid-api.azurewebsites.net/api/Embed?session=x') == 'https://braid-api.azurewebsites.net'
+
+
+def test_same_session_per_host():
+    pool = SessionPool()
+    first = pool.session_for('https://braid-api.azurewebsites.net/api/Embed')
+    second = pool.session_for('https://braid-api.azurewebsites.net/api/Summarize')
+    other = pool.session_for('http://localhost:7071/api/Embed')
+    different_retries = pool.session_for('https://braid-api.azurewebsites.net/api/FindTheme',
+                                         status_forcelist=(502, 503, 504))
+
+    assert first is second
+    assert first is not other
+    assert first is not different_retries
+
+
+def test_thread_safe_creation():
+    pool = SessionPool()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        sessions = list(executor.map(
+            lambda _: pool.session_for('https://braid-api.azurewebsites.net/api/Embed'), range(64)))
+
+    assert len({id(session) for session in sessions}) == 1
+
+
+def test_connection_reused(stub_server):
+    url = make_url(stub_server)
+    pool = SessionPool()
+
+    for _ in range(20):
+        response = pool.post(url, json={'request': {'text': 'test'}})
+        assert response.status_code == 200
+
+    pool.close()
+    assert len(stub_server.client_ports) == 1
+
+
+def test_concurrent_calls_bounded_by_pool(stub_server):
+    url = make_url(stub_server)
+    pool = SessionPool(pool_size=4)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(
+            lambda _: pool.post(url, json={'request': {'text': 'test'}}), range(100)))
+
+    pool.close()
+    assert all(response.status_code == 200 for response in responses)
+    assert len(stub_server.client_ports) <= 4
+
+
+def test_pool_timeout(stub_server):
+    url = make_url(stub_server)
+    stub_server.delay = 0.5
+    pool = SessionPool(total_retries=0, timeout=0.1)
+
+    # Callers post through the session without a timeout of their own
+    with pytest.raises(requests.exceptions.Timeout):
+        pool.session_for(url).post(url, json={'request': {'text': 'test'}})
+    # One passed explicitly still wins
+    assert pool.session_for(url).post(url, json={'request': {'text': 'test'}}, timeout=5).status_code == 200
+    pool.close()
+
+
+def test_configure_sessions_timeout(stub_server):
+    url = make_url(stub_server)
+    stub_server.delay = 0.5
+    configure_sessions(total_retries=0, timeout=0.1)
+    try:
+        with pytest.raises(requests.exceptions.Timeout):
+            get_session(url).post(url, json={'request': {'text': 'test'}})
+    finally:
+        configure_sessions()
+
+
+def test_benchmark_latency(stub_server, record_property):
+    ''' Per-call latency with a fresh session per call (before) versus the shared pool (after) '''
+    url = make_url(stub_server)
+
+    start = time.perf_counter()
+    for _ in range(BENCHMARK_CALLS):
+        post_with_fresh_session(url)
+    fresh_ms = (time.perf_counter() - start) * 1000 / BENCHMARK_CALLS
+    fresh_connections = len(stub_server.client_ports)
+
+    stub_server.client_ports.clear()
+    pool = SessionPool()
+    start = time.perf_counter()
+    for _ in range(BENCHMARK_CALLS):
+        pool.post(url, json={'request': {'text': 'test'}})
+    pooled_ms = (time.perf_counter() - start) * 1000 / BENCHMARK_CALLS
+    pooled_connections = len(stub_server.client_ports)
+    pool.close()
+
+    record_property('fresh_ms_per_call', fresh_ms)
+    record_property('pooled_ms_per_call', pooled_ms)
+
+    # Timing on a shared machine is noisy, so only assert on connection counts
+    assert fresh_connections > BENCHMARK_CALLS // 2
+    assert pooled_connections == 1
@@ -18,6 +18,7 @@ export interface IEmbedRequest{
 
    persona: EPromptPersona;
    text: string;
+   texts?: Array<string>;     // Optional batch of texts, embedded in one request. If present, 'text' is ignored.
 }
 
 /**
@@ -26,4 +27,5 @@ export interface IEmbedRequest{
 export interface IEmbedResponse {
 
    embedding: Array<number>;
+   embeddings?: Array<Array<number>>;  // One embedding per entry in IEmbedRequest.texts, in the same order
 }
\ No newline at end of file
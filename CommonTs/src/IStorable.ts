@@ -78,4 +78,34 @@ export interface IStorableQuerySpec {
 export interface IStorableOperationResult {
 
    ok :boolean;  // True if operation succeeeded
-}
\ No newline at end of file
+}
+
+/**
+ * Defines the structure of a query specification for searching for several records at once.
+ * Includes the functional search keys of the records. 
+ */
+export interface IStorableMultiKeyQuerySpec {
+
+   functionalSearchKeys : Array<string>;  // Keys to search for. Records are returned for the keys found, in no particular order.
+}
+
+/**
+ * Defines the structure of a request to save several records at once.
+ * If upsertByFunctionalKey is true, a record whose functionalSearchKey is already stored takes the stored id,
+ * so it replaces the stored record rather than adding a second one.
+ */
+export interface IStorableMultiSaveSpec {
+
+   records : Array<IStorable>;       // Records to save
+   upsertByFunctionalKey: boolean;   // Replace stored records with the same functionalSearchKey
+}
+
+/**
+ * Defines the result of saving several records at once.
+ */
+export interface IStorableMultiOperationResult {
+
+   ok :boolean;          // True if every record was saved
+   ids: Array<string>;   // The id each record was saved with, in request order
+   saved: Array<boolean>; // Whether each record was saved, in request order
+}
@@ -5,7 +5,6 @@
 # Standard Library Imports
 import logging
 import os
-import json
 
 from src.workflow import YouTubePipelineSpec, HtmlDirectedPipelineSpec, PipelineItem, PipelineFileSpec
 from src.youtube_searcher import YoutubePlaylistSearcher
@@ -15,7 +14,10 @@ from src.html_link_crawler import HtmlLinkCrawler
 from src.html_file_downloader import HtmlFileDownloader
 from src.summariser import Summariser
 from src.embedder import Embedder
+from src.step_cache import open_cache
+from src.stage_executor import PipelinedExecutor, PipelineStage, PipelineStats, DEFAULT_QUEUE_SIZE
 from src.waterfall_pipeline_save_chunks import save_chunks
+from src.record_stream import RecordWriter
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -23,6 +25,15 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+# Threads for each stage of the run. Fetching and summarising wait on remote services, so they
+# get several. Chunking is quick, and embedding is sent in batches.
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_CHUNK_WORKERS = 2
+DEFAULT_SUMMARISE_WORKERS = 4
+DEFAULT_EMBED_WORKERS = 1
+# Most chunks sent to Embedder.embed_many at once
+DEFAULT_EMBED_BATCH_SIZE = 16
+
 
 class BoxerDataPipeline:
     '''
@@ -32,17 +43,37 @@ class BoxerDataPipeline:
        list[str]: A list of HTML content downloaded from the specified links.
     '''
 
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str,
+                 fetch_workers: int = DEFAULT_FETCH_WORKERS,
+                 chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+                 summarise_workers: int = DEFAULT_SUMMARISE_WORKERS,
+                 embed_workers: int = DEFAULT_EMBED_WORKERS,
+                 embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
         '''
         Initializes a BoxerDataPipeline object with the specified output location.
 
         Parameters:
             output_location (str): The location where the output will be stored.
+            fetch_workers (int): Transcripts and pages fetched at once.
+            chunk_workers (int): Transcripts chunked at once.
+            summarise_workers (int): Chunks summarised at once.
+            embed_workers (int): Embedding batches requested at once.
+            embed_batch_size (int): Most chunks in one embedding batch.
+            queue_size (int): Most items waiting in front of each stage.
 
         Returns:
             None
         '''
         self.output_location = output_location
+        self.fetch_workers = fetch_workers
+        self.chunk_workers = chunk_workers
+        self.summarise_workers = summarise_workers
+        self.embed_workers = embed_workers
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        # Per stage throughput of the last run
+        self.stats = PipelineStats()
         return
 
     def search(self,
@@ -57,7 +88,7 @@ class BoxerDataPipeline:
         '''
         youtube_searcher = YoutubePlaylistSearcher(self.output_location)
         youtube_downloader = YouTubeTranscriptDownloader(self.output_location)
-        youtube_chunker = YouTubeTranscriptChunker(self.output_location)
+        youtube_chunker = YouTubeTranscriptChunker(self.output_location, youtube_spec.chunk_engine)
 
         html_crawler = HtmlLinkCrawler(self.output_location)
         html_downloader = HtmlFileDownloader(self.output_location)
@@ -65,62 +96,55 @@ class BoxerDataPipeline:
         summariser = Summariser(self.output_location)
         embedder = Embedder(self.output_location)
 
-        all_chunks = []
-        all_enriched_chunks = []
-
+        # Every crawled page, then every video, runs through fetch, chunk, summarise and embed.
+        # The stages run at once, so a long playlist keeps them all busy.
+        sources = []
         for html_url in html_spec.urls:
-            chunk = PipelineItem()
-            chunk.path = html_url
-            html_items = html_crawler.crawl(chunk)
-
-            for html_item in html_items:
-                downloaded = None
-                summarised = None
-                embedded = None
-
-                downloaded = html_downloader.download(html_item)
-                if downloaded:
-                    summarised = summariser.summarise(downloaded)
-                if summarised:
-                    embedded = embedder.embed(summarised)
-                if embedded:
-                    all_enriched_chunks.append(embedded)
-
+            start_page = PipelineItem()
+            start_page.path = html_url
+            sources.extend(html_crawler.crawl(start_page))
         youtube_items = youtube_searcher.search(youtube_spec)
-
-        for chunk in youtube_items:
-            chunk = youtube_downloader.download(chunk)
-            chunks = youtube_chunker.chunk(
-                chunk, youtube_spec.max_words, youtube_spec.overlap_words)
-            if chunks:
-                all_chunks.extend(chunks)
-
-        for chunk in all_chunks:
-            summarised = None
-            embedded = None
-            logger.info('Processing: %s', chunk.path)
-            if chunk.text:
-                summarised = summariser.summarise(chunk)
-            if summarised:
-                embedded = embedder.embed(summarised)
-            if embedded:
-                all_enriched_chunks.append(embedded)
+        sources.extend(youtube_items)
+        youtube_ids = {id(item) for item in youtube_items}
+
+        def fetch(item: PipelineItem) -> PipelineItem:
+            if id(item) in youtube_ids:
+                return youtube_downloader.download(item)
+            return html_downloader.download(item)
+
+        def chunk_transcript(item: PipelineItem) -> list[PipelineItem]:
+            # Web pages are summarised whole
+            if id(item) not in youtube_ids:
+                return item
+            return youtube_chunker.chunk(item, youtube_spec.max_words, youtube_spec.overlap_words)
+
+        def summarise(item: PipelineItem) -> PipelineItem:
+            logger.info('Processing: %s', item.path)
+            if not item.text:
+                return None
+            return summariser.summarise(item)
+
+        executor = PipelinedExecutor([
+            PipelineStage('fetch', fetch, self.fetch_workers),
+            PipelineStage('chunk', chunk_transcript, self.chunk_workers),
+            PipelineStage('summarise', summarise, self.summarise_workers),
+            PipelineStage('embed', embedder.embed_many, self.embed_workers, self.embed_batch_size)],
+            self.queue_size)
+        all_enriched_chunks = executor.run(sources)
+        self.stats = executor.stats
+
+        logger.info('Step cache: %s', open_cache(self.output_location).stats)
 
         # Save all chunks to the DB
         save_chunks(all_enriched_chunks, file_spec)
 
-        output_results = []
-        for chunk in all_enriched_chunks:
-            output_item = dict()
-            output_item['summary'] = chunk.summary
-            output_item['embedding'] = chunk.embedding
-            output_item['url'] = chunk.path
-            output_results.append(output_item)
-
-        # save the test results to a json file
+        # save the test results to a json file, one chunk at a time
         output_file = os.path.join(
             self.output_location, file_spec.output_data_name)
-        with open(output_file, 'w+', encoding='utf-8') as f:
-            json.dump(output_results, f)
+        with RecordWriter(output_file, embedding_format=file_spec.output_embedding_format) as writer:
+            for chunk in all_enriched_chunks:
+                writer.write({'summary': chunk.summary,
+                              'embedding': chunk.embedding,
+                              'url': chunk.path})
 
         return all_enriched_chunks
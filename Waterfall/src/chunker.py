@@ -5,11 +5,10 @@
 import logging
 import os
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
-from CommonPy.src.request_utilities import request_timeout
+from CommonPy.src.session_pool import get_session
 from src.workflow import PipelineItem, PipelineStep
+from src.local_chunker import chunk_text, chunk_offsets, UNIT_TOKENS, UNIT_WORDS
 
 
 # Set up logging to display information about the execution of the script
@@ -26,20 +25,33 @@ headers = {
     'Accept': 'application/json'
 }
 
+# Chunk with the braid-api Chunk function, or locally by tokens or by words, see local_chunker
+CHUNK_ENGINE_REMOTE = 'remote'
+CHUNK_ENGINE_TOKENS = UNIT_TOKENS
+CHUNK_ENGINE_WORDS = UNIT_WORDS
+CHUNK_ENGINES = (CHUNK_ENGINE_REMOTE, CHUNK_ENGINE_TOKENS, CHUNK_ENGINE_WORDS)
+
 
 class Chunker (PipelineStep):
     '''PipelineStep to chunk a text string'''
 
-    # pylint: disable-next=useless-parent-delegation
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str, engine: str = CHUNK_ENGINE_REMOTE):
         '''
         Initializes the Chunker object with the provided output location.
+
+        Parameters:
+            output_location (str): The location where the output will be stored.
+            engine (str): One of CHUNK_ENGINES. The local engines split the text the same way as
+            the Chunk API, without sending it over the network.
         '''
         super(Chunker, self).__init__(output_location)
+        if engine not in CHUNK_ENGINES:
+            raise ValueError(f'Unknown chunk engine: {engine}')
+        self.engine = engine
 
     def chunk(self, pipeline_item: PipelineItem, chunk_size_words: int, overlap_words: int) -> list[PipelineItem]:
         '''
-        Chunk a text string into smaller parts and return a list of PipelineItem objects representing each chunk. Uses an external API to perform the chunking process. 
+        Chunk a text string into smaller parts and return a list of PipelineItem objects representing each chunk. Uses an external API, or a local engine, to perform the chunking process. 
 
         Parameters:
             - pipeline_item: PipelineItem - The item to be chunked.
@@ -52,10 +64,9 @@ class Chunker (PipelineStep):
 
         logger.debug('Chunking: %s', pipeline_item.path)
 
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        if self.engine != CHUNK_ENGINE_REMOTE:
+            return self._make_chunks(pipeline_item,
+                                     chunk_text(pipeline_item.text, chunk_size_words, overlap_words, self.engine))
 
         summary_url = f'https://braid-api.azurewebsites.net/api/Chunk?session={
             SESSION_KEY}'
@@ -76,23 +87,48 @@ class Chunker (PipelineStep):
                 }
             }
 
+        session = get_session(summary_url)
         response = session.post(summary_url, json=input_json,
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
         pipeline_chunks = []  # If there is an error in the API, return an empty list
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
-            chunks = response_json['chunks']
-
-            for i, chunk in enumerate(chunks):
-                new_item = PipelineItem()
-                new_item.path = pipeline_item.path
-                new_item.text = chunk
-                new_item.chunk = i
-                new_item.summary = pipeline_item.summary
-                new_item.embedding = pipeline_item.embedding
-                new_item.cluster = pipeline_item.cluster
-                pipeline_chunks.append(new_item)
+            pipeline_chunks = self._make_chunks(pipeline_item, response_json['chunks'])
+
+        return pipeline_chunks
 
+    def chunk_with_offsets(self, pipeline_item: PipelineItem, chunk_size_words: int,
+                           overlap_words: int) -> tuple[list[PipelineItem], list[int]]:
+        '''
+        Chunks a text as chunk() does, and also returns where each chunk starts in the text.
+
+        Returns:
+            tuple[list[PipelineItem], list[int]]: The chunks, and the character offset of the first
+            word of each. The local engines know the offsets exactly. For the remote engine they
+            are None, and the caller has to find the chunks in the text.
+        '''
+        if self.engine == CHUNK_ENGINE_REMOTE:
+            return self.chunk(pipeline_item, chunk_size_words, overlap_words), None
+
+        texts = []
+        offsets = []
+        for start, end in chunk_offsets(pipeline_item.text, chunk_size_words, overlap_words, self.engine):
+            chunk = pipeline_item.text[start:end]
+            texts.append(chunk)
+            offsets.append(start + len(chunk) - len(chunk.lstrip()))
+        return self._make_chunks(pipeline_item, texts), offsets
+
+    @staticmethod
+    def _make_chunks(pipeline_item: PipelineItem, chunks: list[str]) -> list[PipelineItem]:
+        pipeline_chunks = []
+        for i, chunk in enumerate(chunks):
+            new_item = PipelineItem()
+            new_item.path = pipeline_item.path
+            new_item.text = chunk
+            new_item.chunk = i
+            new_item.summary = pipeline_item.summary
+            new_item.embedding = pipeline_item.embedding
+            new_item.cluster = pipeline_item.cluster
+            pipeline_chunks.append(new_item)
         return pipeline_chunks
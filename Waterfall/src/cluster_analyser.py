@@ -3,7 +3,15 @@
 
 # Standard Library Imports
 import logging
-from sklearn.cluster import KMeans
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
 
 from src.workflow import PipelineItem, PipelineStep
 
@@ -13,20 +21,197 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+# Full-batch KMeans, exact but slow and memory hungry on large sets
+ENGINE_KMEANS = 'kmeans'
+# MiniBatchKMeans, much faster on large sets and can be fed items as they arrive with partial_fit
+ENGINE_MINI_BATCH = 'minibatch'
+# KMeans below MINI_BATCH_THRESHOLD items, MiniBatchKMeans above
+ENGINE_AUTO = 'auto'
+ENGINES = (ENGINE_KMEANS, ENGINE_MINI_BATCH, ENGINE_AUTO)
+# Recorded in ClusterStats when items are assigned to saved centroids rather than fitted
+ENGINE_CENTROIDS = 'centroids'
+
+MINI_BATCH_THRESHOLD = 10000
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_RANDOM_STATE = 42
+
+# Items the cluster count sweep fits and scores on. Silhouette is quadratic in this.
+DEFAULT_SWEEP_SAMPLE = 2000
+
+
+def make_embedding_matrix(items: list[PipelineItem]) -> np.ndarray:
+    '''
+    Copies the embeddings of the items into one float32 matrix, one row per item.
+
+    Parameters:
+       items (list[PipelineItem]): Items that all have an embedding of the same length.
+
+    Returns:
+       np.ndarray: Shape (items, embedding length).
+    '''
+    matrix = np.empty((len(items), len(items[0].embedding)), dtype=np.float32)
+    for i, item in enumerate(items):
+        matrix[i] = item.embedding
+    return matrix
+
+
+# Set in each sweep worker process by _start_sweep_worker, so the matrix is sent once per process
+_sweep_embeddings: np.ndarray = None
+_sweep_random_state: int = None
+
+
+def _start_sweep_worker(embeddings: np.ndarray, random_state: int) -> None:
+    global _sweep_embeddings, _sweep_random_state  # pylint: disable=global-statement
+    _sweep_embeddings = embeddings
+    _sweep_random_state = random_state
+
+
+def _score_cluster_count(clusters: int) -> float:
+    labels = KMeans(n_clusters=clusters, random_state=_sweep_random_state,
+                    n_init='auto').fit_predict(_sweep_embeddings)
+    return float(silhouette_score(_sweep_embeddings, labels))
+
+
+def _sweep_context() -> multiprocessing.context.BaseContext:
+    # Forked from a clean server process where the platform has one (Linux, macOS), as forking
+    # this one, which may be running threads, can deadlock. The server imports this module once,
+    # then forks are cheap. Elsewhere (Windows) each worker is spawned and imports it itself.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _sweep_serial(embeddings: np.ndarray, candidates: list[int], random_state: int) -> list[float]:
+    _start_sweep_worker(embeddings, random_state)
+    return [_score_cluster_count(clusters) for clusters in candidates]
+
+
+def choose_cluster_count(embeddings: np.ndarray,
+                         min_clusters: int,
+                         max_clusters: int,
+                         sample_size: int = DEFAULT_SWEEP_SAMPLE,
+                         workers: int = None,
+                         random_state: int = DEFAULT_RANDOM_STATE) -> tuple[int, dict[int, float]]:
+    '''
+    Finds the number of clusters with the best silhouette score. Each candidate is fitted and
+    scored on the same random sample of the embeddings, with the candidates spread over a
+    process pool, so the sweep costs about one fit of the full set.
+
+    Parameters:
+       embeddings (np.ndarray): One embedding per row.
+       min_clusters (int): Smallest count to try, at least 2.
+       max_clusters (int): Largest count to try, capped at one less than the sample size.
+       sample_size (int): Rows to fit and score each candidate on.
+       workers (int): Processes to use. None = one per CPU, 1 = no pool. If the pool cannot
+          be started, the candidates are scored in this process.
+       random_state (int): Seed for the sample and the fits.
+
+    Returns:
+       tuple[int, dict[int, float]]: The best count, and the score of each count tried.
+    '''
+    if len(embeddings) > sample_size:
+        rows = np.random.default_rng(random_state).choice(len(embeddings), sample_size, replace=False)
+        embeddings = embeddings[np.sort(rows)]
+
+    candidates = list(range(max(2, min_clusters), min(max_clusters, len(embeddings) - 1) + 1))
+    if not candidates:
+        raise ValueError(f'Cannot choose between {min_clusters} and {max_clusters} clusters '
+                         f'for {len(embeddings)} items')
+
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    if workers == 1:
+        scores = _sweep_serial(embeddings, candidates, random_state)
+    else:
+        try:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=_sweep_context(),
+                                     initializer=_start_sweep_worker,
+                                     initargs=(embeddings, random_state)) as executor:
+                scores = list(executor.map(_score_cluster_count, candidates))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning('Cluster count sweep pool failed, scoring in this process: %s', e)
+            scores = _sweep_serial(embeddings, candidates, random_state)
+
+    scored = dict(zip(candidates, scores))
+    best = max(candidates, key=lambda clusters: scored[clusters])
+    logger.info('Chose %d clusters, silhouette %s', best, scored)
+    return best, scored
+
+
+class ClusterStats:
+    '''
+    Outcome of the last fit of a ClusterAnalyser.
+    '''
+
+    def __init__(self):
+        self.engine: str = None
+        self.items = 0
+        self.inertia: float = None
+        self.seconds = 0.0
+        # Silhouette score of each cluster count tried, if the count was chosen automatically
+        self.scores: dict[int, float] = None
+        self.sweep_seconds = 0.0
+
+    def __str__(self) -> str:
+        text = (f'{self.engine}: {self.items} items, inertia {self.inertia:.4g}, '
+                f'{self.seconds * 1000:.0f} ms')
+        if self.scores:
+            text = text + f', {len(self.scores)} cluster counts tried in {self.sweep_seconds * 1000:.0f} ms'
+        return text
+
 
 class ClusterAnalyser (PipelineStep):
     '''PipelineStep that analyses a set of embedding vectors by KMeans clustering'''
 
-    def __init__(self, output_location: str, clusters: int):
+    def __init__(self, output_location: str, clusters: int,
+                 engine: str = ENGINE_AUTO,
+                 random_state: int = DEFAULT_RANDOM_STATE,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_clusters: int = None,
+                 sweep_workers: int = None):
         '''
         Initializes the ClusterAnalyser object with the provided output location and target cluster count
+
+        Parameters:
+           output_location (str): The location in the file system where output is stored.
+           clusters (int): The number of clusters to find, or the smallest to try if max_clusters is set.
+           engine (str): One of ENGINES.
+           random_state (int): Seed for the clustering, so a run can be repeated. None = random.
+           batch_size (int): Items per mini batch for the mini batch engine.
+           max_clusters (int): If set, analyse chooses the count between clusters and max_clusters
+              with choose_cluster_count, and sets clusters to it.
+           sweep_workers (int): Processes for the cluster count sweep. None = one per CPU.
         '''
         super(ClusterAnalyser, self).__init__(output_location)
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown clustering engine: {engine}')
         self.clusters = clusters
+        self.engine = engine
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.min_clusters = clusters
+        self.max_clusters = max_clusters
+        self.sweep_workers = sweep_workers
+        self.model = None
+        self.stats = ClusterStats()
+
+    def make_model(self, engine: str):
+        '''
+        Creates an unfitted model for an engine.
+        '''
+        if engine == ENGINE_MINI_BATCH:
+            return MiniBatchKMeans(n_clusters=self.clusters,
+                                   batch_size=self.batch_size,
+                                   random_state=self.random_state,
+                                   n_init='auto')
+        return KMeans(n_clusters=self.clusters, random_state=self.random_state, n_init='auto')
 
     def analyse(self, items: list[PipelineItem]) -> list[PipelineItem]:
         '''
         Analyzes the given clusters using KMeans clustering algorithm.
+        If max_clusters is set, the number of clusters is chosen first.
 
         Parameters:
            items: a set of Pipeline items to analyse
@@ -34,19 +219,104 @@ class ClusterAnalyser (PipelineStep):
         Returns:
            list[PipelineItem]: A list of PipelineItem objects with updated cluster assignments.
         '''
+        embeddings = make_embedding_matrix(items)
 
-        x = len (items[0].embedding)
-        y = len (items)
+        if self.max_clusters is not None:
+            start = time.perf_counter()
+            self.clusters, self.stats.scores = choose_cluster_count(
+                embeddings, self.min_clusters, self.max_clusters,
+                workers=self.sweep_workers, random_state=self.random_state)
+            self.stats.sweep_seconds = time.perf_counter() - start
 
-        embeddings = [[0 for _ in range(x)] for _ in range(y)]
-        for i, item in enumerate (items):
-            embeddings[i] = item.embedding
+        engine = self.engine
+        if engine == ENGINE_AUTO:
+            engine = ENGINE_MINI_BATCH if len(items) > MINI_BATCH_THRESHOLD else ENGINE_KMEANS
 
         logger.debug('Making cluster')
-        kmeans = KMeans(n_clusters=self.clusters)
-        kmeans.fit(embeddings)
+        start = time.perf_counter()
+        self.model = self.make_model(engine)
+        self.model.fit(embeddings)
+        self._record(engine, len(items), start)
 
-        for i, item in enumerate(items):
-            item.cluster = int(kmeans.labels_[i])
+        for item, label in zip(items, self.model.labels_):
+            item.cluster = int(label)
 
         return items
+
+    def partial_fit(self, items: list[PipelineItem]) -> list[PipelineItem]:
+        '''
+        Updates the clusters with a batch of newly arrived items, without refitting earlier ones,
+        and labels the batch. Uses the mini batch engine whatever engine was chosen.
+        The first batch must have at least as many items as there are clusters.
+
+        Parameters:
+           items: the newly arrived Pipeline items
+
+        Returns:
+           list[PipelineItem]: The same items with cluster assignments.
+        '''
+        embeddings = make_embedding_matrix(items)
+
+        start = time.perf_counter()
+        if not isinstance(self.model, MiniBatchKMeans):
+            self.model = self.make_model(ENGINE_MINI_BATCH)
+            self.stats.items = 0
+        self.model.partial_fit(embeddings)
+        self._record(ENGINE_MINI_BATCH, self.stats.items + len(items), start)
+
+        return self.predict(items)
+
+    def predict(self, items: list[PipelineItem]) -> list[PipelineItem]:
+        '''
+        Labels items with the nearest of the clusters already fitted.
+
+        Parameters:
+           items: the Pipeline items to label
+
+        Returns:
+           list[PipelineItem]: The same items with cluster assignments.
+        '''
+        if self.model is None:
+            raise RuntimeError('ClusterAnalyser has not been fitted')
+
+        for item, label in zip(items, self.model.predict(make_embedding_matrix(items))):
+            item.cluster = int(label)
+        return items
+
+    def assign(self, items: list[PipelineItem], centroids: np.ndarray) -> list[PipelineItem]:
+        '''
+        Labels items with the nearest of a set of saved centroids, without fitting.
+        Used by incremental runs to keep the clusters of the previous run.
+
+        Parameters:
+           items: the Pipeline items to label
+           centroids (np.ndarray): One centroid per cluster.
+
+        Returns:
+           list[PipelineItem]: The same items with cluster assignments.
+        '''
+        embeddings = make_embedding_matrix(items)
+        centroids = np.asarray(centroids, dtype=np.float32)
+
+        start = time.perf_counter()
+        # |x - c|^2 = |x|^2 - 2x.c + |c|^2, and |x|^2 does not change the nearest
+        distances = (centroids * centroids).sum(axis=1) - 2.0 * (embeddings @ centroids.T)
+        labels = np.argmin(distances, axis=1)
+        self.clusters = len(centroids)
+        self.stats.engine = ENGINE_CENTROIDS
+        self.stats.items = len(items)
+        self.stats.inertia = float(np.maximum(
+            distances[np.arange(len(items)), labels] + (embeddings * embeddings).sum(axis=1), 0).sum())
+        self.stats.seconds = time.perf_counter() - start
+        logger.info('Clustering: %s', self.stats)
+
+        for item, label in zip(items, labels):
+            item.cluster = int(label)
+        return items
+
+    def _record(self, engine: str, items: int, start: float) -> None:
+        self.stats.engine = engine
+        self.stats.items = items
+        self.stats.inertia = float(self.model.inertia_)
+        self.stats.seconds = time.perf_counter() - start
+        logger.info('Clustering: %s', self.stats)
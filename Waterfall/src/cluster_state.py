@@ -0,0 +1,141 @@
+'''
+Module to keep the clusters and themes of one Waterfall run for the next.
+
+An incremental run assigns its items to the centroids saved by the previous run, instead of
+clustering from scratch, and only asks for new themes for clusters whose membership has
+changed by more than a threshold. The other clusters keep their saved descriptions.
+
+The state is two files in the output location: the centroids as a float32 .npy array, and the
+theme descriptions and member paths of each cluster as JSON.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import json
+
+import numpy as np
+
+from src.workflow import PipelineItem, Theme
+from src.file_repository import write_json_atomic
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+CENTROIDS_FILE_NAME = 'cluster_state.npy'
+THEMES_FILE_NAME = 'cluster_state.json'
+
+# Fraction of a cluster's saved members that must have left or joined before it is re-themed
+DEFAULT_RETHEME_THRESHOLD = 0.2
+
+
+class ClusterTheme:
+    '''
+    The saved theme of one cluster.
+    '''
+
+    def __init__(self, short_description: str = None, long_description: str = None,
+                 example_path: str = None, member_paths: list[str] = None):
+        self.short_description = short_description
+        self.long_description = long_description
+        self.example_path = example_path
+        self.member_paths = member_paths or []
+
+    def changed_fraction(self, member_paths: list[str]) -> float:
+        '''
+        Returns the number of members that have left or joined, as a fraction of the saved members.
+        A cluster that had no saved members has changed completely if it has any now.
+        '''
+        saved = set(self.member_paths)
+        changed = len(saved.symmetric_difference(member_paths))
+        if not saved:
+            return 1.0 if changed else 0.0
+        return changed / len(saved)
+
+
+class ClusterState:
+    '''
+    Centroids and themes of every cluster from one run.
+
+    Attributes:
+        centroids (np.ndarray): One row per cluster.
+        themes (list[ClusterTheme]): One per cluster, in cluster order.
+    '''
+
+    def __init__(self, centroids: np.ndarray, themes: list[ClusterTheme]):
+        self.centroids = centroids
+        self.themes = themes
+
+    @property
+    def clusters(self) -> int:
+        ''' The number of clusters '''
+        return len(self.centroids)
+
+    @staticmethod
+    def build(items: list[PipelineItem], themes: list[Theme], clusters: int) -> 'ClusterState':
+        '''
+        Builds the state to save from a run's clustered items and its themes.
+        Each centroid is the mean of its members' embeddings. A cluster with no members keeps a zero centroid.
+        '''
+        centroids = np.zeros((clusters, len(items[0].embedding)), dtype=np.float32)
+        counts = np.zeros(clusters, dtype=np.int64)
+        cluster_themes = [ClusterTheme() for _ in range(clusters)]
+        for item in items:
+            centroids[item.cluster] += item.embedding
+            counts[item.cluster] += 1
+            cluster_themes[item.cluster].member_paths.append(item.path)
+        centroids[counts > 0] /= counts[counts > 0, None]
+
+        for theme in themes:
+            cluster_theme = cluster_themes[theme.member_pipeline_items[0].cluster]
+            cluster_theme.short_description = theme.short_description
+            cluster_theme.long_description = theme.long_description
+            if theme.example_pipeline_items:
+                cluster_theme.example_path = theme.example_pipeline_items[0].path
+
+        return ClusterState(centroids, cluster_themes)
+
+    def save(self, output_location: str) -> None:
+        '''
+        Saves the state to the output location, replacing any saved before.
+        '''
+        os.makedirs(output_location, exist_ok=True)
+        # The themes are written last, so a state is only loaded once both files are complete
+        centroids_file_name = os.path.join(output_location, CENTROIDS_FILE_NAME)
+        temp_file_name = centroids_file_name + '.tmp.npy'
+        np.save(temp_file_name, self.centroids)
+        os.replace(temp_file_name, centroids_file_name)
+
+        write_json_atomic(os.path.join(output_location, THEMES_FILE_NAME),
+                          {'clusters': self.clusters,
+                           'themes': [theme.__dict__ for theme in self.themes]})
+
+    @staticmethod
+    def load(output_location: str) -> 'ClusterState':
+        '''
+        Loads the state saved in the output location.
+
+        Returns:
+            ClusterState: The state, or None if there is none or it cannot be read.
+        '''
+        themes_file_name = os.path.join(output_location, THEMES_FILE_NAME)
+        centroids_file_name = os.path.join(output_location, CENTROIDS_FILE_NAME)
+        if not os.path.exists(themes_file_name) or not os.path.exists(centroids_file_name):
+            return None
+
+        try:
+            with open(themes_file_name, 'r', encoding='utf-8') as file:
+                content = json.load(file)
+            centroids = np.load(centroids_file_name)
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring unreadable cluster state in %s: %s', output_location, str(e))
+            return None
+
+        if len(centroids) != content['clusters']:
+            logger.warning('Ignoring inconsistent cluster state in %s', output_location)
+            return None
+        return ClusterState(centroids, [ClusterTheme(**theme) for theme in content['themes']])
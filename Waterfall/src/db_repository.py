@@ -32,11 +32,12 @@ class DbRepository:
     Class providing load, save, and existence check for files in the Braid Cosmos database.
     '''
 
-    def __init__(self, application_id: str, context_id: str):
+    def __init__(self, application_id: str, context_id: str,
+                 chunk_repository: ChunkRepository = None):
 
         self.application_id = application_id
         self.context_id = context_id
-        self.chunk_repository = ChunkRepository()
+        self.chunk_repository = chunk_repository or ChunkRepository()
 
     def save(self, item: PipelineItem) -> bool:
         '''
@@ -46,6 +47,31 @@ class DbRepository:
            functional_key (str): functionalKey to use for the record
            item (PipelineItem): The content to be saved.
         '''
+        return self.chunk_repository.save(self.make_chunk(item))
+
+    def save_many(self, items: list[PipelineItem], upsert: bool = False) -> bool:
+        '''
+        Save several items to the database in as few requests as their size allows.
+        Each item's id is set to the id it was saved with.
+
+        Parameters:
+           items (list[PipelineItem]): The content to be saved.
+           upsert (bool): If True, an item whose path is already stored replaces the stored
+              record, so there is no need to find it first.
+
+        Returns:
+           bool: True if every item was saved.
+        '''
+        chunks = [self.make_chunk(item) for item in items]
+        ok = self.chunk_repository.save_many(chunks, upsert=upsert)
+        for item, chunk in zip(items, chunks):
+            item.id = chunk.id
+        return ok
+
+    def make_chunk(self, item: PipelineItem) -> IStoredChunk:
+        '''
+        Maps a PipelineItem to the Chunk it is stored as. An item with no id is given a new one.
+        '''
         functional_key = make_local_file_path(item.path)
         logger.debug('Saving: %s', functional_key)
 
@@ -82,7 +108,7 @@ class DbRepository:
         chunk.relatedChunks = None
         chunk.url = item.path
 
-        return self.chunk_repository.save(chunk)
+        return chunk
 
     def find(self, path: str) -> PipelineItem:
         '''
@@ -101,6 +127,28 @@ class DbRepository:
 
         chunk = self.chunk_repository.find(functional_key)
 
+        return self.make_item(chunk)
+
+    def find_many(self, paths: list[str]) -> list[PipelineItem]:
+        '''
+        Load several items from the database in as few requests as possible.
+
+        Parameters:
+           paths (list[str]): The paths of the items
+
+        Returns:
+           list[PipelineItem]: One entry per path, in the same order, None for paths not found.
+        '''
+        chunks = self.chunk_repository.find_many(
+            [make_local_file_path(path) for path in paths])
+
+        return [self.make_item(chunk) for chunk in chunks]
+
+    @staticmethod
+    def make_item(chunk: IStoredChunk) -> PipelineItem:
+        '''
+        Maps a stored Chunk to a PipelineItem, or None to None.
+        '''
         if chunk:
             # Map from a Chunk to a PipelineItem
             item = PipelineItem()
@@ -0,0 +1,216 @@
+'''
+Reduces embeddings to 2-D for the Waterfall chart.
+
+UMAP over full-size embeddings is the slowest step of a large report, and without a seed gives a
+different chart each time. Here embeddings are first reduced with PCA, which is cheap, then UMAP
+is fitted with a fixed seed. The latest 2-D projection is cached in the output location, keyed by
+the paths and embeddings of the items, so the report can be rendered again without refitting.
+Only one projection is kept, so repeated runs do not grow the output location.
+
+The fitted models are kept too, so an incremental run can place only its new items with
+transform() and keep the positions of the items it has already charted.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import time
+import hashlib
+import glob
+
+import joblib
+import numpy as np
+from sklearn.decomposition import PCA
+import umap.umap_ as umap__
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+REDUCTION_DIRECTORY = 'reduction'
+MODEL_FILE_NAME = 'model.joblib'
+LATEST_FILE_NAME = 'latest.npz'
+
+DEFAULT_PCA_COMPONENTS = 50
+DEFAULT_NEIGHBOURS = 15
+DEFAULT_RANDOM_STATE = 42
+
+
+class ReductionStats:
+    '''
+    Timings of the last reduction.
+    '''
+
+    def __init__(self):
+        self.items = 0
+        self.cached = False
+        self.transformed = 0
+        self.pca_seconds = 0.0
+        self.umap_seconds = 0.0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        if self.cached:
+            return f'{self.items} items from cache in {self.seconds * 1000:.0f} ms'
+        return (f'{self.items} items ({self.transformed} transformed) in {self.seconds * 1000:.0f} ms, '
+                f'PCA {self.pca_seconds * 1000:.0f} ms, UMAP {self.umap_seconds * 1000:.0f} ms')
+
+
+class DimensionReducer:
+    '''
+    Reduces embeddings to 2-D with PCA then UMAP, caching results in the output location.
+
+    Attributes:
+        output_location (str): Where the cache and models are kept. None = no cache.
+        pca_components (int): Dimensions PCA reduces to before UMAP. 0 = no PCA.
+        neighbours (int): UMAP n_neighbors.
+        random_state (int): Seed for PCA and UMAP, so the same items give the same chart.
+    '''
+
+    def __init__(self, output_location: str = None,
+                 pca_components: int = DEFAULT_PCA_COMPONENTS,
+                 neighbours: int = DEFAULT_NEIGHBOURS,
+                 random_state: int = DEFAULT_RANDOM_STATE):
+        self.output_location = output_location
+        self.pca_components = pca_components
+        self.neighbours = neighbours
+        self.random_state = random_state
+        self.stats = ReductionStats()
+        self._model: dict = None
+
+    def make_key(self, embeddings: np.ndarray, keys: list[str]) -> str:
+        '''
+        Returns the cache key for a set of items: a hash of their keys, their embeddings and the settings.
+        '''
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((self.pca_components, self.neighbours, self.random_state,
+                            embeddings.shape)).encode('utf-8'))
+        digest.update('\n'.join(keys).encode('utf-8'))
+        digest.update(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def reduce(self, embeddings: np.ndarray, keys: list[str], incremental: bool = False) -> np.ndarray:
+        '''
+        Reduces embeddings to 2-D, from the cache if these items have been reduced before.
+
+        Parameters:
+            embeddings (np.ndarray): One embedding per row.
+            keys (list[str]): One key per row, e.g. the item path.
+            incremental (bool): If True and models have been saved, items reduced last time keep
+                their position and only new items are placed, with transform(). Otherwise the
+                models are fitted again on all the items.
+
+        Returns:
+            np.ndarray: float32, shape (items, 2).
+        '''
+        start = time.perf_counter()
+        self.stats = ReductionStats()
+        self.stats.items = len(keys)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        key = self.make_key(embeddings, keys)
+        cached = self._load_projection(key)
+        if cached is not None:
+            self.stats.cached = True
+            self.stats.seconds = time.perf_counter() - start
+            logger.info('Reduction: %s', self.stats)
+            return cached
+
+        latest = self._load_latest() if incremental else None
+        if latest is not None and self._load_model() is not None:
+            known = dict(zip(latest['keys'].tolist(), latest['coordinates']))
+            new_rows = [i for i, item_key in enumerate(keys) if item_key not in known]
+            coordinates = np.empty((len(keys), 2), dtype=np.float32)
+            for i, item_key in enumerate(keys):
+                if item_key in known:
+                    coordinates[i] = known[item_key]
+            if new_rows:
+                coordinates[new_rows] = self.transform(embeddings[new_rows])
+            self.stats.transformed = len(new_rows)
+        else:
+            coordinates = self._fit(embeddings)
+
+        self._save_projection(key, keys, coordinates)
+        self.stats.seconds = time.perf_counter() - start
+        logger.info('Reduction: %s', self.stats)
+        return coordinates
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        '''
+        Places new embeddings in the 2-D space of the last fit.
+
+        Raises:
+            RuntimeError: If no models have been fitted.
+        '''
+        model = self._load_model()
+        if model is None:
+            raise RuntimeError('DimensionReducer has not been fitted')
+
+        reduced = np.asarray(embeddings, dtype=np.float32)
+        start = time.perf_counter()
+        if model['pca'] is not None:
+            reduced = model['pca'].transform(reduced)
+        self.stats.pca_seconds = self.stats.pca_seconds + time.perf_counter() - start
+
+        start = time.perf_counter()
+        coordinates = model['umap'].transform(reduced).astype(np.float32)
+        self.stats.umap_seconds = self.stats.umap_seconds + time.perf_counter() - start
+        return coordinates
+
+    def _fit(self, embeddings: np.ndarray) -> np.ndarray:
+        reduced = embeddings
+        pca = None
+        start = time.perf_counter()
+        components = min(self.pca_components, embeddings.shape[0], embeddings.shape[1])
+        if self.pca_components and components < embeddings.shape[1]:
+            pca = PCA(n_components=components, random_state=self.random_state)
+            reduced = pca.fit_transform(embeddings)
+        self.stats.pca_seconds = time.perf_counter() - start
+
+        # A seed makes UMAP single threaded, n_jobs=1 says so rather than warning
+        start = time.perf_counter()
+        reducer = umap__.UMAP(n_neighbors=max(2, min(self.neighbours, len(embeddings) - 1)),
+                              random_state=self.random_state, n_jobs=1)
+        coordinates = reducer.fit_transform(reduced).astype(np.float32)
+        self.stats.umap_seconds = time.perf_counter() - start
+
+        self._model = {'pca': pca, 'umap': reducer}
+        if self.output_location is not None:
+            joblib.dump(self._model, self._file_name(MODEL_FILE_NAME))
+        return coordinates
+
+    def _file_name(self, name: str) -> str:
+        directory = os.path.join(self.output_location, REDUCTION_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def _load_model(self) -> dict:
+        model = self._model
+        if model is None and self.output_location is not None \
+                and os.path.exists(self._file_name(MODEL_FILE_NAME)):
+            model = joblib.load(self._file_name(MODEL_FILE_NAME))
+            self._model = model
+        return model
+
+    def _load_projection(self, key: str) -> np.ndarray:
+        latest = self._load_latest()
+        if latest is None or 'key' not in latest.files or str(latest['key']) != key:
+            return None
+        return latest['coordinates']
+
+    def _load_latest(self):
+        if self.output_location is None or not os.path.exists(self._file_name(LATEST_FILE_NAME)):
+            return None
+        return np.load(self._file_name(LATEST_FILE_NAME))
+
+    def _save_projection(self, key: str, keys: list[str], coordinates: np.ndarray) -> None:
+        if self.output_location is None:
+            return
+        np.savez(self._file_name(LATEST_FILE_NAME), key=key, keys=np.asarray(keys, dtype=str),
+                 coordinates=coordinates)
+        # Earlier versions kept one <key>.npy per item set; remove any that are left over
+        for stale in glob.glob(self._file_name('*.npy')):
+            os.remove(stale)
@@ -5,12 +5,12 @@
 import logging
 import os
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
 from src.workflow import PipelineItem, PipelineStep
 from src.embedder_repository_facade import EmbeddingRespositoryFacade
-from CommonPy.src.request_utilities import request_timeout
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
+from CommonPy.src.session_pool import get_session
+from CommonPy.src.batch_utilities import make_batches, default_batch_items, default_batch_tokens
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -18,6 +18,8 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+STEP_NAME = 'embed'
+
 SESSION_KEY = os.environ['BRAID_SESSION_KEY']
 
 headers = {
@@ -40,10 +42,10 @@ class Embedder (PipelineStep):
 
     def embed(self, pipeline_item: PipelineItem) -> PipelineItem:
         """
-        Generates an embedding for the given PipelineItem. If an embedding
-        already exists for the item's path, it is loaded from the repository.
-        Otherwise, a new embedding is created using an external API, saved,
-        and assigned to the PipelineItem.
+        Generates an embedding for the given PipelineItem. If the same text has
+        been embedded before, the embedding is taken from the step cache.
+        Otherwise, a new embedding is created using an external API, cached, saved
+        to the repository under the item's path, and assigned to the PipelineItem.
 
         Args:
             pipeline_item (PipelineItem): The item containing text to be embedded.
@@ -54,18 +56,23 @@ class Embedder (PipelineStep):
         """
         path = pipeline_item.path
         repository = EmbeddingRespositoryFacade(self.output_location)
-        if repository.exists(path):
+        if pipeline_item.text is None and repository.exists(path):
+            # Nothing to hash, so fall back to the embedding saved for the path
+            pipeline_item.embedding = repository.load(path)
+            return pipeline_item
+
+        cache = open_cache(self.output_location)
+        key = StepCache.make_key(STEP_NAME, DEFAULT_MODEL, pipeline_item.text)
+        embedding = cache.get_embedding(STEP_NAME, key)
+        if embedding is None and repository.exists(path) and cache.claim_legacy(STEP_NAME, path):
             embedding = repository.load(path)
+            cache.put_embedding(STEP_NAME, key, embedding)
+        if embedding is not None:
             pipeline_item.embedding = embedding
             return pipeline_item
 
         logger.debug('Embedding: %s', path)
 
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-
         embed_url = f'https://braid-api.azurewebsites.net/api/Embed?session={
             SESSION_KEY}'
         json_input = {
@@ -74,16 +81,18 @@ class Embedder (PipelineStep):
             }
         }
 
+        session = get_session(embed_url)
         response = session.post(embed_url, json=json_input,
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
             embedding = response_json['embedding']
 
+            cache.put_embedding(STEP_NAME, key, embedding)
             if path is not None:
                 repository.save(path, embedding)
+                cache.mark_legacy(STEP_NAME, [path])
 
             pipeline_item.embedding = embedding
 
@@ -93,6 +102,91 @@ class Embedder (PipelineStep):
                          pipeline_item.path)
             return None
 
+    def embed_many(self, pipeline_items: list[PipelineItem],
+                   max_items: int = default_batch_items,
+                   max_tokens: int = default_batch_tokens) -> list[PipelineItem]:
+        """
+        Generates embeddings for many PipelineItems. Items whose text has a cached
+        embedding are served from the step cache. The rest are packed into batches bounded by
+        item count and estimated tokens, and each batch is sent in one request.
+        If a batch request fails, its items are embedded one at a time with embed().
+
+        Args:
+            pipeline_items (list[PipelineItem]): The items containing text to be embedded.
+            max_items (int): Maximum items per request.
+            max_tokens (int): Maximum estimated tokens per request.
+
+        Returns:
+            list[PipelineItem]: The items that were embedded, in the same order as the input.
+        """
+        repository = EmbeddingRespositoryFacade(self.output_location)
+        cache = open_cache(self.output_location)
+
+        embedded: list[bool] = [False] * len(pipeline_items)
+        uncached: list[int] = []
+        for i, pipeline_item in enumerate(pipeline_items):
+            if pipeline_item.text is None:
+                # Nothing to batch, embed() handles the fallback to the repository
+                embedded[i] = self.embed(pipeline_item) is not None
+                continue
+            key = StepCache.make_key(STEP_NAME, DEFAULT_MODEL, pipeline_item.text)
+            embedding = cache.get_embedding(STEP_NAME, key)
+            if embedding is None and repository.exists(pipeline_item.path) \
+                    and cache.claim_legacy(STEP_NAME, pipeline_item.path):
+                embedding = repository.load(pipeline_item.path)
+                cache.put_embedding(STEP_NAME, key, embedding)
+            if embedding is not None:
+                pipeline_item.embedding = embedding
+                embedded[i] = True
+            else:
+                uncached.append(i)
+
+        embed_url = f'https://braid-api.azurewebsites.net/api/Embed?session={
+            SESSION_KEY}'
+
+        texts = [pipeline_items[i].text for i in uncached]
+        for batch in make_batches(texts, max_items, max_tokens):
+            batch_items = [pipeline_items[uncached[j]] for j in batch]
+            logger.debug('Embedding batch of %d items', len(batch_items))
+
+            json_input = {
+                'request': {
+                    'text': batch_items[0].text,
+                    'texts': [item.text for item in batch_items]
+                }
+            }
+
+            batch_embeddings = None
+            try:
+                session = get_session(embed_url)
+                response = session.post(embed_url, json=json_input,
+                                        headers=headers)
+                if response.status_code == 200:
+                    batch_embeddings = json.loads(response.text).get('embeddings')
+            except OSError as e:
+                logger.warning('Batch embedding failed: %s', str(e))
+
+            if batch_embeddings is None or len(batch_embeddings) != len(batch_items):
+                # Fall back to one request per item for this batch
+                for j in batch:
+                    embedded[uncached[j]] = self.embed(pipeline_items[uncached[j]]) is not None
+                continue
+
+            for j, embedding in zip(batch, batch_embeddings):
+                pipeline_item = pipeline_items[uncached[j]]
+                pipeline_item.embedding = embedding
+                embedded[uncached[j]] = True
+                cache.put_embedding(STEP_NAME,
+                                    StepCache.make_key(STEP_NAME, DEFAULT_MODEL, pipeline_item.text),
+                                    embedding)
+
+            to_save = [item for item in batch_items if item.path is not None]
+            repository.save_many([item.path for item in to_save],
+                                 [item.embedding for item in to_save])
+            cache.mark_legacy(STEP_NAME, [item.path for item in to_save])
+
+        return [item for i, item in enumerate(pipeline_items) if embedded[i]]
+
     def embed_text(self, text: str) -> list[float]:
         """
         Generates an embedding for the given text using an external API.
@@ -105,11 +199,6 @@ class Embedder (PipelineStep):
             None if the embedding could not be calculated.
         """
 
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-
         embed_url = f'https://braid-api.azurewebsites.net/api/Embed?session={
             SESSION_KEY}'
         json_input = {
@@ -118,9 +207,9 @@ class Embedder (PipelineStep):
             }
         }
 
+        session = get_session(embed_url)
         response = session.post(embed_url, json=json_input,
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
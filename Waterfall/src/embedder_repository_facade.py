@@ -1,46 +1,43 @@
-'''Facade to store embeddings in local file system'''
+'''
+Facade to store embeddings in local file system.
+Embeddings are kept in a binary EmbeddingStore. Older '.embed.txt' files are still read,
+and moved into the store the first time they are loaded.
+If the location uses a SqliteRespository, embeddings are kept there instead.
+'''
 
 # Copyright (c) 2024 Braid Technologies Ltd
 
-import os
-from glob import glob
-
-from src.file_repository import FileRespository
+from src.sqlite_repository import SqliteRespository, open_repository
+from src.embedding_store import EmbeddingStore, open_store
 
 SPEC = 'embed.txt'
 
-def read_file_names(path: str, file_spec: str):
-    """
-    Retrieve a list of file names matching a specified pattern within a given directory.
-
-    Args:
-     path (str): The directory path to search within.
-     file_spec (str): The pattern to match file names against.
-
-    Returns:
-     list: A list of file names that match the specified pattern.
-    """
-    return list(glob(os.path.join(path, file_spec)))
-
-
 class EmbeddingRespositoryFacade:
     '''
     Class providing an interface to load, save, and existence check for files in the file system.
     '''
 
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str, repository=None):
         """
         Initializes an instance of EmbeddingRespositoryFacade.
 
         Args:
             output_location (str): The directory path where files will be stored.
+            repository: The backend, a file or SQLite repository. Defaults to the one the location uses.
 
         Attributes:
-            file__repository (FileRespository): An instance to manage file operations.
+            file__repository (ShardedFileRespository | SqliteRespository): The SQLite repository
+               that holds the embeddings, or the files holding older '.embed.txt' embeddings.
+            store (EmbeddingStore): The binary store shared by every facade on this location,
+               None if the embeddings are in a SqliteRespository.
             output_location (str): The directory path for storing files.
-            extension (str): The file extension pattern for stored files.
+            extension (str): The file extension pattern for older stored files.
         """
-        self.file__repository = FileRespository(output_location)
+        self.file__repository = repository if repository is not None else open_repository(output_location)
+        if isinstance(self.file__repository, SqliteRespository):
+            self.store: EmbeddingStore = None
+        else:
+            self.store: EmbeddingStore = open_store(output_location)
         self.output_location = output_location
         self.extension = SPEC
 
@@ -56,63 +53,124 @@ class EmbeddingRespositoryFacade:
 
     def list_contents(self) -> list[str]:
         """
-        Lists the contents of the output location by retrieving file names
-        with the specified extension pattern, stripping double extensions,
-        and returning the base file names.
+        Lists the contents of the output location: the keys in the store, then any
+        older '.embed.txt' files not yet in the store, with the extension stripped.
 
         Returns:
             list[str]: A list of base file names without extensions.
         """
-        paths = read_file_names(self.output_location,
-                                EmbeddingRespositoryFacade.spec())
+        if self.store is None:
+            return self.file__repository.list_contents(self.extension)
+
+        file_names = self.store.keys()
+        stored = set(file_names)
 
-        file_names = []
-        for path in paths:
-            # strip twice as we have double extensions in file names
-            stripped = os.path.splitext(os.path.splitext(path)[0])[0]
-            filename = os.path.basename(stripped)
-            file_names.append(filename)
+        file_names.extend(name for name in self.file__repository.list_contents(self.extension)
+                          if name not in stored)
 
         return file_names
 
     def save(self, path: str, embedding: list[float]) -> None:
         '''
-        Save the provided text to a file at the specified path within the output location.
+        Save the provided embedding to the store.
+
+        Parameters:
+           path (str): The path the embedding belongs to.
+           embedding (list[float]): The embedding to be saved.
+        '''
+        if self.store is None:
+            return self.file__repository.save(path, self.extension, embedding)
+        return self.store.save(path, embedding)
+
+    def save_many(self, paths: list[str], embeddings: list[list[float]]) -> None:
+        '''
+        Save several embeddings to the store in one write.
 
         Parameters:
-           path (str): The path where the file will be saved.
-           text (str): The text content to be saved in the file.
+           paths (list[str]): The paths the embeddings belong to.
+           embeddings (list[list[float]]): The embeddings to be saved, one per path.
         '''
-        return self.file__repository.save(path, self.extension, str(embedding))
+        if self.store is None:
+            return self.file__repository.save_many(paths, self.extension, embeddings)
+        return self.store.save_many(paths, embeddings)
 
     def load(self, path: str) -> list[float]:
         '''
-        Load content from a file based on the provided path. 
-        If the file exists in the output location, its contents are read and returned as a string. 
-        If the file does not exist, an empty string is returned.
+        Load the embedding for the provided path. 
+        If it is only present as an older '.embed.txt' file, it is parsed and copied into the store.
 
         Parameters:
            path (str): The path of the file.
 
         Returns:
-           str: The contents of the file if it exists, otherwise an empty string.
+           list[float]: The embedding.
+
+        Raises:
+           ValueError: If there is no embedding for the path.
         '''
+        if self.store is None:
+            embedding = self.file__repository.load(path, self.extension)
+            if not embedding:
+                raise ValueError(f'No embedding for: {path}')
+            return embedding
+
+        if self.store.exists(path):
+            return self.store.load(path)
 
         loaded = self.file__repository.load(path, self.extension)
+        embedding = self.text_to_float(loaded)
+        self.store.save(path, embedding)
 
-        return self.text_to_float(loaded)
+        return self.store.load(path)
 
     def exists(self, path: str) -> bool:
         '''
-        Checks if a file with the specified path exists in the output location.
+        Checks if an embedding for the specified path exists in the output location.
 
         Parameters:
            path (str): The path of the file.
 
         Returns:
-           bool: True if the file exists, False otherwise.
+           bool: True if the embedding exists, False otherwise.
+        '''
+        if self.store is None:
+            return self.file__repository.exists(path, self.extension)
+        return self.store.exists(path) or self.file__repository.exists(path, self.extension)
+
+    def exists_many(self, paths: list[str]) -> list[bool]:
+        '''
+        Checks which of several paths have an embedding, in one query where the backend allows.
+
+        Parameters:
+           paths (list[str]): The paths to check.
+
+        Returns:
+           list[bool]: One entry per path.
+        '''
+        if self.store is None:
+            return self.file__repository.exists_many(paths, self.extension)
+        return [self.exists(path) for path in paths]
+
+    def load_many(self, paths: list[str]) -> list[list[float]]:
+        '''
+        Loads the embeddings for several paths.
+
+        Parameters:
+           paths (list[str]): The paths to load.
+
+        Returns:
+           list[list[float]]: One embedding per path.
+
+        Raises:
+           ValueError: If any path has no embedding.
         '''
-        return self.file__repository.exists(path, self.extension)
+        if self.store is None:
+            embeddings = self.file__repository.load_many(paths, self.extension)
+            for path, embedding in zip(paths, embeddings):
+                if not embedding:
+                    raise ValueError(f'No embedding for: {path}')
+            return embeddings
+        return [self.load(path) for path in paths]
 
     def text_to_float(self, embedding: str) -> list[float]:
         '''
@@ -21,14 +21,117 @@ def cosine_similarity(a, b):
     return result
 
 
+def normalise_rows(matrix: np.ndarray) -> np.ndarray:
+    '''
+    Scales each row of a float32 matrix to unit length, so a dot product is a cosine similarity.
+    All-zero rows are left as zero and score 0 against everything.
+    '''
+    norms = norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
 class EmbeddingFinder:
-    '''Find the nearest embedding to the target text based on cosine similarity.'''
+    '''
+    Find the nearest embeddings to a target based on cosine similarity.
 
-    def __init__(self, embeddings: list[float], output_location: str):
+    The embeddings are held as a pre-normalised float32 matrix, so a query is one
+    matrix-vector product and a batch of queries is one matrix-matrix product.
+    Results are indices into the embeddings the finder was built with.
+    '''
 
+    def __init__(self, embeddings: list[list[float]], output_location: str):
+        '''
+        Parameters:
+        embeddings (list[list[float]]): The embeddings to search, or a 2-D array with one per row.
+        output_location (str): Where the Embedder caches embeddings of query text.
+        '''
         self.embeddings = embeddings
         self.output_location = output_location
 
+        if len(embeddings) == 0:
+            self._normalised = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self._normalised = normalise_rows(
+                np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+
+    def similarities(self, query_embeddings) -> np.ndarray:
+        '''
+        Cosine similarity of each query against every embedding.
+
+        Parameters:
+        query_embeddings: One embedding, or a 2-D array / list of embeddings.
+
+        Returns:
+        np.ndarray: Shape (embeddings,) for one query, (queries, embeddings) for several.
+        '''
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            return self._normalised @ (queries / (norm(queries) or 1.0))
+        return normalise_rows(queries) @ self._normalised.T
+
+    def find_nearest_indices(self, query_embedding: list[float], k: int = 1) -> list[int]:
+        '''
+        Find the k embeddings nearest to a query embedding.
+
+        Parameters:
+        query_embedding (list[float]): The embedding to search for.
+        k (int): How many results to return.
+
+        Returns:
+        list[int]: Indices into the embeddings, nearest first.
+        '''
+        return self.find_nearest_indices_batch([query_embedding], k)[0]
+
+    def find_nearest_indices_batch(self, query_embeddings, k: int = 1) -> list[list[int]]:
+        '''
+        Find the k nearest embeddings for each of several queries with one matrix product.
+
+        Parameters:
+        query_embeddings: A list of embeddings, or a 2-D array with one query per row.
+        k (int): How many results to return per query.
+
+        Returns:
+        list[list[int]]: For each query, indices into the embeddings, nearest first.
+        '''
+        count = self._normalised.shape[0]
+        if count == 0 or len(query_embeddings) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        scores = self.similarities(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        k = min(k, count)
+
+        # Partition to the top k, then sort only those k
+        if k < count:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(count), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1).tolist()
+
+    def find_nearest_index(self, target_text: str) -> int:
+        '''
+        Find the index of the embedding nearest to the target text.
+
+        Parameters:
+        target_text (str): The text to find the nearest embedding for.
+
+        Returns:
+        int: Index into the embeddings, or None if there are none or the text could not be embedded.
+        '''
+        if self._normalised.shape[0] == 0:
+            return None
+
+        pipeline_item = PipelineItem()
+        pipeline_item.text = target_text
+        embedder = Embedder(self.output_location)
+        enriched_embeddding: PipelineItem = embedder.embed(pipeline_item)
+        if enriched_embeddding is None:
+            return None
+
+        return self.find_nearest_indices(enriched_embeddding.embedding, 1)[0]
+
     def find_nearest(self, target_text: str) -> list[float]:
         '''
         Find the nearest embedding to the target text based on cosine similarity.
@@ -37,22 +140,19 @@ class EmbeddingFinder:
         target_text (str): The text to find the nearest embedding for.
 
         Returns:
-        list[float]: The nearest embedding to the target text.
+        list[float]: The nearest embedding to the target text, or None if nothing
+        has a positive similarity.
         '''
         pipeline_item = PipelineItem()
         pipeline_item.text = target_text
         embedder = Embedder(self.output_location)
         enriched_embeddding: PipelineItem = embedder.embed(pipeline_item)
+        if enriched_embeddding is None or self._normalised.shape[0] == 0:
+            return None
 
-        best_similarity = 0.0
-        this_similarity = 0.0
-        best_match = None
-
-        for embeddding in self.embeddings:
-            this_similarity = cosine_similarity(
-                embeddding, enriched_embeddding.embedding)
-            if this_similarity > best_similarity:
-                best_similarity = this_similarity
-                best_match = embeddding
+        scores = self.similarities(enriched_embeddding.embedding)
+        best = int(np.argmax(scores))
+        if scores[best] <= 0.0:
+            return None
 
-        return best_match
+        return self.embeddings[best]
@@ -0,0 +1,301 @@
+'''
+Binary store for embeddings, one contiguous float32 row per item in a single memory-mapped file.
+
+Files in the output location:
+    embeddings.f32        Raw float32 rows, row i holds the embedding for line i of the key file.
+    embeddings.keys       One JSON-encoded key per line, in row order. Keys are the local file names
+                          that the text repository used (see make_local_file_path).
+    embeddings.meta.json  Dimension and dtype of the rows.
+
+Rows are only ever appended, or overwritten in place when a key is saved again, so the key file
+is append-only too. The data row is written before its key, so a crash part way through a save
+leaves at most one orphan row which is trimmed next time the store is opened.
+
+The store is safe to share between threads in one process. It is not designed for several
+processes writing the same location at once.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import json
+import threading
+from glob import glob
+
+import numpy as np
+
+from src.make_local_file_path import make_local_file_path
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+STORE_NAME = 'embeddings'
+DATA_EXTENSION = 'f32'
+KEYS_EXTENSION = 'keys'
+META_EXTENSION = 'meta.json'
+TEXT_SPEC = 'embed.txt'
+DTYPE = np.float32
+
+
+def text_to_float(embedding: str) -> list[float]:
+    '''
+    Converts the text form used by the .embed.txt cache, e.g. '[0.1, 0.2]', to a list of floats.
+    '''
+    return [float(number) for number in embedding.strip().strip('"\'').strip('[]').split(',')]
+
+
+class EmbeddingStore:
+    '''
+    Stores embeddings as float32 rows in one memory-mapped file with a key to row index.
+
+    Attributes:
+        output_location (str): The directory holding the store files.
+        name (str): The base name of the store files.
+        dimension (int): Length of each embedding, None until the first save.
+    '''
+
+    def __init__(self, output_location: str, name: str = STORE_NAME):
+        self.output_location = output_location
+        self.name = name
+        self.dimension = None
+        self._rows: dict[str, int] = {}
+        self._keys: list[str] = []
+        self._matrix = None
+        self._lock = threading.RLock()
+
+        os.makedirs(self.output_location, exist_ok=True)
+        self._open()
+
+    def _file(self, extension: str) -> str:
+        return os.path.join(self.output_location, f'{self.name}.{extension}')
+
+    def _row_bytes(self) -> int:
+        return self.dimension * np.dtype(DTYPE).itemsize
+
+    def _open(self) -> None:
+        meta_file = self._file(META_EXTENSION)
+        if not os.path.exists(meta_file):
+            return
+
+        with open(meta_file, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        self.dimension = int(meta['dimension'])
+
+        keys = []
+        keys_file = self._file(KEYS_EXTENSION)
+        if os.path.exists(keys_file):
+            with open(keys_file, 'r', encoding='utf-8') as file:
+                # Parse every line in one call rather than one json.loads per key
+                keys = json.loads('[' + ','.join(line for line in file if line.strip()) + ']')
+
+        data_file = self._file(DATA_EXTENSION)
+        data_rows = os.path.getsize(data_file) // self._row_bytes() if os.path.exists(data_file) else 0
+
+        if len(keys) > data_rows:
+            logger.warning('Embedding store %s has %d keys but %d rows, dropping the extra keys',
+                           self.name, len(keys), data_rows)
+            keys = keys[:data_rows]
+            self._rewrite_keys(keys)
+        if data_rows > len(keys):
+            logger.warning('Embedding store %s has %d orphan rows, trimming',
+                           self.name, data_rows - len(keys))
+            with open(data_file, 'r+b') as file:
+                file.truncate(len(keys) * self._row_bytes())
+
+        self._keys = keys
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+    def _rewrite_keys(self, keys: list[str]) -> None:
+        with open(self._file(KEYS_EXTENSION), 'w', encoding='utf-8') as file:
+            for key in keys:
+                file.write(json.dumps(key) + '\n')
+
+    def _write_meta(self) -> None:
+        with open(self._file(META_EXTENSION), 'w', encoding='utf-8') as file:
+            json.dump({'dimension': self.dimension, 'dtype': np.dtype(DTYPE).str}, file)
+
+    @staticmethod
+    def make_key(path: str) -> str:
+        '''
+        Returns the key used for a path, the same local file name the text cache used.
+        '''
+        return make_local_file_path(path)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def keys(self) -> list[str]:
+        '''
+        Returns the keys in row order, so keys()[i] labels row i of load_matrix().
+        '''
+        return list(self._keys)
+
+    def row_of(self, path: str) -> int:
+        '''
+        Returns the row index for a path, or None if it is not stored.
+        '''
+        return self._rows.get(self.make_key(path))
+
+    def exists(self, path: str) -> bool:
+        '''
+        Checks if an embedding is stored for the path.
+        '''
+        if not path:
+            return False
+        return self.make_key(path) in self._rows
+
+    def save(self, path: str, embedding: list[float]) -> None:
+        '''
+        Saves one embedding, appending a row or overwriting the existing row for the path.
+
+        Raises:
+            ValueError: If the embedding length differs from the store dimension.
+        '''
+        self.save_many([path], [embedding])
+
+    def save_many(self, paths: list[str], embeddings) -> None:
+        '''
+        Saves several embeddings with one write per file.
+
+        Parameters:
+            paths (list[str]): The paths the embeddings belong to.
+            embeddings: A list of embeddings, or a 2-D array with one row per path.
+
+        Raises:
+            ValueError: If the embedding length differs from the store dimension.
+        '''
+        self._save_keys([self.make_key(path) for path in paths], embeddings)
+
+    def _save_keys(self, keys: list[str], embeddings) -> None:
+        if len(keys) == 0:
+            return
+        matrix = np.asarray(embeddings, dtype=DTYPE)
+        if matrix.ndim != 2 or matrix.shape[0] != len(keys):
+            raise ValueError('Expected one embedding per path')
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = int(matrix.shape[1])
+                self._write_meta()
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f'Embedding has dimension {matrix.shape[1]}, store has {self.dimension}')
+
+            # Maps each new key to the input row holding its latest value
+            new_keys: dict[str, int] = {}
+            for i, key in enumerate(keys):
+                row = self._rows.get(key)
+                if row is None:
+                    new_keys[key] = i
+                else:
+                    self._overwrite_row(row, matrix[i])
+
+            if new_keys:
+                # Data first, then keys, so a key never points past the end of the data
+                with open(self._file(DATA_EXTENSION), 'ab') as file:
+                    file.write(matrix[list(new_keys.values())].tobytes())
+                with open(self._file(KEYS_EXTENSION), 'a', encoding='utf-8') as file:
+                    file.write(''.join(json.dumps(key) + '\n' for key in new_keys))
+                for key in new_keys:
+                    self._rows[key] = len(self._keys)
+                    self._keys.append(key)
+
+            self._matrix = None
+
+        logger.debug('Saved %d embeddings', len(keys))
+
+    def _overwrite_row(self, row: int, embedding: np.ndarray) -> None:
+        with open(self._file(DATA_EXTENSION), 'r+b') as file:
+            file.seek(row * self._row_bytes())
+            file.write(embedding.tobytes())
+
+    def load_matrix(self) -> np.ndarray:
+        '''
+        Returns every stored embedding as a read-only (rows, dimension) float32 array mapped
+        straight from the data file, without copying. Row i belongs to keys()[i].
+        '''
+        with self._lock:
+            if self._matrix is None:
+                if len(self._keys) == 0:
+                    return np.empty((0, self.dimension or 0), dtype=DTYPE)
+                self._matrix = np.memmap(self._file(DATA_EXTENSION), dtype=DTYPE, mode='r',
+                                         shape=(len(self._keys), self.dimension))
+            return self._matrix
+
+    def load_vector(self, path: str) -> np.ndarray:
+        '''
+        Returns the embedding for a path as a float32 view into the mapped file.
+
+        Raises:
+            KeyError: If nothing is stored for the path.
+        '''
+        row = self._rows[self.make_key(path)]
+        return self.load_matrix()[row]
+
+    def load(self, path: str) -> list[float]:
+        '''
+        Returns the embedding for a path as a list of floats.
+
+        Raises:
+            KeyError: If nothing is stored for the path.
+        '''
+        return self.load_vector(path).tolist()
+
+    def import_text_files(self, directory: str = None) -> int:
+        '''
+        Imports embeddings from the older one-file-per-item '.embed.txt' cache.
+        Keys already in the store are left alone.
+
+        Parameters:
+            directory (str): Where the '.embed.txt' files are. Defaults to the store location.
+
+        Returns:
+            int: The number of embeddings imported.
+        '''
+        if directory is None:
+            directory = self.output_location
+
+        keys = []
+        embeddings = []
+        # Files may be flat or in the hashed subdirectories of a ShardedFileRespository
+        for file_name in glob(os.path.join(directory, '**', '*.' + TEXT_SPEC), recursive=True):
+            key = os.path.basename(file_name)[:-len('.' + TEXT_SPEC)]
+            if key in self._rows:
+                continue
+            with open(file_name, 'r', encoding='utf-8') as file:
+                contents = file.read()
+            try:
+                embeddings.append(text_to_float(contents))
+                keys.append(key)
+            except ValueError:
+                logger.warning('Skipping unreadable embedding file: %s', file_name)
+
+        self._save_keys(keys, embeddings)
+        logger.info('Imported %d embeddings from %s', len(keys), directory)
+        return len(keys)
+
+
+_stores: dict[tuple, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(output_location: str, name: str = STORE_NAME) -> EmbeddingStore:
+    '''
+    Returns the process-wide EmbeddingStore for a location, opening it on first use,
+    so the key index is read once rather than on every lookup.
+    '''
+    key = (os.path.abspath(output_location), name)
+    store = _stores.get(key)
+    if store is not None:
+        return store
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = EmbeddingStore(output_location, name)
+            _stores[key] = store
+    return store
@@ -5,6 +5,8 @@
 import logging
 import os
 import json
+import tempfile
+import threading
 
 from src.make_local_file_path import make_local_file_path
 
@@ -28,6 +30,50 @@ def strip_quotes(input_string):
     return input_string.replace('\"', '').replace("'", '')
 
 
+_known_directories: set[str] = set()
+_known_directories_lock = threading.Lock()
+
+
+def ensure_directory(directory: str) -> None:
+    """
+ Create a directory if it does not exist, remembering directories already seen
+ so repeated saves and loads do not each go to the file system.
+
+ Args:
+     directory (str): The directory to create.
+    """
+    if directory in _known_directories:
+        return
+    os.makedirs(directory, exist_ok=True)
+    with _known_directories_lock:
+        _known_directories.add(directory)
+
+
+def write_json_atomic(file_name: str, content) -> None:
+    """
+ Write content as JSON to a temporary file next to the target, then rename it over the target.
+ A crash part way through leaves either the old file or the new one, never a truncated file.
+
+ Args:
+     file_name (str): The file to write.
+     content: The JSON-serialisable content.
+    """
+    directory = os.path.dirname(file_name)
+    try:
+        handle, temp_name = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    except FileNotFoundError:
+        # The directory was removed after it was first seen
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_name = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            json.dump(content, file, indent=4, ensure_ascii=False)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
 class FileRespository:
     '''
     Class providing load, save, and existence check for files in the file system.
@@ -36,6 +82,47 @@ class FileRespository:
     def __init__(self, output_location: str):
         self.output_location = output_location
 
+    def file_name(self, path: str, extension: str) -> str:
+        '''
+        Returns the name of the file a path is saved to.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The extension of the file.
+        '''
+        fake_name = make_local_file_path(path)
+        return os.path.join(self.output_location, f'{fake_name}.' + extension)
+
+    def find_file_name(self, path: str, extension: str) -> str:
+        '''
+        Returns the name of the file holding a path, or None if there is none.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The extension of the file.
+        '''
+        content_output_filename = self.file_name(path, extension)
+        if os.path.exists(content_output_filename):
+            return content_output_filename
+        return None
+
+    def list_contents(self, extension: str) -> list[str]:
+        '''
+        Lists the names saved with an extension, as made by make_local_file_path.
+
+        Parameters:
+           extension (str): The extension of the files.
+
+        Returns:
+           list[str]: The file names with the extension removed.
+        '''
+        suffix = '.' + extension
+        if not os.path.exists(self.output_location):
+            return []
+        with os.scandir(self.output_location) as entries:
+            return [entry.name[:-len(suffix)] for entry in entries
+                    if entry.name.endswith(suffix) and entry.is_file()]
+
     def save(self, path: str, extension: str, text: str) -> None:
         '''
         Save the provided text to a file at the specified path within the output location.
@@ -46,16 +133,10 @@ class FileRespository:
            text (str): The text content to be saved in the file.
         '''
 
-        if not os.path.exists(self.output_location):
-            os.makedirs(self.output_location)
-
-        fake_name = make_local_file_path(path)
-        content_output_filename = os.path.join(
-            self.output_location, f'{fake_name}.' + extension)
+        content_output_filename = self.file_name(path, extension)
 
-        with open(content_output_filename, 'w+', encoding='utf-8') as file:
-            json.dump(text, file, indent=4, ensure_ascii=False)
-            file.close()
+        ensure_directory(os.path.dirname(content_output_filename))
+        write_json_atomic(content_output_filename, text)
 
         logger.debug('Saving: %s', path)
 
@@ -75,16 +156,10 @@ class FileRespository:
            str: The contents of the file if it exists, otherwise an empty string.
         '''
 
-        fake_name = make_local_file_path(path)
-        content_output_filename = os.path.join(
-            self.output_location, f'{fake_name}.' + extension)
+        ensure_directory(self.output_location)
 
-        if not os.path.exists(self.output_location):
-            os.makedirs(self.output_location)
-            return ''
-
-        fake_name = make_local_file_path(path)
-        if os.path.exists(content_output_filename):
+        content_output_filename = self.find_file_name(path, extension)
+        if content_output_filename is not None:
             with open(content_output_filename, 'r', encoding='utf-8') as file:
                 contents = file.read()
                 file.close()
@@ -107,15 +182,44 @@ class FileRespository:
         if not path:
             return False
 
-        fake_name = make_local_file_path(path)
-        content_output_filename = os.path.join(
-            self.output_location, f'{fake_name}.' + extension)
+        ensure_directory(self.output_location)
 
-        if not os.path.exists(self.output_location):
-            os.makedirs(self.output_location)
-            return False
+        return self.find_file_name(path, extension) is not None
 
-        if os.path.exists(content_output_filename):
-            return True
+    def exists_many(self, paths: list[str], extension: str) -> list[bool]:
+        '''
+        Checks which of several paths have a file with the specified extension.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The extension of the files.
 
-        return False
+        Returns:
+           list[bool]: One entry per path, True if its file exists.
+        '''
+        return [self.exists(path, extension) for path in paths]
+
+    def load_many(self, paths: list[str], extension: str) -> list[str]:
+        '''
+        Loads the contents of several files, '' for any that do not exist.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The extension of the files.
+
+        Returns:
+           list[str]: One entry per path.
+        '''
+        return [self.load(path, extension) for path in paths]
+
+    def save_many(self, paths: list[str], extension: str, texts: list[str]) -> None:
+        '''
+        Saves several files.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The extension of the files.
+           texts (list[str]): The text to save, one per path.
+        '''
+        for path, text in zip(paths, texts):
+            self.save(path, extension, text)
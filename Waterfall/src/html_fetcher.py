@@ -0,0 +1,388 @@
+'''
+Fetches web pages for the download and crawl steps.
+
+Most pages are plain HTML and only need an HTTP GET. These are fetched with aiohttp on one event
+loop shared by the process, over a pooled connector that limits connections in total and per host,
+so many pages can be in flight at once without hammering one site. A page fetched before is asked
+for with If-None-Match / If-Modified-Since, and a 304 reply costs no download at all.
+
+Pages that only render with JavaScript are fetched again with a headless browser. The choice is
+made per page by needs_browser(). Browsers are slow to start, so a small pool of them is started on
+first use and reused for every page, and closed when the fetcher is closed or the process exits.
+
+Callers on any thread use fetch() or fetch_many(). Coroutines can await fetch_async() directly,
+provided they run on the fetcher's own loop.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import time
+import atexit
+import asyncio
+import threading
+from typing import Callable
+
+import aiohttp
+from bs4 import BeautifulSoup
+from selenium import webdriver
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_CONNECTIONS_PER_HOST = 4
+DEFAULT_TIMEOUT = 30
+DEFAULT_BROWSERS = 1
+
+# A page with scripts and less visible text than this is assumed to render with JavaScript
+MIN_TEXT_CHARS = 200
+# Ids of the element single page apps mount into. If it is empty, the page renders with JavaScript.
+APP_ROOT_IDS = ('root', 'app', '__next', '__nuxt')
+# Statuses sites commonly send to clients without JavaScript, which a browser may get past
+BROWSER_STATUSES = (403,)
+
+ENGINE_HTTP = 'http'
+ENGINE_BROWSER = 'browser'
+ENGINE_NOT_MODIFIED = 'not_modified'
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+    'Accept-Language': 'en-US,en;q=0.8'
+}
+
+
+def needs_browser(html: str) -> bool:
+    '''
+    Returns True if a page looks like it only renders with JavaScript: an empty single page app
+    root element, or scripts and almost no visible text.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    for root_id in APP_ROOT_IDS:
+        root = soup.find(id=root_id)
+        if root is not None and not root.get_text(strip=True):
+            return True
+
+    has_scripts = soup.find('script') is not None
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    return has_scripts and len(soup.get_text(' ', strip=True)) < MIN_TEXT_CHARS
+
+
+def make_headless_chrome() -> webdriver.Chrome:
+    '''
+    Starts a headless Chrome.
+    '''
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    return webdriver.Chrome(options=options)
+
+
+class FetchResult:
+    '''
+    A fetched page.
+
+    Attributes:
+        url (str): The URL asked for.
+        html (str): The page, or None if it had not changed since the validators were given.
+        status (int): The HTTP status of the GET.
+        engine (str): ENGINE_HTTP, ENGINE_BROWSER or ENGINE_NOT_MODIFIED.
+        validators (dict): 'etag' and 'last_modified' of the page, where the server gave them,
+            to pass to the next fetch of the same URL.
+    '''
+
+    def __init__(self, url: str, html: str = None, status: int = 200,
+                 engine: str = ENGINE_HTTP, validators: dict = None):
+        self.url = url
+        self.html = html
+        self.status = status
+        self.engine = engine
+        self.validators = validators or {}
+
+    @property
+    def not_modified(self) -> bool:
+        ''' True if the page has not changed since it was last fetched '''
+        return self.engine == ENGINE_NOT_MODIFIED
+
+
+class FetchStats:
+    '''
+    Counts of pages fetched by each engine.
+    '''
+
+    def __init__(self):
+        self.http = 0
+        self.not_modified = 0
+        self.browser = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.http} by HTTP, {self.not_modified} not modified, {self.browser} by browser, '
+                f'{self.failed} failed, {self.seconds * 1000:.0f} ms total')
+
+
+class BrowserPool:
+    '''
+    A small pool of browsers, started on first use and reused for every page.
+
+    Attributes:
+        size (int): The most browsers started at once. Callers wait for a free one.
+    '''
+
+    def __init__(self, size: int = DEFAULT_BROWSERS,
+                 make_driver: Callable[[], object] = make_headless_chrome):
+        '''
+        Parameters:
+            size (int): The most browsers started at once.
+            make_driver (Callable): Starts one browser, a selenium WebDriver or anything with
+                get(url), page_source and quit().
+        '''
+        self.size = max(1, size)
+        self.make_driver = make_driver
+        # Every change to the three below is made holding the condition, and wakes a waiter,
+        # so a caller waiting for a browser sees one returned, discarded or closed
+        self._condition = threading.Condition()
+        self._idle: list = []
+        self._drivers: list = []
+        self._starting = 0
+
+    def get_page_source(self, url: str) -> str:
+        '''
+        Loads a page in a free browser and returns the HTML it renders.
+        '''
+        driver = self._take()
+        try:
+            driver.get(url)
+            html = driver.page_source
+        except Exception:
+            # The browser may be broken, so start a new one next time rather than reuse it
+            self._discard(driver)
+            raise
+        self._give_back(driver)
+        return html
+
+    def close(self) -> None:
+        '''
+        Quits every browser. The pool starts new ones if used again.
+        '''
+        with self._condition:
+            drivers = self._drivers
+            self._drivers = []
+            self._idle = []
+            self._condition.notify_all()
+        for driver in drivers:
+            self._quit(driver)
+
+    def _take(self):
+        with self._condition:
+            while not self._idle and len(self._drivers) + self._starting >= self.size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            # Reserve the slot, the browser is started outside the lock
+            self._starting = self._starting + 1
+
+        try:
+            driver = self.make_driver()
+        except Exception:
+            with self._condition:
+                self._starting = self._starting - 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._starting = self._starting - 1
+            self._drivers.append(driver)
+        return driver
+
+    def _give_back(self, driver) -> None:
+        with self._condition:
+            if driver in self._drivers:
+                self._idle.append(driver)
+                self._condition.notify()
+                return
+        # The pool was closed while the browser was in use
+        self._quit(driver)
+
+    def _discard(self, driver) -> None:
+        with self._condition:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+            self._condition.notify()
+        self._quit(driver)
+
+    @staticmethod
+    def _quit(driver) -> None:
+        try:
+            driver.quit()
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            logger.warning('Could not quit browser: %s', str(e))
+
+
+class HtmlFetcher:
+    '''
+    Fetches pages over pooled HTTP, falling back to a BrowserPool for pages that need JavaScript.
+    The event loop, HTTP session and browsers are started on first use.
+
+    Attributes:
+        max_connections (int): Connections open at once, over all hosts.
+        connections_per_host (int): Connections open at once to any one host.
+        timeout (float): Seconds allowed for each HTTP request.
+        browser_pool (BrowserPool): Browsers used for pages that need JavaScript.
+        stats (FetchStats): Pages fetched so far.
+    '''
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 connections_per_host: int = DEFAULT_CONNECTIONS_PER_HOST,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 browser_pool: BrowserPool = None):
+        self.max_connections = max_connections
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+        self.browser_pool = browser_pool if browser_pool is not None else BrowserPool()
+        self.stats = FetchStats()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._thread: threading.Thread = None
+        self._session: aiohttp.ClientSession = None
+        self._lock = threading.Lock()
+
+    def fetch(self, url: str, validators: dict = None) -> FetchResult:
+        '''
+        Fetches one page, blocking until it is done.
+
+        Parameters:
+            url (str): The page to fetch.
+            validators (dict): FetchResult.validators from the last fetch of the page, if any.
+
+        Returns:
+            FetchResult: The page, or a not modified result.
+
+        Raises:
+            aiohttp.ClientError: If the page cannot be fetched.
+        '''
+        return asyncio.run_coroutine_threadsafe(self.fetch_async(url, validators), self._start()).result()
+
+    def fetch_many(self, urls: list[str], validators: list[dict] = None) -> list[FetchResult]:
+        '''
+        Fetches pages concurrently, within the connection limits, blocking until all are done.
+
+        Returns:
+            list[FetchResult]: One per URL, in the same order. None for a page that could not be fetched.
+        '''
+        validators = validators or [None] * len(urls)
+        return asyncio.run_coroutine_threadsafe(self._fetch_many_async(urls, validators),
+                                                self._start()).result()
+
+    async def fetch_async(self, url: str, validators: dict = None) -> FetchResult:
+        '''
+        Fetches one page. Must be awaited on the fetcher's loop.
+        '''
+        start = time.perf_counter()
+        request_headers = {}
+        if validators and validators.get('etag'):
+            request_headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            request_headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            async with self._get_session().get(url, headers=request_headers) as response:
+                if response.status == 304:
+                    self.stats.not_modified = self.stats.not_modified + 1
+                    return FetchResult(url, None, 304, ENGINE_NOT_MODIFIED, validators)
+                if response.status not in BROWSER_STATUSES:
+                    response.raise_for_status()
+                html = await response.text(errors='replace')
+                status = response.status
+                new_validators = {name: value for name, value in
+                                  (('etag', response.headers.get('ETag')),
+                                   ('last_modified', response.headers.get('Last-Modified'))) if value}
+
+            if status in BROWSER_STATUSES or needs_browser(html):
+                logger.debug('Fetching with browser: %s', url)
+                html = await asyncio.get_running_loop().run_in_executor(
+                    None, self.browser_pool.get_page_source, url)
+                self.stats.browser = self.stats.browser + 1
+                return FetchResult(url, html, status, ENGINE_BROWSER, new_validators)
+
+            self.stats.http = self.stats.http + 1
+            return FetchResult(url, html, status, ENGINE_HTTP, new_validators)
+        except Exception:
+            self.stats.failed = self.stats.failed + 1
+            raise
+        finally:
+            self.stats.seconds = self.stats.seconds + time.perf_counter() - start
+
+    def close(self) -> None:
+        '''
+        Closes the HTTP session, stops the loop and quits the browsers.
+        The fetcher starts again if used afterwards.
+        '''
+        with self._lock:
+            loop, thread, session = self._loop, self._thread, self._session
+            self._loop, self._thread, self._session = None, None, None
+        if loop is not None:
+            if session is not None:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.browser_pool.close()
+        logger.info('Fetched pages: %s', self.stats)
+
+    async def _fetch_many_async(self, urls: list[str], validators: list[dict]) -> list[FetchResult]:
+        results = await asyncio.gather(*[self.fetch_async(url, page_validators)
+                                         for url, page_validators in zip(urls, validators)],
+                                       return_exceptions=True)
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                logger.warning('Could not fetch %s: %s', urls[i], str(result))
+                results[i] = None
+        return results
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Only called on the loop thread, so needs no lock
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             limit_per_host=self.connections_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        loop = self._loop
+        if loop is not None:
+            return loop
+
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name='html-fetcher', daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+
+_fetcher: HtmlFetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_html_fetcher() -> HtmlFetcher:
+    '''
+    Returns the HtmlFetcher shared by every step in the process. It is closed when the process exits.
+    '''
+    global _fetcher  # pylint: disable=global-statement
+    fetcher = _fetcher
+    if fetcher is not None:
+        return fetcher
+
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = HtmlFetcher()
+            atexit.register(_fetcher.close)
+        return _fetcher
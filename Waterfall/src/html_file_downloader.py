@@ -3,11 +3,12 @@
 
 # Standard Library Imports
 import logging
-from selenium import webdriver
 from bs4 import BeautifulSoup
 
 from src.workflow import PipelineItem, PipelineStep
 from src.text_repository_facade import TextRespositoryFacade
+from src.step_cache import StepCache, open_cache
+from src.html_fetcher import HtmlFetcher, get_html_fetcher
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -15,14 +16,10 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-    'Accept-Encoding': 'none',
-    'Accept-Language': 'en-US,en;q=0.8',
-    'Connection': 'keep-alive'
-}
+STEP_NAME = 'download_html'
+# ETag and Last-Modified of each page, with its text, kept after the text expires so the next
+# fetch can be conditional and a page that has not changed need not be downloaded again
+VALIDATORS_STEP_NAME = 'download_html_validators'
 
 
 class HtmlFileDownloader (PipelineStep):
@@ -30,18 +27,22 @@ class HtmlFileDownloader (PipelineStep):
 
      Args:
          output_location (str): The location to save the downloaded file.
+         fetcher (HtmlFetcher): Fetches web pages. None = the fetcher shared by the process.
     '''
 
-    # pylint: disable-next=useless-parent-delegation
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str, fetcher: HtmlFetcher = None):
         '''
         Initializes the HtmlFileDownloader object with the provided output location.
         '''
         super(HtmlFileDownloader, self).__init__(output_location)
+        self.fetcher = fetcher
 
     def download(self, pipeline_item: PipelineItem) -> PipelineItem:
         '''
          Downloads the HTML content from the specified path and saves it to the output location.
+         Web pages are cached, and fetched again once the cache entry expires so that
+         changes to the page are picked up. The fetch is conditional, so a page that has not
+         changed is not downloaded again. Local files are always read.
 
          Returns:
              PipelineItem: Enriched with the content of the downloaded HTML file.
@@ -49,29 +50,42 @@ class HtmlFileDownloader (PipelineStep):
 
         path = pipeline_item.path
         repository = TextRespositoryFacade(self.output_location)
-        if path is not None and repository.exists(path):
-            full_text = repository.load(path)
-            pipeline_item.text = full_text
-            return pipeline_item
+        is_web_page = path.find('http') != -1
+
+        if is_web_page:
+            cache = open_cache(self.output_location)
+            key = StepCache.make_key(STEP_NAME, '', path)
+            full_text = cache.get(STEP_NAME, key)
+            if full_text is not None:
+                pipeline_item.text = full_text
+                return pipeline_item
 
         logger.debug('Downloading: %s', path)
 
-        if path.find('http') != -1:
-            # These lines left from version using session library
-            # Switched to webdriver as it has fewer failures to parse
-            # Add headers in case the website expects cookies and/or JavaScript
-            # session = requests.Session()
-            # html_content = session.get(path, headers=headers).text
-            driver = webdriver.Chrome()
-            driver.get(path)
-            html_content = driver.page_source
+        full_text = None
+        if is_web_page:
+            # Pages that need JavaScript are rendered by a browser, see HtmlFetcher
+            fetcher = self.fetcher if self.fetcher is not None else get_html_fetcher()
+            validators_key = StepCache.make_key(VALIDATORS_STEP_NAME, '', path)
+            previous = cache.get(VALIDATORS_STEP_NAME, validators_key)
+            result = fetcher.fetch(path, previous['validators'] if previous else None)
+            if result.not_modified:
+                full_text = previous['text']
+            else:
+                html_content = result.html
         else:
             with open(path, 'r', encoding='utf-8') as file:
                 html_content = file.read()
 
-        soup = BeautifulSoup(html_content, 'html.parser')
-        full_text = soup.get_text()
+        if full_text is None:
+            soup = BeautifulSoup(html_content, 'html.parser')
+            full_text = soup.get_text()
 
+        if is_web_page:
+            cache.put(STEP_NAME, key, full_text)
+            if result.validators:
+                cache.put(VALIDATORS_STEP_NAME, validators_key,
+                          {'validators': result.validators, 'text': full_text})
         repository.save(path, full_text)
 
         pipeline_item.text = full_text
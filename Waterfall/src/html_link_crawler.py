@@ -3,11 +3,13 @@
 
 # Standard Library Imports
 import logging
-from urllib.parse import urljoin, urlparse
-import requests
+import os
+import time
+from urllib.parse import urljoin, urlsplit, urlunsplit
 from bs4 import BeautifulSoup
 
 from src.workflow import PipelineItem, PipelineStep
+from src.html_fetcher import HtmlFetcher, get_html_fetcher
 
 
 # Set up logging to display information about the execution of the script
@@ -16,197 +18,197 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+DEFAULT_MAX_DEPTH = 10
+DEFAULT_MAX_PAGES = 5000
+# Pages fetched at once. The fetcher also limits connections to each host, see HtmlFetcher.
+DEFAULT_BATCH_SIZE = 64
 
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-    'Accept-Encoding': 'none',
-    'Accept-Language': 'en-US,en;q=0.8',
-    'Connection': 'keep-alive'
-}
+# Links to files that are not web pages, which are not fetched
+SKIPPED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp',
+                      '.css', '.js', '.json', '.xml', '.zip', '.gz', '.mp3', '.mp4')
+SKIPPED_SCHEMES = ('mailto', 'tel', 'javascript', 'data', 'ftp')
+
+
+def is_web_path(path: str) -> bool:
+    ''' True for a web URL, False for a path in the local file system '''
+    return path.lower().find('http') != -1
+
+
+def canonicalise_url(url: str) -> str:
+    '''
+    Returns the form of a URL, or local path, used to tell if it has been crawled: no fragment,
+    lower case scheme and host, no default port, and no trailing '/' except at the root.
+    '''
+    if not is_web_path(url):
+        return os.path.normpath(url)
+
+    split = urlsplit(url)
+    scheme = split.scheme.lower()
+    host = (split.hostname or '').lower()
+    if split.port and not (scheme, split.port) in (('http', 80), ('https', 443)):
+        host = f'{host}:{split.port}'
+    path = split.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path[:-1]
+    return urlunsplit((scheme, host, path, split.query, ''))
+
+
+class CrawlStats:
+    '''
+    Outcome of the last crawl of an HtmlLinkCrawler.
+    '''
+
+    def __init__(self):
+        self.pages = 0
+        self.failed = 0
+        self.links = 0
+        self.depth = 0
+        self.budget_reached = False
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        text = (f'{self.pages} pages to depth {self.depth}, {self.failed} failed, '
+                f'{self.links} links seen, {self.seconds * 1000:.0f} ms')
+        if self.budget_reached:
+            text = text + ', page budget reached'
+        return text
 
 
 class HtmlLinkCrawler (PipelineStep):
-    '''PipelineStep to crawl a web page and generate sub-links '''
+    '''
+    PipelineStep to crawl a web page and generate sub-links.
 
-    def __init__(self, output_location: str, max_depth: int = 10):
+    The crawl is breadth first. Each level of links is fetched concurrently, through an HtmlFetcher
+    whose connection pool limits how many requests are made to one host at once. Every URL is
+    canonicalised and kept in a set, so no page is fetched twice. Only links on the same host as
+    the first page, and under its directory, are followed.
+    '''
+
+    def __init__(self, output_location: str, max_depth: int = DEFAULT_MAX_DEPTH,
+                 max_pages: int = DEFAULT_MAX_PAGES,
+                 fetcher: HtmlFetcher = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
         '''Initialize the HtmlLinkCrawler with the specified output location and maximum depth.
 
         Parameters:
            output_location (str): The location where the output will be stored.
-           max_depth (int): The maximum depth for crawling links, default is 10.
+           max_depth (int): The maximum number of links followed from the first page, default is 10.
+           max_pages (int): The most pages crawled. None = no limit.
+           fetcher (HtmlFetcher): Fetches web pages. None = the fetcher shared by the process.
+           batch_size (int): The most pages fetched at once.
         '''
         super(HtmlLinkCrawler, self).__init__(
             output_location)  # pylint: disable=useless-parent-delegation
         self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.fetcher = fetcher
+        self.batch_size = max(1, batch_size)
+        self.stats = CrawlStats()
 
     def crawl(self, pipeline_item: PipelineItem) -> list[PipelineItem]:
+        '''
+        Crawls the site from a page.
 
-        # recurse using strings for URLs as logic is simpler
-        links: list[str] = []
-        self.crawl_links_recursively(
-            pipeline_item.path, links, 0)
+        Parameters:
+           pipeline_item (PipelineItem): The page to start from. Its path is a URL or a local file.
+
+        Returns:
+           list[PipelineItem]: One item per page crawled, the first page first, then in breadth
+           first order. Pages that could not be fetched are left out.
+        '''
+        start = time.perf_counter()
+        self.stats = CrawlStats()
+        root = pipeline_item.path.split('#')[0]
+        # Links are followed within the directory of the first page, e.g. /docs/ for /docs/index.html
+        scope = None
+        if is_web_path(root):
+            split = urlsplit(root)
+            scope = split._replace(path=split.path[:split.path.rfind('/') + 1] or '/')
+
+        visited = {canonicalise_url(root)}
+        frontier = [root]
+        crawled: list[str] = []
+        depth = 0
+        while frontier:
+            self.stats.depth = depth
+            next_frontier = []
+            for batch_start in range(0, len(frontier), self.batch_size):
+                batch = frontier[batch_start:batch_start + self.batch_size]
+                for path, html_content in zip(batch, self._fetch(batch)):
+                    if html_content is None:
+                        self.stats.failed = self.stats.failed + 1
+                        continue
+                    crawled.append(path)
+                    if depth >= self.max_depth:
+                        continue
+                    for link in self._find_links(path, html_content, scope):
+                        key = canonicalise_url(link)
+                        if key in visited:
+                            continue
+                        if self.max_pages is not None and len(visited) >= self.max_pages:
+                            self.stats.budget_reached = True
+                            break
+                        visited.add(key)
+                        next_frontier.append(link)
+            frontier = next_frontier
+            depth = depth + 1
+
+        self.stats.pages = len(crawled)
+        self.stats.seconds = time.perf_counter() - start
+        logger.info('Crawl of %s: %s', root, self.stats)
 
-        # Then make a pipeline
         pipleline_items = []
-        for link in links:
+        for link in crawled:
             item = PipelineItem()
             item.path = link
             pipleline_items.append(item)
 
         return pipleline_items
 
-    def crawl_links_recursively(self, path: str, current_items: list[str], current_depth: int):
-        '''
-        Recursively crawl links on an HTML page to build a full tree for file search within the same site.
-
-        Args:
-           path (str): The URL path to crawl.
-           pipeline_items (list[PipelineItem]): List of links crawled so far.
-           current_depth (int): The current depth of recursion.
-
-        Returns:
-           None
-        '''
+    def _fetch(self, paths: list[str]) -> list[str]:
+        # Local files are read in turn, web pages fetched together
+        contents: list[str] = [None] * len(paths)
+        web = [i for i, path in enumerate(paths) if is_web_path(path)]
+        for i, path in enumerate(paths):
+            if not is_web_path(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as file:
+                        contents[i] = file.read()
+                except OSError as e:
+                    logger.warning('Could not read %s: %s', path, str(e))
+
+        if web:
+            fetcher = self.fetcher if self.fetcher is not None else get_html_fetcher()
+            for i, result in zip(web, fetcher.fetch_many([paths[i] for i in web])):
+                if result is not None:
+                    contents[i] = result.html
+        return contents
+
+    def _find_links(self, path: str, html_content: str, scope) -> list[str]:
         logger.debug('Crawling: %s', path)
-
-        # Bail if the link is a mailto
-        if path.find('mailto:') != -1:
-            return
-
-        # Bail if we hit maximum depth
-        current_depth = current_depth + 1
-        if current_depth > self.max_depth:
-            logger.debug('Depth exceeded: %s', path)
-            return
-
-        session = requests.Session()
-        if path.find('http') != -1:
-            # Add headers in case the website expects cookies and/or JavaScript
-            html_content = session.get(path, headers=headers).text
-        else:
-            with open(path, 'r', encoding='utf-8') as file:
-                html_content = file.read()
-
         soup = BeautifulSoup(html_content, 'html.parser')
 
-        # Add current link to the pipeline
-        current_items.append(path)
-
-        sub_links = soup.find_all('a')
-        sub_urls = []
-        for link in sub_links:
-            href = link.get('href')
-            if href is not None:
-                url = str(href)
-                parsed = urlparse(url, "", False)
-                parsed_domain = parsed.netloc
-                parsed_path = parsed.path
-                joined = urljoin('https://' + parsed_domain, parsed_path)
-                if not parsed_path.startswith('#') and not find_matching_entry(current_items, joined):
-                    sub_urls.append(url)
-
-        full = add_prefix(path, sub_urls)
-        deduped = deduplicate(current_items, full)
-        trimmed = remove_exits(path, deduped)
-
-        # Recurse where we have not already crawled it
-        for link in trimmed:
-            if not find_matching_entry(current_items, link):
-                self.crawl_links_recursively(
-                    link, current_items, current_depth + 1)
-
-
-def find_matching_entry(array: list[any], target: any):
-    '''
-   Find a matching entry in the given array.
-
-   Parameters:
-   - array (list): The list to search for a matching entry.
-   - target (any): The target element to find in the array.
-
-   Returns:
-   - any: The matching entry if found, otherwise None.
-   '''
-    for entry in array:
-        if entry == target:
-            return entry
-    return None
-
-
-# remove duplicates
-def deduplicate(current_links: list[PipelineItem], new_links: list[str]) -> list[str]:
-    '''Remove duplicates from a list of new links by comparing them with the current links list.
-
-    Args:
-       currentLinks (list): List of current links.
-       newLinks (list): List of new links to be checked for duplicates.
-
-    Returns:
-       list: A list of new links without any duplicates.
-    '''
-    deduped = []
-
-    for item in new_links:
-        if (find_matching_entry(current_links, item) is None) and find_matching_entry(deduped, item) is None:
-            deduped.append(item)
-
-    return deduped
-
-
-# remove links that point outside the main site being searched
-# We keep the argument bcs might need it for more sophisticate checking of URLs leaving the current page
-# pylint: disable-next=unused-argument
-def remove_exits(source_url: str, links: list[str]) -> list[str]:
-    # we also remove links starting with #as they are just the same page
-    '''Remove links that point outside the main site being searched.
-
-    Args:
-        source_url (str): The URL of the main site being searched.
-        links (list): List of links to be filtered.
-
-    Returns:
-        list: Filtered list of links that do not point outside the main site.
-    '''
-
-    trimmed = []
-
-    parsed_target = urlparse(source_url)
-    target_domain = parsed_target.netloc
-    target_path = parsed_target.path
-
-    for item in links:
-        # No fragments as we dont want a part within a page
-        parsed_item = urlparse(item, "", False)
-        item_domain = parsed_item.netloc
-        item_path = parsed_item.path
-        item_joined = urljoin('https://' + item_domain, item_path)
-        if (item_domain == target_domain) and (item_domain == '' or item_path.startswith(target_path)):
-            if (not find_matching_entry(trimmed, item_joined)) and (len(item_path.split('#')) == 1):
-                trimmed .append(item)
-
-    return trimmed
-
-
-def add_prefix(source_url: str, links: str) -> str:
-    '''Add prefixes to relative URLs
-
-    Args:
-        sourceUrl (str): The base URL to resolve relative links from.
-        links (list): List of relative URLs to be prefixed.
-
-    Returns:
-        list: List of fully qualified URLs after adding prefixes.
-    '''
-    full = []
-
-    for item in links:
-        new_url = make_fully_qualified_path(source_url, item)
-        full.append(new_url)
-
-    return full
-
-
-def make_fully_qualified_path(base: str, rel: str) -> str:
-    return urljoin(base, rel)
+        links = []
+        for anchor in soup.find_all('a', href=True):
+            self.stats.links = self.stats.links + 1
+            href = str(anchor['href']).strip()
+            if not href or href.startswith('#'):
+                continue
+            if urlsplit(href).scheme.lower() in SKIPPED_SCHEMES:
+                continue
+
+            link = urljoin(path, href).split('#')[0]
+            if urlsplit(link).path.lower().endswith(SKIPPED_EXTENSIONS):
+                continue
+            # Local files only link to local files, web pages only to pages in scope
+            if is_web_path(link) == is_web_path(path) and (not is_web_path(link) or self._in_scope(link, scope)):
+                links.append(link)
+        return links
+
+    @staticmethod
+    def _in_scope(link: str, scope) -> bool:
+        split = urlsplit(link)
+        return (scope is not None
+                and split.scheme in ('http', 'https')
+                and (split.hostname or '').lower() == (scope.hostname or '').lower()
+                and split.path.startswith(scope.path))
@@ -0,0 +1,143 @@
+'''
+Split text into chunks locally, by tokens or by words, with overlap.
+
+This follows the chunking of the braid-api Chunk function, so chunks break in the same places:
+
+- Without overlap, the text is cut into pieces of up to chunk_size units.
+- With overlap, the text is cut into pieces of up to twice the overlap, and pieces are glued together
+  until the next would reach chunk_size. Each chunk after the first starts with the last piece of
+  the chunk before it.
+
+Pieces always end on a word boundary, and keep the white space in front of each word, so chunks
+without overlap join back to the original text. The text is read one word at a time, and each chunk
+is a single slice of the text between two offsets, rather than text rebuilt from decoded tokens.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import re
+import threading
+from typing import Callable, Iterator
+
+import tiktoken
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+UNIT_TOKENS = 'tokens'
+UNIT_WORDS = 'words'
+UNITS = (UNIT_TOKENS, UNIT_WORDS)
+
+# The encoding of the tokenizer used by the Chunk API
+TOKEN_ENCODING = 'r50k_base'
+
+# Largest chunk, as the Chunk API allows: the default model context window less a buffer
+DEFAULT_CHUNK_SIZE = 8192 - 256
+
+# A word with the white space in front of it
+_WORD = re.compile(r'\s*\S+')
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding() -> tiktoken.Encoding:
+    '''
+    Returns the tokenizer, loading it the first time it is needed.
+    '''
+    global _encoding  # pylint: disable=global-statement
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    return _encoding
+
+
+def make_counter(unit: str) -> Callable[[str], int]:
+    '''
+    Returns a function giving the size of a word in the unit, one of UNITS.
+    '''
+    if unit == UNIT_WORDS:
+        return lambda word: 1
+    if unit == UNIT_TOKENS:
+        encoding = get_encoding()
+        return lambda word: len(encoding.encode_ordinary(word))
+    raise ValueError(f'Unknown chunk unit: {unit}')
+
+
+def _pieces(text: str, max_size: int, count: Callable[[str], int]) -> Iterator[tuple[int, int, int]]:
+    # Yields (start, end, size) of runs of whole words up to max_size. A single word bigger than
+    # max_size is a piece of its own. White space at the end of the text joins the last piece.
+    start = 0
+    end = 0
+    size = 0
+    for match in _WORD.finditer(text):
+        word_size = count(match.group())
+        if size and size + word_size > max_size:
+            yield start, end, size
+            start = end
+            size = 0
+        end = match.end()
+        size = size + word_size
+    if size:
+        yield start, len(text), size
+
+
+def chunk_offsets(text: str, chunk_size: int = 0, overlap: int = 0,
+                  unit: str = UNIT_TOKENS) -> Iterator[tuple[int, int]]:
+    '''
+    Finds where each chunk of a text starts and ends.
+
+    Parameters:
+        text (str): The text to chunk.
+        chunk_size (int): Most units per chunk. 0 = DEFAULT_CHUNK_SIZE, which is also the upper limit.
+        overlap (int): Units repeated from the end of one chunk at the start of the next. 0 = no overlap.
+        unit (str): One of UNITS.
+
+    Returns:
+        Iterator[tuple[int, int]]: The start and end offset in the text of each chunk, in order.
+    '''
+    size = min(DEFAULT_CHUNK_SIZE, chunk_size) if chunk_size else DEFAULT_CHUNK_SIZE
+    count = make_counter(unit)
+
+    if not overlap:
+        for start, end, _ in _pieces(text, size, count):
+            yield start, end
+        return
+
+    if overlap > size:
+        raise ValueError('Overlap cannot be bigger than chunk size')
+
+    chunk_start = None
+    chunk_end = 0
+    chunk_units = 0
+    last_start = 0
+    last_units = 0
+    for start, end, units in _pieces(text, overlap * 2, count):
+        if chunk_start is None:
+            chunk_start = start
+        if chunk_units + units < size or chunk_units == 0:
+            chunk_units = chunk_units + units
+        else:
+            yield chunk_start, chunk_end
+            chunk_start = last_start
+            chunk_units = last_units + units
+        chunk_end = end
+        last_start = start
+        last_units = units
+    if chunk_start is not None:
+        yield chunk_start, chunk_end
+
+
+def chunk_text(text: str, chunk_size: int = 0, overlap: int = 0, unit: str = UNIT_TOKENS) -> list[str]:
+    '''
+    Splits a text into chunks, see chunk_offsets for the parameters.
+
+    Returns:
+        list[str]: The text of each chunk, in order.
+    '''
+    return [text[start:end] for start, end in chunk_offsets(text, chunk_size, overlap, unit)]
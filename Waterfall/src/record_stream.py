@@ -0,0 +1,287 @@
+'''
+Module to write and read large lists of records, such as the detailed output of a pipeline run,
+one record at a time.
+
+json.dump of a whole list needs the list, and every embedding as a list of Python floats, in memory
+at once, and writes each float as about 20 characters of text. RecordWriter writes each record as
+it is given, either as one JSON array with a record per line or as JSON Lines, and stores the
+embedding of each record in a more compact form:
+
+- EMBEDDING_FLOATS: a JSON list of numbers, as json.dump would.
+- EMBEDDING_BASE64: the float32 bytes, little endian, as a base64 string. About a quarter of the size.
+- EMBEDDING_NPY: the row number in a float32 .npy sidecar file, see sidecar_file_name.
+
+read_records reads any of these back one record at a time, and also reads files written by json.dump.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import json
+import base64
+import shutil
+import tempfile
+from typing import Iterable, Iterator
+
+import numpy as np
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+EMBEDDING_FLOATS = 'floats'
+EMBEDDING_BASE64 = 'base64'
+EMBEDDING_NPY = 'npy'
+EMBEDDING_FORMATS = (EMBEDDING_FLOATS, EMBEDDING_BASE64, EMBEDDING_NPY)
+
+JSON_LINES_EXTENSION = '.jsonl'
+SIDECAR_SUFFIX = '.embeddings.npy'
+
+# Characters read from a file at a time by read_records
+READ_CHUNK_SIZE = 1 << 20
+
+_EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def encode_embedding(embedding: list[float]) -> str:
+    '''
+    Returns an embedding as the base64 text of its little endian float32 bytes.
+    '''
+    return base64.b64encode(np.asarray(embedding, dtype=_EMBEDDING_DTYPE).tobytes()).decode('ascii')
+
+
+def decode_embedding(text: str) -> list[float]:
+    '''
+    Returns the embedding encoded by encode_embedding.
+    '''
+    return np.frombuffer(base64.b64decode(text), dtype=_EMBEDDING_DTYPE).tolist()
+
+
+def sidecar_file_name(file_name: str) -> str:
+    '''
+    Returns the name of the .npy file that holds the embeddings of a file written with EMBEDDING_NPY,
+    e.g. 'details.embeddings.npy' for 'details.json'.
+    '''
+    return os.path.splitext(file_name)[0] + SIDECAR_SUFFIX
+
+
+def _make_temp_file(file_name: str, mode: str):
+    directory = os.path.dirname(file_name) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_name = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    if 'b' in mode:
+        return os.fdopen(handle, mode), temp_name
+    return os.fdopen(handle, mode, encoding='utf-8'), temp_name
+
+
+class RecordWriter:
+    '''
+    Writes records to a file one at a time. The file, and any sidecar, is written to a temporary
+    name and renamed when the writer is closed, so a failed run never leaves a truncated file.
+
+    Use as a context manager:
+
+        with RecordWriter('details.json') as writer:
+            for item in items:
+                writer.write({'path': item.path, 'embedding': item.embedding})
+
+    Attributes:
+        file_name (str): The file to write.
+        lines (bool): True = JSON Lines, False = a JSON array with one record per line.
+        embedding_format (str): One of EMBEDDING_FORMATS.
+        embedding_key (str): The record field holding the embedding.
+        records (int): The number of records written so far.
+    '''
+
+    def __init__(self, file_name: str,
+                 lines: bool = None,
+                 embedding_format: str = EMBEDDING_BASE64,
+                 embedding_key: str = 'embedding'):
+        '''
+        Parameters:
+            file_name (str): The file to write.
+            lines (bool): True = JSON Lines. None = JSON Lines if the file name ends in '.jsonl'.
+            embedding_format (str): One of EMBEDDING_FORMATS.
+            embedding_key (str): The record field holding the embedding.
+        '''
+        if embedding_format not in EMBEDDING_FORMATS:
+            raise ValueError(f'Unknown embedding format: {embedding_format}')
+        self.file_name = file_name
+        self.lines = file_name.endswith(JSON_LINES_EXTENSION) if lines is None else lines
+        self.embedding_format = embedding_format
+        self.embedding_key = embedding_key
+        self.records = 0
+        self._width: int = None
+        self._rows = 0
+        self._file, self._temp_name = _make_temp_file(file_name, 'w')
+        self._sidecar = None
+        self._sidecar_temp_name: str = None
+        if embedding_format == EMBEDDING_NPY:
+            self._sidecar, self._sidecar_temp_name = _make_temp_file(file_name, 'wb')
+        if not self.lines:
+            self._file.write('[')
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, record: dict) -> None:
+        '''
+        Writes one record. The record is not changed.
+        '''
+        embedding = record.get(self.embedding_key)
+        if embedding is not None and self.embedding_format != EMBEDDING_FLOATS:
+            record = dict(record)
+            if self.embedding_format == EMBEDDING_BASE64:
+                record[self.embedding_key] = encode_embedding(embedding)
+            else:
+                record[self.embedding_key] = self._write_row(embedding)
+
+        text = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        if self.lines:
+            self._file.write(text + '\n')
+        else:
+            self._file.write(('\n' if self.records == 0 else ',\n') + text)
+        self.records = self.records + 1
+
+    def close(self) -> None:
+        '''
+        Finishes the file, and any sidecar, and renames them to their final names.
+        '''
+        if self._file is None:
+            return
+        if not self.lines:
+            self._file.write('\n]\n')
+        self._file.close()
+        self._file = None
+
+        if self._sidecar is not None:
+            self._finish_sidecar()
+        os.replace(self._temp_name, self.file_name)
+        logger.debug('Wrote %d records to %s', self.records, self.file_name)
+
+    def abort(self) -> None:
+        '''
+        Discards everything written, leaving any earlier file in place.
+        '''
+        for file in (self._file, self._sidecar):
+            if file is not None:
+                file.close()
+        for temp_name in (self._temp_name, self._sidecar_temp_name):
+            if temp_name is not None and os.path.exists(temp_name):
+                os.unlink(temp_name)
+        self._file = None
+        self._sidecar = None
+
+    def _write_row(self, embedding: list[float]) -> int:
+        row = np.asarray(embedding, dtype=_EMBEDDING_DTYPE)
+        if self._width is None:
+            self._width = len(row)
+        elif len(row) != self._width:
+            raise ValueError(f'Embedding of length {len(row)} does not match earlier length {self._width}')
+        self._sidecar.write(row.tobytes())
+        self._rows = self._rows + 1
+        return self._rows - 1
+
+    def _finish_sidecar(self) -> None:
+        # The .npy header holds the shape, which is only known now, so the rows are copied in after it
+        self._sidecar.close()
+        self._sidecar = None
+        output, temp_name = _make_temp_file(self.file_name, 'wb')
+        try:
+            with output, open(self._sidecar_temp_name, 'rb') as rows_file:
+                np.lib.format.write_array_header_1_0(output, {'descr': _EMBEDDING_DTYPE.str,
+                                                             'fortran_order': False,
+                                                             'shape': (self._rows, self._width or 0)})
+                shutil.copyfileobj(rows_file, output)
+            os.replace(temp_name, sidecar_file_name(self.file_name))
+        finally:
+            if os.path.exists(temp_name):
+                os.unlink(temp_name)
+            os.unlink(self._sidecar_temp_name)
+
+
+def write_records(file_name: str, records: Iterable[dict], **kwargs) -> int:
+    '''
+    Writes records from any iterable with a RecordWriter, see RecordWriter for the arguments.
+
+    Returns:
+        int: The number of records written.
+    '''
+    with RecordWriter(file_name, **kwargs) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.records
+
+
+def read_records(file_name: str, embedding_key: str = 'embedding') -> Iterator[dict]:
+    '''
+    Reads records one at a time from a file written by RecordWriter or by json.dump of a list,
+    decoding embeddings back to lists of floats whatever format they were written in.
+
+    Parameters:
+        file_name (str): The file to read.
+        embedding_key (str): The record field holding the embedding.
+
+    Returns:
+        Iterator[dict]: The records, in the order they were written.
+    '''
+    sidecar = None
+    for record in _read_values(file_name):
+        embedding = record.get(embedding_key) if isinstance(record, dict) else None
+        if isinstance(embedding, str):
+            record[embedding_key] = decode_embedding(embedding)
+        elif isinstance(embedding, int):
+            if sidecar is None:
+                # Memory mapped, so only the rows read are loaded
+                sidecar = np.load(sidecar_file_name(file_name), mmap_mode='r')
+            record[embedding_key] = sidecar[embedding].tolist()
+        yield record
+
+
+def _read_values(file_name: str) -> Iterator:
+    # Decodes the values of a top level JSON array, or of JSON Lines, from a buffer that is
+    # refilled from the file as it is used up
+    decoder = json.JSONDecoder()
+    with open(file_name, 'r', encoding='utf-8') as file:
+        buffer = file.read(READ_CHUNK_SIZE)
+        position = 0
+        first = True
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position = position + 1
+            if position == len(buffer):
+                buffer = file.read(READ_CHUNK_SIZE)
+                position = 0
+                if not buffer:
+                    return
+                continue
+
+            if first and buffer[position] == '[':
+                position = position + 1
+                first = False
+                continue
+            first = False
+            if buffer[position] == ']':
+                return
+
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = file.read(READ_CHUNK_SIZE)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+
+            yield value
+            position = end
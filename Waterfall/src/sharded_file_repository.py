@@ -0,0 +1,207 @@
+'''
+Module to store data in local file system, fanned out into hashed subdirectories.
+
+A flat directory of tens of thousands of files is slow to list and glob. Here each file is
+placed under a subdirectory named from a hash of its name, e.g.
+
+    output_location/3f/a.com_page.summary.txt
+
+so no directory holds more than a few hundred files. File names are unchanged, so a flat
+directory can be moved over with migrate_flat_files(), or from the command line:
+
+    python -m src.sharded_file_repository <output_location> [--levels N]
+
+Files still in the flat layout are read until they are migrated.
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import sys
+import hashlib
+import argparse
+
+from src.file_repository import FileRespository, ensure_directory
+from src.make_local_file_path import make_local_file_path
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+# One level of 256 directories keeps each under a few hundred files up to ~100k files
+DEFAULT_SHARD_LEVELS = 1
+SHARD_WIDTH = 2
+
+# Extensions written by the repository facades, longest first. Anything else in an output
+# location (charts, json, the embedding store, the step cache) is read by name and stays put.
+REPOSITORY_EXTENSIONS = ('summary.txt', 'embed.txt', 'txt')
+
+
+def shard_directory(output_location: str, fake_name: str, levels: int = DEFAULT_SHARD_LEVELS) -> str:
+    '''
+    Returns the subdirectory the files for a name are placed in. Every extension for
+    one name, e.g. its text, summary and embedding, shares a directory.
+
+    Parameters:
+       output_location (str): The root directory.
+       fake_name (str): The name from make_local_file_path, without extension.
+       levels (int): The number of levels of subdirectories.
+
+    Returns:
+       str: The directory path.
+    '''
+    digest = hashlib.md5(fake_name.encode('utf-8')).hexdigest()
+    parts = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(levels)]
+    return os.path.join(output_location, *parts)
+
+
+class ShardedFileRespository(FileRespository):
+    '''
+    Class providing load, save, and existence check for files in the file system,
+    with files fanned out into hashed subdirectories and written atomically.
+    '''
+
+    def __init__(self, output_location: str, levels: int = DEFAULT_SHARD_LEVELS):
+        super(ShardedFileRespository, self).__init__(output_location)
+        self.levels = levels
+
+    def file_name(self, path: str, extension: str) -> str:
+        '''
+        Returns the name of the file a path is saved to, inside its shard directory.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The extension of the file.
+        '''
+        fake_name = make_local_file_path(path)
+        return os.path.join(shard_directory(self.output_location, fake_name, self.levels),
+                            f'{fake_name}.' + extension)
+
+    def find_file_name(self, path: str, extension: str) -> str:
+        '''
+        Returns the name of the file holding a path, looking in its shard and then in the
+        flat layout, or None if there is neither.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The extension of the file.
+        '''
+        for content_output_filename in (self.file_name(path, extension),
+                                        FileRespository.file_name(self, path, extension)):
+            if os.path.exists(content_output_filename):
+                return content_output_filename
+        return None
+
+    def list_contents(self, extension: str) -> list[str]:
+        '''
+        Lists the names saved with an extension, in the shards and in the flat layout.
+
+        Parameters:
+           extension (str): The extension of the files.
+
+        Returns:
+           list[str]: The file names with the extension removed.
+        '''
+        return [name for name, _ in self.list_files(extension)]
+
+    def list_files(self, extension: str) -> list[tuple[str, str]]:
+        '''
+        Lists the files saved with an extension, in the shards and then in the flat layout.
+
+        Parameters:
+           extension (str): The extension of the files.
+
+        Returns:
+           list[tuple[str, str]]: The file name with the extension removed, and the full path, for each file.
+        '''
+        suffix = '.' + extension
+        files = []
+        seen = set()
+        for directory in self._shard_directories() + [self.output_location]:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(suffix) and entry.is_file():
+                        name = entry.name[:-len(suffix)]
+                        if name not in seen:
+                            seen.add(name)
+                            files.append((name, entry.path))
+        return files
+
+    def _shard_directories(self) -> list[str]:
+        directories = [self.output_location]
+        for _ in range(self.levels):
+            next_directories = []
+            for directory in directories:
+                if not os.path.isdir(directory):
+                    continue
+                with os.scandir(directory) as entries:
+                    next_directories.extend(entry.path for entry in entries
+                                            if entry.is_dir() and len(entry.name) == SHARD_WIDTH)
+            directories = next_directories
+        return directories
+
+
+def migrate_flat_files(output_location: str, levels: int = DEFAULT_SHARD_LEVELS,
+                       extensions: tuple[str] = REPOSITORY_EXTENSIONS) -> int:
+    '''
+    Moves repository files from the flat layout into shard directories. Each file is renamed, not copied,
+    so the move is atomic per file and the migration can be stopped and run again.
+    A file already present in its shard is left there and the flat copy removed.
+
+    Parameters:
+       output_location (str): The directory to migrate.
+       levels (int): The number of levels of subdirectories.
+       extensions (tuple[str]): Only files with one of these extensions are moved.
+
+    Returns:
+       int: The number of files moved.
+    '''
+    if not os.path.isdir(output_location):
+        return 0
+
+    suffixes = ['.' + extension for extension in extensions]
+    moved = 0
+    with os.scandir(output_location) as entries:
+        files = [entry.name for entry in entries
+                 if entry.is_file() and not entry.name.startswith('.')]
+
+    for file_name in files:
+        suffix = next((suffix for suffix in suffixes if file_name.endswith(suffix)), None)
+        if suffix is None:
+            continue
+        directory = shard_directory(output_location, file_name[:-len(suffix)], levels)
+        ensure_directory(directory)
+        target = os.path.join(directory, file_name)
+        if os.path.exists(target):
+            os.remove(os.path.join(output_location, file_name))
+            continue
+        os.replace(os.path.join(output_location, file_name), target)
+        moved = moved + 1
+
+    logger.info('Moved %d files into shards in %s', moved, output_location)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Move a flat Waterfall output directory into hashed subdirectories.')
+    parser.add_argument('output_location', help='The directory to migrate')
+    parser.add_argument('--levels', type=int, default=DEFAULT_SHARD_LEVELS,
+                        help='Levels of subdirectories')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.output_location):
+        print(f'Directory not found: {args.output_location}')
+        sys.exit(1)
+
+    moved = migrate_flat_files(args.output_location, args.levels)
+    print(f'Moved {moved} files')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+'''
+Module to store text, summaries and embeddings in one SQLite file.
+
+Each page is one row, keyed by the same make_local_file_path name the file repositories use,
+with a column for its text, its summary and its embedding (packed float32). The interface
+matches FileRespository, with the file extension choosing the column, so the repository facades
+can use either. The batch methods check, load or save any number of pages in one query or
+one transaction, instead of one or two file system calls per page.
+
+A location uses this backend once it has a repository file, which open_sqlite_repository
+creates. Existing files and embeddings in the location can be copied in with import_files().
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from src.make_local_file_path import make_local_file_path
+from src.file_repository import strip_quotes
+from src.sharded_file_repository import ShardedFileRespository
+from src.embedding_store import open_store, text_to_float
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+REPOSITORY_FILE_NAME = 'repository.sqlite'
+
+# File extension used by each facade, and the column that holds it
+COLUMNS = {
+    'txt': 'text',
+    'summary.txt': 'summary',
+    'embed.txt': 'embedding'
+}
+EMBEDDING_EXTENSION = 'embed.txt'
+
+# SQLite allows 999 parameters per statement in older builds
+QUERY_BATCH_SIZE = 900
+
+
+def column_for(extension: str) -> str:
+    '''
+    Returns the column that holds an extension.
+
+    Raises:
+        ValueError: If the extension is not one of the repository's.
+    '''
+    column = COLUMNS.get(extension)
+    if column is None:
+        raise ValueError(f'No column for extension: {extension}')
+    return column
+
+
+class SqliteRespository:
+    '''
+    Class providing load, save, and existence check for pages in one SQLite file, singly or in batches.
+
+    Attributes:
+        output_location (str): The directory holding the repository file.
+    '''
+
+    def __init__(self, output_location: str):
+        self.output_location = output_location
+        self._lock = threading.Lock()
+
+        os.makedirs(self.output_location, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(output_location, REPOSITORY_FILE_NAME),
+                                           check_same_thread=False)
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS items (
+                                       key TEXT PRIMARY KEY,
+                                       text TEXT,
+                                       summary TEXT,
+                                       embedding BLOB)''')
+        self._connection.commit()
+
+    @staticmethod
+    def _encode(extension: str, value):
+        if extension == EMBEDDING_EXTENSION:
+            return np.asarray(value, dtype=np.float32).tobytes()
+        return value
+
+    @staticmethod
+    def _decode(extension: str, value):
+        if extension == EMBEDDING_EXTENSION:
+            return np.frombuffer(value, dtype=np.float32).tolist()
+        return value
+
+    def _select(self, keys: list[str], column: str, values: bool = True) -> dict:
+        selected = column if values else '1'
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), QUERY_BATCH_SIZE):
+                batch = keys[start:start + QUERY_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._connection.execute(
+                    f'SELECT key, {selected} FROM items WHERE key IN ({placeholders}) '
+                    f'AND {column} IS NOT NULL', batch)
+                found.update(rows)
+        return found
+
+    def save(self, path: str, extension: str, value) -> None:
+        '''
+        Save a value for a path.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The file extension the value would have, which chooses the column.
+           value: The text, or for 'embed.txt' the embedding.
+        '''
+        self.save_many([path], extension, [value])
+
+    def save_many(self, paths: list[str], extension: str, values: list) -> None:
+        '''
+        Save values for several paths in one transaction. Other columns of existing rows are kept.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The file extension the values would have, which chooses the column.
+           values (list): One value per path.
+        '''
+        self._save_keys([make_local_file_path(path) for path in paths], extension, values)
+
+    def _save_keys(self, keys: list[str], extension: str, values: list) -> None:
+        column = column_for(extension)
+        rows = [(key, self._encode(extension, value)) for key, value in zip(keys, values)]
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    f'INSERT INTO items (key, {column}) VALUES (?, ?) '
+                    f'ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}', rows)
+        logger.debug('Saving %d items', len(rows))
+
+    def load(self, path: str, extension: str):
+        '''
+        Load the value for a path.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The file extension the value would have, which chooses the column.
+
+        Returns:
+           The value, or '' if there is none, as FileRespository returns.
+        '''
+        return self.load_many([path], extension)[0]
+
+    def load_many(self, paths: list[str], extension: str) -> list:
+        '''
+        Load the values for several paths in one query.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The file extension the values would have, which chooses the column.
+
+        Returns:
+           list: One value per path, '' for any with no value.
+        '''
+        keys = [make_local_file_path(path) for path in paths]
+        found = self._select(list(set(keys)), column_for(extension))
+        return [self._decode(extension, found[key]) if key in found else '' for key in keys]
+
+    def exists(self, path: str, extension: str) -> bool:
+        '''
+        Checks if there is a value for a path.
+
+        Parameters:
+           path (str): An Http path.
+           extension (str): The file extension the value would have, which chooses the column.
+
+        Returns:
+           bool: True if there is a value, False otherwise.
+        '''
+        if not path:
+            return False
+        return self.exists_many([path], extension)[0]
+
+    def exists_many(self, paths: list[str], extension: str) -> list[bool]:
+        '''
+        Checks which of several paths have a value, in one query.
+
+        Parameters:
+           paths (list[str]): Http paths.
+           extension (str): The file extension the values would have, which chooses the column.
+
+        Returns:
+           list[bool]: One entry per path.
+        '''
+        keys = [make_local_file_path(path) if path else None for path in paths]
+        found = self._select(list({key for key in keys if key is not None}), column_for(extension),
+                             values=False)
+        return [key in found for key in keys]
+
+    def list_contents(self, extension: str) -> list[str]:
+        '''
+        Lists the names that have a value, as made by make_local_file_path.
+
+        Parameters:
+           extension (str): The file extension the values would have, which chooses the column.
+
+        Returns:
+           list[str]: The names.
+        '''
+        column = column_for(extension)
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT key FROM items WHERE {column} IS NOT NULL ORDER BY rowid').fetchall()
+        return [row[0] for row in rows]
+
+    def import_files(self, directory: str = None) -> int:
+        '''
+        Copies text and summary files, flat or sharded, into the repository, and embeddings from
+        the location's EmbeddingStore and from older '.embed.txt' files. Where a page has both,
+        the store is used, as the embedding facade does. Values already in the repository are left alone.
+
+        Parameters:
+            directory (str): Where the files are. Defaults to the repository location.
+
+        Returns:
+            int: The number of values imported.
+        '''
+        files = ShardedFileRespository(directory or self.output_location)
+        imported = 0
+        for extension in ('summary.txt', 'txt'):
+            listed = files.list_files(extension)
+            if extension == 'txt':
+                # '*.txt' also matches the other extensions
+                listed = [(name, file_name) for name, file_name in listed
+                          if not name.endswith(('.summary', '.embed'))]
+            present = self._select([name for name, _ in listed], column_for(extension), values=False)
+
+            keys = []
+            values = []
+            for name, file_name in listed:
+                if name in present:
+                    continue
+                with open(file_name, 'r', encoding='utf-8') as file:
+                    keys.append(name)
+                    values.append(strip_quotes(file.read()))
+            self._save_keys(keys, extension, values)
+            imported = imported + len(keys)
+
+        imported = imported + self._import_embeddings(files)
+
+        logger.info('Imported %d values from %s', imported, files.output_location)
+        return imported
+
+    def _import_embeddings(self, files: ShardedFileRespository) -> int:
+        column = column_for(EMBEDDING_EXTENSION)
+        keys = []
+        values = []
+
+        store = open_store(files.output_location)
+        stored = store.keys()
+        present = self._select(stored, column, values=False)
+        if len(stored) > len(present):
+            matrix = store.load_matrix()
+            for row, key in enumerate(stored):
+                if key not in present:
+                    keys.append(key)
+                    values.append(matrix[row])
+
+        # Pages in the store are taken from there, not from an older file
+        in_store = set(stored)
+        listed = [(name, file_name) for name, file_name in files.list_files(EMBEDDING_EXTENSION)
+                  if name not in in_store]
+        present = self._select([name for name, _ in listed], column, values=False)
+        for name, file_name in listed:
+            if name in present:
+                continue
+            with open(file_name, 'r', encoding='utf-8') as file:
+                contents = file.read()
+            try:
+                values.append(text_to_float(contents))
+                keys.append(name)
+            except ValueError:
+                logger.warning('Skipping unreadable embedding file: %s', file_name)
+
+        self._save_keys(keys, EMBEDDING_EXTENSION, values)
+        return len(keys)
+
+    def close(self) -> None:
+        '''
+        Closes the repository file.
+        '''
+        with self._lock:
+            self._connection.close()
+
+
+_repositories: dict[str, SqliteRespository] = {}
+_repositories_lock = threading.Lock()
+
+
+def open_sqlite_repository(output_location: str) -> SqliteRespository:
+    '''
+    Returns the process-wide SqliteRespository for a location, creating its file on first use.
+    From then on the repository facades for the location use it.
+    '''
+    key = os.path.abspath(output_location)
+    repository = _repositories.get(key)
+    if repository is not None:
+        return repository
+
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = SqliteRespository(output_location)
+            _repositories[key] = repository
+    return repository
+
+
+def open_repository(output_location: str):
+    '''
+    Returns the backend for a location: its SqliteRespository if the location has a
+    repository file, otherwise a ShardedFileRespository.
+    '''
+    key = os.path.abspath(output_location)
+    repository = _repositories.get(key)
+    if repository is not None:
+        return repository
+
+    if os.path.exists(os.path.join(output_location, REPOSITORY_FILE_NAME)):
+        return open_sqlite_repository(output_location)
+    return ShardedFileRespository(output_location)
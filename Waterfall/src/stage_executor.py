@@ -0,0 +1,312 @@
+'''Run a PipelineStep over a list of PipelineItems with bounded concurrency'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import time
+import queue
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from src.workflow import PipelineItem
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+# Items waiting between two stages of a PipelinedExecutor before the earlier stage blocks
+DEFAULT_QUEUE_SIZE = 32
+
+# Marks the end of the items in a queue between stages
+_END = object()
+
+
+def run_step_isolated(stage_name: str,
+                      step: Callable[[PipelineItem], PipelineItem],
+                      item: PipelineItem) -> PipelineItem:
+    '''
+    Runs a single step on a single item. Any exception is logged and the item is dropped,
+    so one failing item does not stop the rest of the run.
+
+    Parameters:
+       stage_name (str): Name of the stage, used for logging.
+       step (Callable): The step to apply, e.g. Summariser.summarise.
+       item (PipelineItem): The item to process.
+
+    Returns:
+       PipelineItem: The enriched item, or None if the step failed or rejected the item.
+    '''
+    try:
+        return step(item)
+    # pylint: disable-next=broad-exception-caught
+    except Exception as e:
+        logger.error("Error in stage %s for %s: %s", stage_name, item.path, str(e))
+        return None
+
+
+class StageExecutor:
+    '''
+    Applies a pipeline step to every item in a list, running up to 'workers' items at once.
+    Output order matches input order, and items that fail or are rejected by the step are dropped.
+    '''
+
+    def __init__(self, stage_name: str, workers: int = 1):
+        '''
+        Initializes the StageExecutor.
+
+        Parameters:
+           stage_name (str): Name of the stage, used for logging.
+           workers (int): Maximum number of items processed concurrently. 1 = serial.
+        '''
+        self.stage_name = stage_name
+        self.workers = max(1, workers)
+
+    def run(self, step: Callable[[PipelineItem], PipelineItem],
+            items: list[PipelineItem]) -> list[PipelineItem]:
+        '''
+        Runs the step over all the items.
+
+        Parameters:
+           step (Callable): The step to apply to each item.
+           items (list[PipelineItem]): The items to process.
+
+        Returns:
+           list[PipelineItem]: Items the step succeeded on, in the same order as the input.
+        '''
+        logger.debug('Running stage %s on %d items with %d workers',
+                     self.stage_name, len(items), self.workers)
+
+        if self.workers == 1 or len(items) <= 1:
+            results = [run_step_isolated(self.stage_name, step, item) for item in items]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # map() yields results in submission order, whatever order they complete in
+                results = list(executor.map(
+                    lambda item: run_step_isolated(self.stage_name, step, item), items))
+
+        return [result for result in results if result]
+
+
+class PipelineStage:
+    '''
+    One stage of a PipelinedExecutor.
+
+    The step is given one item and returns the item, a list of items (e.g. the chunks of a
+    transcript), or None to drop it. If batch_size is set, the step is instead given a list
+    of up to batch_size items, and returns the list of those it succeeded on, as Embedder.embed_many does.
+    '''
+
+    def __init__(self, name: str, step: Callable, workers: int = 1, batch_size: int = None):
+        '''
+        Parameters:
+           name (str): Name of the stage, used for logging and stats.
+           step (Callable): The step to apply.
+           workers (int): Number of threads running the step.
+           batch_size (int): Most items given to the step at once. None = one item, not a list, per call.
+        '''
+        self.name = name
+        self.step = step
+        self.workers = max(1, workers)
+        self.batch_size = None if batch_size is None else max(1, batch_size)
+
+
+class StageStats:
+    '''
+    Throughput of one stage in the last run of a PipelinedExecutor.
+    '''
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.failed = 0
+        self.calls = 0
+        # Seconds spent in the step, summed over all workers
+        self.busy_seconds = 0.0
+        # Seconds of the whole run, set when the run finishes
+        self.run_seconds = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        ''' Items taken in per second of the run '''
+        return self.items_in / self.run_seconds if self.run_seconds else 0.0
+
+    @property
+    def utilisation(self) -> float:
+        ''' Fraction of the run the workers of the stage spent in the step '''
+        if not self.run_seconds:
+            return 0.0
+        return self.busy_seconds / (self.run_seconds * self.workers)
+
+    def __str__(self) -> str:
+        return (f'{self.name}: {self.items_in} in, {self.items_out} out, {self.failed} failed, '
+                f'{self.items_per_second:.1f} items/s, {self.utilisation:.0%} busy')
+
+
+class PipelineStats:
+    '''
+    Outcome of the last run of a PipelinedExecutor.
+    '''
+
+    def __init__(self, stages: list[PipelineStage] = None):
+        self.stages = [StageStats(stage.name, stage.workers) for stage in stages or []]
+        self.items = 0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        text = f'{self.items} items in {self.seconds * 1000:.0f} ms'
+        for stage in self.stages:
+            text = text + '; ' + str(stage)
+        return text
+
+
+class PipelinedExecutor:
+    '''
+    Runs a list of stages over a list of items, with every stage working at once.
+
+    Each stage has its own worker threads, and stages are connected by bounded queues, so an item
+    moves on to the next stage as soon as it is done rather than waiting for the whole list. A slow
+    stage fills the queue in front of it and the stages before it then wait, so memory stays bounded.
+    Items that fail, or are dropped by a step, do not reach later stages. Output is in input order,
+    with the items a step fans out in the order the step returned them.
+    '''
+
+    def __init__(self, stages: list[PipelineStage], queue_size: int = DEFAULT_QUEUE_SIZE):
+        '''
+        Parameters:
+           stages (list[PipelineStage]): The stages, in the order items pass through them.
+           queue_size (int): Most items waiting in the queue in front of each stage.
+        '''
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stats = PipelineStats(stages)
+
+    def run(self, items: list[PipelineItem]) -> list[PipelineItem]:
+        '''
+        Runs all the items through all the stages.
+
+        Parameters:
+           items (list[PipelineItem]): The items to process.
+
+        Returns:
+           list[PipelineItem]: Items that passed every stage, in input order.
+        '''
+        start = time.perf_counter()
+        self.stats = PipelineStats(self.stages)
+        lock = threading.Lock()
+
+        # Queue i feeds stage i, and the last queue holds the output. Each item travels with a
+        # key, its position in the input plus its position in any fan out, used to sort the output.
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        finished = [0] * len(self.stages)
+
+        def finish_worker(index: int) -> None:
+            with lock:
+                finished[index] = finished[index] + 1
+                last = finished[index] == self.stages[index].workers
+            if last:
+                # One end marker for each worker of the next stage, or one for the output
+                following = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+                for _ in range(following):
+                    queues[index + 1].put(_END)
+
+        def work(index: int) -> None:
+            stage = self.stages[index]
+            stats = self.stats.stages[index]
+            source = queues[index]
+            target = queues[index + 1]
+            ended = False
+            while not ended:
+                entry = source.get()
+                if entry is _END:
+                    break
+                batch = [entry]
+                while stage.batch_size is not None and len(batch) < stage.batch_size:
+                    try:
+                        entry = source.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is _END:
+                        ended = True
+                        break
+                    batch.append(entry)
+
+                call_start = time.perf_counter()
+                outputs, failed = self._call(stage, batch)
+                call_seconds = time.perf_counter() - call_start
+                with lock:
+                    stats.items_in = stats.items_in + len(batch)
+                    stats.items_out = stats.items_out + len(outputs)
+                    stats.failed = stats.failed + failed
+                    stats.calls = stats.calls + 1
+                    stats.busy_seconds = stats.busy_seconds + call_seconds
+                for output in outputs:
+                    target.put(output)
+            finish_worker(index)
+
+        threads = [threading.Thread(target=work, args=(index,), daemon=True,
+                                    name=f'{stage.name}-{worker}')
+                   for index, stage in enumerate(self.stages)
+                   for worker in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+
+        def feed() -> None:
+            for i, item in enumerate(items):
+                queues[0].put(((i,), item))
+            for _ in range(self.stages[0].workers if self.stages else 1):
+                queues[0].put(_END)
+
+        feeder = threading.Thread(target=feed, daemon=True, name='pipeline-feed')
+        feeder.start()
+
+        results = []
+        while True:
+            entry = queues[-1].get()
+            if entry is _END:
+                break
+            results.append(entry)
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+
+        results.sort(key=lambda entry: entry[0])
+        self.stats.items = len(results)
+        self.stats.seconds = time.perf_counter() - start
+        for stats in self.stats.stages:
+            stats.run_seconds = self.stats.seconds
+        logger.info('Pipelined run: %s', self.stats)
+
+        return [item for _, item in results]
+
+    @staticmethod
+    def _call(stage: PipelineStage, batch: list[tuple]) -> tuple[list[tuple], int]:
+        # Returns the (key, item) entries to pass on, and the number of items the step raised on
+        if stage.batch_size is not None:
+            keys = {id(item): key for key, item in batch}
+            try:
+                processed = stage.step([item for _, item in batch])
+            # pylint: disable-next=broad-exception-caught
+            except Exception as e:
+                logger.error("Error in stage %s for a batch of %d items: %s",
+                             stage.name, len(batch), str(e))
+                return [], len(batch)
+            return [(keys[id(item)], item) for item in processed or [] if id(item) in keys], 0
+
+        key, item = batch[0]
+        try:
+            processed = stage.step(item)
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            logger.error("Error in stage %s for %s: %s", stage.name, item.path, str(e))
+            return [], 1
+        if isinstance(processed, list):
+            return [(key + (j,), output) for j, output in enumerate(processed) if output], 0
+        if processed:
+            return [(key, processed)], 0
+        return [], 0
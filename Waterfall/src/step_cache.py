@@ -0,0 +1,366 @@
+'''
+Cache of pipeline step results, keyed by a hash of what the step was asked to do.
+
+A key is the SHA-256 of (step name, model id, input text, parameters), so a result is reused
+only when the step would be given exactly the same input. If a page changes, its text changes,
+and its summary and embedding are recomputed; if it does not, they are not.
+
+Invalidation policy:
+    - Content: any change to the input text or parameters gives a new key.
+    - Model: the model id is part of the key, so a new model gives new keys.
+    - Age: steps listed in max_age expire entries older than the given number of seconds.
+      Downloads use this so pages are fetched again on the next nightly run.
+    - Explicit: invalidate(), invalidate_step() and clear().
+    - Upgrade: results in the older path-keyed repositories are adopted once per path
+      (see claim_legacy), so a first run after upgrading does not redo every call. Paths whose
+      results are computed after the upgrade are marked (see mark_legacy), so their saved result is
+      never adopted for changed text. Claims are kept apart from entries, so eviction, invalidation
+      and clear() do not remove them.
+
+The cache is capped by entry count and total bytes. When either cap is passed, the least
+recently used entries are evicted down to 90% of the cap.
+
+Entries are stored in a SQLite file in the output location. One StepCache per location is
+shared by every step in the process through open_cache().
+'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+CACHE_FILE_NAME = 'step_cache.sqlite'
+
+# The Braid API chooses the model for each call. Bump this when it changes default model,
+# so cached results from the old model are not reused.
+DEFAULT_MODEL = 'braid-api-default-1'
+
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+EVICT_TO_FRACTION = 0.9
+
+# Steps whose results go stale without their input changing. Seconds.
+DEFAULT_MAX_AGE = {
+    'download_html': 12 * 60 * 60,
+    'download_youtube': 7 * 24 * 60 * 60
+}
+
+KIND_JSON = 'json'
+KIND_EMBEDDING = 'f32'
+
+
+class CacheStats:
+    '''
+    Hit and miss counts for a StepCache, overall and per step.
+    '''
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.by_step: dict[str, list[int]] = {}
+
+    def record(self, step: str, hit: bool) -> None:
+        counts = self.by_step.setdefault(step, [0, 0])
+        if hit:
+            self.hits = self.hits + 1
+            counts[0] = counts[0] + 1
+        else:
+            self.misses = self.misses + 1
+            counts[1] = counts[1] + 1
+
+    def hit_rate(self) -> float:
+        '''
+        Returns the fraction of lookups that were hits, 0 if there were none.
+        '''
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        steps = ', '.join(f'{step}: {counts[0]} hits / {counts[1]} misses'
+                          for step, counts in sorted(self.by_step.items()))
+        return (f'{self.hits} hits, {self.misses} misses ({self.hit_rate():.0%} hit rate), '
+                f'{self.expired} expired, {self.evictions} evicted. {steps}')
+
+
+class StepCache:
+    '''
+    Content-hash keyed cache of step results with age expiry and LRU size caps.
+
+    Attributes:
+        output_location (str): The directory holding the cache file.
+        max_entries (int): Maximum number of entries kept.
+        max_bytes (int): Maximum total size of stored values.
+        max_age (dict[str, float]): Per step, the age in seconds after which entries expire.
+        stats (CacheStats): Hit and miss counts since the cache was opened.
+    '''
+
+    def __init__(self, output_location: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: dict[str, float] = None):
+        self.output_location = output_location
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = dict(DEFAULT_MAX_AGE if max_age is None else max_age)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        os.makedirs(self.output_location, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(output_location, CACHE_FILE_NAME),
+                                           check_same_thread=False)
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                       key TEXT PRIMARY KEY,
+                                       step TEXT NOT NULL,
+                                       kind TEXT NOT NULL,
+                                       value BLOB NOT NULL,
+                                       size INTEGER NOT NULL,
+                                       created REAL NOT NULL,
+                                       last_used REAL NOT NULL)''')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS legacy_claims (
+                                       step TEXT NOT NULL,
+                                       path TEXT NOT NULL,
+                                       PRIMARY KEY (step, path))''')
+        self._connection.commit()
+
+        count, total = self._connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        self._entries = count
+        self._bytes = total
+
+    @staticmethod
+    def make_key(step: str, model: str, text: str, params: dict = None) -> str:
+        '''
+        Returns the cache key for a step call.
+
+        Parameters:
+            step (str): Name of the step, e.g. 'summarise'.
+            model (str): The model the step uses, or '' if it does not use one.
+            text (str): The input text.
+            params (dict): Any other parameters that change the result.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        '''
+        digest = hashlib.sha256()
+        digest.update(json.dumps([step, model, params or {}], sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update((text or '').encode('utf-8'))
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def _get(self, step: str, key: str, kind: str):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, created FROM entries WHERE key = ? AND kind = ?',
+                (key, kind)).fetchone()
+
+            if row is not None:
+                max_age = self.max_age.get(step)
+                if max_age is not None and now - row[1] > max_age:
+                    self._delete(key)
+                    self.stats.expired = self.stats.expired + 1
+                    row = None
+                else:
+                    self._connection.execute(
+                        'UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+                    self._connection.commit()
+
+            self.stats.record(step, row is not None)
+        return None if row is None else row[0]
+
+    def _put(self, step: str, key: str, kind: str, value: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._connection.execute(
+                'INSERT INTO entries (key, step, kind, value, size, created, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, step, kind, value, len(value), now, now))
+            self._entries = self._entries + 1
+            self._bytes = self._bytes + len(value)
+
+            if self._entries > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def _delete(self, key: str) -> None:
+        row = self._connection.execute(
+            'SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self._connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._entries = self._entries - 1
+            self._bytes = self._bytes - row[0]
+
+    def _evict(self) -> None:
+        target_entries = int(self.max_entries * EVICT_TO_FRACTION)
+        target_bytes = int(self.max_bytes * EVICT_TO_FRACTION)
+
+        cursor = self._connection.execute(
+            'SELECT key, size FROM entries ORDER BY last_used ASC')
+        evicted = []
+        entries = self._entries
+        total = self._bytes
+        for key, size in cursor:
+            if entries <= target_entries and total <= target_bytes:
+                break
+            evicted.append((key,))
+            entries = entries - 1
+            total = total - size
+
+        self._connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        self._entries = entries
+        self._bytes = total
+        self.stats.evictions = self.stats.evictions + len(evicted)
+        logger.debug('Evicted %d cache entries', len(evicted))
+
+    def get(self, step: str, key: str):
+        '''
+        Returns the cached value for a key, or None on a miss or if the entry has expired.
+        '''
+        value = self._get(step, key, KIND_JSON)
+        return None if value is None else json.loads(value)
+
+    def put(self, step: str, key: str, value) -> None:
+        '''
+        Stores a JSON-serialisable value. None is not cached, so failed calls are retried.
+        '''
+        if value is None:
+            return
+        self._put(step, key, KIND_JSON, json.dumps(value).encode('utf-8'))
+
+    def get_embedding(self, step: str, key: str) -> list[float]:
+        '''
+        Returns a cached embedding, or None on a miss or if the entry has expired.
+        '''
+        value = self._get(step, key, KIND_EMBEDDING)
+        return None if value is None else np.frombuffer(value, dtype=np.float32).tolist()
+
+    def put_embedding(self, step: str, key: str, embedding: list[float]) -> None:
+        '''
+        Stores an embedding as packed float32, about a fifth of the size of its JSON text.
+        '''
+        if embedding is None:
+            return
+        self._put(step, key, KIND_EMBEDDING, np.asarray(embedding, dtype=np.float32).tobytes())
+
+    def claim_legacy(self, step: str, path: str) -> bool:
+        '''
+        Says whether a path-keyed repository result may be moved into the cache, once per path.
+
+        Repositories written before this cache existed are keyed by path, not content, so their
+        results are trusted the first time a path is seen after an upgrade and not after that.
+        Later changes to the page then miss the cache and are recomputed as usual.
+
+        Returns:
+            bool: True the first time it is called for a step and path, False after that, or if
+            mark_legacy has been called for them.
+        '''
+        # Caches written before claims had their own table hold them as entries
+        marker = self.make_key(step + '_legacy', '', path)
+        with self._lock:
+            seen = self._connection.execute(
+                'SELECT 1 FROM entries WHERE key = ?', (marker,)).fetchone()
+            claimed = self._connection.execute(
+                'INSERT OR IGNORE INTO legacy_claims (step, path) VALUES (?, ?)',
+                (step, path)).rowcount == 1
+            self._connection.commit()
+        return claimed and seen is None
+
+    def mark_legacy(self, step: str, paths: list[str]) -> None:
+        '''
+        Records that results for paths have been computed since the upgrade, so what the
+        path-keyed repository holds for them is not adopted by claim_legacy. Steps call this
+        whenever they save a freshly computed result.
+
+        Parameters:
+            step (str): Name of the step.
+            paths (list[str]): The paths saved.
+        '''
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO legacy_claims (step, path) VALUES (?, ?)',
+                [(step, path) for path in paths if path is not None])
+            self._connection.commit()
+
+    def invalidate(self, key: str) -> None:
+        '''
+        Removes one entry.
+        '''
+        with self._lock:
+            self._delete(key)
+            self._connection.commit()
+
+    def invalidate_step(self, step: str) -> int:
+        '''
+        Removes every entry for a step, e.g. after changing its prompt.
+
+        Returns:
+            int: The number of entries removed.
+        '''
+        with self._lock:
+            count, total = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE step = ?',
+                (step,)).fetchone()
+            self._connection.execute('DELETE FROM entries WHERE step = ?', (step,))
+            self._connection.commit()
+            self._entries = self._entries - count
+            self._bytes = self._bytes - total
+        return count
+
+    def clear(self) -> None:
+        '''
+        Removes every entry.
+        '''
+        with self._lock:
+            self._connection.execute('DELETE FROM entries')
+            self._connection.commit()
+            self._entries = 0
+            self._bytes = 0
+
+    def close(self) -> None:
+        '''
+        Closes the cache file.
+        '''
+        with self._lock:
+            self._connection.close()
+
+
+_caches: dict[str, StepCache] = {}
+_caches_lock = threading.Lock()
+
+
+def open_cache(output_location: str) -> StepCache:
+    '''
+    Returns the process-wide StepCache for a location, opening it on first use.
+    '''
+    key = os.path.abspath(output_location)
+    cache = _caches.get(key)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = StepCache(output_location)
+            _caches[key] = cache
+    return cache
@@ -5,11 +5,10 @@
 import logging
 import os
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
 from src.workflow import PipelineItem, PipelineStep
-from CommonPy.src.request_utilities import request_timeout
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
+from CommonPy.src.session_pool import get_session
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -17,6 +16,8 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+STEP_NAME = 'suppress'
+
 SESSION_KEY = os.environ['BRAID_SESSION_KEY']
 
 headers = {
@@ -47,12 +48,13 @@ class SummariseFailSuppressor (PipelineStep):
           PipelineItem: The PipelineItem if suppression is not needed, otherwise None.
         '''
 
-        logger.debug('Evaluation for suppression: %s', pipeline_item.path)
+        cache = open_cache(self.output_location)
+        key = StepCache.make_key(STEP_NAME, DEFAULT_MODEL, pipeline_item.summary)
+        keep = cache.get(STEP_NAME, key)
+        if keep is not None:
+            return pipeline_item if keep else None
 
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        logger.debug('Evaluation for suppression: %s', pipeline_item.path)
 
         summary_url = f'https://braid-api.azurewebsites.net/api/TestForSummariseFail?session={
             SESSION_KEY}'
@@ -62,14 +64,16 @@ class SummariseFailSuppressor (PipelineStep):
             }
         }
 
+        session = get_session(summary_url)
         response = session.post(summary_url, json=input_json, 
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
 
         keep: bool = True  # If there is an error in the API, we default to 'keep'
         if response.status_code == 200:
             response_json = json.loads(response.text)
             keep = response_json['isValidSummary'] == 'SummarySucceeded'
+            # Only cache real answers, so an API error is checked again next time
+            cache.put(STEP_NAME, key, keep)
 
         if keep:
             return pipeline_item
@@ -5,13 +5,11 @@
 import logging
 import os
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
-
 
 from src.workflow import PipelineItem, PipelineStep
 from src.summary_repository_facade import SummaryRespositoryFacade
-from CommonPy.src.request_utilities import request_timeout
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
+from CommonPy.src.session_pool import get_session
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -19,6 +17,10 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+STEP_NAME = 'summarise'
+SUMMARY_PERSONA = 'ArticleSummariser'
+SUMMARY_LENGTH_WORDS = 50
+
 SESSION_KEY = os.environ['BRAID_SESSION_KEY']
 
 headers = {
@@ -41,25 +43,26 @@ class Summariser (PipelineStep):
 
     def summarise(self, pipeline_item: PipelineItem) -> PipelineItem:
         '''
-        Summarises the text content by either loading an existing summary from the specified path or generating a new summary using an external API. 
-        If an existing summary is found, it is returned; otherwise, a new summary is generated and saved at the specified path. 
+        Summarises the text content by either loading a cached summary of the same text or generating a new summary using an external API. 
+        If a cached summary is found, it is returned; otherwise, a new summary is generated, cached, and saved at the specified path. 
         Returns the generated or loaded summary as an enriched PipelineItem.
         '''
         path = pipeline_item.path
         repository = SummaryRespositoryFacade(self.output_location)
 
-        if repository.exists(path):
+        cache = open_cache(self.output_location)
+        key = StepCache.make_key(STEP_NAME, DEFAULT_MODEL, pipeline_item.text,
+                                 {'persona': SUMMARY_PERSONA, 'lengthInWords': SUMMARY_LENGTH_WORDS})
+        summary = cache.get(STEP_NAME, key)
+        if summary is None and repository.exists(path) and cache.claim_legacy(STEP_NAME, path):
             summary = repository.load(path)
+            cache.put(STEP_NAME, key, summary)
+        if summary is not None:
             pipeline_item.summary = summary
             return pipeline_item
 
         logger.debug('Summarising: %s', path)
 
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-
         print("Summarising: " + pipeline_item.path)
 
         #summary_url = f'http://localhost:7071/api/Summarize?session={
@@ -67,21 +70,23 @@ class Summariser (PipelineStep):
             SESSION_KEY}'
         input_json = {
             'request': {
-                'persona': "ArticleSummariser",
+                'persona': SUMMARY_PERSONA,
                 'text': pipeline_item.text,
-                'lengthInWords': 50
+                'lengthInWords': SUMMARY_LENGTH_WORDS
             }
         }
 
+        session = get_session(summary_url)
         response = session.post(summary_url, json=input_json, 
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
             summary = response_json['summary']
 
+            cache.put(STEP_NAME, key, summary)
             repository.save(path, summary)
+            cache.mark_legacy(STEP_NAME, [path])
             pipeline_item.summary = summary
 
             return pipeline_item
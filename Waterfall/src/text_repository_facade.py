@@ -1,7 +1,7 @@
 '''Facade to store text in local file system'''
 # Copyright (c) 2024 Braid Technologies Ltd
 
-from src.file_repository import FileRespository
+from src.sqlite_repository import open_repository
 
 
 class TextRespositoryFacade:
@@ -9,8 +9,13 @@ class TextRespositoryFacade:
     Class providing an interface to load, save, and existence check for files in the file system.
     '''
 
-    def __init__(self, output_location: str):
-        self.file__repository = FileRespository(output_location)
+    def __init__(self, output_location: str, repository=None):
+        '''
+        Parameters:
+           output_location (str): The directory where files will be stored.
+           repository: The backend, a file or SQLite repository. Defaults to the one the location uses.
+        '''
+        self.file__repository = repository if repository is not None else open_repository(output_location)
         self.output_location = output_location
         self.extension = "txt"
 
@@ -55,3 +60,37 @@ class TextRespositoryFacade:
            bool: True if the file exists, False otherwise.
         '''
         return self.file__repository.exists(path, self.extension)
+
+    def exists_many(self, paths: list[str]) -> list[bool]:
+        '''
+        Checks which of several paths have texts saved, in one query where the backend allows.
+
+        Parameters:
+           paths (list[str]): The paths to check.
+
+        Returns:
+           list[bool]: One entry per path.
+        '''
+        return self.file__repository.exists_many(paths, self.extension)
+
+    def load_many(self, paths: list[str]) -> list[str]:
+        '''
+        Loads the texts for several paths, '' for any with none.
+
+        Parameters:
+           paths (list[str]): The paths to load.
+
+        Returns:
+           list[str]: One entry per path.
+        '''
+        return self.file__repository.load_many(paths, self.extension)
+
+    def save_many(self, paths: list[str], texts: list[str]) -> None:
+        '''
+        Saves the texts for several paths, in one transaction where the backend allows.
+
+        Parameters:
+           paths (list[str]): The paths to save.
+           texts (list[str]): One entry per path.
+        '''
+        return self.file__repository.save_many(paths, self.extension, texts)
@@ -5,10 +5,13 @@
 import logging
 import os
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
 
-from CommonPy.src.request_utilities import request_timeout
+import numpy as np
+
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
+from src.embedding_finder import normalise_rows
+from CommonPy.src.batch_utilities import estimate_tokens, AVERAGE_CHARACTERS_PER_TOKEN
+from CommonPy.src.session_pool import get_session
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -16,6 +19,12 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+STEP_NAME = 'find_theme'
+
+# Estimated tokens of summaries sent to FindTheme for one cluster
+DEFAULT_THEME_INPUT_TOKENS = 16000
+SUMMARY_SEPARATOR = "\n "
+
 SESSION_KEY = os.environ['BRAID_SESSION_KEY']
 
 headers = {
@@ -25,11 +34,55 @@ headers = {
 }
 
 
+def make_theme_input(summaries: list[str], embeddings: list[list[float]] = None,
+                     max_tokens: int = DEFAULT_THEME_INPUT_TOKENS) -> str:
+    '''
+    Joins the summaries of a cluster's members into the text a theme is found for.
+
+    If they are over the token budget and embeddings are given, the members nearest the cluster
+    centroid are kept, up to the budget, and joined in their original order. The most central
+    member is always kept, cut to the budget if it is over on its own.
+
+    Parameters:
+        summaries (list[str]): One summary per member.
+        embeddings (list[list[float]]): One embedding per member, used to rank them by centrality.
+        max_tokens (int): Maximum estimated tokens of the result.
+
+    Returns:
+        str: Each kept summary followed by a separator.
+    '''
+    tokens = [estimate_tokens(summary + SUMMARY_SEPARATOR) for summary in summaries]
+    if sum(tokens) <= max_tokens or len(summaries) == 0:
+        return ''.join(summary + SUMMARY_SEPARATOR for summary in summaries)
+
+    if embeddings is None or any(embedding is None for embedding in embeddings):
+        order = list(range(len(summaries)))
+    else:
+        normalised = normalise_rows(np.asarray(embeddings, dtype=np.float32))
+        centroid = normalised.mean(axis=0)
+        order = np.argsort(-(normalised @ centroid), kind='stable').tolist()
+
+    kept = [order[0]]
+    used = tokens[order[0]]
+    for i in order[1:]:
+        if used + tokens[i] <= max_tokens:
+            kept.append(i)
+            used = used + tokens[i]
+
+    logger.debug('Kept %d of %d summaries for theme', len(kept), len(summaries))
+    if len(kept) == 1:
+        return summaries[kept[0]][:max_tokens * AVERAGE_CHARACTERS_PER_TOKEN] + SUMMARY_SEPARATOR
+    return ''.join(summaries[i] + SUMMARY_SEPARATOR for i in sorted(kept))
+
+
 class ThemeFinder:
     '''Class to create a theme for a number of input paragraphs of text'''
 
-    def __init__(self):
-        return
+    def __init__(self, output_location: str = None):
+        '''
+        Initializes the ThemeFinder. If output_location is given, themes are cached there.
+        '''
+        self.output_location = output_location
 
     def find_theme(self, text: str, length: int) -> str:
         """
@@ -45,10 +98,13 @@ class ThemeFinder:
 
         Logs an error message if unable to find a theme.
         """
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        cache = None
+        if self.output_location is not None:
+            cache = open_cache(self.output_location)
+            key = StepCache.make_key(STEP_NAME, DEFAULT_MODEL, text, {'length': length})
+            theme = cache.get(STEP_NAME, key)
+            if theme is not None:
+                return theme
 
         summary_url = f'https://braid-api.azurewebsites.net/api/FindTheme?session={
             SESSION_KEY}'
@@ -59,14 +115,16 @@ class ThemeFinder:
             }
         }
 
+        session = get_session(summary_url, status_forcelist=(502, 503, 504))
         response = session.post(summary_url, json=input_json, 
-                                headers=headers,
-                                timeout=request_timeout)
+                                headers=headers)
         
         if response.status_code == 200:
             response_json = json.loads(response.text)
             theme = response_json['theme']
 
+            if cache is not None:
+                cache.put(STEP_NAME, key, theme)
             return theme
         else:
             logger.error("Unable to find theme for: %s", text)
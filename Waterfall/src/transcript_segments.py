@@ -0,0 +1,69 @@
+'''Where each caption segment of a transcript starts, in the text and in the video'''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import logging
+import bisect
+from array import array
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class TranscriptSegments:
+    '''
+    The caption segments of a transcript, kept as two typed arrays rather than a list of objects,
+    so a transcript of several hours with tens of thousands of segments takes a few hundred KB.
+
+    Attributes:
+        offsets (array): The character offset in the transcript text where each segment starts, the
+            running total of the lengths of the segments before it, so ascending.
+        starts (array): The second in the video where each segment starts.
+    '''
+
+    def __init__(self, offsets: array = None, starts: array = None):
+        self.offsets = offsets if offsets is not None else array('q')
+        self.starts = starts if starts is not None else array('d')
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, offset: int, start: float) -> None:
+        '''
+        Adds a segment that starts at a character offset after those already added.
+        '''
+        self.offsets.append(offset)
+        self.starts.append(start)
+
+    def start_seconds(self, offset: int) -> float:
+        '''
+        Returns when the segment holding a character offset starts in the video, by binary search
+        over the offsets, so O(log n) in the number of segments.
+
+        Parameters:
+            offset (int): A character offset in the transcript text.
+
+        Returns:
+            float: The start in seconds of the last segment starting at or before the offset, or
+            0 if there are no segments.
+        '''
+        if not self.offsets:
+            return 0.0
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return self.starts[max(index, 0)]
+
+    def to_json(self) -> dict:
+        '''
+        Returns the segments as a JSON-serialisable dict, e.g. to store in the step cache.
+        '''
+        return {'offsets': self.offsets.tolist(), 'starts': self.starts.tolist()}
+
+    @staticmethod
+    def from_json(value: dict) -> 'TranscriptSegments':
+        '''
+        Returns the segments stored by to_json.
+        '''
+        return TranscriptSegments(array('q', value['offsets']), array('d', value['starts']))
@@ -4,6 +4,7 @@
 # Standard Library Imports
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from src.workflow import PipelineItem, Theme, WebSearchPipelineSpec, FileDirectedPipelineSpec, PipelineSpec
 from src.web_searcher import WebSearcher
@@ -11,12 +12,16 @@ from src.html_file_downloader import HtmlFileDownloader
 from src.summariser import Summariser
 from src.summarise_fail_suppressor import SummariseFailSuppressor
 from src.embedder import Embedder
+from src.stage_executor import StageExecutor
+from src.step_cache import open_cache
 from src.cluster_analyser import ClusterAnalyser
-from src.theme_finder import ThemeFinder
+from src.cluster_state import ClusterState, DEFAULT_RETHEME_THRESHOLD
+from src.theme_finder import ThemeFinder, make_theme_input, DEFAULT_THEME_INPUT_TOKENS
 from src.embedding_finder import EmbeddingFinder
 from src.waterfall_pipeline_report_common import write_details_json, write_chart
 from src.waterfall_pipeline_save_chunks import save_chunk_tree
 from src.text_repository_facade import TextRespositoryFacade
+from src.sqlite_repository import open_sqlite_repository
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -105,10 +110,15 @@ class WaterfallDataPipeline:
             list[Theme]: A list of Theme objects 
         '''
 
+        previous = self.load_cluster_state(spec)
+
         items: list[WebSearchPipelineSpec] = self.search_and_cluster(spec)
 
-        themes: list[Theme] = self.create_themes(items, spec.clusters)
+        themes: list[Theme] = self.create_themes(items, spec.clusters, spec.theme_workers,
+                                                   spec.theme_input_tokens,
+                                                   previous, spec.retheme_threshold)
 
+        self.save_cluster_state(items, themes, spec)
         self.create_report(items, themes, spec)
 
         return themes
@@ -121,15 +131,39 @@ class WaterfallDataPipeline:
             list[Theme]: A list of Theme objects 
         '''
 
+        previous = self.load_cluster_state(spec)
+
         items: list[WebSearchPipelineSpec] = self.cluster_from_files(
-            file_spec.files, spec.clusters)
+            file_spec.files, spec.clusters, spec)
 
-        themes: list[Theme] = self.create_themes(items, spec.clusters)
+        themes: list[Theme] = self.create_themes(items, spec.clusters, spec.theme_workers,
+                                                   spec.theme_input_tokens,
+                                                   previous, spec.retheme_threshold)
 
+        self.save_cluster_state(items, themes, spec)
         self.create_report(items, themes, spec)
 
         return themes
 
+    def load_cluster_state(self, spec: PipelineSpec) -> ClusterState:
+        '''
+        Loads the clusters and themes saved by the previous incremental run.
+
+        Returns:
+            ClusterState: The saved state, or None if the spec is not incremental or there is none.
+        '''
+        if not spec.incremental_clusters:
+            return None
+        return ClusterState.load(self.output_location)
+
+    def save_cluster_state(self, items: list[PipelineItem], themes: list[Theme],
+                           spec: PipelineSpec) -> None:
+        '''
+        Saves the clusters and themes of this run for the next, if the spec is incremental.
+        '''
+        if spec.incremental_clusters and items:
+            ClusterState.build(items, themes, spec.clusters).save(self.output_location)
+
     def search_and_cluster(self, spec: WebSearchPipelineSpec) -> list[PipelineItem]:
         '''
         Create themes based on the provided PipelineSpec.
@@ -146,15 +180,17 @@ class WaterfallDataPipeline:
 
         input_items = searcher.search(spec)
 
-        return self.cluster(input_items, spec.clusters)
+        return self.cluster(input_items, spec.clusters, spec)
 
-    def cluster_from_files(self, items: list[str], clusters: int) -> list[PipelineItem]:
+    def cluster_from_files(self, items: list[str], clusters: int,
+                           spec: PipelineSpec = None) -> list[PipelineItem]:
         '''
         Create themes based on the provided PipelineItems and PipelineSpec.
 
         Parameters:
            items (list[str]): A list of files to create themes from.
            clusters (int): The number of clusters to create.
+           spec (PipelineSpec): Optional spec supplying per-stage worker counts.
 
         Returns:
            list[Theme]: A list of Theme objects created based on the provided PipelineItems 
@@ -164,136 +200,193 @@ class WaterfallDataPipeline:
 
         repository = TextRespositoryFacade(self.output_location)
 
-        for file in items:
-            file_path = make_path(self.output_location, file) + "." + repository.extension
-            file_contents = load_file(file_path)
+        # One query for every file where the backend allows, rather than a probe and read per file
+        for file, exists in zip(items, repository.exists_many(items)):
+            if not exists:
+                logger.error(f"File not found: {file}")
+                raise FileNotFoundError(file)
+
+        for file, file_contents in zip(items, repository.load_many(items)):
             pipeline_item: PipelineItem = PipelineItem()
             pipeline_item.path = file
             pipeline_item.text = file_contents
             pipeline_items.append(pipeline_item)
 
-        return self.cluster(pipeline_items, clusters)
+        return self.cluster(pipeline_items, clusters, spec)
 
-    def cluster(self, input_items: list[PipelineItem], clusters: int) -> list[PipelineItem]:
+    def cluster(self, input_items: list[PipelineItem], clusters: int,
+                spec: PipelineSpec = None) -> list[PipelineItem]:
         '''
         Create themes based on the provided PipelineItems.
+        Each stage (download, summarise, suppress, embed) runs over all items before the next starts,
+        processing up to the spec's worker count for that stage concurrently.
+        Items that fail at any stage are dropped without stopping the run.
+        If the spec is incremental and a previous run saved its clusters, items are assigned
+        to the saved centroids rather than clustered again.
 
         Parameters:
            input_items (list[PipelineItem]): A list of PipelineItem objects to create themes from.
            clusters (int): The number of clusters to create.
+           spec (PipelineSpec): Optional spec supplying per-stage worker counts and the
+              embedding batch size. None = serial, one request per item.
 
         Returns:
            list[Theme]: A list of Theme objects created based on the provided PipelineItems 
            and PipelineSpec.
         '''
 
+        if spec is None:
+            spec = PipelineSpec()
+
+        if spec.use_sqlite_repository:
+            # Creates the repository file, so every facade on this location uses it from now on
+            open_sqlite_repository(self.output_location)
+
         downloader = HtmlFileDownloader(self.output_location)
         summariser = Summariser(self.output_location)
         suppressor = SummariseFailSuppressor(self.output_location)
         embedder = Embedder(self.output_location)
-        cluster_analyser = ClusterAnalyser(self.output_location, clusters)
-
-        items: list[PipelineItem] = []
-
-        for item in input_items:
-            downloaded = None
-            suppression_checked = None
-            summarised = None
-            embedded = None
-
-            # Download the HTML file - added specific exception handling bcs we seem to get some fails, no reason not to continue if others requests can succe
-            try:
-                downloaded = downloader.download(item)
-            except Exception as e:
-                logger.error(f"Error downloading {item.path}: {str(e)}")
-                downloaded = None
-                continue
-
-            if downloaded:
-                summarised = summariser.summarise(downloaded)
-            if summarised:
-                suppression_checked = suppressor.should_suppress(summarised)
-            if suppression_checked:
-                embedded = embedder.embed(suppression_checked)
-            if embedded:
-                items.append(embedded)
-
-        clustered_items = cluster_analyser.analyse(items)
+        cluster_analyser = ClusterAnalyser(self.output_location, clusters,
+                                           spec.cluster_engine, spec.cluster_random_state,
+                                           max_clusters=spec.max_clusters)
+
+        downloaded = StageExecutor('download', spec.download_workers).run(
+            downloader.download, input_items)
+        summarised = StageExecutor('summarise', spec.summarise_workers).run(
+            summariser.summarise, downloaded)
+        suppression_checked = StageExecutor('suppress', spec.suppress_workers).run(
+            suppressor.should_suppress, summarised)
+        if spec.embed_batch_size > 1:
+            items: list[PipelineItem] = embedder.embed_many(
+                suppression_checked, max_items=spec.embed_batch_size)
+        else:
+            items: list[PipelineItem] = StageExecutor('embed', spec.embed_workers).run(
+                embedder.embed, suppression_checked)
+
+        previous = self.load_cluster_state(spec)
+        if previous is not None:
+            # Keep the previous run's clusters, so only clusters that change need new themes
+            clustered_items = cluster_analyser.assign(items, previous.centroids)
+        else:
+            clustered_items = cluster_analyser.analyse(items)
+        if spec.max_clusters is not None or previous is not None:
+            # Themes are created for the number of clusters chosen
+            spec.clusters = cluster_analyser.clusters
+
+        logger.info('Step cache: %s', open_cache(self.output_location).stats)
 
         return clustered_items
 
-    def create_themes(self, items: list[PipelineItem], clusters: int) -> list[Theme]:
+    def create_themes(self, items: list[PipelineItem], clusters: int,
+                      workers: int = 1,
+                      max_tokens: int = DEFAULT_THEME_INPUT_TOKENS,
+                      previous: ClusterState = None,
+                      threshold: float = DEFAULT_RETHEME_THRESHOLD) -> list[Theme]:
         '''
         Create themes based on the provided PipelineItems and PipelineSpec.
+        The short and long description of every cluster, and the embedding of each long
+        description, are requested concurrently, up to 'workers' requests at once.
+        Theme order depends only on cluster sizes, not on which request finishes first.
+        A cluster whose summaries are over max_tokens is described from its most central members.
+        Given the state of a previous run with the same clusters, a cluster keeps its saved theme
+        unless the fraction of members that left or joined is over the threshold.
 
         Parameters:
            items (list[PipelineItem]): A list of PipelineItem objects to create themes from.
-           spec (PipelineSpec): The PipelineSpec object containing specifications 
-                for theme creation.
+           clusters (int): The number of clusters the items are classified into.
+           workers (int): Maximum number of requests in flight. 1 = serial.
+           max_tokens (int): Maximum estimated tokens of summaries sent per cluster.
+           previous (ClusterState): Clusters and themes saved by a previous run, or None.
+           threshold (float): Fraction of changed members above which a saved theme is replaced.
 
         Returns:
            list[Theme]: A list of Theme objects created based on the provided 
               PipelineItems and PipelineSpec.
         '''
-        themes: list[Theme] = []
-
-        accumulated_summaries: list[str] = [''] * clusters
-        accumulated_counts: list[int] = [0] * clusters
-        accumulated_members: list[list[PipelineItem]] = [None] * clusters
-        for x in range(clusters):
-            accumulated_members[x] = []
-
-        # Accumulate a set of summaries and counts of summaries according to classification
-        for i, item in enumerate(items):
-            cluster = items[i].cluster
-            accumulated_summaries[cluster] = accumulated_summaries[cluster] + \
-                item.summary + "\n "
-            accumulated_counts[cluster] = accumulated_counts[cluster] + 1
-            accumulated_members[cluster].append(item)
-
-        # Ask the theme finder to find a theme, then store it
-        for i, accumulated_summary in enumerate(accumulated_summaries):
-            theme_finder = ThemeFinder()
-            short_description = theme_finder.find_theme(
-                accumulated_summary, 15)
-            long_description = theme_finder.find_theme(accumulated_summary, 50)
-            theme = Theme()
-            theme.member_pipeline_items = accumulated_members[i]
-            theme.short_description = short_description
-            theme.long_description = long_description + "\n\n" + "There are " + \
+        # Group the members of each cluster, then build each cluster's text in one pass
+        accumulated_members: list[list[PipelineItem]] = [[] for _ in range(clusters)]
+        for item in items:
+            accumulated_members[item.cluster].append(item)
+        accumulated_counts: list[int] = [len(members) for members in accumulated_members]
+        accumulated_summaries: list[str] = [
+            make_theme_input([item.summary for item in members],
+                             [item.embedding for item in members], max_tokens)
+            for members in accumulated_members]
+
+        # Clusters with no members get no theme, and with a previous run only changed clusters
+        # are described again
+        if previous is not None and previous.clusters != clusters:
+            previous = None
+        to_describe = [i for i in range(clusters) if accumulated_members[i] and (
+            previous is None or previous.themes[i].short_description is None or
+            previous.themes[i].changed_fraction(
+                [item.path for item in accumulated_members[i]]) > threshold)]
+        logger.debug('Describing %d of %d clusters', len(to_describe), clusters)
+
+        theme_finder = ThemeFinder(self.output_location)
+        embedder = Embedder(self.output_location)
+
+        def find_short_description(i: int) -> str:
+            return theme_finder.find_theme(accumulated_summaries[i], 15)
+
+        def find_long_description(i: int) -> PipelineItem:
+            # The long description is embedded as soon as it arrives, to find the nearest member
+            long_description = theme_finder.find_theme(accumulated_summaries[i], 50)
+            theme_text = PipelineItem()
+            theme_text.text = long_description + "\n\n" + "There are " + \
                 str(accumulated_counts[i]) + " members in this cluster."
-            themes.append(theme)
+            embedder.embed(theme_text)
+            return theme_text
+
+        # Ask the theme finder to find a theme for every cluster at once
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            short_futures = {i: executor.submit(find_short_description, i) for i in to_describe}
+            long_futures = {i: executor.submit(find_long_description, i) for i in to_describe}
+            short_descriptions = {i: future.result() for i, future in short_futures.items()}
+            theme_texts = {i: future.result() for i, future in long_futures.items()}
 
-        # Ask the embedding finder to find nearest article for each theme
+        # Find the member nearest to each theme
         enriched_themes = []
-        for i, theme in enumerate(themes):
+        enriched_counts = []
+        for i in range(clusters):
             logger.debug('Finding nearest embedding')
+            members = accumulated_members[i]
+            if not members:
+                continue
 
-            # Accumulate the embeddings that are part of the cluster
-            embeddings_for_theme = []
-            for item in items:
-                if item.cluster == i:
-                    embeddings_for_theme.append(item.embedding)
-
-            # Build embedding finder with the right embeddings,
-            # then find the nearest one to the theme that is in the cluster
-            embedding_finder = EmbeddingFinder(
-                embeddings_for_theme, self.output_location)
-            nearest_items: list[PipelineItem] = []
-            nearest_embedding = embedding_finder.find_nearest(
-                theme.long_description)
+            theme = Theme()
+            theme.member_pipeline_items = members
+            example = None
+            if i in theme_texts:
+                theme.short_description = short_descriptions[i]
+                theme.long_description = theme_texts[i].text
+                target = theme_texts[i].embedding
+                if target is None:
+                    continue
+            else:
+                # Keep the saved theme, with the member count brought up to date
+                saved = previous.themes[i]
+                theme.short_description = saved.short_description
+                theme.long_description = saved.long_description.rpartition("\n\nThere are ")[0] + \
+                    "\n\n" + "There are " + str(accumulated_counts[i]) + " members in this cluster."
+                target = previous.centroids[i]
+                example = next((item for item in members if item.path == saved.example_path), None)
+
+            if example is None:
+                # Build embedding finder with the embeddings of the cluster members,
+                # then find the member nearest to the theme
+                embedding_finder = EmbeddingFinder(
+                    [item.embedding for item in members], self.output_location)
+                example = members[embedding_finder.find_nearest_indices(target, 1)[0]]
 
             # Store nearest item
-            for item in items:
-                if item.embedding == nearest_embedding:
-                    nearest_items.append(item)
-                    theme.example_pipeline_items = nearest_items
-                    enriched_themes.append(theme)
-                    break
+            theme.example_pipeline_items = [example]
+            enriched_themes.append(theme)
+            enriched_counts.append(accumulated_counts[i])
 
         logger.debug('Ordering themes')
         ordered_themes = sort_array_by_another(
-            enriched_themes, accumulated_counts)
+            enriched_themes, enriched_counts)
 
         return ordered_themes
 
@@ -4,12 +4,13 @@
 # Standard Library Imports
 import logging
 import os
-import json
 import plotly
 import plotly.express as px
-import umap.umap_ as umap__
 
 from src.workflow import PipelineItem, Theme, WebSearchPipelineSpec
+from src.cluster_analyser import make_embedding_matrix
+from src.dimension_reducer import DimensionReducer
+from src.record_stream import RecordWriter
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -24,6 +25,7 @@ def write_chart(output_location: str,
                 spec: WebSearchPipelineSpec) -> str:
     '''
     Generates a report based on the provided PipelineItems, Themes, and PipelineSpec.
+    The 2-D positions are cached in the output location, see DimensionReducer.
 
         Parameters:
         - output_location - directory to store file output
@@ -35,13 +37,11 @@ def write_chart(output_location: str,
         - path to the created file
     '''
 
-    reducer = umap__.UMAP()
     logger.debug('Reducing cluster')
-    embeddings_as_float = []
-
-    for item in items:
-        embeddings_as_float.append(item.embedding)
-    embeddings_2d = reducer.fit_transform(embeddings_as_float)
+    reducer = DimensionReducer(output_location)
+    embeddings_2d = reducer.reduce(make_embedding_matrix(items),
+                                   [item.path for item in items],
+                                   incremental=spec.incremental_clusters)
 
     logger.debug('Generating chart')
 
@@ -66,21 +66,17 @@ def write_details_json(output_location: str,
                        themes: list[Theme],
                        spec: WebSearchPipelineSpec) -> None:
     '''
-    write the detailed items to a JSON file in case manual inspection is needed
+    write the detailed items to a JSON file in case manual inspection is needed.
+    Items are written one at a time, with embeddings stored as spec.output_embedding_format,
+    see record_stream.RecordWriter.
     '''
 
     logger.debug('Writing output file')
 
-    output_results = []
-    for item in items:
-        output_item = dict()
-        output_item['summary'] = item.summary
-        output_item['embedding'] = item.embedding
-        output_item['path'] = item.path
-        output_item['theme'] = themes[item.cluster].short_description
-        output_results.append(output_item)
-
-    # save the test results to a json file
     output_file = os.path.join(output_location, spec.output_data_name)
-    with open(output_file, 'w+', encoding='utf-8') as f:
-        json.dump(output_results, f)
+    with RecordWriter(output_file, embedding_format=spec.output_embedding_format) as writer:
+        for item in items:
+            writer.write({'summary': item.summary,
+                          'embedding': item.embedding,
+                          'path': item.path,
+                          'theme': themes[item.cluster].short_description})
@@ -47,19 +47,23 @@ def create_theme_chunk(short_description: str,
                        context: str,
                        long_description: str,
                        output_location: str,
-                       chunk_repository: ChunkRepository) -> IStoredChunk:
-    ''' Utility function to create a chunk from Theme attributes '''
-    existing_theme = chunk_repository.find(short_description)
+                       chunk_repository: ChunkRepository,
+                       existing_theme: IStoredChunk = None,
+                       embedding: list[float] = None) -> IStoredChunk:
+    '''
+    Utility function to create a chunk from Theme attributes.
+    existing_theme is the stored chunk for the theme, if there is one, which is updated in place.
+    embedding is the embedding of long_description, calculated here if not supplied.
+    '''
     if existing_theme:
         theme_to_save = existing_theme
     else:
         theme_to_save = IStoredChunk()
 
-    embedder = Embedder(output_location)
-
     set_timestamps(theme_to_save, existing_theme is not None)
 
-    embedding = embedder.embed_text(long_description)
+    if embedding is None:
+        embedding = Embedder(output_location).embed_text(long_description)
 
     theme_to_save.storedSummary = create_text_rendering(long_description,
                                                         chunk_repository.default_model)
@@ -82,53 +86,75 @@ def create_theme_chunk(short_description: str,
 
 
 def save_chunks(items: list[PipelineItem],
-                spec: PipelineFileSpec) -> None:
+                spec: PipelineFileSpec,
+                chunk_repository: ChunkRepository = None) -> None:
     """
-    Save a list of PipelineItem objects as chunks in the database.
+    Save a list of PipelineItem objects as chunks in the database, in batched requests.
 
     Parameters:
         items (list[PipelineItem]): A list of PipelineItem objects to be saved.
         spec (PipelineFileSpec): The specification for the pipeline file.
+        chunk_repository (ChunkRepository): Optional repository to save to.
 
     Returns:
         None
     """
-    db_repository = DbRepository(boxer_application_name, spec.description)
+    db_repository = DbRepository(boxer_application_name, spec.description, chunk_repository)
+    items_to_save = []
     for item in items:
-        loaded_item = db_repository.find(item.path)
-        if loaded_item is None:
-            loaded_item = PipelineItem()
-            loaded_item.id = str(uuid.uuid4())
-        loaded_item.parent_id = None
-        loaded_item.path = item.path
-        loaded_item.embedding = item.embedding
-        loaded_item.summary = item.summary
-        loaded_item.text = item.text
-        db_repository.save(loaded_item)
+        item_to_save = PipelineItem()
+        item_to_save.parent_id = None
+        item_to_save.path = item.path
+        item_to_save.embedding = item.embedding
+        item_to_save.summary = item.summary
+        item_to_save.text = item.text
+        items_to_save.append(item_to_save)
+
+    # Upsert keeps the stored id for any path already saved, so there is no find per item
+    db_repository.save_many(items_to_save, upsert=True)
 
 
 def save_chunk_tree(output_location: str,
                     items: list[PipelineItem],
                     themes: list[Theme],
-                    spec: WebSearchPipelineSpec) -> None:
+                    spec: WebSearchPipelineSpec,
+                    chunk_repository: ChunkRepository = None) -> None:
     '''
     saves chunks in a tree based on the provided PipelineItems, Themes, and PipelineSpec. 
     There is one root chunk, then one per Theme, then one per Item. 
+    Existing chunks are looked up in two requests and the tree is saved in batches, so the
+    number of requests depends on the size of the tree in bytes rather than the number of items.
 
         Parameters:
         - output_location - directory to store file output
         - items (list[PipelineItem]): A list of PipelineItem objects to generate the report from.
         - themes (list[Theme]): A list of Theme objects associated with the PipelineItems.
         - spec (PipelineSpec): The PipelineSpec object containing specifications for the report.
+        - chunk_repository (ChunkRepository): Optional repository to save to.
         '''
 
     logger.debug('Writing chunk tree to DB')
     embedder = Embedder(output_location)
-    db_repository = DbRepository(waterfall_application_name, spec.description)
-    chunk_repository = ChunkRepository()
+    if chunk_repository is None:
+        chunk_repository = ChunkRepository()
+    db_repository = DbRepository(waterfall_application_name, spec.description, chunk_repository)
+
+    # Find the stored master theme, themes and member items up front
+    loaded_themes = chunk_repository.find_many(
+        [spec.description] + [theme.short_description for theme in themes])
+    loaded_master_theme = loaded_themes.pop(0)
+    members = [item for theme in themes for item in theme.member_pipeline_items]
+    loaded_members = db_repository.find_many([item.path for item in members])
+
+    # Embed every theme description in as few requests as possible
+    theme_texts: list[PipelineItem] = []
+    for theme in themes:
+        theme_text = PipelineItem()
+        theme_text.text = theme.long_description
+        theme_texts.append(theme_text)
+    embedder.embed_many(theme_texts)
 
     # First we either load the master theme if it exists, or create a new one
-    loaded_master_theme = chunk_repository.find(spec.description)
     if loaded_master_theme is None:
         master_id = str(uuid.uuid4())
         master_theme = create_theme_chunk(spec.description,
@@ -151,9 +177,12 @@ def save_chunk_tree(output_location: str,
         spec.description + \
         ' cluster analysis (' + str(len(items)) + ' samples).'
 
-    for theme in themes:
+    themes_to_save: list[IStoredChunk] = []
+    items_to_save: list[PipelineItem] = []
+    member_index = 0
+
+    for theme, loaded_theme, theme_text in zip(themes, loaded_themes, theme_texts):
 
-        loaded_theme = chunk_repository.find(theme.short_description)
         if loaded_theme is None:
             theme_id = str(uuid.uuid4())
         else:
@@ -163,13 +192,16 @@ def save_chunk_tree(output_location: str,
                                            spec.description,
                                            theme.long_description,
                                            output_location,
-                                           chunk_repository)
+                                           chunk_repository,
+                                           loaded_theme,
+                                           theme_text.embedding)
         theme_to_save.id = theme_id
         theme_to_save.parentChunkId = master_id
 
-        # Save all the member items
+        # Collect all the member items
         for item in theme.member_pipeline_items:
-            loaded_item = db_repository.find(item.path)
+            loaded_item = loaded_members[member_index]
+            member_index = member_index + 1
             if loaded_item is None:
                 loaded_item = PipelineItem()
                 loaded_item.id = str(uuid.uuid4())
@@ -178,15 +210,14 @@ def save_chunk_tree(output_location: str,
             loaded_item.embedding = item.embedding
             loaded_item.summary = item.summary
             loaded_item.text = item.text
-            db_repository.save(loaded_item)
+            items_to_save.append(loaded_item)
 
             # Accumulate the related items in the parent Theme
             if theme_to_save.relatedChunks is None:
                 theme_to_save.relatedChunks = []
             theme_to_save.relatedChunks.append(loaded_item.id)
 
-        # Save the Theme
-        chunk_repository.save(theme_to_save)
+        themes_to_save.append(theme_to_save)
 
         # Save the Theme as a related item to the master theme
         if master_theme.relatedChunks is None:
@@ -200,6 +231,10 @@ def save_chunk_tree(output_location: str,
             master_theme.originalText = master_theme.originalText + \
                 '\n\n' + theme.long_description
 
+    # Save all the member items, then the Themes
+    db_repository.save_many(items_to_save)
+    chunk_repository.save_many(themes_to_save)
+
     # Save the Theme
     master_theme.url = "https://braid-api.azurewebsites.net/api/GetPage?id=" + \
         str(master_theme.id)
@@ -215,7 +250,7 @@ def save_chunk_tree(output_location: str,
     chunk_repository.save(master_theme)
 
     # Save the Page - use functional search key and id from the parent theme
-    page_repository = PageRepository()
+    page_repository = PageRepository(chunk_repository.api_url)
 
     page: IStoredPage = make_page_from_file(waterfall_application_name,
                                             spec.description,
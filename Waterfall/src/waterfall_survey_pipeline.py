@@ -11,7 +11,7 @@ from src.summariser import Summariser
 from src.summarise_fail_suppressor import SummariseFailSuppressor
 from src.embedder import Embedder
 from src.cluster_analyser import ClusterAnalyser
-from src.theme_finder import ThemeFinder
+from src.theme_finder import ThemeFinder, make_theme_input
 from src.embedding_finder import EmbeddingFinder
 from src.waterfall_pipeline_report import create_mail_report
 from src.waterfall_pipeline_report_common import write_details_json
@@ -132,19 +132,15 @@ class WaterfallDataPipeline:
         '''
         themes: list[Theme] = []
 
-        accumulated_summaries: list[str] = [''] * spec.clusters
-        accumulated_counts: list[int] = [0] * spec.clusters
-        accumulated_members: list[list[PipelineItem]] = [None] * spec.clusters
-        for x in range(spec.clusters):
-            accumulated_members[x] = []
-
-        # Accumulate a set of summaries and counts of summaries according to classification
-        for i, item in enumerate(items):
-            cluster = items[i].cluster
-            accumulated_summaries[cluster] = accumulated_summaries[cluster] + \
-                item.summary + "\n "
-            accumulated_counts[cluster] = accumulated_counts[cluster] + 1
-            accumulated_members[cluster].append(item)
+        # Group the members of each cluster, then build each cluster's text in one pass
+        accumulated_members: list[list[PipelineItem]] = [[] for _ in range(spec.clusters)]
+        for item in items:
+            accumulated_members[item.cluster].append(item)
+        accumulated_counts: list[int] = [len(members) for members in accumulated_members]
+        accumulated_summaries: list[str] = [
+            make_theme_input([item.summary for item in members],
+                             [item.embedding for item in members], spec.theme_input_tokens)
+            for members in accumulated_members]
 
         # Ask the theme finder to find a theme, then store it
         for i, accumulated_summary in enumerate(accumulated_summaries):
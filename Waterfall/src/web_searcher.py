@@ -4,9 +4,15 @@
 # Standard Library Imports
 import logging
 import os
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from src.workflow import PipelineItem, WebSearchPipelineSpec
+from src.step_cache import StepCache, open_cache
+from src.html_link_crawler import canonicalise_url
+from src.summary_repository_facade import SummaryRespositoryFacade
+from src.embedder_repository_facade import EmbeddingRespositoryFacade
+from CommonPy.src.session_pool import get_session
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -26,25 +32,62 @@ AI_NATIONWIDE_SEARCH_ENGINE_ID= '3498036ca64b54980'
 AI_BNY_SEARCH_ENGINE_ID= 'a4521230dc31a4716'
 AI_VODAFONE_SEARCH_ENGINE_ID= '1482b42ca30924b1c'
 
+# doc: https://developers.google.com/custom-search/v1/using_rest
+SEARCH_URL = 'https://www.googleapis.com/customsearch/v1'
+DATE_RESTRICT = 'm[1]'
+RESULTS_PER_PAGE = 10
+SEARCH_TIMEOUT = 20
+
+STEP_NAME = 'web_search'
+
+
+class SearchStats:
+    '''
+    Outcome of the last search of a WebSearcher.
+    '''
+
+    def __init__(self):
+        self.pages = 0
+        self.cached_pages = 0
+        self.results = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.pages} pages requested, {self.cached_pages} from cache, {self.results} results, '
+                f'{self.duplicates} duplicates, {self.processed} already processed, '
+                f'{self.seconds * 1000:.0f} ms')
+
+
 class WebSearcher:
     '''
     Searches for links related to a specific query using the Google Custom Search Engine API.
     Returns a list of URLs extracted from the search results.
+
+    All result pages are requested at once over the pooled session for the API. Each response
+    is cached by query, engine, date window and page, so a repeated search within the cache
+    lifetime makes no requests and uses no quota.
     '''
 
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str, search_url: str = SEARCH_URL):
         self.output_location = output_location
+        self.search_url = search_url
+        self.stats = SearchStats()
         return
 
     def search(self, pipeline: WebSearchPipelineSpec) -> list[PipelineItem]:
         '''
         Searches for links related to a specific query using the Google Custom Search Engine API.
-        Returns a list of URLs extracted from the search results.
+        Returns a list of URLs extracted from the search results, in result order, with each
+        page only once however many times, and in whatever form, it was returned.
+        If pipeline.exclude_processed is set, pages whose summary and embedding are already
+        in the local repositories are left out.
         '''
         # See this link for details of what we are doing here
         # https://thepythoncode.com/article/use-google-custom-search-engine-api-in-python?utm_content=cmp-true
-
-        pipeline_items = []
+        start_time = time.perf_counter()
+        self.stats = SearchStats()
 
         # the search query you want
         query = 'Generative AI'
@@ -52,29 +95,76 @@ class WebSearcher:
             query += ' ' + pipeline.query_additions
 
         # Pull back 1- pages of results (100 items ...)
-        for page in range(1, pipeline.pages + 1):
-            # constructing the URL
-            # doc: https://developers.google.com/custom-search/v1/using_rest
-            # calculating start, (page=2) => (start=11), (page=3) => (start=21)
-            start = (page - 1) * 10 + 1
-            url = f'https://www.googleapis.com/customsearch/v1?key={GOOGLE_DEVELOPER_API_KEY}&cx={
-                pipeline.search_key}&q={query}&start={start}&dateRestrict=m[1]'
-
-            # make the API request
-            data = requests.get(url, timeout=20).json()
-
-            # get the result items
-            search_items = data.get('items')
+        pages = range(1, pipeline.pages + 1)
+        with ThreadPoolExecutor(max_workers=max(1, len(pages))) as executor:
+            responses = list(executor.map(
+                lambda page: self._search_page(query, pipeline.search_key, page,
+                                               pipeline.search_cache_seconds), pages))
 
-            # iterate over the results
-            if search_items is not None:
-                for search_item in search_items:
-                    # extract the page url
-                    link = search_item.get('link')
-                    pipeline_item = PipelineItem()
-                    pipeline_item.path = link
-                    pipeline_items.append(pipeline_item)
-            else:
+        links = []
+        self.stats.cached_pages = sum(1 for _, cached in responses if cached)
+        self.stats.pages = len(responses) - self.stats.cached_pages
+        for data, _ in responses:
+            # get the result items, the results end at the first page without any
+            search_items = data.get('items')
+            if search_items is None:
                 break
+            for search_item in search_items:
+                # extract the page url
+                links.append(search_item.get('link'))
+        self.stats.results = len(links)
+
+        links = self._deduplicate(links)
+        if pipeline.exclude_processed:
+            links = self._exclude_processed(links)
 
+        pipeline_items = []
+        for link in links:
+            pipeline_item = PipelineItem()
+            pipeline_item.path = link
+            pipeline_items.append(pipeline_item)
+
+        self.stats.seconds = time.perf_counter() - start_time
+        logger.info('Search for %s: %s', query, self.stats)
         return pipeline_items
+
+    def _search_page(self, query: str, search_key: str, page: int, cache_seconds: float) -> tuple[dict, bool]:
+        # calculating start, (page=2) => (start=11), (page=3) => (start=21)
+        start = (page - 1) * RESULTS_PER_PAGE + 1
+        cache = open_cache(self.output_location)
+        key = StepCache.make_key(STEP_NAME, '', query,
+                                 {'engine': search_key, 'date_restrict': DATE_RESTRICT, 'start': start})
+
+        cached = cache.get(STEP_NAME, key) if cache_seconds else None
+        if cached is not None and time.time() - cached['created'] <= cache_seconds:
+            return cached['response'], True
+
+        # make the API request
+        params = {'key': GOOGLE_DEVELOPER_API_KEY, 'cx': search_key, 'q': query,
+                  'start': start, 'dateRestrict': DATE_RESTRICT}
+        response = get_session(self.search_url).get(self.search_url, params=params, timeout=SEARCH_TIMEOUT)
+        data = response.json()
+
+        # Errors are not cached, so the next search asks again
+        if response.status_code == 200 and cache_seconds:
+            cache.put(STEP_NAME, key, {'created': time.time(), 'response': data})
+        return data, False
+
+    def _deduplicate(self, links: list[str]) -> list[str]:
+        seen = set()
+        unique = []
+        for link in links:
+            canonical = canonicalise_url(link)
+            if canonical not in seen:
+                seen.add(canonical)
+                unique.append(link)
+        self.stats.duplicates = len(links) - len(unique)
+        return unique
+
+    def _exclude_processed(self, links: list[str]) -> list[str]:
+        summarised = SummaryRespositoryFacade(self.output_location).exists_many(links)
+        embedded = EmbeddingRespositoryFacade(self.output_location).exists_many(links)
+        remaining = [link for link, summary, embedding in zip(links, summarised, embedded)
+                     if not (summary and embedding)]
+        self.stats.processed = len(links) - len(remaining)
+        return remaining
@@ -34,6 +34,8 @@ class PipelineItem(Freezable):
         self.embedding = None
         self.cluster = None
         self.length_minutes = 0
+        # Where each caption segment of a transcript starts, a TranscriptSegments. None if unknown.
+        self.segments = None
 
         self._freeze()
 
@@ -111,6 +113,33 @@ class PipelineSpec(Freezable):
         self.output_chart_name = None
         self.output_data_name = None
         self.themes = None
+        # Number of items each stage processes concurrently. 1 = serial.
+        self.download_workers = 1
+        self.summarise_workers = 1
+        self.suppress_workers = 1
+        self.embed_workers = 1
+        # Number of theme description and embedding requests in flight at once. 1 = serial.
+        self.theme_workers = 4
+        # Estimated tokens of member summaries sent to find each theme.
+        self.theme_input_tokens = 16000
+        # Number of texts sent per embedding request. 1 = one request per item.
+        self.embed_batch_size = 1
+        # Clustering engine, see cluster_analyser.ENGINES, and seed so runs can be repeated.
+        self.cluster_engine = 'auto'
+        self.cluster_random_state = 42
+        # If set, the number of clusters is chosen between clusters and max_clusters,
+        # and clusters is updated to the choice.
+        self.max_clusters = None
+        # Keep clusters and themes from the last run in the output location, assign new items to
+        # the saved clusters, and only find new themes for clusters whose members changed by more
+        # than retheme_threshold.
+        self.incremental_clusters = False
+        self.retheme_threshold = 0.2
+        # Keep text, summaries and embeddings in one SQLite file rather than one file each.
+        self.use_sqlite_repository = False
+        # How embeddings are stored in the output data file, see record_stream.EMBEDDING_FORMATS.
+        # An output_data_name ending in '.jsonl' is written as JSON Lines.
+        self.output_embedding_format = 'base64'
 
 
 class WebSearchPipelineSpec(PipelineSpec):
@@ -126,6 +155,10 @@ class WebSearchPipelineSpec(PipelineSpec):
         self.search_key = None
         self.query_additions = None
         self.mail_to = None
+        # Seconds search responses are reused for the same query, engine and date window. 0 = no cache.
+        self.search_cache_seconds = 24 * 60 * 60
+        # Leave out results whose summary and embedding are already in the local repositories.
+        self.exclude_processed = False
 
         self._freeze()
 
@@ -140,6 +173,9 @@ class YouTubePipelineSpec(Freezable):
         self.playlists = []
         self.max_words = 3500 # This seems to come out at about 15 minutes of video
         self.overlap_words = 100
+        # How transcripts are chunked, see chunker.CHUNK_ENGINES. The local engines give the same
+        # chunks as the remote Chunk API without sending each transcript to it.
+        self.chunk_engine = 'remote'
 
         self._freeze()
 
@@ -177,6 +213,9 @@ class PipelineFileSpec(Freezable):
         Freeze the object to prevent adding spurious variables.
         '''
         self.output_data_name = None
+        # How embeddings are stored in the output data file, see record_stream.EMBEDDING_FORMATS.
+        # Plain floats by default, as the Boxer output is read by other tools.
+        self.output_embedding_format = 'floats'
         self.description = None
 
         self._freeze()
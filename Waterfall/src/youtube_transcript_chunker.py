@@ -3,11 +3,12 @@
 
 # Standard Library Imports
 import math
+import re
 import logging
 import datetime
 
 from src.workflow import PipelineItem, PipelineStep
-from src.chunker import Chunker
+from src.chunker import Chunker, CHUNK_ENGINE_REMOTE
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -16,6 +17,12 @@ logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
 
+# Characters from the start of a chunk looked for in the transcript to find where the chunk starts
+FIND_CHARS = 64
+
+_WORD_START = re.compile(r'\S+')
+
+
 def make_start_time_offset(minutes: int) -> str:
 
     hours = math.floor(minutes / 60)
@@ -27,22 +34,86 @@ def make_start_time_offset(minutes: int) -> str:
     return '&t=' + time_marker.strftime("%Mm")
 
 
+def make_start_time_offset_seconds(seconds: float) -> str:
+    '''
+    Returns the URL parameter to start a video at a number of seconds, e.g. '&t=01h02m03s'.
+    '''
+    hours, remainder = divmod(int(seconds), 60 * 60)
+    minutes, seconds_left = divmod(remainder, 60)
+    if hours > 0:
+        return f'&t={hours:02d}h{minutes:02d}m{seconds_left:02d}s'
+    return f'&t={minutes:02d}m{seconds_left:02d}s'
+
+
+def _tail_length(chunk: str, words: int) -> int:
+    # Characters taken by the last 'words' words of a chunk, with the white space before them
+    if words <= 0:
+        return 0
+    starts = [match.start() for match in _WORD_START.finditer(chunk)]
+    if len(starts) <= words:
+        return len(chunk)
+    return len(chunk) - starts[-words]
+
+
+def find_chunk_offsets(text: str, chunks: list[str], overlap_words: int = 0) -> list[int]:
+    '''
+    Finds where each chunk starts in the text it was cut from. Each chunk starts where the one before
+    ends, less the words it repeats from that one: at most twice the overlap, as the Chunk API cuts
+    overlapping chunks from pieces of that size. So each is looked for from there, not from the start
+    of the chunk before, where a phrase the transcript repeats could match first. If it is not found
+    from there, for example if the chunking service changed its text, it is looked for after the
+    start of the chunk before, and failing that is given the start of the chunk before.
+
+    Parameters:
+        text (str): The whole text.
+        chunks (list[str]): The text of each chunk, in order.
+        overlap_words (int): The overlap the chunks were cut with.
+
+    Returns:
+        list[int]: The character offset in the text where each chunk starts.
+    '''
+    offsets = []
+    previous = 0
+    position = 0
+    for chunk in chunks:
+        stripped = chunk.lstrip()
+        prefix = stripped[:FIND_CHARS]
+        found = text.find(prefix, position) if stripped else -1
+        if found == -1 and stripped and offsets:
+            found = text.find(prefix, previous + 1)
+        if found == -1:
+            logger.debug('Chunk not found in transcript after offset %d', previous)
+            offsets.append(previous)
+            continue
+        offsets.append(found)
+        previous = found
+        position = max(found + 1, found + len(stripped) - _tail_length(stripped, overlap_words * 2))
+    return offsets
+
+
 class YouTubeTranscriptChunker (PipelineStep):
     '''
     Utility class to chunk a transcript for a YouTube video
     '''
 
-    def __init__(self, output_location: str):
+    def __init__(self, output_location: str, engine: str = CHUNK_ENGINE_REMOTE):
         '''
         Initializes the YouTubeTranscriptChunker object.
+
+        Parameters:
+            output_location (str): The location where the output will be stored.
+            engine (str): How the transcript is chunked, one of chunker.CHUNK_ENGINES.
         '''
-        # pylint: disable-next=useless-parent-delegation
         super(YouTubeTranscriptChunker, self).__init__(output_location)
-        self.chunker = Chunker(output_location)
+        self.chunker = Chunker(output_location, engine)
 
     def chunk(self, pipeline_item: PipelineItem, chunk_size_words: int, overlap_words: int) -> list[PipelineItem]:
         '''
          Divides the transcript of the specific video into chunks and new PipelineItems.
+         Each chunk's path links to where it starts in the video. If the item has its caption segments,
+         see YouTubeTranscriptDownloader, that is the start of the segment holding the first
+         character of the chunk, which the local chunk engines give exactly and which is otherwise
+         found in the transcript. If not, it is estimated from the length of the video.
 
          Parameters:
             pipeline_item: PipelineItem - The item to be chunked.
@@ -51,7 +122,7 @@ class YouTubeTranscriptChunker (PipelineStep):
          Returns:
              list[PipelineItem]: The chunks of the Video transcript.
         '''
-        chunks = self.chunker.chunk(
+        chunks, offsets = self.chunker.chunk_with_offsets(
             pipeline_item, chunk_size_words, overlap_words)
 
         # special case if we only have one chunk
@@ -62,6 +133,15 @@ class YouTubeTranscriptChunker (PipelineStep):
         if number_of_chunks == 0:
             return None
 
+        segments = pipeline_item.segments
+        if segments is not None and len(segments) > 0:
+            if offsets is None:
+                offsets = find_chunk_offsets(pipeline_item.text, [chunk.text for chunk in chunks],
+                                             overlap_words)
+            for chunk, offset in zip(chunks, offsets):
+                chunk.path = chunk.path + make_start_time_offset_seconds(segments.start_seconds(offset))
+            return chunks
+
         # linear interpolation by chunk size after correction for overlap
         # this assumes text is evenly spread throughout the video, but this seems ok for lectures / presentations
         original_length = len(pipeline_item.text)
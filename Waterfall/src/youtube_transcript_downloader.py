@@ -3,12 +3,15 @@
 
 # Standard Library Imports
 import logging
+import re
 from urllib.parse import urlparse, parse_qs
 from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
 # from youtube_transcript_api.formatters import WebVTTFormatter
 
 from src.workflow import PipelineStep, PipelineItem
 from src.text_repository_facade import TextRespositoryFacade
+from src.step_cache import StepCache, open_cache
+from src.transcript_segments import TranscriptSegments
 
 # Set up logging to display information about the execution of the script
 logging.basicConfig(level=logging.WARNING,
@@ -16,16 +19,52 @@ logging.basicConfig(level=logging.WARNING,
 logger = logging.getLogger(__name__)
 logging.getLogger().setLevel(logging.WARNING)
 
+STEP_NAME = 'download_youtube'
+# Segment offsets are cached under their own key, next to the transcript text
+SEGMENTS_STEP_NAME = 'download_youtube_segments'
+
+# Everything clean_text changes, matched in one pass. Runs of spaces and new lines become one
+# space, and markers are removed along with the white space after them.
+_CLEAN_PATTERN = re.compile(r'[ \n]+|&#39;|(?:>>|\[inaudible\])[ \n]*')
+
 
 def clean_text(text: str) -> str:
-    """clean the text"""
-    text = text.replace("\n", " ")  # remove new lines
-    text = text.replace("&#39;", "'")
-    text = text.replace(">>", "")  # remove '>>'
-    text = text.replace("  ", " ")  # remove double spaces
-    text = text.replace("[inaudible]", "")  # [inaudible]
+    """clean the text: new lines and repeated spaces become one space, '&#39;' becomes a quote,
+    and '>>' and '[inaudible]' are removed"""
+    return _CLEAN_PATTERN.sub(_clean_match, text)
+
+
+def _clean_match(match: re.Match) -> str:
+    first = match.group()[0]
+    if first in ' \n':
+        return ' '
+    return "'" if first == '&' else ''
+
 
-    return text
+def assemble_transcript(transcript: list[dict]) -> tuple[str, TranscriptSegments]:
+    """
+    Joins the cleaned text of each caption segment, with a space between segments, in time linear in
+    the length of the transcript.
+
+    Parameters:
+        transcript (list[dict]): Caption segments, each with 'text' and 'start' in seconds.
+
+    Returns:
+        tuple[str, TranscriptSegments]: The text, and where each segment with any text starts in it.
+    """
+    parts = []
+    segments = TranscriptSegments()
+    position = 0
+    for item in transcript:
+        text = clean_text(item["text"]).strip()
+        if not text:
+            continue
+        if parts:
+            position = position + 1
+        segments.append(position, float(item.get("start", 0.0)))
+        parts.append(text)
+        position = position + len(text)
+    return ' '.join(parts), segments
 
 
 def parse_video_id(value: str) -> str:
@@ -69,26 +108,32 @@ class YouTubeTranscriptDownloader (PipelineStep):
     def download(self, pipeline_item: PipelineItem) -> PipelineItem:
         '''
          Downloads the transcript of the specific video and saves it to the output location.
+         Transcripts are cached, and fetched again once the cache entry expires.
 
          Returns:
              PipelineItem: The content of the downloaded Video transcript.
         '''
         path = pipeline_item.path
         repository = TextRespositoryFacade(self.output_location)
-        if repository.exists(path):
-            text = repository.load(path)
+        cache = open_cache(self.output_location)
+        key = StepCache.make_key(STEP_NAME, '', path)
+        segments_key = StepCache.make_key(SEGMENTS_STEP_NAME, '', path)
+        text = cache.get(STEP_NAME, key)
+        if text is not None:
             pipeline_item.text = text
+            segments = cache.get(SEGMENTS_STEP_NAME, segments_key)
+            if segments is not None:
+                pipeline_item.segments = TranscriptSegments.from_json(segments)
             return pipeline_item
 
+        full_text = ""
+        segments = None
         try:
-            full_text = ""
             video_id = parse_video_id(pipeline_item.path)
             if not video_id:
                 raise RuntimeError ("Unable to parse video id")
             transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            # Remove \n from the text
-            for item in transcript:
-                full_text = full_text + clean_text(item["text"])
+            full_text, segments = assemble_transcript(transcript)
 
         except NoTranscriptFound:
             logger.error("No transcript found for video: %s", path)
@@ -102,9 +147,13 @@ class YouTubeTranscriptDownloader (PipelineStep):
         # pylint: disable-broad-exception-caught
         except Exception as exception:
             logger.error("An error occurred: %s", str(exception))
-            logger.v("Transcription not found for video: %s", path)
+            logger.error("Transcription not found for video: %s", path)
 
         pipeline_item.text = full_text
+        pipeline_item.segments = segments
+        cache.put(STEP_NAME, key, full_text)
+        if segments is not None:
+            cache.put(SEGMENTS_STEP_NAME, segments_key, segments.to_json())
         repository.save(path, full_text)
 
         return pipeline_item
@@ -0,0 +1,98 @@
+''' Local web server for tests that fetch pages, serving the .html fixtures in this directory '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import time
+import hashlib
+import threading
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+FIXTURE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class HtmlTestHandler(BaseHTTPRequestHandler):
+    ''' Serves /<name>.html from server.directory, with an ETag and Last-Modified, and 304s for conditional GETs '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        server = self.server
+        name = os.path.basename(urlparse(self.path).path)
+        file_name = os.path.join(server.directory, name)
+
+        with server.lock:
+            server.requests[name] += 1
+            server.active = server.active + 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if server.delay:
+                time.sleep(server.delay)
+
+            if not name.endswith('.html') or not os.path.isfile(file_name):
+                self._send(404, b'')
+                return
+
+            with open(file_name, 'rb') as file:
+                body = file.read()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                with server.lock:
+                    server.not_modified[name] += 1
+                self._send(304, b'', etag)
+            else:
+                self._send(200, body, etag)
+        finally:
+            with server.lock:
+                server.active = server.active - 1
+
+    def _send(self, status: int, body: bytes, etag: str = None) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(self.server.modified, usegmt=True))
+        if status != 304:
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+class HtmlTestServer(ThreadingHTTPServer):
+    '''
+    Local server for the .html fixtures. Counts requests, and 304 replies, per file name,
+    and records the most requests it has handled at once.
+
+    Attributes:
+        delay (float): Seconds to wait before answering each request.
+    '''
+
+    def __init__(self, directory: str = FIXTURE_DIRECTORY, delay: float = 0.0):
+        super().__init__(('127.0.0.1', 0), HtmlTestHandler)
+        self.directory = directory
+        self.delay = delay
+        self.modified = time.time()
+        self.requests: Counter = Counter()
+        self.not_modified: Counter = Counter()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.base_url = f'http://127.0.0.1:{self.server_address[1]}'
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        ''' Returns the URL of a fixture, e.g. url('one.html') '''
+        return self.base_url + '/' + name
+
+    def start(self) -> 'HtmlTestServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
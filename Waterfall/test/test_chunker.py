@@ -19,7 +19,8 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.chunker import Chunker
+from src.chunker import Chunker, CHUNK_ENGINE_TOKENS, CHUNK_ENGINE_WORDS
+from src.local_chunker import chunk_text, chunk_offsets, UNIT_WORDS
 from src.html_file_downloader import HtmlFileDownloader
 
 # Fixture to create a temporary directory for test output
@@ -143,4 +144,100 @@ def test_long_overlap (test_output_dir):
     start_point = chunk_1.find (last_block)
     test_depth = (overlap_words * chars_per_word * 4)
 
-    assert  start_point < test_depth
\ No newline at end of file
+    assert  start_point < test_depth
+
+def make_long_text ():
+    long_text = "this is going to be long "
+    for i in range (15):
+       long_text = long_text + long_text
+    return long_text
+
+def download_simple_test (test_output_location):
+    test_root = os.path.dirname(__file__)
+    os.chdir (test_root)
+    pipeline_item = PipelineItem()
+    pipeline_item.path = 'simple_test.html'
+    return HtmlFileDownloader (test_output_location).download (pipeline_item)
+
+OVERLAP_TEXT = "this is going to be long but also needs to be long enough so we can see overlap errors when degugging and also needs to be more than 20 words"
+
+def chunk_words (chunks):
+    # The words of each chunk, so chunks compare by where they break, not by the white space kept at a break
+    return [chunk.text.split() for chunk in chunks]
+
+@pytest.mark.parametrize ('fixture, chunk_size, overlap', [('simple', 0, 0), ('long', 0, 0),
+                                                          ('long', 0, 1024), ('overlap', 20, 5)])
+def test_local_matches_remote (test_output_dir, fixture, chunk_size, overlap):
+    enriched_text = download_simple_test (test_output_dir)
+    if fixture == 'long':
+        enriched_text.text = make_long_text()
+    elif fixture == 'overlap':
+        enriched_text.text = OVERLAP_TEXT + OVERLAP_TEXT
+
+    remote = Chunker (test_output_dir).chunk (enriched_text, chunk_size, overlap)
+    local = Chunker (test_output_dir, CHUNK_ENGINE_TOKENS).chunk (enriched_text, chunk_size, overlap)
+
+    assert len(remote) > 0
+    assert chunk_words (local) == chunk_words (remote)
+
+@pytest.mark.parametrize ('engine', [CHUNK_ENGINE_WORDS, CHUNK_ENGINE_TOKENS])
+def test_local_with_output (test_output_dir, engine):
+    enriched_text = download_simple_test (test_output_dir)
+
+    chunks = Chunker (test_output_dir, engine).chunk (enriched_text, 0, 0)
+
+    assert len(chunks) == 1
+    assert chunks[0].text == enriched_text.text
+    assert chunks[0].path == enriched_text.path and chunks[0].chunk == 0
+
+@pytest.mark.parametrize ('engine', [CHUNK_ENGINE_WORDS, CHUNK_ENGINE_TOKENS])
+def test_local_long (test_output_dir, engine):
+    enriched_text = download_simple_test (test_output_dir)
+    enriched_text.text = make_long_text()
+
+    chunker = Chunker (test_output_dir, engine)
+    chunks = chunker.chunk (enriched_text, 0, 0)
+    chunks_overlapped = chunker.chunk (enriched_text, 0, 1024)
+
+    assert len(chunks) > 1
+    assert len(chunks_overlapped) > len (chunks)
+    # Without overlap, the chunks are the text cut in pieces
+    assert ''.join (chunk.text for chunk in chunks) == enriched_text.text
+
+@pytest.mark.parametrize ('engine', [CHUNK_ENGINE_WORDS, CHUNK_ENGINE_TOKENS])
+def test_local_long_overlap (test_output_dir, engine):
+    enriched_text = download_simple_test (test_output_dir)
+    long_text = "this is going to be long but also needs to be long enough so we can see overlap errors when degugging and also needs to be more than 20 words"
+    enriched_text.text = long_text + long_text
+    chunk_words = 20
+    overlap_words = 5
+    chars_per_word = 4
+
+    chunks_overlapped = Chunker (test_output_dir, engine).chunk (enriched_text, chunk_words, overlap_words)
+
+    chunk_0 = chunks_overlapped[0].text
+    chunk_1 = chunks_overlapped[1].text
+    last_block = chunk_0[len(chunk_0)-(overlap_words * chars_per_word):]
+    assert chunk_1.find (last_block) < overlap_words * chars_per_word * 4
+
+def test_local_boundaries ():
+    # Pieces of twice the overlap are glued together while they fit, as the Chunk API does
+    text = 'a b c d e f g h i j'
+    assert chunk_text (text, 4, 0, UNIT_WORDS) == ['a b c d', ' e f g h', ' i j']
+    assert chunk_text (text, 4, 1, UNIT_WORDS) == ['a b', 'a b c d', ' c d e f', ' e f g h', ' g h i j']
+    assert chunk_text (text, 5, 1, UNIT_WORDS) == ['a b c d', ' c d e f', ' e f g h', ' g h i j']
+    assert list (chunk_offsets ('  one two  ', 1, 0, UNIT_WORDS)) == [(0, 5), (5, 11)]
+    assert chunk_text ('', 4, 1, UNIT_WORDS) == []
+
+    with pytest.raises (ValueError):
+        chunk_text (text, 4, 5, UNIT_WORDS)
+    with pytest.raises (ValueError):
+        Chunker ('output', 'sentences')
+
+def test_local_sizes ():
+    text = make_long_text()
+    for size, overlap in [(100, 0), (100, 10), (7, 1)]:
+        chunks = chunk_text (text, size, overlap, UNIT_WORDS)
+        assert all (len (chunk.split()) <= size for chunk in chunks)
+        assert chunks[0].startswith ('this is going')
+        assert text.endswith (chunks[-1])
@@ -5,7 +5,10 @@ import pytest
 import os
 import shutil
 import sys
+import time
 import logging
+import multiprocessing
+import numpy as np
 
 # Set paths tp find the 'src' directory
 test_root = os.path.dirname(__file__)
@@ -19,7 +22,9 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.cluster_analyser import ClusterAnalyser
+from src import cluster_analyser
+from src.cluster_analyser import (ClusterAnalyser, make_embedding_matrix, choose_cluster_count,
+                                  ENGINE_KMEANS, ENGINE_MINI_BATCH, ENGINE_AUTO)
 from src.html_file_downloader import HtmlFileDownloader
 from src.summariser import Summariser
 from src.embedder import Embedder
@@ -76,4 +81,140 @@ def test_with_output (test_output_dir):
     cluster_analyser = ClusterAnalyser (test_output_location, 2) 
     cluster_labels = cluster_analyser.analyse (items)
 
-    assert len(cluster_labels) == len (items)
\ No newline at end of file
+    assert len(cluster_labels) == len (items)
+
+
+def make_blobs (count: int, clusters: int = 3, dimensions: int = 16) -> list[PipelineItem]:
+    rng = np.random.default_rng (0)
+    centres = rng.normal (size=(clusters, dimensions)) * 10
+    items = []
+    for i in range (count):
+        item = PipelineItem ()
+        item.path = 'https://example.com/' + str(i)
+        item.embedding = (centres[i % clusters] + rng.normal (size=dimensions)).tolist ()
+        items.append (item)
+    return items
+
+def same_partition (items: list[PipelineItem], clusters: int = 3) -> bool:
+    # Blob i % clusters should map to one label, whatever the numbering
+    labels = {}
+    for i, item in enumerate (items):
+        if labels.setdefault (i % clusters, item.cluster) != item.cluster:
+            return False
+    return len(set(labels.values())) == clusters
+
+def test_matrix ():
+    items = make_blobs (10)
+    matrix = make_embedding_matrix (items)
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (10, 16)
+
+@pytest.mark.parametrize ('engine', [ENGINE_KMEANS, ENGINE_MINI_BATCH, ENGINE_AUTO])
+def test_engines (test_output_dir, engine):
+    analyser = ClusterAnalyser (test_output_dir, 3, engine=engine)
+    items = analyser.analyse (make_blobs (300))
+
+    assert same_partition (items)
+    assert analyser.stats.items == 300
+    assert analyser.stats.inertia > 0
+    assert analyser.stats.seconds > 0
+
+def test_reproducible (test_output_dir):
+    first = [item.cluster for item in ClusterAnalyser (test_output_dir, 5).analyse (make_blobs (200, 8))]
+    second = [item.cluster for item in ClusterAnalyser (test_output_dir, 5).analyse (make_blobs (200, 8))]
+
+    assert first == second
+
+def test_unknown_engine (test_output_dir):
+    with pytest.raises (ValueError):
+        ClusterAnalyser (test_output_dir, 2, engine='dbscan')
+
+def test_partial_fit (test_output_dir):
+    analyser = ClusterAnalyser (test_output_dir, 3)
+    items = make_blobs (3000)
+
+    for start in range (0, 3000, 500):
+        analyser.partial_fit (items[start:start + 500])
+
+    assert analyser.stats.items == 3000
+    assert analyser.stats.engine == ENGINE_MINI_BATCH
+    assert same_partition (analyser.predict (items))
+
+def test_predict_unfitted (test_output_dir):
+    with pytest.raises (RuntimeError):
+        ClusterAnalyser (test_output_dir, 2).predict (make_blobs (4))
+
+def test_speed (test_output_dir, record_property):
+    items = make_blobs (20000, 10, 256)
+
+    full = ClusterAnalyser (test_output_dir, 10, engine=ENGINE_KMEANS)
+    full.analyse (items)
+    mini_batch = ClusterAnalyser (test_output_dir, 10, engine=ENGINE_MINI_BATCH)
+    mini_batch.analyse (items)
+
+    # Timings go to the test report (e.g. --junitxml) rather than being asserted
+    record_property ('kmeans_seconds', full.stats.seconds)
+    record_property ('minibatch_seconds', mini_batch.stats.seconds)
+    assert same_partition (items, 10)
+
+def test_choose_cluster_count ():
+    embeddings = make_embedding_matrix (make_blobs (600, 5))
+
+    serial, serial_scores = choose_cluster_count (embeddings, 2, 8, workers=1)
+    parallel, parallel_scores = choose_cluster_count (embeddings, 2, 8, workers=4)
+
+    assert serial == parallel == 5
+    assert sorted (serial_scores) == list (range (2, 9))
+    assert serial_scores == pytest.approx (parallel_scores)
+
+def test_choose_cluster_count_spawn (monkeypatch):
+    # As on Windows, where there is no forkserver
+    monkeypatch.setattr (multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+    embeddings = make_embedding_matrix (make_blobs (300, 3))
+
+    assert choose_cluster_count (embeddings, 2, 5, workers=2)[0] == 3
+
+def test_choose_cluster_count_no_pool (monkeypatch):
+    def fail (*args, **kwargs):
+        raise OSError ('no semaphores')
+    monkeypatch.setattr (cluster_analyser, 'ProcessPoolExecutor', fail)
+    embeddings = make_embedding_matrix (make_blobs (300, 3))
+
+    best, scores = choose_cluster_count (embeddings, 2, 5, workers=2)
+
+    assert best == 3
+    assert sorted (scores) == [2, 3, 4, 5]
+
+def test_choose_cluster_count_few_items ():
+    embeddings = make_embedding_matrix (make_blobs (4))
+
+    assert choose_cluster_count (embeddings, 2, 10, workers=1)[0] in (2, 3)
+    with pytest.raises (ValueError):
+        choose_cluster_count (embeddings[:2], 2, 10)
+
+def test_auto_clusters (test_output_dir):
+    analyser = ClusterAnalyser (test_output_dir, 2, max_clusters=8, sweep_workers=2)
+    items = analyser.analyse (make_blobs (600, 4))
+
+    assert analyser.clusters == 4
+    assert same_partition (items, 4)
+    assert len(analyser.stats.scores) == 7
+
+def test_auto_clusters_cost (test_output_dir, record_property):
+    items = make_blobs (20000, 6, 256)
+
+    single = ClusterAnalyser (test_output_dir, 6)
+    single.analyse (items)
+    auto = ClusterAnalyser (test_output_dir, 2, max_clusters=10)
+    start = time.perf_counter ()
+    auto.analyse (items)
+    elapsed = time.perf_counter () - start
+
+    # Wall clock time depends on the machine and its load, so the cost of the sweep is
+    # reported, not asserted
+    record_property ('single_fit_seconds', single.stats.seconds)
+    record_property ('sweep_seconds', auto.stats.sweep_seconds)
+    record_property ('auto_to_single_ratio', elapsed / single.stats.seconds)
+    assert auto.clusters == 6
+    assert auto.stats.sweep_seconds > 0
@@ -0,0 +1,103 @@
+''' Tests for the cluster state kept between incremental runs '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import shutil
+import sys
+import logging
+import numpy as np
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.workflow import PipelineItem, Theme
+from src.cluster_state import ClusterState, ClusterTheme, THEMES_FILE_NAME
+from src.cluster_analyser import ClusterAnalyser, ENGINE_CENTROIDS
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_state")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def make_item (path: str, cluster: int, embedding: list[float]) -> PipelineItem:
+    item = PipelineItem ()
+    item.path = path
+    item.cluster = cluster
+    item.embedding = embedding
+    return item
+
+def make_state () -> tuple[list[PipelineItem], list[Theme]]:
+    items = [make_item ('a', 0, [1.0, 0.0]), make_item ('b', 0, [3.0, 0.0]), make_item ('c', 2, [0.0, 4.0])]
+    theme = Theme ()
+    theme.short_description = 'Short'
+    theme.long_description = 'Long\n\nThere are 2 members in this cluster.'
+    theme.member_pipeline_items = items[:2]
+    theme.example_pipeline_items = items[1:2]
+    return items, [theme]
+
+def test_build ():
+    items, themes = make_state ()
+    state = ClusterState.build (items, themes, 3)
+
+    assert state.clusters == 3
+    assert state.centroids.tolist () == [[2.0, 0.0], [0.0, 0.0], [0.0, 4.0]]
+    assert state.themes[0].short_description == 'Short'
+    assert state.themes[0].example_path == 'b'
+    assert state.themes[0].member_paths == ['a', 'b']
+    assert state.themes[1].member_paths == []
+    assert state.themes[2].short_description is None
+
+def test_save_load (test_output_dir):
+    assert ClusterState.load (test_output_dir) is None
+
+    items, themes = make_state ()
+    ClusterState.build (items, themes, 3).save (test_output_dir)
+    state = ClusterState.load (test_output_dir)
+
+    assert state.centroids.dtype == np.float32
+    assert state.centroids.tolist () == [[2.0, 0.0], [0.0, 0.0], [0.0, 4.0]]
+    assert state.themes[0].long_description == 'Long\n\nThere are 2 members in this cluster.'
+    assert state.themes[2].member_paths == ['c']
+
+def test_load_broken (test_output_dir):
+    items, themes = make_state ()
+    ClusterState.build (items, themes, 3).save (test_output_dir)
+    with open (os.path.join (test_output_dir, THEMES_FILE_NAME), 'w', encoding='utf-8') as file:
+        file.write ('{')
+
+    assert ClusterState.load (test_output_dir) is None
+
+def test_changed_fraction ():
+    theme = ClusterTheme (member_paths=['a', 'b', 'c', 'd'])
+
+    assert theme.changed_fraction (['a', 'b', 'c', 'd']) == 0.0
+    assert theme.changed_fraction (['a', 'b', 'c', 'd', 'e']) == 0.25
+    assert theme.changed_fraction (['a', 'b', 'e']) == 0.75
+    assert ClusterTheme ().changed_fraction ([]) == 0.0
+    assert ClusterTheme ().changed_fraction (['a']) == 1.0
+
+def test_assign (test_output_dir):
+    analyser = ClusterAnalyser (test_output_dir, 2)
+    centroids = np.array ([[2.0, 0.0], [0.0, 0.0], [0.0, 4.0]], dtype=np.float32)
+    items = [make_item ('x', None, [1.8, 0.1]), make_item ('y', None, [0.1, 3.0]), make_item ('z', None, [0.2, 0.3])]
+
+    analyser.assign (items, centroids)
+
+    assert [item.cluster for item in items] == [0, 2, 1]
+    assert analyser.clusters == 3
+    assert analyser.stats.engine == ENGINE_CENTROIDS
+    assert analyser.stats.inertia == pytest.approx (0.05 + 1.01 + 0.13, rel=1e-5)
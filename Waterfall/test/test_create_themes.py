@@ -0,0 +1,186 @@
+''' Tests for concurrent theme creation, with the theme and embedding requests replaced by slow local functions '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import shutil
+import sys
+import time
+import random
+import logging
+import threading
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.workflow import PipelineItem
+from src.theme_finder import ThemeFinder
+from src.embedder import Embedder
+from src.waterfall_pipeline import WaterfallDataPipeline
+from src.cluster_analyser import ClusterAnalyser
+from src.cluster_state import ClusterState
+
+CLUSTERS = 8
+DELAY = 0.05
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_themes")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+@pytest.fixture
+def slow_requests(monkeypatch):
+    ''' Replaces the API calls with ones that take DELAY seconds, and counts the most in flight at once '''
+    state = {'in_flight': 0, 'most': 0}
+    lock = threading.Lock()
+
+    def request ():
+        with lock:
+            state['in_flight'] += 1
+            state['most'] = max (state['most'], state['in_flight'])
+        time.sleep (DELAY * random.random () * 2)
+        with lock:
+            state['in_flight'] -= 1
+
+    def find_theme (self, text: str, length: int) -> str:
+        request ()
+        return f'{length} words about {text.split()[0]}'
+
+    def embed (self, pipeline_item: PipelineItem) -> PipelineItem:
+        request ()
+        cluster = int(pipeline_item.text.split()[3].removeprefix ('Cluster'))
+        pipeline_item.embedding = [1.0 if i == cluster else 0.0 for i in range (CLUSTERS)]
+        return pipeline_item
+
+    monkeypatch.setattr (ThemeFinder, 'find_theme', find_theme)
+    monkeypatch.setattr (Embedder, 'embed', embed)
+    return state
+
+def make_items () -> list[PipelineItem]:
+    items = []
+    for cluster in range (CLUSTERS):
+        # Cluster sizes differ so the theme order is fixed
+        for i in range (cluster + 1):
+            item = PipelineItem ()
+            item.path = f'https://example.com/{cluster}/{i}'
+            item.summary = f'Cluster{cluster} item {i}'
+            item.cluster = cluster
+            item.embedding = [1.0 if j == cluster else 0.1 * i for j in range (CLUSTERS)]
+            items.append (item)
+    return items
+
+def test_order (test_output_dir, slow_requests):
+    pipeline = WaterfallDataPipeline (test_output_dir)
+
+    serial = pipeline.create_themes (make_items (), CLUSTERS, 1)
+    concurrent = pipeline.create_themes (make_items (), CLUSTERS, 8)
+
+    assert [theme.short_description for theme in serial] == \
+        [theme.short_description for theme in concurrent] == \
+        [f'15 words about Cluster{cluster}' for cluster in reversed (range (CLUSTERS))]
+    assert [theme.example_pipeline_items[0].path for theme in concurrent] == \
+        [f'https://example.com/{cluster}/0' for cluster in reversed (range (CLUSTERS))]
+    assert concurrent[0].long_description.endswith (f'There are {CLUSTERS} members in this cluster.')
+
+def test_limit (test_output_dir, slow_requests):
+    pipeline = WaterfallDataPipeline (test_output_dir)
+
+    pipeline.create_themes (make_items (), CLUSTERS, 3)
+
+    assert slow_requests['most'] == 3
+
+def test_concurrent (test_output_dir, slow_requests):
+    pipeline = WaterfallDataPipeline (test_output_dir)
+
+    pipeline.create_themes (make_items (), CLUSTERS, 1)
+    assert slow_requests['most'] == 1
+
+    slow_requests['most'] = 0
+    pipeline.create_themes (make_items (), CLUSTERS, 2 * CLUSTERS)
+    assert 1 < slow_requests['most'] <= 2 * CLUSTERS
+
+def test_budget (test_output_dir, monkeypatch):
+    texts = []
+
+    def find_theme (self, text: str, length: int) -> str:
+        texts.append (text)
+        return text.split()[0]
+
+    def embed (self, pipeline_item: PipelineItem) -> PipelineItem:
+        pipeline_item.embedding = [1.0, 0.0]
+        return pipeline_item
+
+    monkeypatch.setattr (ThemeFinder, 'find_theme', find_theme)
+    monkeypatch.setattr (Embedder, 'embed', embed)
+
+    items = []
+    for i in range (1000):
+        item = PipelineItem ()
+        item.path = f'https://example.com/{i}'
+        item.summary = f'Summary{i} ' + 'x' * 400
+        item.cluster = 0
+        item.embedding = [1.0, 0.001 * i]
+        items.append (item)
+
+    themes = WaterfallDataPipeline (test_output_dir).create_themes (items, 1, 2, max_tokens=1000)
+
+    assert all (len(text) <= 4000 for text in texts)
+    # Members near the middle of the spread are the most central
+    assert 400 < int(themes[0].short_description.removeprefix ('Summary')) < 500
+    assert len(themes[0].member_pipeline_items) == 1000
+
+def test_incremental (test_output_dir, monkeypatch):
+    described = []
+
+    def find_theme (self, text: str, length: int) -> str:
+        described.append (text.split()[0])
+        return f'{length} words about {text.split()[0]}'
+
+    def embed (self, pipeline_item: PipelineItem) -> PipelineItem:
+        pipeline_item.embedding = [1.0] + [0.0] * (CLUSTERS - 1)
+        return pipeline_item
+
+    monkeypatch.setattr (ThemeFinder, 'find_theme', find_theme)
+    monkeypatch.setattr (Embedder, 'embed', embed)
+    pipeline = WaterfallDataPipeline (test_output_dir)
+
+    items = make_items ()
+    first = pipeline.create_themes (items, CLUSTERS, 4)
+    previous = ClusterState.build (items, first, CLUSTERS)
+    assert len(described) == 2 * CLUSTERS
+
+    # One new member of the largest cluster is under the threshold, three new members of
+    # the smallest are over it
+    new_items = []
+    for cluster, count in ((CLUSTERS - 1, 1), (0, 3)):
+        for i in range (count):
+            item = PipelineItem ()
+            item.path = f'https://example.com/{cluster}/new{i}'
+            item.summary = f'Cluster{cluster} new item {i}'
+            item.embedding = [1.0 if j == cluster else 0.0 for j in range (CLUSTERS)]
+            new_items.append (item)
+    items = ClusterAnalyser (test_output_dir, CLUSTERS).assign (make_items () + new_items, previous.centroids)
+    described.clear ()
+
+    second = pipeline.create_themes (items, CLUSTERS, 4, previous=previous, threshold=0.2)
+
+    assert described == ['Cluster0', 'Cluster0']
+    assert len(second) == CLUSTERS
+    assert second[0].short_description == first[0].short_description
+    assert second[0].long_description.endswith (f'There are {CLUSTERS + 1} members in this cluster.')
+    assert second[0].example_pipeline_items[0].path == first[0].example_pipeline_items[0].path
+    rethemed = [theme for theme in second if theme.short_description == '15 words about Cluster0']
+    assert len(rethemed[0].member_pipeline_items) == 4
@@ -0,0 +1,104 @@
+''' Tests for the cached PCA + UMAP reduction used by the chart '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import shutil
+import sys
+import logging
+import numpy as np
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.dimension_reducer import DimensionReducer
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_reducer")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def make_embeddings (count: int, dimensions: int = 128) -> tuple[np.ndarray, list[str]]:
+    rng = np.random.default_rng (0)
+    centres = rng.normal (size=(4, dimensions)) * 5
+    embeddings = np.array ([centres[i % 4] + rng.normal (size=dimensions) for i in range (count)],
+                           dtype=np.float32)
+    return embeddings, ['https://example.com/' + str(i) for i in range (count)]
+
+def test_reduce (test_output_dir):
+    embeddings, keys = make_embeddings (200)
+    reducer = DimensionReducer (test_output_dir)
+
+    coordinates = reducer.reduce (embeddings, keys)
+
+    assert coordinates.shape == (200, 2)
+    assert coordinates.dtype == np.float32
+    assert not reducer.stats.cached
+    assert reducer.stats.pca_seconds > 0 and reducer.stats.umap_seconds > 0
+
+def test_deterministic ():
+    embeddings, keys = make_embeddings (100)
+
+    first = DimensionReducer ().reduce (embeddings, keys)
+    second = DimensionReducer ().reduce (embeddings, keys)
+
+    assert np.array_equal (first, second)
+
+def test_cached (test_output_dir):
+    embeddings, keys = make_embeddings (200)
+    first = DimensionReducer (test_output_dir).reduce (embeddings, keys)
+
+    reducer = DimensionReducer (test_output_dir)
+    second = reducer.reduce (embeddings, keys)
+
+    assert reducer.stats.cached
+    assert np.array_equal (first, second)
+
+    # A changed embedding is a different item set
+    embeddings[0, 0] += 1.0
+    reducer.reduce (embeddings, keys)
+    assert not reducer.stats.cached
+
+def test_incremental (test_output_dir):
+    embeddings, keys = make_embeddings (240)
+    first = DimensionReducer (test_output_dir).reduce (embeddings[:200], keys[:200])
+
+    reducer = DimensionReducer (test_output_dir)
+    second = reducer.reduce (embeddings, keys, incremental=True)
+
+    assert reducer.stats.transformed == 40
+    assert np.array_equal (second[:200], first)
+    assert np.isfinite (second[200:]).all ()
+
+def test_keeps_latest_only (test_output_dir):
+    embeddings, keys = make_embeddings (240)
+    reducer = DimensionReducer (test_output_dir)
+    reducer.reduce (embeddings[:200], keys[:200])
+    for count in (210, 220, 230):
+        reducer.reduce (embeddings[:count], keys[:count], incremental=True)
+
+    directory = os.path.join (test_output_dir, 'reduction')
+    assert sorted (os.listdir (directory)) == ['latest.npz', 'model.joblib']
+
+    # The last item set is still served from the cache
+    reducer.reduce (embeddings[:230], keys[:230])
+    assert reducer.stats.cached
+
+def test_transform_unfitted (test_output_dir):
+    embeddings, _ = make_embeddings (10)
+
+    with pytest.raises (RuntimeError):
+        DimensionReducer (test_output_dir).transform (embeddings)
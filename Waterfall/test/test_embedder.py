@@ -20,6 +20,7 @@ logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
 from src.embedder import Embedder
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
 from src.html_file_downloader import HtmlFileDownloader
 
 # Fixture to create a temporary directory for test output
@@ -52,4 +53,42 @@ def test_with_output (test_output_dir):
 
     embedder = Embedder (test_output_location)
     enriched_embedding : PipelineItem = embedder.embed (enriched_text)    
-    assert len(enriched_embedding.embedding) > 0  
\ No newline at end of file
+    assert len(enriched_embedding.embedding) > 0  
+
+
+def test_many_from_cache (test_output_dir):
+    test_output_location = test_output_dir
+
+    cache = open_cache (test_output_location)
+    pipeline_items = []
+    for i in range (5):
+        pipeline_item = PipelineItem()
+        pipeline_item.path = 'cached_' + str(i) + '.html'
+        pipeline_item.text = 'Text ' + str(i)
+        cache.put_embedding ('embed', StepCache.make_key ('embed', DEFAULT_MODEL, pipeline_item.text), [float(i), 1.0])
+        pipeline_items.append (pipeline_item)
+
+    embedder = Embedder (test_output_location)
+    embedded = embedder.embed_many (pipeline_items)
+
+    assert [item.path for item in embedded] == [item.path for item in pipeline_items]
+    assert [item.embedding[0] for item in embedded] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+def test_many_with_output (test_output_dir):
+    test_root = os.path.dirname(__file__)
+    os.chdir (test_root)
+    test_output_location = test_output_dir
+
+    downloader = HtmlFileDownloader (test_output_location)
+    pipeline_items = []
+    for test_path in ['simple_test.html', 'one.html', 'two.html']:
+        pipeline_item = PipelineItem()
+        pipeline_item.path = test_path
+        pipeline_items.append (downloader.download (pipeline_item))
+
+    embedder = Embedder (test_output_location)
+    embedded = embedder.embed_many (pipeline_items, max_items = 2)
+
+    assert len(embedded) == 3
+    for item in embedded:
+        assert len(item.embedding) > 0
@@ -6,6 +6,8 @@ import os
 import shutil
 import sys
 import logging
+import time
+import numpy as np
 
 test_root = os.path.dirname(__file__)
 parent= os.path.abspath(os.path.join(test_root, '..'))
@@ -18,7 +20,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.embedding_finder import EmbeddingFinder
+from src.embedding_finder import EmbeddingFinder, cosine_similarity
 from src.html_file_downloader import HtmlFileDownloader
 from src.summariser import Summariser
 from src.embedder import Embedder
@@ -72,4 +74,55 @@ def test_with_output (test_output_dir):
     embedding_finder = EmbeddingFinder (embeddings, test_output_dir) 
     found = embedding_finder.find_nearest (texts[0])
 
-    assert len(found) > 0 
\ No newline at end of file
+    assert len(found) > 0 
+
+
+def test_nearest_indices (test_output_dir):
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7], [-1.0, 0.0]]
+    finder = EmbeddingFinder (embeddings, test_output_dir)
+
+    assert finder.find_nearest_indices ([1.0, 0.1], 1) == [0]
+    assert finder.find_nearest_indices ([1.0, 0.1], 3) == [0, 2, 1]
+    assert finder.find_nearest_indices ([1.0, 0.1], 10) == [0, 2, 1, 3]
+
+
+def test_nearest_indices_batch (test_output_dir):
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]]
+    finder = EmbeddingFinder (embeddings, test_output_dir)
+
+    found = finder.find_nearest_indices_batch ([[0.0, 2.0], [3.0, 0.0], [1.0, 1.0]], 2)
+
+    assert found == [[1, 2], [0, 2], [2, 0]] or found == [[1, 2], [0, 2], [2, 1]]
+
+
+def test_zero_and_empty (test_output_dir):
+    finder = EmbeddingFinder ([[0.0, 0.0], [1.0, 0.0]], test_output_dir)
+    assert finder.find_nearest_indices ([1.0, 0.0], 1) == [1]
+
+    empty = EmbeddingFinder ([], test_output_dir)
+    assert empty.find_nearest_indices ([1.0, 0.0], 1) == []
+
+
+def test_matches_loop (test_output_dir):
+    rng = np.random.default_rng (7)
+    embeddings = rng.normal (size=(500, 64)).tolist()
+    queries = rng.normal (size=(20, 64)).tolist()
+    finder = EmbeddingFinder (embeddings, test_output_dir)
+
+    found = finder.find_nearest_indices_batch (queries, 1)
+    for query, indices in zip(queries, found):
+        expected = max (range(len(embeddings)), key=lambda i: cosine_similarity (embeddings[i], query))
+        assert indices == [expected]
+
+
+def test_large_cluster_speed (test_output_dir, record_property):
+    rng = np.random.default_rng (7)
+    embeddings = rng.normal (size=(20000, 1536)).astype (np.float32)
+    finder = EmbeddingFinder (embeddings, test_output_dir)
+
+    start = time.perf_counter ()
+    found = finder.find_nearest_indices_batch (embeddings[:100], 5)
+    elapsed = time.perf_counter () - start
+
+    record_property ('query_seconds', elapsed)
+    assert [indices[0] for indices in found] == list(range(100))
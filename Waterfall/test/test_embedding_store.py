@@ -0,0 +1,149 @@
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import pytest
+import os
+import shutil
+import sys
+import time
+import logging
+import numpy as np
+
+# Set paths tp find the 'src' directory
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.embedding_store import EmbeddingStore
+from src.embedder_repository_facade import EmbeddingRespositoryFacade
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_store")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def test_basic (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    assert store.output_location == test_output_dir
+    assert len(store) == 0
+    assert store.load_matrix().shape == (0, 0)
+
+def test_with_output (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save ('https://a.com/one', [0.0, 1.0])
+    store.save ('https://a.com/two', [2.0, 3.0])
+
+    assert store.exists ('https://a.com/one')
+    assert not store.exists ('https://a.com/three')
+    assert store.load ('https://a.com/two') == [2.0, 3.0]
+    assert store.row_of ('https://a.com/two') == 1
+
+def test_with_no_output (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    with pytest.raises (KeyError):
+        store.load ('https://a.com/missing')
+
+def test_reopen (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save_many (['one', 'two', 'three'], [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+
+    reopened = EmbeddingStore (test_output_dir)
+    assert reopened.keys() == ['one', 'two', 'three']
+    assert reopened.load ('three') == [3.0, 3.0]
+
+def test_overwrite (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save ('one', [1.0, 1.0])
+    store.save ('two', [2.0, 2.0])
+    store.save ('one', [5.0, 5.0])
+    store.save_many (['three', 'three'], [[3.0, 3.0], [4.0, 4.0]])
+
+    reopened = EmbeddingStore (test_output_dir)
+    assert len(reopened) == 3
+    assert reopened.load ('one') == [5.0, 5.0]
+    assert reopened.load ('three') == [4.0, 4.0]
+
+def test_dimension_mismatch (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save ('one', [1.0, 1.0])
+    with pytest.raises (ValueError):
+        store.save ('two', [1.0, 1.0, 1.0])
+
+def test_matrix_is_mapped (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save_many (['one', 'two'], np.array([[1.0, 2.0], [3.0, 4.0]]))
+
+    matrix = store.load_matrix ()
+    assert isinstance (matrix, np.memmap)
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (2, 2)
+    assert np.shares_memory (matrix, store.load_vector ('two'))
+
+    store.save ('three', [5.0, 6.0])
+    assert store.load_matrix ().shape == (3, 2)
+
+def test_orphan_row_trimmed (test_output_dir):
+    store = EmbeddingStore (test_output_dir)
+    store.save_many (['one', 'two'], [[1.0, 1.0], [2.0, 2.0]])
+
+    # Simulate a crash between writing the data row and its key
+    with open (os.path.join (test_output_dir, 'embeddings.f32'), 'ab') as file:
+        file.write (np.array ([9.0, 9.0], dtype=np.float32).tobytes())
+
+    reopened = EmbeddingStore (test_output_dir)
+    assert reopened.keys() == ['one', 'two']
+    reopened.save ('three', [3.0, 3.0])
+    assert reopened.load ('three') == [3.0, 3.0]
+
+def test_import_text_files (test_output_dir):
+    legacy_dir = os.path.join (test_output_dir, 'legacy')
+    os.makedirs (legacy_dir)
+    with open (os.path.join (legacy_dir, 'a.com_one.embed.txt'), 'w', encoding='utf-8') as file:
+        file.write ('"[0.5, 1.5]"')
+    with open (os.path.join (legacy_dir, 'a.com_two.embed.txt'), 'w', encoding='utf-8') as file:
+        file.write ('"[2.5, 3.5]"')
+    with open (os.path.join (legacy_dir, 'broken.embed.txt'), 'w', encoding='utf-8') as file:
+        file.write ('""')
+
+    store = EmbeddingStore (test_output_dir)
+    assert store.import_text_files (legacy_dir) == 2
+    assert store.load ('https://a.com/two') == [2.5, 3.5]
+    assert store.import_text_files (legacy_dir) == 0
+
+def test_facade_migrates_text_files (test_output_dir):
+    with open (os.path.join (test_output_dir, 'legacy.html.embed.txt'), 'w', encoding='utf-8') as file:
+        file.write ('"[0.5, 1.5]"')
+
+    repository = EmbeddingRespositoryFacade (test_output_dir)
+    assert repository.exists ('legacy.html')
+    assert not repository.store.exists ('legacy.html')
+    assert repository.load ('legacy.html') == [0.5, 1.5]
+    assert repository.store.exists ('legacy.html')
+    assert repository.list_contents () == ['legacy.html']
+
+def test_load_speed (test_output_dir, record_property):
+    items = 50000
+    dimension = 128
+    store = EmbeddingStore (test_output_dir)
+    matrix = np.random.default_rng(1).random ((items, dimension), dtype=np.float32)
+    store.save_many ([str(i) for i in range(items)], matrix)
+
+    start = time.perf_counter()
+    reopened = EmbeddingStore (test_output_dir)
+    loaded = reopened.load_matrix ()
+    elapsed = time.perf_counter() - start
+
+    record_property ('open_seconds', elapsed)
+    assert loaded.shape == (items, dimension)
+    assert np.array_equal (loaded[items - 1], matrix[items - 1])
@@ -0,0 +1,177 @@
+''' Tests for the HTML fetch engine, against a local server for the .html fixtures '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import time
+import logging
+import threading
+import pytest
+import aiohttp
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.html_fetcher import (HtmlFetcher, BrowserPool, needs_browser,
+                              ENGINE_HTTP, ENGINE_BROWSER, ENGINE_NOT_MODIFIED)
+from Waterfall.test.html_test_server import HtmlTestServer
+
+class FakeBrowser:
+    ''' Stands in for a WebDriver, rendering every page as a fixed paragraph '''
+    started = 0
+
+    def __init__(self):
+        FakeBrowser.started = FakeBrowser.started + 1
+        self.pages = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.pages.append (url)
+        self.page_source = '<html><body><p>Rendered ' + url + '</p></body></html>'
+
+    def quit(self):
+        self.quit_called = True
+
+@pytest.fixture
+def server():
+    html_server = HtmlTestServer().start()
+    yield html_server
+    html_server.stop()
+
+@pytest.fixture
+def fetcher():
+    FakeBrowser.started = 0
+    html_fetcher = HtmlFetcher (browser_pool=BrowserPool (1, FakeBrowser))
+    yield html_fetcher
+    html_fetcher.close()
+
+def test_needs_browser ():
+    with open (os.path.join (test_root, 'simple_test.html'), 'r', encoding='utf-8') as file:
+        assert not needs_browser (file.read())
+    with open (os.path.join (test_root, 'spa_test.html'), 'r', encoding='utf-8') as file:
+        assert needs_browser (file.read())
+    assert needs_browser ('<html><body><script>render()</script><p>Loading</p></body></html>')
+    assert not needs_browser ('<html><body><p>Short but static</p></body></html>')
+
+def test_fetch (server, fetcher):
+    result = fetcher.fetch (server.url ('simple_test.html'))
+
+    assert result.engine == ENGINE_HTTP
+    assert result.status == 200
+    assert 'Waterfall from Braid Technologies' in result.html
+    assert set (result.validators) == {'etag', 'last_modified'}
+    assert FakeBrowser.started == 0
+
+def test_conditional_get (server, fetcher):
+    first = fetcher.fetch (server.url ('one.html'))
+    second = fetcher.fetch (server.url ('one.html'), first.validators)
+
+    assert second.engine == ENGINE_NOT_MODIFIED
+    assert second.not_modified and second.html is None
+    assert server.requests['one.html'] == 2
+    assert server.not_modified['one.html'] == 1
+    assert fetcher.stats.http == 1 and fetcher.stats.not_modified == 1
+
+def test_browser_fallback (server, fetcher):
+    results = fetcher.fetch_many ([server.url ('spa_test.html'), server.url ('simple_test.html'),
+                                   server.url ('spa_test.html')])
+
+    assert [result.engine for result in results] == [ENGINE_BROWSER, ENGINE_HTTP, ENGINE_BROWSER]
+    assert results[0].html.find ('Rendered') != -1
+    # One browser, reused for both pages that needed it
+    assert FakeBrowser.started == 1
+    browser = fetcher.browser_pool._idle[0]
+    fetcher.close()
+    assert browser.quit_called
+
+def test_failures (server, fetcher):
+    with pytest.raises (aiohttp.ClientResponseError):
+        fetcher.fetch (server.url ('missing.html'))
+
+    results = fetcher.fetch_many ([server.url ('missing.html'), server.url ('two.html')])
+    assert results[0] is None
+    assert results[1].engine == ENGINE_HTTP
+    assert fetcher.stats.failed == 2
+
+def test_per_host_limit (fetcher):
+    slow_server = HtmlTestServer (delay=0.2).start()
+    try:
+        urls = [slow_server.url ('one.html')] * 4 + [slow_server.url ('two.html')] * 4
+        fetcher.connections_per_host = 2
+
+        results = fetcher.fetch_many (urls)
+    finally:
+        slow_server.stop()
+
+    assert all (result.engine == ENGINE_HTTP for result in results)
+    # Pages in flight together, but never more than the limit
+    assert slow_server.max_active == 2
+    assert sum (slow_server.requests.values()) == 8
+
+def test_threads (server, fetcher):
+    # Steps call fetch() from many worker threads at once, all sharing one loop and session
+    results = []
+    def fetch (name):
+        results.append (fetcher.fetch (server.url (name)).engine)
+
+    threads = [threading.Thread (target=fetch, args=(name,))
+               for name in ['one.html', 'two.html', 'three.html', 'simple_test.html'] * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [ENGINE_HTTP] * 12
+
+class FailingBrowser (FakeBrowser):
+    ''' A browser that holds the only slot in the pool for a moment, then fails '''
+    def get(self, url):
+        time.sleep (0.2)
+        raise RuntimeError ('browser crashed')
+
+def test_browser_failure_wakes_waiter ():
+    pool = BrowserPool (1, FailingBrowser)
+    errors = []
+    def load ():
+        try:
+            pool.get_page_source ('http://example.com/')
+        except RuntimeError as e:
+            errors.append (e)
+
+    threads = [threading.Thread (target=load, daemon=True) for _ in range (2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join (5)
+
+    # The second caller waited for the only slot, then started its own browser when the first failed
+    assert not any (thread.is_alive() for thread in threads)
+    assert len(errors) == 2
+    assert pool._drivers == []
+
+def test_close_wakes_waiter ():
+    pool = BrowserPool (1, FakeBrowser)
+    busy = pool._take()
+    pages = []
+    waiter = threading.Thread (target=lambda: pages.append (pool.get_page_source ('http://example.com/')),
+                               daemon=True)
+    waiter.start()
+    time.sleep (0.1)
+
+    pool.close()
+    waiter.join (5)
+
+    assert not waiter.is_alive()
+    assert 'Rendered' in pages[0]
+    assert busy.quit_called
+    # Given back after the close, so quit rather than reused
+    pool._give_back (busy)
+    assert pool._idle != [busy]
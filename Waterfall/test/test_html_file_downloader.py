@@ -18,7 +18,10 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.html_file_downloader import HtmlFileDownloader
+from src.html_file_downloader import HtmlFileDownloader, STEP_NAME
+from src.html_fetcher import HtmlFetcher, BrowserPool
+from src.step_cache import StepCache, open_cache
+from Waterfall.test.html_test_server import HtmlTestServer
 
 # Fixture to create a temporary directory for test output
 @pytest.fixture
@@ -62,3 +65,30 @@ def test_connected (test_output_dir):
     enriched : PipelineItem = downloader.download (pipeline_item) 
       
     assert len(enriched.text) > 0
+
+
+def test_local_server (test_output_dir):
+    server = HtmlTestServer().start()
+    fetcher = HtmlFetcher (browser_pool=BrowserPool (1, lambda: None))
+    try:
+        downloader = HtmlFileDownloader (test_output_dir, fetcher)
+        pipeline_item = PipelineItem()
+        pipeline_item.path = server.url ('simple_test.html')
+        path = pipeline_item.path
+
+        first = downloader.download (pipeline_item).text
+        cached = downloader.download (pipeline_item).text
+
+        # Once the text expires the page is asked for again, and comes back not modified
+        open_cache (test_output_dir).invalidate (StepCache.make_key (STEP_NAME, '', path))
+        refreshed = downloader.download (pipeline_item).text
+    finally:
+        fetcher.close()
+        server.stop()
+
+    assert first.find ('Waterfall from Braid Technologies') != -1
+    assert cached == first
+    assert refreshed == first
+    assert server.requests['simple_test.html'] == 2
+    assert server.not_modified['simple_test.html'] == 1
+
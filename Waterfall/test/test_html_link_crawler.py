@@ -18,7 +18,9 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.html_link_crawler import HtmlLinkCrawler
+from src.html_link_crawler import HtmlLinkCrawler, canonicalise_url
+from src.html_fetcher import HtmlFetcher, BrowserPool
+from Waterfall.test.html_test_server import HtmlTestServer
 
 # Fixture to create a temporary directory for test output
 @pytest.fixture
@@ -99,4 +101,82 @@ def test_mad_page(test_output_dir):
     pipeline_item = PipelineItem()
     pipeline_item.path = test_path
     links = crawler.crawl (pipeline_item)   
-    assert len(links) == 1   
\ No newline at end of file
+    assert len(links) == 1
+
+
+def make_site (directory, pages):
+    # Page i links to pages 2i+1 and 2i+2, back to the first page, to itself with a fragment,
+    # and to pages that must not be crawled
+    for i in range (pages):
+        links = [f'page_{child}.html' for child in (2 * i + 1, 2 * i + 2) if child < pages]
+        links = links + ['page_0.html', f'page_{i}.html#top', '/other/page.html',
+                         'https://example.com/', 'mailto:a@b.com', 'logo.png']
+        anchors = ''.join (f'<a href="{link}">Link</a>' for link in links)
+        with open (os.path.join (directory, f'page_{i}.html'), 'w', encoding='utf-8') as file:
+            file.write (f'<html><body><p>Page {i}</p>{anchors}</body></html>')
+
+def crawl_site (directory, max_depth=10, max_pages=None, delay=0.0):
+    server = HtmlTestServer (directory, delay).start()
+    fetcher = HtmlFetcher (connections_per_host=8, browser_pool=BrowserPool (1, lambda: None))
+    try:
+        crawler = HtmlLinkCrawler (directory, max_depth, max_pages, fetcher)
+        pipeline_item = PipelineItem()
+        # The server ignores directories, so the site appears to be under /site/ and /other/ is outside it
+        pipeline_item.path = server.url ('site/page_0.html')
+        items = crawler.crawl (pipeline_item)
+    finally:
+        fetcher.close()
+        server.stop()
+    return [os.path.basename (item.path) for item in items], server, crawler
+
+def test_canonicalise_url ():
+    assert canonicalise_url ('HTTPS://Site.com:443/docs/#intro') == 'https://site.com/docs'
+    assert canonicalise_url ('http://site.com:8080/a?b=1') == 'http://site.com:8080/a?b=1'
+    assert canonicalise_url ('https://site.com') == 'https://site.com/'
+    assert canonicalise_url ('./test/../one.html') == 'one.html'
+
+def test_local_server (test_output_dir):
+    server = HtmlTestServer().start()
+    fetcher = HtmlFetcher (browser_pool=BrowserPool (1, lambda: None))
+    try:
+        crawler = HtmlLinkCrawler (test_output_dir, 5, fetcher=fetcher)
+        pipeline_item = PipelineItem()
+        pipeline_item.path = server.url ('three.html')
+        links = crawler.crawl (pipeline_item)
+    finally:
+        fetcher.close()
+        server.stop()
+
+    assert [link.path for link in links] == [server.url ('three.html'), server.url ('two.html'), server.url ('one.html')]
+
+def test_breadth_first (test_output_dir):
+    make_site (test_output_dir, 31)
+    names, server, crawler = crawl_site (test_output_dir)
+
+    # Levels of the tree in order, each page fetched once
+    assert names == [f'page_{i}.html' for i in range (31)]
+    assert all (server.requests[name] == 1 for name in names)
+    assert 'page.html' not in server.requests and 'logo.png' not in server.requests
+    assert crawler.stats.pages == 31 and crawler.stats.depth == 4
+
+def test_limits (test_output_dir):
+    make_site (test_output_dir, 31)
+
+    names, server, crawler = crawl_site (test_output_dir, max_depth=2)
+    assert names == [f'page_{i}.html' for i in range (7)]
+
+    names, server, crawler = crawl_site (test_output_dir, max_pages=10)
+    assert names == [f'page_{i}.html' for i in range (10)]
+    assert crawler.stats.budget_reached
+    assert sum (server.requests.values()) == 10
+
+def test_crawl_concurrency (test_output_dir):
+    pages = 200
+    make_site (test_output_dir, pages)
+
+    names, server, crawler = crawl_site (test_output_dir, delay=0.02)
+
+    assert len(names) == pages
+    assert all (server.requests[name] == 1 for name in names)
+    # Pages of a level are fetched together, within the connection limit
+    assert 1 < server.max_active <= 8
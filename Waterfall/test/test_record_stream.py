@@ -0,0 +1,135 @@
+''' Tests for the streaming record writer and reader '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import shutil
+import sys
+import json
+import logging
+import pytest
+import numpy as np
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+import src.record_stream as record_stream
+from src.record_stream import (RecordWriter, write_records, read_records, sidecar_file_name,
+                               EMBEDDING_FLOATS, EMBEDDING_BASE64, EMBEDDING_NPY)
+from src.workflow import PipelineItem, Theme, WebSearchPipelineSpec
+from src.waterfall_pipeline_report_common import write_details_json
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_record_stream")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def make_records (count, width = 8):
+    rng = np.random.default_rng (1)
+    return [{'path': 'https://a.com/' + str(i),
+             'summary': 'Summary "' + str(i) + '" é',
+             'embedding': rng.standard_normal (width).astype (np.float32).tolist()} for i in range (count)]
+
+@pytest.mark.parametrize ('name', ['details.json', 'details.jsonl'])
+@pytest.mark.parametrize ('embedding_format', [EMBEDDING_FLOATS, EMBEDDING_BASE64, EMBEDDING_NPY])
+def test_round_trip (test_output_dir, name, embedding_format):
+    records = make_records (50)
+    file_name = os.path.join (test_output_dir, name)
+
+    assert write_records (file_name, records, embedding_format=embedding_format) == 50
+
+    assert list (read_records (file_name)) == records
+    assert os.path.exists (sidecar_file_name (file_name)) == (embedding_format == EMBEDDING_NPY)
+    assert [name for name in os.listdir (test_output_dir) if name.endswith ('.tmp')] == []
+
+def test_formats (test_output_dir):
+    file_name = os.path.join (test_output_dir, 'details.json')
+    write_records (file_name, make_records (3), embedding_format=EMBEDDING_NPY)
+    with open (file_name, 'r', encoding='utf-8') as file:
+        content = json.load (file)
+    assert [record['embedding'] for record in content] == [0, 1, 2]
+    assert np.load (sidecar_file_name (file_name)).shape == (3, 8)
+
+    lines_name = os.path.join (test_output_dir, 'details.jsonl')
+    write_records (lines_name, make_records (3))
+    with open (lines_name, 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    assert len(lines) == 3
+    assert isinstance (json.loads (lines[0])['embedding'], str)
+
+def test_read_json_dump (test_output_dir, monkeypatch):
+    # Files written by json.dump, indented or not, read the same, even across small read buffers
+    monkeypatch.setattr (record_stream, 'READ_CHUNK_SIZE', 7)
+    records = make_records (20)
+    for indent in (None, 4):
+        file_name = os.path.join (test_output_dir, f'dump_{indent}.json')
+        with open (file_name, 'w', encoding='utf-8') as file:
+            json.dump (records, file, indent=indent)
+        assert list (read_records (file_name)) == records
+
+    empty = os.path.join (test_output_dir, 'empty.json')
+    write_records (empty, [])
+    assert list (read_records (empty)) == []
+
+def test_failed_write (test_output_dir):
+    file_name = os.path.join (test_output_dir, 'details.json')
+    write_records (file_name, make_records (2))
+
+    with pytest.raises (ValueError):
+        with RecordWriter (file_name, embedding_format=EMBEDDING_NPY) as writer:
+            writer.write ({'embedding': [1.0, 2.0]})
+            writer.write ({'embedding': [1.0, 2.0, 3.0]})
+
+    assert list (read_records (file_name)) == make_records (2)
+    assert sorted (os.listdir (test_output_dir)) == ['details.json']
+    with pytest.raises (ValueError):
+        RecordWriter (file_name, embedding_format='text')
+
+def test_size (test_output_dir):
+    records = make_records (200, 1536)
+    legacy = os.path.join (test_output_dir, 'legacy.json')
+    with open (legacy, 'w', encoding='utf-8') as file:
+        json.dump (records, file, indent=4)
+    compact = os.path.join (test_output_dir, 'compact.json')
+    write_records (compact, records)
+
+    legacy_size = os.path.getsize (legacy)
+    compact_size = os.path.getsize (compact)
+    print (f'\n200 records: json.dump indent=4 {legacy_size} bytes, base64 {compact_size} bytes')
+    assert compact_size * 4 < legacy_size
+
+def test_write_details_json (test_output_dir):
+    items = []
+    for i in range (4):
+        item = PipelineItem()
+        item.path = 'https://a.com/' + str(i)
+        item.summary = 'Summary ' + str(i)
+        item.embedding = [float(i), 0.5]
+        item.cluster = i % 2
+        items.append (item)
+    themes = []
+    for i in range (2):
+        theme = Theme()
+        theme.short_description = 'Theme ' + str(i)
+        themes.append (theme)
+
+    spec = WebSearchPipelineSpec()
+    spec.output_data_name = 'details.jsonl'
+    write_details_json (test_output_dir, items, themes, spec)
+
+    records = list (read_records (os.path.join (test_output_dir, 'details.jsonl')))
+    assert [record['path'] for record in records] == [item.path for item in items]
+    assert [record['embedding'] for record in records] == [item.embedding for item in items]
+    assert [record['theme'] for record in records] == ['Theme 0', 'Theme 1', 'Theme 0', 'Theme 1']
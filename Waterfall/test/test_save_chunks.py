@@ -0,0 +1,97 @@
+''' Tests for batched saving of PipelineItems as Chunks, run against a local stand-in for the Api '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import logging
+
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from CommonPy.src.chunk_repository_api import ChunkRepository
+from CommonPy.test.chunk_api_stub import ChunkApiStub
+from src.workflow import PipelineItem, PipelineFileSpec
+from src.db_repository import DbRepository
+from src.waterfall_pipeline_save_chunks import save_chunks
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+@pytest.fixture
+def stub_api():
+    server = ChunkApiStub().start()
+    yield server
+    server.stop()
+
+
+def make_items(count: int) -> list[PipelineItem]:
+    items = []
+    for i in range(count):
+        item = PipelineItem()
+        item.path = 'https://example.com/' + str(i)
+        item.text = 'Text ' + str(i)
+        item.summary = 'Summary ' + str(i)
+        item.embedding = [float(i)] * 8
+        items.append(item)
+    return items
+
+
+def test_save_find_many(stub_api):
+    repository = DbRepository('TestApplication', 'TestContext', ChunkRepository(stub_api.api_url))
+    items = make_items(10)
+
+    assert repository.save_many(items)
+    found = repository.find_many(['https://example.com/2', 'https://example.com/missing'])
+
+    assert found[0].id == items[2].id
+    assert found[0].summary == 'Summary 2'
+    assert found[0].embedding == [2.0] * 8
+    assert found[1] is None
+
+
+def test_save_chunks_upserts(stub_api):
+    spec = PipelineFileSpec()
+    spec.description = 'Test'
+    chunk_repository = ChunkRepository(stub_api.api_url)
+
+    save_chunks(make_items(5), spec, chunk_repository)
+    ids = set(stub_api.chunks)
+    save_chunks(make_items(5), spec, chunk_repository)
+
+    assert set(stub_api.chunks) == ids
+    assert len(ids) == 5
+
+
+def test_save_chunks_paged(stub_api):
+    # More stored chunks than one page of query results, saved again
+    spec = PipelineFileSpec()
+    spec.description = 'Test'
+    chunk_repository = ChunkRepository(stub_api.api_url)
+    stub_api.page_size = 7
+
+    save_chunks(make_items(40), spec, chunk_repository)
+    ids = set(stub_api.chunks)
+    save_chunks(make_items(40), spec, chunk_repository)
+
+    assert set(stub_api.chunks) == ids
+    assert stub_api.pages > 2
+
+
+def test_save_chunks_request_count(stub_api):
+    spec = PipelineFileSpec()
+    spec.description = 'Test'
+
+    save_chunks(make_items(500), spec, ChunkRepository(stub_api.api_url))
+
+    assert len(stub_api.chunks) == 500
+    assert stub_api.calls['SaveChunks'] <= 10
+    assert stub_api.calls['FindChunk'] == stub_api.calls['SaveChunk'] == 0
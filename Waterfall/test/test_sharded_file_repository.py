@@ -0,0 +1,125 @@
+''' Tests for the sharded File System API '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+
+import os
+import shutil
+import sys
+import logging
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.file_repository import FileRespository
+from src.sharded_file_repository import ShardedFileRespository, migrate_flat_files
+from src.summary_repository_facade import SummaryRespositoryFacade
+from src.text_repository_facade import TextRespositoryFacade
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_sharded")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def test_basic (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    assert repository.output_location == test_output_dir
+    assert repository.list_contents ('txt') == []
+
+def test_with_output (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'summary.txt', 'Here is some text')
+
+    file_name = repository.file_name ('https://a.com/page.html', 'summary.txt')
+    assert os.path.dirname (os.path.dirname (file_name)) == test_output_dir
+    assert os.path.exists (file_name)
+    assert repository.exists ('https://a.com/page.html', 'summary.txt')
+    assert repository.load ('https://a.com/page.html', 'summary.txt') == 'Here is some text'
+    assert not repository.exists ('https://a.com/other.html', 'summary.txt')
+    assert repository.load ('https://a.com/other.html', 'summary.txt') == ''
+
+def test_same_shard_per_page (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir, levels=2)
+    text_file = repository.file_name ('https://a.com/page.html', 'txt')
+    summary_file = repository.file_name ('https://a.com/page.html', 'summary.txt')
+
+    assert os.path.dirname (text_file) == os.path.dirname (summary_file)
+    assert len(os.path.relpath (text_file, test_output_dir).split (os.sep)) == 3
+
+def test_fan_out (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    for i in range (1000):
+        repository.save ('https://a.com/' + str(i), 'txt', 'Text ' + str(i))
+
+    directories = [name for name in os.listdir (test_output_dir)
+                   if os.path.isdir (os.path.join (test_output_dir, name))]
+    assert len(directories) > 200
+    assert max (len(os.listdir (os.path.join (test_output_dir, name))) for name in directories) < 20
+    assert sorted (repository.list_contents ('txt')) == sorted ('a.com_' + str(i) for i in range(1000))
+
+def test_no_temp_files_left (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'txt', 'First')
+    repository.save ('https://a.com/page.html', 'txt', 'Second')
+
+    directory = os.path.dirname (repository.file_name ('https://a.com/page.html', 'txt'))
+    assert os.listdir (directory) == ['a.com_page.html.txt']
+    assert repository.load ('https://a.com/page.html', 'txt') == 'Second'
+
+def test_failed_write_keeps_old_file (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'txt', 'First')
+
+    with pytest.raises (TypeError):
+        repository.save ('https://a.com/page.html', 'txt', object())
+
+    directory = os.path.dirname (repository.file_name ('https://a.com/page.html', 'txt'))
+    assert os.listdir (directory) == ['a.com_page.html.txt']
+    assert repository.load ('https://a.com/page.html', 'txt') == 'First'
+
+def test_directory_removed (test_output_dir):
+    repository = ShardedFileRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'txt', 'First')
+    shutil.rmtree (os.path.dirname (repository.file_name ('https://a.com/page.html', 'txt')))
+
+    repository.save ('https://a.com/page.html', 'txt', 'Second')
+    assert repository.load ('https://a.com/page.html', 'txt') == 'Second'
+
+def test_reads_flat_layout (test_output_dir):
+    FileRespository (test_output_dir).save ('https://a.com/page.html', 'summary.txt', 'Flat')
+
+    repository = SummaryRespositoryFacade (test_output_dir)
+    assert repository.exists ('https://a.com/page.html')
+    assert repository.load ('https://a.com/page.html') == 'Flat'
+
+def test_migrate (test_output_dir):
+    flat = FileRespository (test_output_dir)
+    for i in range (20):
+        flat.save ('https://a.com/' + str(i), 'txt', 'Text ' + str(i))
+        flat.save ('https://a.com/' + str(i), 'summary.txt', 'Summary ' + str(i))
+    with open (os.path.join (test_output_dir, 'chart.html'), 'w', encoding='utf-8') as file:
+        file.write ('<html></html>')
+
+    assert migrate_flat_files (test_output_dir) == 40
+    assert migrate_flat_files (test_output_dir) == 0
+
+    assert sorted (name for name in os.listdir (test_output_dir)
+                   if os.path.isfile (os.path.join (test_output_dir, name))) == ['chart.html']
+
+    text = TextRespositoryFacade (test_output_dir)
+    summary = SummaryRespositoryFacade (test_output_dir)
+    assert text.load ('https://a.com/7') == 'Text 7'
+    assert summary.load ('https://a.com/7') == 'Summary 7'
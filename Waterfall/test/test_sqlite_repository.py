@@ -0,0 +1,168 @@
+''' Tests for the SQLite repository backend '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+
+import os
+import math
+import shutil
+import sys
+import time
+import logging
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.sqlite_repository import SqliteRespository, open_repository, open_sqlite_repository, QUERY_BATCH_SIZE
+from src.sharded_file_repository import ShardedFileRespository
+from src.text_repository_facade import TextRespositoryFacade
+from src.summary_repository_facade import SummaryRespositoryFacade
+from src.embedder_repository_facade import EmbeddingRespositoryFacade
+from src.embedding_store import open_store
+from src.make_local_file_path import make_local_file_path
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_sqlite")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def test_basic (test_output_dir):
+    repository = SqliteRespository (test_output_dir)
+    assert repository.output_location == test_output_dir
+    assert repository.list_contents ('txt') == []
+
+def test_with_output (test_output_dir):
+    repository = SqliteRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'txt', 'Here is "some" text')
+    repository.save ('https://a.com/page.html', 'summary.txt', 'A summary')
+    repository.save ('https://a.com/page.html', 'embed.txt', [0.5, 1.5])
+
+    assert repository.exists ('https://a.com/page.html', 'txt')
+    assert repository.load ('https://a.com/page.html', 'txt') == 'Here is "some" text'
+    assert repository.load ('https://a.com/page.html', 'summary.txt') == 'A summary'
+    assert repository.load ('https://a.com/page.html', 'embed.txt') == [0.5, 1.5]
+
+def test_with_no_output (test_output_dir):
+    repository = SqliteRespository (test_output_dir)
+    repository.save ('https://a.com/page.html', 'txt', 'Text only')
+
+    assert not repository.exists ('https://a.com/page.html', 'summary.txt')
+    assert not repository.exists ('https://a.com/other.html', 'txt')
+    assert not repository.exists ('', 'txt')
+    assert repository.load ('https://a.com/other.html', 'txt') == ''
+    with pytest.raises (ValueError):
+        repository.load ('https://a.com/page.html', 'html')
+
+def test_batches (test_output_dir):
+    repository = SqliteRespository (test_output_dir)
+    paths = ['https://a.com/' + str(i) for i in range (2000)]
+    repository.save_many (paths[::2], 'summary.txt', ['Summary ' + str(i) for i in range (0, 2000, 2)])
+
+    exists = repository.exists_many (paths + [None], 'summary.txt')
+    loaded = repository.load_many (paths[:4] + paths[:1], 'summary.txt')
+
+    assert exists == [i % 2 == 0 for i in range (2000)] + [False]
+    assert loaded == ['Summary 0', '', 'Summary 2', '', 'Summary 0']
+    assert len(repository.list_contents ('summary.txt')) == 1000
+
+def test_open_repository (test_output_dir):
+    assert isinstance (open_repository (test_output_dir), ShardedFileRespository)
+
+    repository = open_sqlite_repository (test_output_dir)
+    assert open_repository (test_output_dir) is repository
+    assert TextRespositoryFacade (test_output_dir).file__repository is repository
+
+def test_facades (test_output_dir):
+    repository = SqliteRespository (test_output_dir)
+    text = TextRespositoryFacade (test_output_dir, repository)
+    summary = SummaryRespositoryFacade (test_output_dir, repository)
+    embedding = EmbeddingRespositoryFacade (test_output_dir, repository)
+
+    text.save_many (['one.html', 'two.html'], ['One', 'Two'])
+    summary.save ('one.html', 'Summary one')
+    embedding.save_many (['one.html', 'two.html'], [[1.0, 0.0], [0.0, 1.0]])
+
+    assert text.load_many (['two.html', 'one.html']) == ['Two', 'One']
+    assert summary.exists_many (['one.html', 'two.html']) == [True, False]
+    assert embedding.store is None
+    assert embedding.load ('two.html') == [0.0, 1.0]
+    assert embedding.load_many (['one.html']) == [[1.0, 0.0]]
+    assert embedding.list_contents () == ['one.html', 'two.html']
+    with pytest.raises (ValueError):
+        embedding.load ('three.html')
+
+def test_import_files (test_output_dir):
+    files = ShardedFileRespository (test_output_dir)
+    for i in range (10):
+        files.save ('https://a.com/' + str(i), 'txt', 'Text ' + str(i))
+        files.save ('https://a.com/' + str(i), 'summary.txt', 'Summary ' + str(i))
+
+    repository = SqliteRespository (test_output_dir)
+    assert repository.import_files () == 20
+    assert repository.import_files () == 0
+    assert repository.load ('https://a.com/3', 'txt') == 'Text 3'
+    assert repository.load ('https://a.com/3', 'summary.txt') == 'Summary 3'
+
+def test_import_embeddings (test_output_dir):
+    files = ShardedFileRespository (test_output_dir)
+    store = open_store (test_output_dir)
+    for i in range (6):
+        path = 'https://a.com/' + str(i)
+        files.save (path, 'txt', 'Text ' + str(i))
+        if i < 3:
+            store.save (path, [float(i), 0.5])
+        else:
+            files.save (path, 'embed.txt', str ([float(i), 0.25]))
+    # In both, the store wins
+    files.save ('https://a.com/0', 'embed.txt', str ([9.0, 9.0]))
+    files.save ('https://a.com/bad', 'embed.txt', 'not an embedding')
+
+    repository = SqliteRespository (test_output_dir)
+    assert repository.import_files () == 12
+    assert repository.import_files () == 0
+
+    embedding = EmbeddingRespositoryFacade (test_output_dir, repository)
+    paths = ['https://a.com/' + str(i) for i in range (6)]
+    assert embedding.load_many (paths) == [[0.0, 0.5], [1.0, 0.5], [2.0, 0.5],
+                                           [3.0, 0.25], [4.0, 0.25], [5.0, 0.25]]
+    assert embedding.exists_many (paths + ['https://a.com/bad']) == [True] * 6 + [False]
+    assert sorted (embedding.list_contents ()) == sorted (store.keys () + [make_local_file_path (path) for path in paths[3:]])
+
+def test_batch_speed (test_output_dir, record_property):
+    items = 5000
+    paths = ['https://a.com/' + str(i) for i in range (items)]
+    texts = ['Text ' + str(i) for i in range (items)]
+    files = ShardedFileRespository (os.path.join (test_output_dir, 'files'))
+    repository = SqliteRespository (test_output_dir)
+    files.save_many (paths, 'txt', texts)
+    repository.save_many (paths, 'txt', texts)
+
+    start = time.perf_counter()
+    loaded_files = [files.load (path, 'txt') for path in paths if files.exists (path, 'txt')]
+    files_elapsed = time.perf_counter() - start
+
+    statements = []
+    repository._connection.set_trace_callback (statements.append)
+    start = time.perf_counter()
+    loaded = repository.load_many ([path for path, exists in zip (paths, repository.exists_many (paths, 'txt')) if exists], 'txt')
+    elapsed = time.perf_counter() - start
+
+    # Timings depend on the machine, so they are recorded rather than compared
+    record_property ('files_seconds', files_elapsed)
+    record_property ('sqlite_seconds', elapsed)
+    assert loaded == loaded_files == texts
+    # One query per QUERY_BATCH_SIZE keys to check, and again to load, not one or two per item
+    assert len(statements) == 2 * math.ceil (items / QUERY_BATCH_SIZE)
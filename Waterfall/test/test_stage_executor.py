@@ -0,0 +1,204 @@
+''' Tests for the concurrent stage executor '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import time
+import random
+import threading
+import logging
+
+test_root = os.path.dirname(__file__)
+parent = os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+from src.workflow import PipelineItem
+from src.stage_executor import StageExecutor, PipelinedExecutor, PipelineStage
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+
+def make_items(count: int) -> list[PipelineItem]:
+    items = []
+    for i in range(count):
+        item = PipelineItem()
+        item.path = str(i)
+        items.append(item)
+    return items
+
+
+def slow_step(item: PipelineItem) -> PipelineItem:
+    time.sleep(random.uniform(0.0, 0.02))
+    item.summary = 'Summary ' + item.path
+    return item
+
+
+def test_basic():
+    executor = StageExecutor('test', 4)
+    assert executor.stage_name == 'test'
+    assert executor.workers == 4
+
+
+def test_preserves_order():
+    items = make_items(50)
+
+    executor = StageExecutor('test', 8)
+    processed = executor.run(slow_step, items)
+
+    assert [item.path for item in processed] == [item.path for item in items]
+    assert all(item.summary == 'Summary ' + item.path for item in processed)
+
+
+def test_serial_matches_parallel():
+    serial = StageExecutor('test', 1).run(slow_step, make_items(20))
+    parallel = StageExecutor('test', 8).run(slow_step, make_items(20))
+
+    assert [item.path for item in serial] == [item.path for item in parallel]
+
+
+def test_error_isolation():
+    def failing_step(item: PipelineItem) -> PipelineItem:
+        if int(item.path) % 3 == 0:
+            raise RuntimeError('Failed ' + item.path)
+        return item
+
+    processed = StageExecutor('test', 4).run(failing_step, make_items(9))
+
+    assert [item.path for item in processed] == ['1', '2', '4', '5', '7', '8']
+
+
+def test_rejected_items_dropped():
+    def rejecting_step(item: PipelineItem) -> PipelineItem:
+        if item.path == '1':
+            return None
+        return item
+
+    processed = StageExecutor('test', 4).run(rejecting_step, make_items(3))
+
+    assert [item.path for item in processed] == ['0', '2']
+
+
+def test_bounded_concurrency():
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def counting_step(item: PipelineItem) -> PipelineItem:
+        with lock:
+            active[0] = active[0] + 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] = active[0] - 1
+        return item
+
+    StageExecutor('test', 3).run(counting_step, make_items(30))
+
+    assert 1 < peak[0] <= 3
+
+
+def make_stages(delay: float, workers: int = 1) -> list[PipelineStage]:
+    def fetch(item: PipelineItem) -> PipelineItem:
+        time.sleep(delay)
+        item.text = 'Text ' + item.path
+        return item
+
+    def chunk(item: PipelineItem) -> list[PipelineItem]:
+        chunks = []
+        for j in range(2):
+            piece = PipelineItem()
+            piece.path = item.path + '#' + str(j)
+            piece.text = item.text
+            chunks.append(piece)
+        return chunks
+
+    def summarise(item: PipelineItem) -> PipelineItem:
+        time.sleep(delay)
+        item.summary = 'Summary ' + item.path
+        return item
+
+    def embed_many(items: list[PipelineItem]) -> list[PipelineItem]:
+        time.sleep(delay)
+        for item in items:
+            item.embedding = [float(len(items))]
+        return items
+
+    return [PipelineStage('fetch', fetch, workers),
+            PipelineStage('chunk', chunk),
+            PipelineStage('summarise', summarise, workers),
+            PipelineStage('embed', embed_many, 1, 8)]
+
+
+def test_pipelined_order():
+    executor = PipelinedExecutor(make_stages(0.001, 4), queue_size=4)
+    processed = executor.run(make_items(30))
+
+    assert [item.path for item in processed] == [str(i) + '#' + str(j) for i in range(30) for j in range(2)]
+    assert all(item.summary == 'Summary ' + item.path and item.embedding for item in processed)
+
+    counts = [(stats.name, stats.items_in, stats.items_out) for stats in executor.stats.stages]
+    assert counts == [('fetch', 30, 30), ('chunk', 30, 60), ('summarise', 60, 60), ('embed', 60, 60)]
+    # Chunks queue up while a batch is embedded, so later batches hold more than one
+    assert executor.stats.stages[3].calls < 60
+    assert executor.stats.items == 60
+    assert str(executor.stats).find('items/s') != -1
+
+
+def test_pipelined_error_isolation():
+    def failing_step(item: PipelineItem) -> PipelineItem:
+        if int(item.path) % 3 == 0:
+            raise RuntimeError('Failed ' + item.path)
+        return item
+
+    def rejecting_step(item: PipelineItem) -> PipelineItem:
+        return None if item.path == '1' else item
+
+    def failing_batch(items: list[PipelineItem]) -> list[PipelineItem]:
+        if any(item.path == '8' for item in items):
+            raise RuntimeError('Failed batch')
+        return items
+
+    executor = PipelinedExecutor([PipelineStage('fail', failing_step, 2),
+                                  PipelineStage('reject', rejecting_step),
+                                  PipelineStage('batch', failing_batch, 1, 1)])
+    processed = executor.run(make_items(9))
+
+    assert [item.path for item in processed] == ['2', '4', '5', '7']
+    assert [stats.failed for stats in executor.stats.stages] == [3, 0, 1]
+    assert PipelinedExecutor([]).run(make_items(2))[1].path == '1'
+    assert PipelinedExecutor(make_stages(0.0)).run([]) == []
+
+
+def test_pipelined_overlap():
+    # Stages run at once, so later stages work on the first items while earlier ones take the rest
+    lock = threading.Lock()
+    active = {}
+    most_active = []
+
+    def track(name, step):
+        def tracked(value):
+            with lock:
+                active[name] = active.get(name, 0) + 1
+                most_active.append(sum(1 for count in active.values() if count))
+            try:
+                return step(value)
+            finally:
+                with lock:
+                    active[name] = active[name] - 1
+        return tracked
+
+    stages = [PipelineStage(stage.name, track(stage.name, stage.step), stage.workers, stage.batch_size)
+              for stage in make_stages(0.01, 4)]
+    executor = PipelinedExecutor(stages)
+    processed = executor.run(make_items(40))
+
+    assert len(processed) == 80
+    assert max(most_active) >= 2
+    assert [stats.items_in for stats in executor.stats.stages] == [40, 40, 80, 80]
+    assert [stats.items_out for stats in executor.stats.stages] == [40, 80, 80, 80]
@@ -0,0 +1,224 @@
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import pytest
+import os
+import shutil
+import sys
+import time
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Set paths tp find the 'src' directory
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.workflow import PipelineItem
+from src.step_cache import StepCache, open_cache, DEFAULT_MODEL
+import src.summariser as summariser_module
+import src.embedder as embedder_module
+from src.summariser import Summariser, SUMMARY_PERSONA, SUMMARY_LENGTH_WORDS
+from src.embedder import Embedder
+from src.summarise_fail_suppressor import SummariseFailSuppressor
+
+# Fixture to create a temporary directory for test output
+@pytest.fixture
+def test_output_dir(tmpdir):
+    dir_path = tmpdir.mkdir("test_output_cache")
+    logger.info(f"Created temporary test output directory: {dir_path}")
+    yield str(dir_path)
+    # Clean up after the test
+    logger.info(f"Cleaning up test output directory: {dir_path}")
+    shutil.rmtree(str(dir_path))
+
+def test_basic (test_output_dir):
+    cache = StepCache (test_output_dir)
+    assert cache.output_location == test_output_dir
+    assert len(cache) == 0
+
+def test_key ():
+    key = StepCache.make_key ('summarise', 'model', 'text', {'a': 1, 'b': 2})
+
+    assert key == StepCache.make_key ('summarise', 'model', 'text', {'b': 2, 'a': 1})
+    assert key != StepCache.make_key ('summarise', 'model', 'text changed', {'a': 1, 'b': 2})
+    assert key != StepCache.make_key ('summarise', 'other model', 'text', {'a': 1, 'b': 2})
+    assert key != StepCache.make_key ('embed', 'model', 'text', {'a': 1, 'b': 2})
+    assert key != StepCache.make_key ('summarise', 'model', 'text', {'a': 1, 'b': 3})
+
+def test_with_output (test_output_dir):
+    cache = StepCache (test_output_dir)
+    key = StepCache.make_key ('summarise', DEFAULT_MODEL, 'text')
+
+    assert cache.get ('summarise', key) is None
+    cache.put ('summarise', key, 'A summary')
+    assert cache.get ('summarise', key) == 'A summary'
+
+    cache.put ('summarise', key, None)
+    assert cache.get ('summarise', key) == 'A summary'
+
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+    assert cache.stats.by_step['summarise'] == [2, 1]
+
+def test_embedding (test_output_dir):
+    cache = StepCache (test_output_dir)
+    key = StepCache.make_key ('embed', DEFAULT_MODEL, 'text')
+
+    cache.put_embedding ('embed', key, [0.5, 1.5, -2.0])
+
+    assert cache.get_embedding ('embed', key) == [0.5, 1.5, -2.0]
+    assert cache.get ('embed', key) is None
+
+def test_persists (test_output_dir):
+    cache = StepCache (test_output_dir)
+    cache.put ('suppress', 'key', False)
+    cache.close ()
+
+    reopened = StepCache (test_output_dir)
+    assert reopened.get ('suppress', 'key') is False
+    assert len(reopened) == 1
+
+def test_expiry (test_output_dir):
+    cache = StepCache (test_output_dir, max_age={'download_html': 0.05})
+    cache.put ('download_html', 'page', 'Page text')
+    cache.put ('summarise', 'summary', 'Summary')
+
+    time.sleep (0.1)
+
+    assert cache.get ('download_html', 'page') is None
+    assert cache.get ('summarise', 'summary') == 'Summary'
+    assert cache.stats.expired == 1
+    assert len(cache) == 1
+
+def test_lru_by_count (test_output_dir):
+    cache = StepCache (test_output_dir, max_entries=10)
+    for i in range (10):
+        cache.put ('summarise', str(i), 'Summary ' + str(i))
+    cache.get ('summarise', '0')
+
+    cache.put ('summarise', '10', 'Summary 10')
+
+    assert len(cache) == 9
+    assert cache.get ('summarise', '0') == 'Summary 0'
+    assert cache.get ('summarise', '1') is None
+    assert cache.get ('summarise', '10') == 'Summary 10'
+    assert cache.stats.evictions == 2
+
+def test_lru_by_bytes (test_output_dir):
+    cache = StepCache (test_output_dir, max_bytes=1000)
+    for i in range (20):
+        cache.put ('summarise', str(i), 'x' * 100)
+
+    assert len(cache) <= 10
+    assert cache.get ('summarise', '19') is not None
+
+def test_invalidate (test_output_dir):
+    cache = StepCache (test_output_dir)
+    cache.put ('summarise', 'one', 'Summary')
+    cache.put ('find_theme', 'two', 'Theme')
+    cache.put ('find_theme', 'three', 'Theme')
+
+    cache.invalidate ('one')
+    assert cache.invalidate_step ('find_theme') == 2
+    assert len(cache) == 0
+
+def test_threads (test_output_dir):
+    cache = StepCache (test_output_dir)
+
+    def work (i: int):
+        cache.put ('summarise', str(i), 'Summary ' + str(i))
+        return cache.get ('summarise', str(i))
+
+    with ThreadPoolExecutor (max_workers=8) as executor:
+        results = list(executor.map (work, range(200)))
+
+    assert results == ['Summary ' + str(i) for i in range(200)]
+    assert len(cache) == 200
+
+def test_steps_use_cache (test_output_dir):
+    cache = open_cache (test_output_dir)
+    params = {'persona': SUMMARY_PERSONA, 'lengthInWords': SUMMARY_LENGTH_WORDS}
+
+    items = []
+    for i in range (10):
+        item = PipelineItem ()
+        item.path = 'https://example.com/' + str(i)
+        item.text = 'Unchanged page ' + str(i)
+        item.summary = 'Summary ' + str(i)
+        cache.put ('summarise', StepCache.make_key ('summarise', DEFAULT_MODEL, item.text, params), item.summary)
+        cache.put ('suppress', StepCache.make_key ('suppress', DEFAULT_MODEL, item.summary), i != 3)
+        items.append (item)
+
+    summariser = Summariser (test_output_dir)
+    suppressor = SummariseFailSuppressor (test_output_dir)
+    kept = [suppressor.should_suppress (summariser.summarise (item)) for item in items]
+
+    assert [item.summary for item in items] == ['Summary ' + str(i) for i in range(10)]
+    assert kept[3] is None
+    assert len([item for item in kept if item]) == 9
+    assert cache.stats.misses == 0
+
+def test_claim_legacy (test_output_dir):
+    cache = StepCache (test_output_dir)
+
+    assert cache.claim_legacy ('summarise', 'https://example.com/page')
+    assert not cache.claim_legacy ('summarise', 'https://example.com/page')
+    assert cache.claim_legacy ('embed', 'https://example.com/page')
+
+def test_claim_after_mark (test_output_dir):
+    cache = StepCache (test_output_dir, max_entries=2)
+    cache.mark_legacy ('summarise', ['https://example.com/page', None])
+
+    # Eviction and clear() do not forget claims
+    for i in range (10):
+        cache.put ('summarise', StepCache.make_key ('summarise', '', str(i)), i)
+    cache.clear()
+    assert not cache.claim_legacy ('summarise', 'https://example.com/page')
+    assert not StepCache (test_output_dir).claim_legacy ('summarise', 'https://example.com/page')
+
+class FakeResponse:
+    ''' The response of the FakeSession '''
+    def __init__(self, body):
+        self.status_code = 200
+        self.text = json.dumps (body)
+
+class FakeSession:
+    ''' Stands in for the API, answering with a result made from each text it is sent '''
+    def __init__(self):
+        self.texts = []
+
+    def post(self, url, **kwargs):
+        request = kwargs['json']['request']
+        texts = request.get ('texts', [request['text']])
+        self.texts.extend (texts)
+        return FakeResponse ({'summary': 'Summary of ' + texts[0],
+                              'embedding': [float(len(texts[0]))],
+                              'embeddings': [[float(len(text))] for text in texts]})
+
+def test_changed_text_recomputed (test_output_dir, monkeypatch):
+    # A page first computed after the upgrade, then changed, must not be given its old result
+    session = FakeSession()
+    monkeypatch.setattr (summariser_module, 'get_session', lambda url: session)
+    monkeypatch.setattr (embedder_module, 'get_session', lambda url: session)
+
+    item = PipelineItem ()
+    item.path = 'https://example.com/page'
+    item.text = 'First text'
+    Summariser (test_output_dir).summarise (item)
+    Embedder (test_output_dir).embed (item)
+    assert (item.summary, item.embedding) == ('Summary of First text', [10.0])
+
+    item.text = 'Changed text, longer'
+    Summariser (test_output_dir).summarise (item)
+    Embedder (test_output_dir).embed_many ([item])
+
+    assert (item.summary, item.embedding) == ('Summary of Changed text, longer', [20.0])
+    assert session.texts == ['First text', 'First text', 'Changed text, longer', 'Changed text, longer']
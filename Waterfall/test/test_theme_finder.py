@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.workflow import PipelineItem
-from src.theme_finder import ThemeFinder
+from src.theme_finder import ThemeFinder, make_theme_input
 from src.summariser import Summariser
 from src.html_file_downloader import HtmlFileDownloader
 
@@ -26,6 +26,36 @@ def test_basic ():
     summariser = ThemeFinder  ()
     assert summariser != None
 
+def test_theme_input ():
+    summaries = ['First summary', 'Second summary']
+
+    assert make_theme_input (summaries) == 'First summary\n Second summary\n '
+    assert make_theme_input ([]) == ''
+
+def test_theme_input_budget ():
+    # Members 0-7 sit round the centroid, 8 and 9 are outliers
+    summaries = ['Summary ' + str(i) + ' ' + 'x' * 100 for i in range (10)]
+    embeddings = [[1.0, 0.1 * (i % 2)] for i in range (8)] + [[0.0, 1.0], [-1.0, 0.0]]
+
+    text = make_theme_input (summaries, embeddings, max_tokens=150)
+
+    kept = [line.split()[1] for line in text.split ('\n ') if line]
+    assert len(kept) == 5
+    assert '8' not in kept and '9' not in kept
+    assert kept == sorted (kept)
+
+def test_theme_input_one_member_over_budget ():
+    text = make_theme_input (['x' * 1000, 'y' * 1000], max_tokens=100)
+
+    assert text == 'x' * 400 + '\n '
+
+def test_theme_input_linear ():
+    summaries = ['Summary of a page ' + str(i) for i in range (200000)]
+
+    text = make_theme_input (summaries, max_tokens=10000000)
+
+    assert text.count ('\n ') == 200000
+
 def test_with_output ():
     test_root = os.path.dirname(__file__)
     os.chdir (test_root)
@@ -3,7 +3,14 @@
 # Standard Library Imports
 import os
 import sys
+import json
+import time
+import shutil
 import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
 
 from src.workflow import WebSearchPipelineSpec
 
@@ -19,6 +26,61 @@ logger.setLevel(logging.ERROR)
 
 from src.waterfall_pipeline import WebSearcher
 from src.web_searcher import AI_SUPPLY_STACK_SEARCH_ENGINE_ID
+from src.summary_repository_facade import SummaryRespositoryFacade
+from src.embedder_repository_facade import EmbeddingRespositoryFacade
+
+class SearchHandler (BaseHTTPRequestHandler):
+    ''' Answers like the Custom Search API: ten links per page, the same site under two URLs, no items after page 3 '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET (self):  # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.requests = server.requests + 1
+            server.active = server.active + 1
+            server.max_active = max (server.max_active, server.active)
+        time.sleep (server.delay)
+
+        start = int (parse_qs (urlparse (self.path).query)['start'][0])
+        body = {}
+        if start <= 21:
+            links = [f'https://a.com/page{i}' for i in range (start, start + 9)] + ['https://A.com/shared/#results']
+            body = {'items': [{'link': link} for link in links]}
+        encoded = json.dumps (body).encode ('utf-8')
+        self.send_response (200)
+        self.send_header ('Content-Type', 'application/json')
+        self.send_header ('Content-Length', str (len (encoded)))
+        self.end_headers()
+        self.wfile.write (encoded)
+        with server.lock:
+            server.active = server.active - 1
+
+    def log_message (self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+@pytest.fixture
+def search_server ():
+    server = ThreadingHTTPServer (('127.0.0.1', 0), SearchHandler)
+    server.lock = threading.Lock()
+    server.requests = server.active = server.max_active = 0
+    server.delay = 0.2
+    thread = threading.Thread (target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def test_output_dir (tmpdir):
+    dir_path = tmpdir.mkdir ("test_output_search")
+    yield str (dir_path)
+    shutil.rmtree (str (dir_path))
+
+def make_spec (pages):
+    spec = WebSearchPipelineSpec()
+    spec.search_key = 'engine'
+    spec.pages = pages
+    return spec
 
 def test_basic ():
     test_output_location = 'test_output'
@@ -35,5 +97,55 @@ def test_with_search ():
     pipeline.search_key = AI_SUPPLY_STACK_SEARCH_ENGINE_ID
     pipeline.pages = 1
     pipeline_items = searcher.search (pipeline)    
-    assert len(pipeline_items) >= 1   
+    assert len(pipeline_items) >= 1
+
+
+def test_pages_in_parallel (test_output_dir, search_server):
+    searcher = WebSearcher (test_output_dir, f'http://127.0.0.1:{search_server.server_address[1]}/customsearch/v1')
+
+    items = searcher.search (make_spec (4))
+
+    # Pages 1 to 3 have results, page 4 has none. The shared link is kept once, where it first appeared.
+    paths = [item.path for item in items]
+    assert len(paths) == 28
+    assert paths[:10] == [f'https://a.com/page{i}' for i in range (1, 10)] + ['https://A.com/shared/#results']
+    assert searcher.stats.duplicates == 2
+    # One request per page, all in flight together
+    assert search_server.requests == 4
+    assert search_server.max_active == 4
+
+def test_cache (test_output_dir, search_server):
+    url = f'http://127.0.0.1:{search_server.server_address[1]}/customsearch/v1'
+    first = WebSearcher (test_output_dir, url).search (make_spec (3))
+
+    assert search_server.requests == 3
+
+    searcher = WebSearcher (test_output_dir, url)
+    second = searcher.search (make_spec (3))
+
+    # Every page from the cache, with no request to the server
+    assert [item.path for item in second] == [item.path for item in first]
+    assert search_server.requests == 3
+    assert searcher.stats.cached_pages == 3
+
+    spec = make_spec (3)
+    spec.search_cache_seconds = 0
+    WebSearcher (test_output_dir, url).search (spec)
+    assert search_server.requests == 6
+
+def test_exclude_processed (test_output_dir, search_server):
+    url = f'http://127.0.0.1:{search_server.server_address[1]}/customsearch/v1'
+    SummaryRespositoryFacade (test_output_dir).save ('https://a.com/page1', 'Summary')
+    SummaryRespositoryFacade (test_output_dir).save ('https://a.com/page2', 'Summary')
+    EmbeddingRespositoryFacade (test_output_dir).save ('https://a.com/page2', [0.5, 1.5])
+
+    spec = make_spec (1)
+    assert len (WebSearcher (test_output_dir, url).search (spec)) == 10
+
+    spec.exclude_processed = True
+    searcher = WebSearcher (test_output_dir, url)
+    paths = [item.path for item in searcher.search (spec)]
+    assert 'https://a.com/page1' in paths
+    assert 'https://a.com/page2' not in paths
+    assert searcher.stats.processed == 1
 
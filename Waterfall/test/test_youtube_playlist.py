@@ -3,6 +3,7 @@
 # Standard Library Imports
 import os
 import sys
+import time
 import logging
 
 from src.workflow import YouTubePipelineSpec
@@ -18,7 +19,9 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 from src.youtube_searcher import YoutubePlaylistSearcher
-from src.youtube_transcript_downloader import YouTubeTranscriptDownloader
+import src.youtube_transcript_downloader as youtube_transcript_downloader
+from src.youtube_transcript_downloader import YouTubeTranscriptDownloader, clean_text, assemble_transcript
+from src.workflow import PipelineItem
 from src.boxer_sources import youtube_playlists
 
 def test_basic ():
@@ -55,3 +58,55 @@ def test_download():
        assert len(item.text) >= 1 
 
     assert len(pipeline_items) >= 1   
+
+def make_transcript (count):
+    return [{'text': f'segment {i} &#39;said\n>> this[inaudible]  ', 'start': i * 2.5, 'duration': 2.5}
+            for i in range (count)]
+
+def test_clean_text ():
+    assert clean_text ("it&#39;s\nhere >> now  [inaudible] end") == "it's here now end"
+    assert clean_text ("a\n \nb") == "a b"
+
+def test_assemble_transcript ():
+    transcript = make_transcript (3) + [{'text': ' [inaudible] ', 'start': 8.0}, {'text': 'last', 'start': 9.0}]
+    text, segments = assemble_transcript (transcript)
+
+    assert text == "segment 0 'said this segment 1 'said this segment 2 'said this last"
+    # Segments left empty by cleaning are dropped
+    assert len(segments) == 4
+    assert list (segments.starts) == [0.0, 2.5, 5.0, 9.0]
+    for offset, segment in zip (segments.offsets, transcript[:3]):
+        assert text[offset:].startswith ('segment ' + segment['text'].split()[1])
+    assert text[segments.offsets[3]:] == 'last'
+    assert assemble_transcript ([])[0] == ''
+
+def test_assemble_long_transcript (record_property):
+    # A 3 hour talk has a few thousand segments, this is well beyond
+    transcript = make_transcript (100000)
+
+    start = time.perf_counter()
+    text, segments = assemble_transcript (transcript)
+    elapsed = time.perf_counter() - start
+
+    record_property ('assemble_seconds', elapsed)
+    assert len(segments) == 100000
+    assert text[segments.offsets[-1]:].startswith ('segment 99999')
+
+def test_download_segments (tmpdir, monkeypatch):
+    monkeypatch.setattr (youtube_transcript_downloader.YouTubeTranscriptApi, 'get_transcript',
+                         lambda video_id: make_transcript (4), raising=False)
+    output_location = str(tmpdir)
+
+    item = PipelineItem()
+    item.path = 'https://www.youtube.com/watch?v=abc'
+    item = YouTubeTranscriptDownloader (output_location).download (item)
+    assert list (item.segments.starts) == [0.0, 2.5, 5.0, 7.5]
+
+    # Served from the cache, with the segments
+    monkeypatch.setattr (youtube_transcript_downloader.YouTubeTranscriptApi, 'get_transcript',
+                         lambda video_id: [], raising=False)
+    cached = PipelineItem()
+    cached.path = item.path
+    cached = YouTubeTranscriptDownloader (output_location).download (cached)
+    assert cached.text == item.text
+    assert list (cached.segments.offsets) == list (item.segments.offsets)
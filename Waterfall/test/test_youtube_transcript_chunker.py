@@ -0,0 +1,161 @@
+''' Tests for the time markers given to chunks of a YouTube transcript '''
+# Copyright (c) 2024 Braid Technologies Ltd
+
+# Standard Library Imports
+import os
+import sys
+import re
+import time
+import random
+import logging
+import pytest
+
+test_root = os.path.dirname(__file__)
+parent= os.path.abspath(os.path.join(test_root, '..'))
+src_dir = os.path.join(parent, 'src')
+sys.path.extend([parent, src_dir])
+
+# Set up logging to display information about the execution of the script
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+from src.workflow import PipelineItem
+from src.chunker import CHUNK_ENGINE_WORDS
+from src.local_chunker import chunk_offsets, chunk_text
+from src.transcript_segments import TranscriptSegments
+from src.youtube_transcript_downloader import assemble_transcript
+from src.youtube_transcript_chunker import (YouTubeTranscriptChunker, find_chunk_offsets,
+                                            make_start_time_offset_seconds)
+
+URL = 'https://www.youtube.com/watch?v=abc'
+
+def make_item (count, seed = 1):
+    # Segments of uneven length and duration, as in a talk with pauses and fast passages
+    rng = random.Random (seed)
+    transcript = []
+    start = 0.0
+    for i in range (count):
+        words = ' '.join (['word'] * rng.randint (1, 12))
+        transcript.append ({'text': f'seg{i} {words}', 'start': start})
+        start = start + rng.uniform (0.5, 20.0)
+    item = PipelineItem()
+    item.path = URL
+    item.text, item.segments = assemble_transcript (transcript)
+    item.length_minutes = int (start / 60)
+    return item, transcript
+
+def expected_marker (item, transcript, chunk_text):
+    # The segment holding the first word of the chunk, found by a plain scan of the segments
+    offset = item.text.find (chunk_text.lstrip())
+    index = 0
+    while index + 1 < len(item.segments) and item.segments.offsets[index + 1] <= offset:
+        index = index + 1
+    return URL + make_start_time_offset_seconds (transcript[index]['start'])
+
+def test_make_start_time_offset_seconds ():
+    assert make_start_time_offset_seconds (0) == '&t=00m00s'
+    assert make_start_time_offset_seconds (754.9) == '&t=12m34s'
+    assert make_start_time_offset_seconds (3 * 3600 + 62) == '&t=03h01m02s'
+
+def test_start_seconds ():
+    segments = TranscriptSegments()
+    for offset, start in [(0, 0.0), (10, 4.0), (25, 9.5)]:
+        segments.append (offset, start)
+
+    assert [segments.start_seconds (offset) for offset in (0, 9, 10, 24, 25, 1000)] == [0.0, 0.0, 4.0, 4.0, 9.5, 9.5]
+    assert TranscriptSegments().start_seconds (5) == 0.0
+    assert TranscriptSegments.from_json (segments.to_json()).start_seconds (12) == 4.0
+
+def test_find_chunk_offsets ():
+    text = 'one two three four five six'
+    assert find_chunk_offsets (text, ['one two', ' three four', 'four five six']) == [0, 8, 14]
+    # Not found, so given the start of the chunk before
+    assert find_chunk_offsets (text, ['one two', 'changed', ' five six']) == [0, 0, 19]
+
+def make_repeated_item (count, seed = 1):
+    # Mostly the same few captions, as in a music video or a string of thank yous
+    rng = random.Random (seed)
+    transcript = []
+    start = 0.0
+    for i in range (count):
+        text = rng.choice (['thank you', 'thank you so much', '[Music]', 'thank you']) if i % 25 else f'part {i}'
+        transcript.append ({'text': text, 'start': start})
+        start = start + rng.uniform (0.5, 5.0)
+    item = PipelineItem()
+    item.path = URL
+    item.text, item.segments = assemble_transcript (transcript)
+    item.length_minutes = int (start / 60)
+    return item
+
+def first_word_offsets (text, size, overlap):
+    return [start + len(text[start:end]) - len(text[start:end].lstrip())
+            for start, end in chunk_offsets (text, size, overlap, CHUNK_ENGINE_WORDS)]
+
+@pytest.mark.parametrize ('overlap', [0, 10])
+def test_find_chunk_offsets_repeated (overlap):
+    item = make_repeated_item (1000)
+    chunk_texts = chunk_text (item.text, 100, overlap, CHUNK_ENGINE_WORDS)
+
+    assert find_chunk_offsets (item.text, chunk_texts, overlap) == first_word_offsets (item.text, 100, overlap)
+
+@pytest.mark.parametrize ('overlap', [0, 10])
+def test_exact_markers_repeated (tmpdir, overlap):
+    item = make_repeated_item (1000)
+
+    chunks = YouTubeTranscriptChunker (str(tmpdir), CHUNK_ENGINE_WORDS).chunk (item, 100, overlap)
+
+    expected = [URL + make_start_time_offset_seconds (item.segments.start_seconds (offset))
+                for offset in first_word_offsets (item.text, 100, overlap)]
+    assert [chunk.path for chunk in chunks] == expected
+
+@pytest.mark.parametrize ('overlap', [0, 10])
+def test_exact_markers (tmpdir, overlap):
+    item, transcript = make_item (500)
+
+    chunks = YouTubeTranscriptChunker (str(tmpdir), CHUNK_ENGINE_WORDS).chunk (item, 300, overlap)
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert chunk.path == expected_marker (item, transcript, chunk.text)
+
+def test_markers_against_estimate (tmpdir, record_property):
+    item, transcript = make_item (2000)
+    chunker = YouTubeTranscriptChunker (str(tmpdir), CHUNK_ENGINE_WORDS)
+
+    exact = chunker.chunk (item, 500, 20)
+    segments = item.segments
+    item.segments = None
+    estimated = chunker.chunk (item, 500, 20)
+    item.segments = segments
+
+    # The estimate, to the minute, drifts from where each chunk really starts
+    def seconds (path):
+        hours, minutes, seconds = re.search (r'&t=(?:(\d+)h)?(\d+)m(?:(\d+)s)?', path).groups()
+        return int (hours or 0) * 3600 + int (minutes) * 60 + int (seconds or 0)
+    drift = max (abs (seconds (a.path) - seconds (b.path)) for a, b in zip (exact, estimated))
+    record_property ('largest_estimate_drift_seconds', drift)
+    assert all (a.path == expected_marker (item, transcript, a.text) for a in exact)
+
+def test_no_segments (tmpdir):
+    item, _ = make_item (200)
+    item.segments = None
+
+    chunks = YouTubeTranscriptChunker (str(tmpdir), CHUNK_ENGINE_WORDS).chunk (item, 200, 0)
+
+    assert chunks[0].path == URL + '&t=00m'
+    assert all (chunk.path.startswith (URL + '&t=') for chunk in chunks)
+
+def test_benchmark (tmpdir, record_property):
+    item, transcript = make_item (10000)
+    chunk_texts = YouTubeTranscriptChunker (str(tmpdir), CHUNK_ENGINE_WORDS).chunker.chunk (item, 200, 20)
+
+    start = time.perf_counter()
+    offsets = find_chunk_offsets (item.text, [chunk.text for chunk in chunk_texts])
+    markers = [make_start_time_offset_seconds (item.segments.start_seconds (offset)) for offset in offsets]
+    elapsed = time.perf_counter() - start
+
+    record_property ('marker_seconds', elapsed)
+    assert len(markers) == len(chunk_texts)
+    assert [URL + marker for marker in markers[:20]] == [expected_marker (item, transcript, chunk.text)
+                                                         for chunk in chunk_texts[:20]]